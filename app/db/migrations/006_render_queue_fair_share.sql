@@ -0,0 +1,114 @@
+-- 006_render_queue_fair_share.sql
+-- Fair-share claiming for the render queues (export_jobs, video_jobs)
+-- Version: 1.6.0
+-- Date: 2026-10-18
+--
+-- Workers used to claim the oldest queued row (ORDER BY created_at), so one
+-- tenant bulk-submitting 30 exports occupied the queue ahead of everyone
+-- else. claim_render_job() instead picks the head job of the tenant that has
+-- received the least service recently, normalised by an optional per-job
+-- weight derived from the tenant's plan.
+
+BEGIN;
+
+INSERT INTO migration_history (version, description)
+VALUES ('1.6.0', 'Fair-share claiming for export_jobs and video_jobs');
+
+-- Per-job queue weight (copied from the submitter's plan at insert time) and
+-- the moment a worker claimed the job, used to measure recent service.
+ALTER TABLE export_jobs
+ADD COLUMN IF NOT EXISTS queue_weight NUMERIC NOT NULL DEFAULT 1,
+ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMPTZ;
+
+ALTER TABLE video_jobs
+ADD COLUMN IF NOT EXISTS queue_weight NUMERIC NOT NULL DEFAULT 1,
+ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMPTZ;
+
+COMMENT ON COLUMN export_jobs.queue_weight IS 'Fair-share weight from the submitter plan (free=1, higher plans get a larger share)';
+COMMENT ON COLUMN export_jobs.claimed_at IS 'When a worker claimed the job; drives the fair-share service window';
+COMMENT ON COLUMN video_jobs.queue_weight IS 'Fair-share weight from the submitter plan (free=1, higher plans get a larger share)';
+COMMENT ON COLUMN video_jobs.claimed_at IS 'When a worker claimed the job; drives the fair-share service window';
+
+-- Head-of-queue per tenant: DISTINCT ON (user_id) ... ORDER BY user_id, created_at
+CREATE INDEX IF NOT EXISTS idx_export_jobs_queued_user_created
+    ON export_jobs (user_id, created_at) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS idx_video_jobs_queued_user_created
+    ON video_jobs (user_id, created_at) WHERE status = 'queued';
+
+-- Recent service per tenant
+CREATE INDEX IF NOT EXISTS idx_export_jobs_claimed_at
+    ON export_jobs (claimed_at) WHERE claimed_at IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_video_jobs_claimed_at
+    ON video_jobs (claimed_at) WHERE claimed_at IS NOT NULL;
+
+-- Claim the next job for p_table using weighted fair share across user_id.
+--
+-- Score per tenant = (running jobs + jobs claimed in the last p_window_minutes)
+--                    / queue_weight of the tenant's oldest queued job
+-- Lowest score wins, ties broken by the job's age. A tenant with 30 queued
+-- jobs therefore alternates with every other tenant instead of draining
+-- first. The row is locked with SKIP LOCKED so concurrent workers never
+-- claim the same job; the caller simply polls again when nothing comes back.
+CREATE OR REPLACE FUNCTION claim_render_job(
+    p_table TEXT,
+    p_window_minutes INTEGER DEFAULT 15
+)
+RETURNS TABLE (id UUID, user_id TEXT, job_type TEXT)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_job_type_expr TEXT;
+BEGIN
+    IF p_table NOT IN ('export_jobs', 'video_jobs') THEN
+        RAISE EXCEPTION 'claim_render_job: unsupported table %', p_table;
+    END IF;
+
+    v_job_type_expr := CASE WHEN p_table = 'video_jobs' THEN 'j.job_type' ELSE 'NULL::text' END;
+
+    RETURN QUERY EXECUTE format($claim$
+        WITH service AS (
+            SELECT s.user_id::text AS user_id, count(*) AS served
+            FROM %1$I s
+            WHERE s.status = 'processing'
+               OR s.claimed_at > now() - make_interval(mins => $1)
+            GROUP BY s.user_id
+        ),
+        heads AS (
+            SELECT DISTINCT ON (q.user_id)
+                   q.id, q.user_id::text AS user_id, q.created_at, q.queue_weight
+            FROM %1$I q
+            WHERE q.status = 'queued'
+            ORDER BY q.user_id, q.created_at
+        ),
+        pick AS (
+            SELECT h.id
+            FROM heads h
+            LEFT JOIN service sv ON sv.user_id = h.user_id
+            ORDER BY COALESCE(sv.served, 0) / GREATEST(COALESCE(h.queue_weight, 1), 0.1),
+                     h.created_at
+            LIMIT 1
+        ),
+        locked AS (
+            SELECT j.id
+            FROM %1$I j
+            JOIN pick p ON p.id = j.id
+            WHERE j.status = 'queued'
+            FOR UPDATE OF j SKIP LOCKED
+        )
+        UPDATE %1$I j
+        SET status = 'processing',
+            progress = 0,
+            progress_stage = 'initializing',
+            claimed_at = now(),
+            updated_at = now()
+        FROM locked
+        WHERE j.id = locked.id
+        RETURNING j.id, j.user_id::text, %2$s
+    $claim$, p_table, v_job_type_expr)
+    USING p_window_minutes;
+END;
+$$;
+
+COMMENT ON FUNCTION claim_render_job(TEXT, INTEGER) IS 'Weighted fair-share claim for export_jobs / video_jobs workers';
+
+COMMIT;
@@ -0,0 +1,113 @@
+-- 007_render_priority_lanes.sql
+-- Priority lanes for the render queues (export_jobs, video_jobs)
+-- Version: 1.7.0
+-- Date: 2026-10-18
+--
+-- Interactive previews, user-triggered exports and automated batch work used
+-- to share one status='queued' pool. Each job now carries a lane, and
+-- claim_render_job() only considers the lanes a worker slot serves, highest
+-- lane first, fair share across tenants within a lane. Worker slots that do
+-- not list 'batch' act as capacity reserved for user-facing work.
+
+BEGIN;
+
+INSERT INTO migration_history (version, description)
+VALUES ('1.7.0', 'Priority lanes for export_jobs and video_jobs');
+
+ALTER TABLE export_jobs
+ADD COLUMN IF NOT EXISTS priority TEXT NOT NULL DEFAULT 'standard'
+    CHECK (priority IN ('interactive', 'standard', 'batch'));
+
+ALTER TABLE video_jobs
+ADD COLUMN IF NOT EXISTS priority TEXT NOT NULL DEFAULT 'standard'
+    CHECK (priority IN ('interactive', 'standard', 'batch'));
+
+COMMENT ON COLUMN export_jobs.priority IS 'Render lane: interactive (previews), standard (user exports), batch (automation)';
+COMMENT ON COLUMN video_jobs.priority IS 'Render lane: interactive (previews), standard (user exports), batch (automation)';
+
+-- Replace the 006 per-tenant head index with a lane-aware one
+DROP INDEX IF EXISTS idx_export_jobs_queued_user_created;
+DROP INDEX IF EXISTS idx_video_jobs_queued_user_created;
+CREATE INDEX IF NOT EXISTS idx_export_jobs_queued_lane_user_created
+    ON export_jobs (priority, user_id, created_at) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS idx_video_jobs_queued_lane_user_created
+    ON video_jobs (priority, user_id, created_at) WHERE status = 'queued';
+
+-- The signature gains p_lanes, so drop the 006 version first
+DROP FUNCTION IF EXISTS claim_render_job(TEXT, INTEGER);
+
+-- Claim the next job for p_table from the lanes in p_lanes (NULL = all).
+--
+-- Candidates are the oldest queued job per (lane, tenant). The highest lane
+-- with work always wins; inside a lane the tenant with the lowest
+-- (running + recently claimed) / queue_weight score wins, ties by age.
+CREATE OR REPLACE FUNCTION claim_render_job(
+    p_table TEXT,
+    p_lanes TEXT[] DEFAULT NULL,
+    p_window_minutes INTEGER DEFAULT 15
+)
+RETURNS TABLE (id UUID, user_id TEXT, job_type TEXT, priority TEXT)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_job_type_expr TEXT;
+BEGIN
+    IF p_table NOT IN ('export_jobs', 'video_jobs') THEN
+        RAISE EXCEPTION 'claim_render_job: unsupported table %', p_table;
+    END IF;
+
+    v_job_type_expr := CASE WHEN p_table = 'video_jobs' THEN 'j.job_type' ELSE 'NULL::text' END;
+
+    RETURN QUERY EXECUTE format($claim$
+        WITH service AS (
+            SELECT s.user_id::text AS user_id, count(*) AS served
+            FROM %1$I s
+            WHERE s.status = 'processing'
+               OR s.claimed_at > now() - make_interval(mins => $2)
+            GROUP BY s.user_id
+        ),
+        heads AS (
+            SELECT DISTINCT ON (q.priority, q.user_id)
+                   q.id, q.user_id::text AS user_id, q.priority, q.created_at, q.queue_weight
+            FROM %1$I q
+            WHERE q.status = 'queued'
+              AND ($1 IS NULL OR q.priority = ANY ($1))
+            ORDER BY q.priority, q.user_id, q.created_at
+        ),
+        pick AS (
+            SELECT h.id
+            FROM heads h
+            LEFT JOIN service sv ON sv.user_id = h.user_id
+            ORDER BY CASE h.priority
+                         WHEN 'interactive' THEN 0
+                         WHEN 'standard' THEN 1
+                         ELSE 2
+                     END,
+                     COALESCE(sv.served, 0) / GREATEST(COALESCE(h.queue_weight, 1), 0.1),
+                     h.created_at
+            LIMIT 1
+        ),
+        locked AS (
+            SELECT j.id
+            FROM %1$I j
+            JOIN pick p ON p.id = j.id
+            WHERE j.status = 'queued'
+            FOR UPDATE OF j SKIP LOCKED
+        )
+        UPDATE %1$I j
+        SET status = 'processing',
+            progress = 0,
+            progress_stage = 'initializing',
+            claimed_at = now(),
+            updated_at = now()
+        FROM locked
+        WHERE j.id = locked.id
+        RETURNING j.id, j.user_id::text, %2$s, j.priority
+    $claim$, p_table, v_job_type_expr)
+    USING p_lanes, p_window_minutes;
+END;
+$$;
+
+COMMENT ON FUNCTION claim_render_job(TEXT, TEXT[], INTEGER) IS 'Lane-aware weighted fair-share claim for export_jobs / video_jobs workers';
+
+COMMIT;
@@ -0,0 +1,26 @@
+-- 008_render_job_cancellation.sql
+-- Allow render jobs to be cancelled
+-- Version: 1.8.0
+-- Date: 2026-10-18
+--
+-- DELETE /api/v1/compose/{job_id} and DELETE /api/v1/videos/jobs/{job_id}
+-- move a queued or processing job to status='cancelled'. Queued rows are
+-- never claimed afterwards; the worker running a processing row notices the
+-- status change, kills FFmpeg and releases its slot.
+
+BEGIN;
+
+INSERT INTO migration_history (version, description)
+VALUES ('1.8.0', 'Cancelled status for export_jobs and video_jobs');
+
+ALTER TABLE export_jobs DROP CONSTRAINT IF EXISTS export_jobs_status_check;
+ALTER TABLE export_jobs
+ADD CONSTRAINT export_jobs_status_check
+    CHECK (status IN ('queued', 'processing', 'completed', 'failed', 'cancelled'));
+
+ALTER TABLE video_jobs DROP CONSTRAINT IF EXISTS video_jobs_status_check;
+ALTER TABLE video_jobs
+ADD CONSTRAINT video_jobs_status_check
+    CHECK (status IN ('queued', 'processing', 'completed', 'failed', 'cancelled'));
+
+COMMIT;
@@ -0,0 +1,243 @@
+-- 009_render_job_leases.sql
+-- Lease / heartbeat job ownership with automatic requeue
+-- Version: 1.9.0
+-- Date: 2026-10-18
+--
+-- Stale jobs used to be detected once at compose-worker startup (15 minute
+-- cutoff) and marked failed; the videos worker had no recovery at all. Now
+-- every claimed job records the claiming worker and a lease that the worker
+-- renews while it runs. Any worker periodically requeues jobs whose lease
+-- expired (crash, OOM kill, deploy) with exponential backoff, and only
+-- fails a job once it has used up max_attempts.
+
+BEGIN;
+
+INSERT INTO migration_history (version, description)
+VALUES ('1.9.0', 'Worker leases, heartbeats and retry backoff for render jobs');
+
+ALTER TABLE export_jobs
+ADD COLUMN IF NOT EXISTS worker_id TEXT,
+ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMPTZ,
+ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0,
+ADD COLUMN IF NOT EXISTS max_attempts INTEGER NOT NULL DEFAULT 3,
+ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMPTZ;
+
+ALTER TABLE video_jobs
+ADD COLUMN IF NOT EXISTS worker_id TEXT,
+ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMPTZ,
+ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0,
+ADD COLUMN IF NOT EXISTS max_attempts INTEGER NOT NULL DEFAULT 3,
+ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMPTZ;
+
+COMMENT ON COLUMN export_jobs.worker_id IS 'Worker (host:pid) currently holding the job lease';
+COMMENT ON COLUMN export_jobs.lease_expires_at IS 'Lease deadline, renewed by the worker heartbeat';
+COMMENT ON COLUMN export_jobs.attempts IS 'Number of times the job has been claimed';
+COMMENT ON COLUMN export_jobs.next_attempt_at IS 'Backoff: the job is not claimable before this time';
+COMMENT ON COLUMN video_jobs.worker_id IS 'Worker (host:pid) currently holding the job lease';
+COMMENT ON COLUMN video_jobs.lease_expires_at IS 'Lease deadline, renewed by the worker heartbeat';
+COMMENT ON COLUMN video_jobs.attempts IS 'Number of times the job has been claimed';
+COMMENT ON COLUMN video_jobs.next_attempt_at IS 'Backoff: the job is not claimable before this time';
+
+CREATE INDEX IF NOT EXISTS idx_export_jobs_processing_lease
+    ON export_jobs (lease_expires_at) WHERE status = 'processing';
+CREATE INDEX IF NOT EXISTS idx_video_jobs_processing_lease
+    ON video_jobs (lease_expires_at) WHERE status = 'processing';
+
+-- Claim now also records the worker, starts its lease, counts the attempt
+-- and skips jobs still inside their retry backoff.
+DROP FUNCTION IF EXISTS claim_render_job(TEXT, TEXT[], INTEGER);
+
+CREATE OR REPLACE FUNCTION claim_render_job(
+    p_table TEXT,
+    p_lanes TEXT[] DEFAULT NULL,
+    p_window_minutes INTEGER DEFAULT 15,
+    p_worker_id TEXT DEFAULT NULL,
+    p_lease_seconds INTEGER DEFAULT 90
+)
+RETURNS TABLE (id UUID, user_id TEXT, job_type TEXT, priority TEXT, attempts INTEGER)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_job_type_expr TEXT;
+BEGIN
+    IF p_table NOT IN ('export_jobs', 'video_jobs') THEN
+        RAISE EXCEPTION 'claim_render_job: unsupported table %', p_table;
+    END IF;
+
+    v_job_type_expr := CASE WHEN p_table = 'video_jobs' THEN 'j.job_type' ELSE 'NULL::text' END;
+
+    RETURN QUERY EXECUTE format($claim$
+        WITH service AS (
+            SELECT s.user_id::text AS user_id, count(*) AS served
+            FROM %1$I s
+            WHERE s.status = 'processing'
+               OR s.claimed_at > now() - make_interval(mins => $2)
+            GROUP BY s.user_id
+        ),
+        heads AS (
+            SELECT DISTINCT ON (q.priority, q.user_id)
+                   q.id, q.user_id::text AS user_id, q.priority, q.created_at, q.queue_weight
+            FROM %1$I q
+            WHERE q.status = 'queued'
+              AND ($1 IS NULL OR q.priority = ANY ($1))
+              AND (q.next_attempt_at IS NULL OR q.next_attempt_at <= now())
+            ORDER BY q.priority, q.user_id, q.created_at
+        ),
+        pick AS (
+            SELECT h.id
+            FROM heads h
+            LEFT JOIN service sv ON sv.user_id = h.user_id
+            ORDER BY CASE h.priority
+                         WHEN 'interactive' THEN 0
+                         WHEN 'standard' THEN 1
+                         ELSE 2
+                     END,
+                     COALESCE(sv.served, 0) / GREATEST(COALESCE(h.queue_weight, 1), 0.1),
+                     h.created_at
+            LIMIT 1
+        ),
+        locked AS (
+            SELECT j.id
+            FROM %1$I j
+            JOIN pick p ON p.id = j.id
+            WHERE j.status = 'queued'
+            FOR UPDATE OF j SKIP LOCKED
+        )
+        UPDATE %1$I j
+        SET status = 'processing',
+            progress = 0,
+            progress_stage = 'initializing',
+            claimed_at = now(),
+            worker_id = $3,
+            lease_expires_at = now() + make_interval(secs => $4),
+            attempts = j.attempts + 1,
+            updated_at = now()
+        FROM locked
+        WHERE j.id = locked.id
+        RETURNING j.id, j.user_id::text, %2$s, j.priority, j.attempts
+    $claim$, p_table, v_job_type_expr)
+    USING p_lanes, p_window_minutes, p_worker_id, p_lease_seconds;
+END;
+$$;
+
+COMMENT ON FUNCTION claim_render_job(TEXT, TEXT[], INTEGER, TEXT, INTEGER) IS 'Lane-aware weighted fair-share claim that starts a worker lease';
+
+-- Heartbeat: extend the lease while p_worker_id still owns the running job.
+-- Returns 'processing' when renewed, otherwise the job's current status
+-- ('cancelled', 'queued' after a requeue, ...) or NULL if the row is gone,
+-- telling the worker to stop.
+CREATE OR REPLACE FUNCTION heartbeat_render_job(
+    p_table TEXT,
+    p_job_id UUID,
+    p_worker_id TEXT,
+    p_lease_seconds INTEGER DEFAULT 90
+)
+RETURNS TEXT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_status TEXT;
+BEGIN
+    IF p_table NOT IN ('export_jobs', 'video_jobs') THEN
+        RAISE EXCEPTION 'heartbeat_render_job: unsupported table %', p_table;
+    END IF;
+
+    EXECUTE format(
+        'UPDATE %I SET lease_expires_at = now() + make_interval(secs => $3)
+         WHERE id = $1 AND worker_id = $2 AND status = ''processing''
+         RETURNING status', p_table)
+    INTO v_status
+    USING p_job_id, p_worker_id, p_lease_seconds;
+
+    IF v_status IS NULL THEN
+        EXECUTE format('SELECT CASE WHEN worker_id IS DISTINCT FROM $2 AND status = ''processing''
+                                    THEN ''lost'' ELSE status END
+                        FROM %I WHERE id = $1', p_table)
+        INTO v_status
+        USING p_job_id, p_worker_id;
+    END IF;
+
+    RETURN v_status;
+END;
+$$;
+
+-- Requeue (or finally fail) jobs whose lease has expired. Rows claimed
+-- before leases existed have no lease; those fall back to the old
+-- updated_at staleness cutoff. Backoff doubles per attempt:
+-- p_backoff_seconds, 2x, 4x, ...
+CREATE OR REPLACE FUNCTION requeue_expired_render_jobs(
+    p_table TEXT,
+    p_backoff_seconds INTEGER DEFAULT 30,
+    p_legacy_stale_minutes INTEGER DEFAULT 15
+)
+RETURNS TABLE (id UUID, status TEXT, attempts INTEGER)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF p_table NOT IN ('export_jobs', 'video_jobs') THEN
+        RAISE EXCEPTION 'requeue_expired_render_jobs: unsupported table %', p_table;
+    END IF;
+
+    RETURN QUERY EXECUTE format($requeue$
+        WITH expired AS (
+            SELECT e.id
+            FROM %1$I e
+            WHERE e.status = 'processing'
+              AND (e.lease_expires_at < now()
+                   OR (e.lease_expires_at IS NULL
+                       AND e.updated_at < now() - make_interval(mins => $2)))
+            FOR UPDATE SKIP LOCKED
+        )
+        UPDATE %1$I j
+        SET status = CASE WHEN j.attempts >= j.max_attempts THEN 'failed' ELSE 'queued' END,
+            progress = 0,
+            progress_stage = CASE WHEN j.attempts >= j.max_attempts THEN 'failed' ELSE 'requeued' END,
+            error = CASE WHEN j.attempts >= j.max_attempts
+                         THEN format('Worker lost the job %%s times (crash or restart); giving up', j.attempts)
+                         ELSE j.error END,
+            completed_at = CASE WHEN j.attempts >= j.max_attempts THEN now() ELSE NULL END,
+            next_attempt_at = CASE WHEN j.attempts >= j.max_attempts THEN NULL
+                                   ELSE now() + make_interval(secs => $1 * power(2, GREATEST(j.attempts - 1, 0)))
+                              END,
+            worker_id = NULL,
+            lease_expires_at = NULL,
+            updated_at = now()
+        FROM expired
+        WHERE j.id = expired.id
+        RETURNING j.id, j.status, j.attempts
+    $requeue$, p_table)
+    USING p_backoff_seconds, p_legacy_stale_minutes;
+END;
+$$;
+
+-- Hand a job back to the queue right away (graceful worker shutdown). The
+-- interrupted attempt is not counted against max_attempts.
+CREATE OR REPLACE FUNCTION release_render_job(
+    p_table TEXT,
+    p_job_id UUID,
+    p_worker_id TEXT
+)
+RETURNS BOOLEAN
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_count INTEGER;
+BEGIN
+    IF p_table NOT IN ('export_jobs', 'video_jobs') THEN
+        RAISE EXCEPTION 'release_render_job: unsupported table %', p_table;
+    END IF;
+
+    EXECUTE format(
+        'UPDATE %I
+         SET status = ''queued'', progress = 0, progress_stage = ''requeued'',
+             attempts = GREATEST(attempts - 1, 0), next_attempt_at = NULL,
+             worker_id = NULL, lease_expires_at = NULL, updated_at = now()
+         WHERE id = $1 AND worker_id = $2 AND status = ''processing''', p_table)
+    USING p_job_id, p_worker_id;
+
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    RETURN v_count > 0;
+END;
+$$;
+
+COMMIT;
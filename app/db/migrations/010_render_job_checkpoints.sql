@@ -0,0 +1,29 @@
+-- 010_render_job_checkpoints.sql
+-- Stage checkpoints for render jobs
+-- Version: 1.10.0
+-- Date: 2026-10-18
+--
+-- A job that lost its worker after FFmpeg finished (but before the upload
+-- completed) used to start again from downloading. Workers now record each
+-- completed stage (downloaded, rendered, uploaded) with its artifacts:
+--   - downloaded / rendered: node_id + scratch_dir (+ output_path), usable
+--     only by a retry on the same node
+--   - uploaded: output_url, output_r2_key, file_size_bytes, duration_seconds,
+--     usable by a retry on any node
+-- A retry resumes from the latest usable checkpoint.
+
+BEGIN;
+
+INSERT INTO migration_history (version, description)
+VALUES ('1.10.0', 'Stage checkpoints for export_jobs and video_jobs');
+
+ALTER TABLE export_jobs
+ADD COLUMN IF NOT EXISTS checkpoint JSONB;
+
+ALTER TABLE video_jobs
+ADD COLUMN IF NOT EXISTS checkpoint JSONB;
+
+COMMENT ON COLUMN export_jobs.checkpoint IS 'Last completed stage (downloaded/rendered/uploaded) and its artifacts, for resuming retries';
+COMMENT ON COLUMN video_jobs.checkpoint IS 'Last completed stage (downloaded/rendered/uploaded) and its artifacts, for resuming retries';
+
+COMMIT;
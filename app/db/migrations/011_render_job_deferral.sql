@@ -0,0 +1,49 @@
+-- 011_render_job_deferral.sql
+-- Deferred release of render jobs
+-- Version: 1.11.0
+-- Date: 2026-10-18
+--
+-- A worker that claims a job it cannot run right now (e.g. not enough free
+-- scratch space on its node) hands it back with a delay instead of failing
+-- it. The attempt is not counted, and the job becomes claimable again after
+-- p_delay_seconds, by any worker.
+
+BEGIN;
+
+INSERT INTO migration_history (version, description)
+VALUES ('1.11.0', 'Deferred release for export_jobs and video_jobs');
+
+DROP FUNCTION IF EXISTS release_render_job(TEXT, UUID, TEXT);
+
+CREATE OR REPLACE FUNCTION release_render_job(
+    p_table TEXT,
+    p_job_id UUID,
+    p_worker_id TEXT,
+    p_delay_seconds INTEGER DEFAULT 0
+)
+RETURNS BOOLEAN
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_count INTEGER;
+BEGIN
+    IF p_table NOT IN ('export_jobs', 'video_jobs') THEN
+        RAISE EXCEPTION 'release_render_job: unsupported table %', p_table;
+    END IF;
+
+    EXECUTE format(
+        'UPDATE %I
+         SET status = ''queued'', progress = 0,
+             progress_stage = CASE WHEN $3 > 0 THEN ''deferred'' ELSE ''requeued'' END,
+             attempts = GREATEST(attempts - 1, 0),
+             next_attempt_at = CASE WHEN $3 > 0 THEN now() + make_interval(secs => $3) ELSE NULL END,
+             worker_id = NULL, lease_expires_at = NULL, updated_at = now()
+         WHERE id = $1 AND worker_id = $2 AND status = ''processing''', p_table)
+    USING p_job_id, p_worker_id, p_delay_seconds;
+
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    RETURN v_count > 0;
+END;
+$$;
+
+COMMIT;
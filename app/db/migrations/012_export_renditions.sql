@@ -0,0 +1,31 @@
+-- 012_export_renditions.sql
+-- Multi-rendition exports
+-- Version: 1.12.0
+-- Date: 2026-10-18
+--
+-- An export job may list several output targets (e.g. 9:16 for Reels, 16:9
+-- for YouTube, a 720p preview), each with its own size, fit (pad / crop),
+-- bitrate and optional poster frame and thumbnail. The worker encodes all
+-- of them from one decode of the sources instead of one job per platform.
+--   - outputs:    the requested targets, as submitted (NULL = one output at
+--                 the composition's canvas, as before)
+--   - renditions: per target, once completed: name, width, height, url,
+--                 r2_key, file_size_bytes, poster_url, thumbnail_url
+-- output_url / output_r2_key / file_size_bytes keep describing the first
+-- target, so existing readers are unaffected.
+
+BEGIN;
+
+INSERT INTO migration_history (version, description)
+VALUES ('1.12.0', 'Multi-rendition outputs for export_jobs');
+
+ALTER TABLE export_jobs
+ADD COLUMN IF NOT EXISTS outputs JSONB;
+
+ALTER TABLE export_jobs
+ADD COLUMN IF NOT EXISTS renditions JSONB;
+
+COMMENT ON COLUMN export_jobs.outputs IS 'Requested output targets (size, fit, bitrate, poster, thumbnail); NULL = single canvas-sized output';
+COMMENT ON COLUMN export_jobs.renditions IS 'Uploaded renditions of a multi-output job (first = output_url)';
+
+COMMIT;
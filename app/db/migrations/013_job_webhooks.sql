@@ -0,0 +1,64 @@
+-- 013_job_webhooks.sql
+-- Completion webhooks for render and ingest jobs
+-- Version: 1.13.0
+-- Date: 2026-10-18
+--
+-- Jobs may be submitted with a callback_url. When such a job completes or
+-- fails, the worker records a row in webhook_deliveries, which the webhook
+-- dispatcher (app/services/webhooks.py) POSTs with an HMAC signature,
+-- retrying with exponential backoff. The table doubles as the delivery log.
+--   - status: pending -> delivering -> delivered | failed (back to pending
+--             between retries)
+--   - next_attempt_at: when the next attempt is due; while delivering it is
+--             the claim's expiry, so a delivery whose dispatcher died is
+--             picked up again
+--   - (job_table, job_id, event) is unique: a job is announced once even if
+--             it finished twice after a lost lease
+
+BEGIN;
+
+INSERT INTO migration_history (version, description)
+VALUES ('1.13.0', 'Completion webhooks and webhook_deliveries log');
+
+ALTER TABLE export_jobs
+ADD COLUMN IF NOT EXISTS callback_url TEXT;
+
+ALTER TABLE video_jobs
+ADD COLUMN IF NOT EXISTS callback_url TEXT;
+
+ALTER TABLE IF EXISTS youtube_ingest_jobs
+ADD COLUMN IF NOT EXISTS callback_url TEXT;
+
+CREATE TABLE IF NOT EXISTS webhook_deliveries (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    job_table TEXT NOT NULL,
+    job_id UUID NOT NULL,
+    user_id TEXT,
+    event TEXT NOT NULL,
+    url TEXT NOT NULL,
+    payload JSONB NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending'
+        CHECK (status IN ('pending', 'delivering', 'delivered', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    last_status_code INTEGER,
+    last_error TEXT,
+    delivered_at TIMESTAMPTZ,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    UNIQUE (job_table, job_id, event)
+);
+
+-- Dispatcher scan: due deliveries that are not finished
+CREATE INDEX IF NOT EXISTS idx_webhook_deliveries_due
+ON webhook_deliveries (next_attempt_at)
+WHERE status IN ('pending', 'delivering');
+
+CREATE INDEX IF NOT EXISTS idx_webhook_deliveries_job
+ON webhook_deliveries (job_id, created_at DESC);
+
+COMMENT ON COLUMN export_jobs.callback_url IS 'Webhook URL notified when the job completes or fails';
+COMMENT ON COLUMN video_jobs.callback_url IS 'Webhook URL notified when the job completes or fails';
+COMMENT ON TABLE webhook_deliveries IS 'Outbox and delivery log of job completion webhooks';
+
+COMMIT;
@@ -0,0 +1,24 @@
+-- 014_listing_keyset_indexes.sql
+-- Keyset pagination indexes for per-user listings
+-- Version: 1.14.0
+-- Date: 2026-10-18
+--
+-- GET /api/v1/compose/my-jobs and GET /api/media/library page newest first
+-- on (created_at, id) with a cursor instead of OFFSET
+-- (app/services/pagination.py). These indexes make every page, however
+-- deep, one range scan of the user's rows in order:
+--   WHERE user_id = $1 AND (created_at, id) < ($cursor) ORDER BY created_at DESC, id DESC
+-- They supersede the plain user_id index for these queries.
+
+BEGIN;
+
+INSERT INTO migration_history (version, description)
+VALUES ('1.14.0', 'Keyset pagination indexes on export_jobs and media_files');
+
+CREATE INDEX IF NOT EXISTS idx_export_jobs_user_created
+ON export_jobs (user_id, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_media_files_user_created
+ON media_files (user_id, created_at DESC, id DESC);
+
+COMMIT;
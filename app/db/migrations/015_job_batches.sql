@@ -0,0 +1,33 @@
+-- 015_job_batches.sql
+-- Batch job submission
+-- Version: 1.15.0
+-- Date: 2026-10-18
+--
+-- POST /api/v1/compose/batch and POST /api/v1/videos/batch queue many jobs
+-- with one multi-row INSERT. Each job of such a submission carries the same
+-- batch_id, which GET .../batch/{batch_id} uses to report the group.
+-- Jobs submitted one by one keep batch_id NULL (not indexed).
+
+BEGIN;
+
+INSERT INTO migration_history (version, description)
+VALUES ('1.15.0', 'batch_id for export_jobs and video_jobs');
+
+ALTER TABLE export_jobs
+ADD COLUMN IF NOT EXISTS batch_id UUID;
+
+ALTER TABLE video_jobs
+ADD COLUMN IF NOT EXISTS batch_id UUID;
+
+CREATE INDEX IF NOT EXISTS idx_export_jobs_batch
+ON export_jobs (batch_id, created_at)
+WHERE batch_id IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_video_jobs_batch
+ON video_jobs (batch_id, created_at)
+WHERE batch_id IS NOT NULL;
+
+COMMENT ON COLUMN export_jobs.batch_id IS 'Batch submission this job belongs to (POST /compose/batch)';
+COMMENT ON COLUMN video_jobs.batch_id IS 'Batch submission this job belongs to (POST /videos/batch)';
+
+COMMIT;
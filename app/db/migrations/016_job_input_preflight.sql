@@ -0,0 +1,36 @@
+-- 016_job_input_preflight.sql
+-- Preflight results of job inputs
+-- Version: 1.16.0
+-- Date: 2026-10-18
+--
+-- Submit endpoints HEAD every media URL of a job before queueing it
+-- (app/services/preflight.py).
+--   - input_bytes: summed size of the inputs as reported by their servers
+--                  (NULL if none reported one); the compose worker reserves
+--                  scratch space from it
+--   - preflight:   findings, only when there were any:
+--                  {"checked", "errors": [...], "warnings": [...]}
+--                  (errors are only stored with PREFLIGHT_MODE=flag; in
+--                  the default reject mode such jobs are never inserted)
+
+BEGIN;
+
+INSERT INTO migration_history (version, description)
+VALUES ('1.16.0', 'input_bytes and preflight findings for export_jobs and video_jobs');
+
+ALTER TABLE export_jobs
+ADD COLUMN IF NOT EXISTS input_bytes BIGINT;
+
+ALTER TABLE export_jobs
+ADD COLUMN IF NOT EXISTS preflight JSONB;
+
+ALTER TABLE video_jobs
+ADD COLUMN IF NOT EXISTS input_bytes BIGINT;
+
+ALTER TABLE video_jobs
+ADD COLUMN IF NOT EXISTS preflight JSONB;
+
+COMMENT ON COLUMN export_jobs.input_bytes IS 'Total size of the input media, measured at submit time (preflight)';
+COMMENT ON COLUMN video_jobs.input_bytes IS 'Total size of the input media, measured at submit time (preflight)';
+
+COMMIT;
@@ -0,0 +1,33 @@
+-- 017_render_stage_timings.sql
+-- Render cost model inputs and per-job estimates
+-- Version: 1.17.0
+-- Date: 2026-10-18
+--
+-- The render cost model (app/services/render_estimator.py) is fitted from
+-- the most recent completed export jobs.
+--   - stage_timings:     written on completion by a worker that ran the job
+--                        from scratch: download / render / upload seconds,
+--                        input and output bytes, and the render plan's
+--                        encode work (megapixel-seconds)
+--   - estimated_seconds: predicted processing time, stored at submit time
+
+BEGIN;
+
+INSERT INTO migration_history (version, description)
+VALUES ('1.17.0', 'stage_timings and estimated_seconds for export_jobs');
+
+ALTER TABLE export_jobs
+ADD COLUMN IF NOT EXISTS stage_timings JSONB;
+
+ALTER TABLE export_jobs
+ADD COLUMN IF NOT EXISTS estimated_seconds NUMERIC;
+
+-- Model fit: latest completed jobs
+CREATE INDEX IF NOT EXISTS idx_export_jobs_completed_recent
+ON export_jobs (completed_at DESC)
+WHERE status = 'completed';
+
+COMMENT ON COLUMN export_jobs.stage_timings IS 'Per-stage durations and plan features of a completed render (cost model samples)';
+COMMENT ON COLUMN export_jobs.estimated_seconds IS 'Processing time predicted by the render cost model at submit time';
+
+COMMIT;
@@ -0,0 +1,59 @@
+-- 018_export_queue_load.sql
+-- Export queue load for admission control
+-- Version: 1.18.0
+-- Date: 2026-10-18
+--
+-- Submissions are refused with 429 when the export queue is over capacity
+-- (app/services/admission.py). export_queue_load() aggregates the queue in
+-- one statement: per lane and status, the jobs, those of p_user_id, and
+-- their outstanding work in seconds (estimated_seconds, or p_default_seconds
+-- for rows without an estimate; the unfinished part for running jobs).
+-- jobs_before / work_before cover queued jobs created before p_before, for
+-- the estimated start time of a queued job.
+
+BEGIN;
+
+INSERT INTO migration_history (version, description)
+VALUES ('1.18.0', 'export_queue_load() for export admission control');
+
+CREATE INDEX IF NOT EXISTS idx_export_jobs_outstanding_user
+    ON export_jobs (user_id) WHERE status IN ('queued', 'processing');
+
+CREATE OR REPLACE FUNCTION export_queue_load(
+    p_user_id TEXT DEFAULT NULL,
+    p_before TIMESTAMPTZ DEFAULT NULL,
+    p_default_seconds NUMERIC DEFAULT 120
+)
+RETURNS TABLE (
+    priority TEXT,
+    status TEXT,
+    jobs BIGINT,
+    user_jobs BIGINT,
+    work_seconds NUMERIC,
+    jobs_before BIGINT,
+    work_before NUMERIC
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        j.priority,
+        j.status,
+        count(*),
+        count(*) FILTER (WHERE j.user_id::text = p_user_id),
+        COALESCE(sum(
+            CASE WHEN j.status = 'processing'
+                 THEN COALESCE(j.estimated_seconds, p_default_seconds)
+                      * (100 - LEAST(COALESCE(j.progress, 0), 99)) / 100.0
+                 ELSE COALESCE(j.estimated_seconds, p_default_seconds)
+            END
+        ), 0),
+        count(*) FILTER (WHERE j.status = 'queued' AND j.created_at < p_before),
+        COALESCE(sum(COALESCE(j.estimated_seconds, p_default_seconds))
+            FILTER (WHERE j.status = 'queued' AND j.created_at < p_before), 0)
+    FROM export_jobs j
+    WHERE j.status IN ('queued', 'processing')
+    GROUP BY j.priority, j.status;
+$$;
+
+COMMIT;
@@ -0,0 +1,30 @@
+-- 019_export_compiled_timeline.sql
+-- Compiled timelines for export jobs
+-- Version: 1.19.0
+-- Date: 2026-10-18
+--
+-- Submit endpoints validate a composition and compile it once into a compact,
+-- versioned timeline (normalized segments, audio overlays, transitions and
+-- the canvas size when the composition sets one; see _compile_timeline in
+-- app/routers/compose.py). The worker reads the timeline instead of the raw
+-- composition. timeline_hash identifies the rendered timeline independently
+-- of how the composition spelled it, for render caching and diffing.
+
+BEGIN;
+
+INSERT INTO migration_history (version, description)
+VALUES ('1.19.0', 'Compiled timeline and timeline_hash for export_jobs');
+
+ALTER TABLE export_jobs
+ADD COLUMN IF NOT EXISTS timeline JSONB;
+
+ALTER TABLE export_jobs
+ADD COLUMN IF NOT EXISTS timeline_hash TEXT;
+
+CREATE INDEX IF NOT EXISTS idx_export_jobs_timeline_hash
+    ON export_jobs (timeline_hash) WHERE timeline_hash IS NOT NULL;
+
+COMMENT ON COLUMN export_jobs.timeline IS 'Composition compiled at submit time ({"v", "hash", "width", "height", "duration", "segments"})';
+COMMENT ON COLUMN export_jobs.timeline_hash IS 'SHA-256 of the compiled timeline (same hash = same rendered timeline)';
+
+COMMIT;
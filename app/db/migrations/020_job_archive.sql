@@ -0,0 +1,100 @@
+-- 020_job_archive.sql
+-- Archive of finished job rows
+-- Version: 1.20.0
+-- Date: 2026-10-18
+--
+-- Terminal rows (completed, failed, cancelled) of export_jobs, video_jobs
+-- and youtube_ingest_jobs created more than the retention window ago are
+-- moved here by the job archiver (app/services/job_archive.py), so the hot
+-- tables the workers poll and the clients list only hold recent history.
+--   - row:        the job row as it was stored (JSONB, so the archive does
+--                 not follow column changes of the hot tables)
+--   - user_id / status / batch_id / created_at: copied out for lookups
+-- Status endpoints fall back to this table when a job is not in its hot
+-- table.
+--
+-- archive_terminal_jobs() moves up to p_limit rows of one table in a single
+-- statement; rows are picked FOR UPDATE SKIP LOCKED so archivers running on
+-- several nodes never wait on each other.
+
+BEGIN;
+
+INSERT INTO migration_history (version, description)
+VALUES ('1.20.0', 'job_archive and archive_terminal_jobs() for finished job rows');
+
+CREATE TABLE IF NOT EXISTS job_archive (
+    job_table TEXT NOT NULL,
+    id UUID NOT NULL,
+    user_id TEXT,
+    status TEXT,
+    batch_id UUID,
+    created_at TIMESTAMPTZ,
+    archived_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    row JSONB NOT NULL,
+    PRIMARY KEY (job_table, id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_job_archive_batch
+    ON job_archive (job_table, batch_id) WHERE batch_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_job_archive_user_created
+    ON job_archive (user_id, created_at DESC);
+
+-- Archiver scan: oldest terminal rows first
+CREATE INDEX IF NOT EXISTS idx_export_jobs_terminal_created
+    ON export_jobs (created_at) WHERE status IN ('completed', 'failed', 'cancelled');
+CREATE INDEX IF NOT EXISTS idx_video_jobs_terminal_created
+    ON video_jobs (created_at) WHERE status IN ('completed', 'failed', 'cancelled');
+
+DO $$
+BEGIN
+    IF to_regclass('youtube_ingest_jobs') IS NOT NULL THEN
+        CREATE INDEX IF NOT EXISTS idx_youtube_ingest_jobs_terminal_created
+            ON youtube_ingest_jobs (created_at) WHERE status IN ('completed', 'failed', 'cancelled');
+    END IF;
+END $$;
+
+CREATE OR REPLACE FUNCTION archive_terminal_jobs(
+    p_table TEXT,
+    p_before TIMESTAMPTZ,
+    p_limit INTEGER DEFAULT 500
+)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_moved INTEGER;
+BEGIN
+    IF p_table NOT IN ('export_jobs', 'video_jobs', 'youtube_ingest_jobs') THEN
+        RAISE EXCEPTION 'Unsupported job table: %', p_table;
+    END IF;
+
+    EXECUTE format($sql$
+        WITH picked AS (
+            SELECT id FROM %1$I
+            WHERE status IN ('completed', 'failed', 'cancelled')
+              AND created_at < $1
+            ORDER BY created_at
+            LIMIT $2
+            FOR UPDATE SKIP LOCKED
+        ), moved AS (
+            DELETE FROM %1$I t
+            USING picked
+            WHERE t.id = picked.id
+            RETURNING t.*
+        )
+        INSERT INTO job_archive (job_table, id, user_id, status, batch_id, created_at, row)
+        SELECT %1$L, m.id::uuid, m.user_id::text, m.status,
+               (to_jsonb(m) ->> 'batch_id')::uuid, m.created_at, to_jsonb(m)
+        FROM moved m
+        ON CONFLICT (job_table, id) DO NOTHING
+    $sql$, p_table)
+    USING p_before, p_limit;
+
+    GET DIAGNOSTICS v_moved = ROW_COUNT;
+    RETURN v_moved;
+END;
+$$;
+
+COMMENT ON TABLE job_archive IS 'Finished job rows moved out of export_jobs, video_jobs and youtube_ingest_jobs';
+
+COMMIT;
@@ -0,0 +1,62 @@
+-- 021_render_queue_plan_weights.sql
+-- Fair-share queue weights derived from the submitter's subscription
+-- Version: 1.21.0
+-- Date: 2026-10-18
+--
+-- queue_weight (migration 006) used to be copied from a `plan` field of the
+-- request body, so any caller could claim the top weight. It is now set on
+-- insert from the user's own subscription (users.plan_name while the
+-- subscription is active), and the API no longer sends the column at all:
+-- until this migration is applied every job simply gets the default weight.
+-- export_jobs.user_id / video_jobs.user_id hold the id the Next.js backend
+-- knows the user by (users.id or the Firebase uid); both are matched.
+
+BEGIN;
+
+INSERT INTO migration_history (version, description)
+VALUES ('1.21.0', 'Server-side fair-share queue weights from the user plan');
+
+-- Relative share of worker time per plan. A "pro" tenant with queued work
+-- is served four times as often as a free one when both compete.
+CREATE OR REPLACE FUNCTION render_queue_weight(p_user_id TEXT)
+RETURNS NUMERIC
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT COALESCE((
+        SELECT CASE lower(u.plan_name)
+                   WHEN 'basic' THEN 2
+                   WHEN 'pro' THEN 4
+                   WHEN 'enterprise' THEN 8
+                   ELSE 1
+               END
+        FROM users u
+        WHERE (u.id::text = p_user_id OR u.firebase_uid = p_user_id)
+          AND COALESCE(u.subscription_status, 'free') IN ('active', 'canceling')
+        LIMIT 1
+    ), 1)::NUMERIC;
+$$;
+
+CREATE OR REPLACE FUNCTION set_render_queue_weight()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    NEW.queue_weight := render_queue_weight(NEW.user_id::text);
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_export_jobs_queue_weight ON export_jobs;
+CREATE TRIGGER trg_export_jobs_queue_weight
+    BEFORE INSERT ON export_jobs
+    FOR EACH ROW EXECUTE FUNCTION set_render_queue_weight();
+
+DROP TRIGGER IF EXISTS trg_video_jobs_queue_weight ON video_jobs;
+CREATE TRIGGER trg_video_jobs_queue_weight
+    BEFORE INSERT ON video_jobs
+    FOR EACH ROW EXECUTE FUNCTION set_render_queue_weight();
+
+COMMENT ON FUNCTION render_queue_weight(TEXT) IS 'Fair-share weight of a user from their active subscription plan (free=1)';
+
+COMMIT;
@@ -0,0 +1,23 @@
+-- 022_job_events_indexes.sql
+-- Indexes for the per-user job event streams
+-- Version: 1.22.0
+-- Date: 2026-10-18
+--
+-- GET /api/v1/compose/events (app/services/job_events.py) re-reads the
+-- user's rows changed since its last read, for jobs submitted or running on
+-- other nodes:
+--   WHERE user_id = $1 AND updated_at >= $since
+-- Without these, every read scanned all of the user's rows.
+
+BEGIN;
+
+INSERT INTO migration_history (version, description)
+VALUES ('1.22.0', 'Per-user updated_at indexes for job event streams');
+
+CREATE INDEX IF NOT EXISTS idx_export_jobs_user_updated
+ON export_jobs (user_id, updated_at);
+
+CREATE INDEX IF NOT EXISTS idx_video_jobs_user_updated
+ON video_jobs (user_id, updated_at);
+
+COMMIT;
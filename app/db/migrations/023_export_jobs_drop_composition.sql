@@ -0,0 +1,28 @@
+-- 023_export_jobs_drop_composition.sql
+-- Export rows keep only the compiled timeline
+-- Version: 1.23.0
+-- Date: 2026-10-18
+--
+-- Since 019 the worker renders from export_jobs.timeline; the raw
+-- composition was still stored next to it, so every row carried the
+-- composition twice (once as submitted, once compiled). New rows no longer
+-- set composition at all, and rows that already have a timeline drop theirs.
+-- The column stays for rows queued before 019, which the worker still
+-- compiles when it claims them.
+
+BEGIN;
+
+INSERT INTO migration_history (version, description)
+VALUES ('1.23.0', 'Stop storing the raw composition on compiled export_jobs rows');
+
+ALTER TABLE export_jobs
+ALTER COLUMN composition DROP NOT NULL;
+
+UPDATE export_jobs
+SET composition = NULL
+WHERE timeline IS NOT NULL
+  AND composition IS NOT NULL;
+
+COMMENT ON COLUMN export_jobs.composition IS 'Raw composition of rows queued before compiled timelines (NULL otherwise)';
+
+COMMIT;
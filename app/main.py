@@ -1,4 +1,5 @@
 from contextlib import asynccontextmanager
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
@@ -16,18 +17,33 @@ except ImportError:
 
 # Import our routers - media, AI processing, video composition, and video processing
 from app.routers import media, ai, compose, videos
+from app.services import job_archive, job_queue, preflight, scratch, storage, webhooks
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Manage background workers on startup/shutdown."""
-    # Startup: launch background workers
+    # Startup: launch background workers, the scratch-space sweeper, the
+    # webhook dispatcher and the job archiver (plus the local CDN stand-in
+    # when STORAGE_BACKEND is local / memory)
+    storage_server = storage.start_local_server()
     compose.start_worker()
     videos.start_worker()
+    scratch_sweeper = asyncio.create_task(scratch.sweeper_loop(
+        lambda: {job["job_id"] for job in job_queue.running_jobs()}
+    ))
+    webhook_dispatcher = asyncio.create_task(webhooks.dispatcher_loop())
+    archiver = asyncio.create_task(job_archive.archiver_loop())
     yield
     # Shutdown: cancel workers
+    scratch_sweeper.cancel()
+    webhook_dispatcher.cancel()
+    archiver.cancel()
     compose.stop_worker()
     videos.stop_worker()
+    await preflight.close()
+    if storage_server:
+        storage_server.shutdown()
 
 
 app = FastAPI(
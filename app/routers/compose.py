@@ -6,9 +6,42 @@ a single MP4 file using FFmpeg.
 
 Uses a database-backed job queue:
   - POST endpoint inserts a row with status='queued' and returns immediately
-  - A background worker loop polls for queued jobs and processes them one at a time
-  - If the server crashes, stale 'processing' jobs are recovered on startup
-  - 10 concurrent users = 10 queued rows, processed sequentially (no lost jobs)
+  - Background worker slots poll for queued jobs; each slot processes one job
+    at a time and only claims from its priority lanes (interactive, standard,
+    batch), so batch work cannot take the capacity reserved for users
+  - Jobs are claimed in weighted fair-share order across users, not strict FIFO
+  - Each claimed job holds a worker lease renewed by a heartbeat; if a worker
+    crashes or is redeployed, any worker requeues the job once the lease
+    expires (with backoff, failing only after max_attempts)
+  - DELETE /{job_id} cancels a queued job, or stops a running one on whichever
+    node owns it (FFmpeg killed, temp files removed, slot released)
+  - Job stages (downloaded, rendered, uploaded) are checkpointed, so a retried
+    job resumes from its last completed stage instead of rendering again
+  - Timelines with more inputs than one FFmpeg pass can hold (memory budget)
+    are rendered in batches to intermediates and then merged
+  - Timelines with transitions are smart-rendered: only the windows around
+    each transition are re-encoded, clip middles are stream-copied
+  - Upper video tracks (picture-in-picture) are composited over the whole
+    output after the clip chain (one input per clip, trimmed to its window
+    and placed by its output time); extra audio tracks (music) are mixed
+    under the program audio the same way
+  - Text and sticker layers are rasterized once to cached transparent PNGs
+    and composited over their time windows, not drawn per frame
+  - Single-pass timelines encode video and audio in two concurrent
+    processes and mux them; the audio track is cached by its inputs, so an
+    export that only changes the picture (text, layers) reuses its audio
+  - A job may request several output targets (aspect, size, bitrate, poster,
+    thumbnail); all are encoded from one decode of the sources
+  - Every input URL is preflighted (HEAD) at submit time, so dead links and
+    wrong file types are rejected before they cost a worker slot
+  - POST /batch queues many jobs in one validated, single-statement insert;
+    GET /batch/{batch_id} reports the group
+  - A job may carry a callback_url, POSTed (HMAC-signed, with retries) when
+    it completes or fails
+  - GET /{job_id}/events and GET /events stream job progress as Server-Sent
+    Events, pushed by the workers instead of polled by the client
+  - 10 concurrent users = 10 queued rows, processed sequentially by default
+    (one worker slot per process, COMPOSE_WORKER_LANES adds more; no lost jobs)
 
 Two routers are exposed:
   - router        : Firebase-authenticated endpoints
@@ -16,22 +49,49 @@ Two routers are exposed:
 """
 
 from fastapi import APIRouter, Depends, HTTPException, Request, status
-from typing import Any, Dict, List, Optional
-from dataclasses import dataclass
+from fastapi.responses import StreamingResponse
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from dataclasses import dataclass, field, replace
+import hashlib
 from datetime import datetime, timedelta, timezone
 import asyncio
 import json
 import logging
 import os
-import tempfile
+import re
 import time
 import uuid
 
-import boto3
-from botocore.exceptions import ClientError
 import httpx
 
 from app.dependencies.auth import get_current_user
+from app.services import (
+    admission, cpu_budget, job_archive, job_events, overlay_layers, pagination, preflight,
+    render_estimator, scratch, storage, webhooks,
+)
+from app.services.ffmpeg_runner import run_ffmpeg
+from app.services.still_images import prescale_still
+from app.services.job_queue import (
+    DEFAULT_WORKER_LANES,
+    NODE_ID,
+    PRIORITY_LANES,
+    WORKER_ID,
+    batch_job_specs,
+    batch_status,
+    cancel_job,
+    checkpoint_is_local,
+    claim_next_job,
+    defer_job,
+    lease_reaper_loop,
+    load_checkpoint,
+    normalize_priority,
+    parse_worker_lanes,
+    run_claimed_job,
+    running_jobs,
+    save_checkpoint,
+    should_keep_scratch,
+    stage_reached,
+)
 from app.utils.database import get_db
 
 # ---------------------------------------------------------------------------
@@ -60,35 +120,6 @@ public_router = APIRouter(
 # ---------------------------------------------------------------------------
 db_admin = get_db(admin_access=True)
 
-# ---------------------------------------------------------------------------
-# Cloudflare R2 configuration
-# ---------------------------------------------------------------------------
-R2_ENDPOINT_URL = os.getenv("R2_ENDPOINT_URL")
-R2_ACCESS_KEY_ID = os.getenv("R2_ACCESS_KEY_ID")
-R2_SECRET_ACCESS_KEY = os.getenv("R2_SECRET_ACCESS_KEY")
-R2_BUCKET_NAME = os.getenv("R2_BUCKET_NAME")
-CDN_DOMAIN = os.getenv("CDN_DOMAIN", "cdn.multivio.com")
-
-from botocore.config import Config as BotoConfig
-
-# Connect/read timeouts so a hung R2 endpoint doesn't wedge the worker forever.
-# Without these, a stalled TCP connection can hold _upload_to_r2 indefinitely
-# because boto3's defaults are effectively unbounded for some environments.
-# Plus a few retries for transient network blips.
-r2_client = boto3.client(
-    "s3",
-    endpoint_url=R2_ENDPOINT_URL,
-    aws_access_key_id=R2_ACCESS_KEY_ID,
-    aws_secret_access_key=R2_SECRET_ACCESS_KEY,
-    region_name="auto",
-    config=BotoConfig(
-        connect_timeout=15,        # 15s to establish TCP / TLS handshake
-        read_timeout=120,          # 2 min ceiling for a single S3 request
-        retries={"max_attempts": 3, "mode": "standard"},
-        signature_version="s3v4",
-    ),
-)
-
 # ---------------------------------------------------------------------------
 # Internal API key (same pattern as media.py)
 # ---------------------------------------------------------------------------
@@ -100,10 +131,76 @@ if not INTERNAL_API_KEY:
 # Worker configuration
 # ---------------------------------------------------------------------------
 WORKER_POLL_INTERVAL = 5        # seconds between queue polls when idle
-STALE_JOB_TIMEOUT_MINUTES = 15  # mark processing jobs older than this as failed
 
-# Handle to the background worker task (set on startup, cancelled on shutdown)
-_worker_task: Optional[asyncio.Task] = None
+# One worker slot per ";"-separated entry, each serving the listed priority
+# lanes. The default reserves one slot for interactive/standard work so
+# batch jobs can never occupy every slot (see app/services/job_queue.py).
+WORKER_LANES = parse_worker_lanes(os.getenv("COMPOSE_WORKER_LANES", DEFAULT_WORKER_LANES))
+
+# Handles to the background worker slot tasks (set on startup, cancelled on shutdown)
+_worker_tasks: List[asyncio.Task] = []
+
+# Staged rendering: one FFmpeg pass opens a decoder per input, so long
+# timelines are rendered in batches whose size is derived from this memory
+# budget (see _max_inputs_per_pass). COMPOSE_MAX_INPUTS_PER_PASS pins the
+# batch size instead.
+RENDER_MEMORY_BUDGET_MB = int(os.getenv("COMPOSE_RENDER_MEMORY_MB", "1536"))
+MAX_INPUTS_PER_PASS_OVERRIDE = int(os.getenv("COMPOSE_MAX_INPUTS_PER_PASS", "0"))
+MIN_INPUTS_PER_PASS = 4
+MAX_INPUTS_PER_PASS = 64
+
+# Scratch-space estimate per job (see _estimate_scratch_bytes). Sources are
+# downloaded whole, so a clip's estimate covers its source up to the out-point.
+SOURCE_VIDEO_BYTES_PER_SECOND = 2.5 * 1024 * 1024    # ~20 Mbps phone footage
+SOURCE_IMAGE_BYTES = 8 * 1024 * 1024
+AUDIO_OVERLAY_BYTES_PER_SECOND = 32 * 1024
+OUTPUT_BYTES_PER_SECOND = 1024 * 1024                # ~8 Mbps 1080p CRF 23
+# A job that does not fit on this node's scratch space is retried after this
+SCRATCH_RETRY_SECONDS = 60
+
+# Smart rendering for timelines with transitions: only the windows around
+# each transition are re-encoded; clip middles are stream-copied from the
+# source (when it already matches the output format) or from a normalized
+# copy cached per node across jobs. COMPOSE_SMART_RENDER=0 disables it.
+SMART_RENDER_ENABLED = os.getenv("COMPOSE_SMART_RENDER", "1").lower() not in ("0", "false", "no")
+NORMALIZED_CACHE_DIR = os.path.join(scratch.SCRATCH_ROOT, "agdoc_normalized_cache")
+NORMALIZED_CACHE_MAX_MB = int(os.getenv("COMPOSE_NORMALIZED_CACHE_MB", "4096"))
+# Clip middles shorter than this are not worth a separate copy piece
+SMART_MIN_COPY_SECONDS = 2.0
+# Keyframe interval assumed for sources when planning without probing them
+SMART_PLAN_KEYFRAME_SECONDS = 2.0
+# Single-pass renders encode the video and the audio track in two concurrent
+# FFmpeg processes, the audio cached by its inputs, then mux them (_render_split_av)
+SPLIT_AV_ENABLED = os.getenv("COMPOSE_SPLIT_AV", "1").lower() not in ("0", "false", "no")
+AUDIO_ENCODE_ARGS = ["-c:a", "aac", "-b:a", "128k"]
+
+# Format version of the compiled `timeline` stored on each job (see _compile_timeline)
+TIMELINE_IR_VERSION = 3
+# Layer types drawn over the video (app/services/overlay_layers.py)
+OVERLAY_LAYER_TYPES = ("text", "sticker")
+# Track types composited over the base video track, and mixed audio tracks
+UPPER_TRACK_TYPES = ("overlay", "pip")
+MUSIC_TRACK_TYPES = ("music",)
+# Columns the worker reads from its claimed row (not the raw composition)
+JOB_COLUMNS = "id,user_id,timeline,outputs,checkpoint,input_bytes,callback_url"
+# Output options shared by normalized clips and re-encoded windows: a fixed
+# 1s GOP (keyframes every 30 frames, no scene-cut keyframes) so copy pieces
+# can start and end on exact second boundaries, and one audio format so
+# every piece concatenates without resampling.
+SMART_RENDER_OUTPUT_ARGS = [
+    "-g", "30", "-keyint_min", "30", "-sc_threshold", "0",
+    "-ar", "44100", "-ac", "2",
+]
+
+# Multi-rendition exports: one job can request several output targets
+# (e.g. 9:16 Reels, 16:9 YouTube, 720p preview). Sources are decoded and the
+# timeline composited once; the result is split in the filter graph and fed
+# to one encoder per target (see _build_rendition_command).
+MAX_OUTPUT_TARGETS = 6
+MIN_TARGET_SIDE = 64
+MAX_TARGET_SIDE = 4096
+OUTPUT_TARGET_NAME_RE = re.compile(r"^[a-z0-9][a-z0-9_-]{0,31}$")
+BITRATE_RE = re.compile(r"^\d+(\.\d+)?[kKmM]?$")
 
 # ---------------------------------------------------------------------------
 # Pydantic-free data structures for internal processing
@@ -127,6 +224,38 @@ class Transition:
     duration: float
 
 
+@dataclass
+class OverlayPlacement:
+    """
+    A layer shown over part of the output: a rasterized text or sticker
+    (see app/services/overlay_layers.py) or a clip of an upper video track.
+    """
+    path: str                # local file
+    x: int                   # top-left position on the canvas, pixels
+    y: int
+    start: float             # seconds on the rendered output
+    end: float
+    # "frame": one transparent PNG already at output size (text, stickers);
+    # "video" / "image": media fitted into the width x height box at (x, y)
+    media_type: str = "frame"
+    width: int = 0
+    height: int = 0
+    source_start: float = 0.0  # video: seconds into the source at `start`
+    opacity: float = 1.0
+    url: str = ""              # source of an upper-track clip (cache keys)
+
+
+@dataclass
+class AudioMix:
+    """A clip of an additional audio track mixed into part of the output."""
+    path: str                # local file
+    start: float             # seconds on the rendered output
+    end: float
+    source_start: float = 0.0
+    volume: float = 1.0
+    url: str = ""            # source URL (cache keys)
+
+
 @dataclass
 class Segment:
     """A single contiguous segment in the rendered timeline."""
@@ -150,6 +279,46 @@ class Segment:
     # None on the last segment (nothing to transition to) and on cuts
     # (the default — no special filter needed).
     transition_to_next: Optional["Transition"] = None
+    # Images only: canvas-sized frame pre-rendered by Pillow (see
+    # app/services/still_images.py). When set, the builder decodes this
+    # single frame once instead of re-decoding the original per frame.
+    still_path: str = ""
+
+
+@dataclass
+class OutputLayers:
+    """
+    Layers applied over the whole rendered timeline, after the concat /
+    xfade chain: upper-track clips then text / stickers in stacking order
+    (bottom to top), and clips of the mixed audio tracks. Each is one FFmpeg
+    input, placed by its position on the output (see _output_layers).
+    """
+    overlays: List[OverlayPlacement] = field(default_factory=list)
+    audio_mix: List[AudioMix] = field(default_factory=list)
+
+
+@dataclass
+class OutputTarget:
+    """One requested rendition of a composition (see `outputs` on POST)."""
+    name: str
+    width: int
+    height: int
+    # "pad": letterbox the canvas into the target; "crop": fill it, centre-crop
+    fit: str = "pad"
+    video_bitrate: str = ""  # e.g. "6M"; empty = CRF 23 (the single-output default)
+    audio_bitrate: str = "128k"
+    poster: bool = False
+    poster_time: float = 1.0
+    thumbnail_width: int = 0  # 0 = no thumbnail
+
+
+@dataclass
+class RenditionFiles:
+    """Local files one OutputTarget renders to."""
+    target: OutputTarget
+    video_path: str
+    poster_path: str = ""
+    thumbnail_path: str = ""
 
 
 # ---------------------------------------------------------------------------
@@ -171,61 +340,26 @@ def _verify_api_key(request: Request) -> None:
         )
 
 
-async def _upload_to_r2(file_content: bytes, key: str, content_type: str) -> str:
-    """Upload bytes to Cloudflare R2 and return the CDN URL.
-
-    Two important wrinkles:
-
-    1. boto3 is synchronous. Calling it directly from an async function blocks
-       the entire asyncio event loop — including the FastAPI HTTP handler and
-       the background worker. We dispatch via `run_in_executor` so the upload
-       runs on a worker thread and the loop stays responsive.
-
-    2. Even with the boto3 client's `read_timeout=120`, a TCP connection that
-       stalls mid-transfer can sometimes outlast the configured timeout. Wrap
-       in `asyncio.wait_for` as defense in depth so a wedged upload fails the
-       job rather than hanging the worker.
+async def _download_media(url: str, dest_path: str) -> None:
     """
-    loop = asyncio.get_running_loop()
-    UPLOAD_TIMEOUT_SECONDS = 180
-
-    def _do_upload():
-        r2_client.put_object(
-            Bucket=R2_BUCKET_NAME,
-            Key=key,
-            Body=file_content,
-            ContentType=content_type,
-        )
-
-    try:
-        await asyncio.wait_for(
-            loop.run_in_executor(None, _do_upload),
-            timeout=UPLOAD_TIMEOUT_SECONDS,
-        )
-        cdn_url = f"https://{CDN_DOMAIN}/{key}"
-        logger.info("Uploaded to R2: %s (%d bytes)", cdn_url, len(file_content))
-        return cdn_url
-    except asyncio.TimeoutError:
-        logger.error(
-            "R2 upload timed out for key=%s after %ds (%d bytes)",
-            key, UPLOAD_TIMEOUT_SECONDS, len(file_content),
-        )
-        raise RuntimeError(
-            f"R2 upload timed out after {UPLOAD_TIMEOUT_SECONDS}s for key={key}"
-        )
-    except ClientError as exc:
-        logger.error("R2 upload failed for key=%s: %s", key, exc)
-        raise
+    Download a media file from a CDN URL to a local path.
 
+    The file is written to `<dest_path>.part` and renamed when complete, so
+    a file at `dest_path` is always whole. A retried job that finds it in its
+    scratch directory skips the download.
+    """
+    if os.path.exists(dest_path) and os.path.getsize(dest_path) > 0:
+        logger.info("Reusing downloaded %s", dest_path)
+        return
 
-async def _download_media(url: str, dest_path: str) -> None:
-    """Download a media file from a CDN URL to a local path."""
+    part_path = dest_path + ".part"
     async with httpx.AsyncClient(timeout=httpx.Timeout(120.0, connect=30.0)) as client:
         async with client.stream("GET", url) as response:
             response.raise_for_status()
-            with open(dest_path, "wb") as f:
+            with open(part_path, "wb") as f:
                 async for chunk in response.aiter_bytes(chunk_size=1024 * 256):
                     f.write(chunk)
+    os.replace(part_path, dest_path)
     logger.info("Downloaded %s -> %s", url, dest_path)
 
 
@@ -321,6 +455,107 @@ async def _has_audio_stream(file_path: str) -> bool:
 # Composition parser
 # ---------------------------------------------------------------------------
 
+def _layers_by_id(composition: Dict[str, Any]) -> Dict[str, Any]:
+    """The composition's layers keyed by id."""
+    raw_layers = composition.get("layers", {})
+    if isinstance(raw_layers, list):
+        return {l["id"]: l for l in raw_layers if "id" in l}
+    if isinstance(raw_layers, dict):
+        # Already a dict (possible future format)
+        return raw_layers
+    return {}
+
+
+def _is_overlay_clip(clip: Dict[str, Any], layers: Dict[str, Any]) -> bool:
+    """True for clips of text / sticker layers (drawn over the video, not segments)."""
+    layer_id = clip.get("layerId") or clip.get("layer_id")
+    layer = layers.get(layer_id, {}) if layer_id else {}
+    return (layer.get("type") or "").lower() in OVERLAY_LAYER_TYPES
+
+
+def _clip_media_type(layer: Dict[str, Any], media_url: str) -> str:
+    """"video" or "image", from the layer's mediaType (or the URL extension)."""
+    media_type = (
+        layer.get("mediaType")
+        or layer.get("media_type")
+        or layer.get("type")
+        or "video"
+    ).lower()
+    # Normalise: layer types like "media", "background" need mediaType to determine
+    if media_type in ("image", "photo", "still", "jpeg", "jpg", "png", "webp"):
+        return "image"
+    if media_type in ("media", "background"):
+        # Fallback: check the URL extension
+        return "image" if _is_image_ext(_guess_extension(media_url).lower()) else "video"
+    return "video"
+
+
+def _clip_source_start(clip: Dict[str, Any]) -> float:
+    """
+    Source in-point: which second of the SOURCE media this clip starts
+    from. Accepts mediaStartTime (camelCase, our client) or source_start.
+    Defaults to 0 → from the start of the source (prior behavior).
+    """
+    return float(
+        clip.get("mediaStartTime")
+        or clip.get("media_start_time")
+        or clip.get("sourceStart")
+        or clip.get("source_start")
+        or 0
+    )
+
+
+def _track_z(track: Dict[str, Any]) -> float:
+    for key in ("zIndex", "z_index", "layer"):
+        try:
+            return float(track[key])
+        except (KeyError, TypeError, ValueError):
+            continue
+    return 0.0
+
+
+def _video_tracks(composition: Dict[str, Any]) -> Tuple[set, List[str]]:
+    """
+    (base track ids, upper track ids from bottom to top).
+
+    Clips of all base tracks ("video" / "main") form the segment sequence.
+    Tracks of type "overlay" / "pip", and video tracks with a zIndex above
+    0, are upper tracks: composited over the base while their clips play.
+    A raised video track only counts as upper when a base track remains:
+    otherwise the lowest one is the base.
+    """
+    base: set = set()
+    upper: List[Tuple[float, int, str]] = []
+    raised: List[Tuple[float, int, str]] = []
+    for pos, track in enumerate(composition.get("tracks", [])):
+        ttype = track.get("type", "video")
+        if ttype in UPPER_TRACK_TYPES:
+            upper.append((_track_z(track), pos, track["id"]))
+        elif ttype in ("video", "main"):
+            if _track_z(track) > 0:
+                raised.append((_track_z(track), pos, track["id"]))
+            else:
+                base.add(track["id"])
+    raised.sort()
+    if raised and not base:
+        base.add(raised.pop(0)[2])
+    return base, [track_id for _, _, track_id in sorted(upper + raised)]
+
+
+def _audio_tracks(composition: Dict[str, Any]) -> Tuple[set, List[str]]:
+    """
+    (voiceover track ids, mixed track ids).
+
+    The first "audio" track is the voiceover: its clip replaces the audio
+    of the segment it overlaps. Further audio tracks and "music" tracks are
+    mixed over the program audio; muted ones are left out.
+    """
+    tracks = [t for t in composition.get("tracks", []) if t.get("type") in ("audio",) + MUSIC_TRACK_TYPES]
+    voice = next((t["id"] for t in tracks if t.get("type") == "audio"), None)
+    mixed = [t["id"] for t in tracks if t["id"] != voice and not t.get("muted")]
+    return ({voice} if voice else set()), mixed
+
+
 def _parse_composition(composition: Dict[str, Any]) -> List[Segment]:
     """
     Extract an ordered list of Segments from the composition object.
@@ -342,26 +577,11 @@ def _parse_composition(composition: Dict[str, Any]) -> List[Segment]:
       ]
     }
     """
-    # --- Build layers lookup (list -> dict keyed by id) ---
-    raw_layers = composition.get("layers", {})
-    if isinstance(raw_layers, list):
-        layers: Dict[str, Any] = {l["id"]: l for l in raw_layers if "id" in l}
-    elif isinstance(raw_layers, dict):
-        # Already a dict (possible future format)
-        layers = raw_layers
-    else:
-        layers = {}
+    layers = _layers_by_id(composition)
 
-    # --- Build set of video track IDs ---
-    tracks = composition.get("tracks", [])
-    video_track_ids = {
-        t["id"] for t in tracks
-        if t.get("type", "video") in ("video", "main")
-    }
-    audio_track_ids = {
-        t["id"] for t in tracks
-        if t.get("type") == "audio"
-    }
+    # --- Base video tracks and the voiceover track (others: _parse_tracks) ---
+    video_track_ids, _ = _video_tracks(composition)
+    audio_track_ids, _ = _audio_tracks(composition)
 
     if not video_track_ids:
         logger.warning("No video tracks found in composition")
@@ -400,6 +620,8 @@ def _parse_composition(composition: Dict[str, Any]) -> List[Segment]:
         track_id = clip.get("trackId") or clip.get("track_id")
         if track_id not in video_track_ids:
             continue  # Skip audio-only clips (collected above)
+        if _is_overlay_clip(clip, layers):
+            continue  # Text / stickers: see _parse_overlays
 
         layer_id = clip.get("layerId") or clip.get("layer_id")
         layer = layers.get(layer_id, {}) if layer_id else {}
@@ -416,22 +638,7 @@ def _parse_composition(composition: Dict[str, Any]) -> List[Segment]:
             logger.warning("Clip %s has no media URL, skipping", clip.get("id"))
             continue
 
-        # Resolve media type from layer's mediaType field
-        media_type = (
-            layer.get("mediaType")
-            or layer.get("media_type")
-            or layer.get("type")
-            or "video"
-        ).lower()
-        # Normalise: layer types like "media", "background" need mediaType to determine
-        if media_type in ("image", "photo", "still", "jpeg", "jpg", "png", "webp"):
-            media_type = "image"
-        elif media_type in ("media", "background"):
-            # Fallback: check the URL extension
-            ext = _guess_extension(media_url).lower()
-            media_type = "image" if _is_image_ext(ext) else "video"
-        else:
-            media_type = "video"
+        media_type = _clip_media_type(layer, media_url)
 
         start_time = float(clip.get("startTime", 0))
         end_time = float(clip.get("endTime", start_time + float(clip.get("duration", 5))))
@@ -440,16 +647,7 @@ def _parse_composition(composition: Dict[str, Any]) -> List[Segment]:
             logger.warning("Clip %s has invalid timing (%.2f-%.2f), skipping", clip.get("id"), start_time, end_time)
             continue
 
-        # Source in-point: which second of the SOURCE media this clip starts
-        # from. Accepts mediaStartTime (camelCase, our client) or source_start.
-        # Defaults to 0 → from the start of the source (prior behavior).
-        source_start = float(
-            clip.get("mediaStartTime")
-            or clip.get("media_start_time")
-            or clip.get("sourceStart")
-            or clip.get("source_start")
-            or 0
-        )
+        source_start = _clip_source_start(clip)
 
         # Match an audio overlay clip whose time range overlaps this segment.
         # Common case (Flow / Studio): exact same start/end as the video clip.
@@ -490,6 +688,7 @@ def _parse_composition(composition: Dict[str, Any]) -> List[Segment]:
         for seg_idx, clip in enumerate(
             [c for c in all_clips
              if (c.get("trackId") or c.get("track_id")) in video_track_ids
+             and not _is_overlay_clip(c, layers)
              and float(c.get("endTime", 0)) > float(c.get("startTime", 0))]
         ):
             cid = clip.get("id")
@@ -556,30 +755,440 @@ def _parse_composition(composition: Dict[str, Any]) -> List[Segment]:
     return segments
 
 
+def _overlay_position(clip: Dict[str, Any], layer: Dict[str, Any], default_y: float) -> Tuple[float, float]:
+    """Centre of an overlay as fractions of the canvas (clip settings win over the layer's)."""
+    def coord(key: str, default: float) -> float:
+        for source in (clip, clip.get("position") or {}, layer, layer.get("position") or {}):
+            if isinstance(source, dict) and source.get(key) is not None:
+                return min(1.0, max(0.0, float(source[key])))
+        return default
+    return coord("x", 0.5), coord("y", default_y)
+
+
+def _parse_overlays(composition: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Text and sticker layers of the composition, in stacking order (clip
+    order), as stored in the compiled timeline:
+
+      {"type": "text", "text": "...", "style": {...}, "x": 0.5, "y": 0.85,
+       "start": 1.0, "end": 4.0}
+      {"type": "sticker", "url": "...", "width": 0.25, "opacity": 1.0,
+       "x": 0.5, "y": 0.5, "start": 0.0, "end": 2.0}
+
+    Layer fields:
+      text:    text (or content) and style (fontSize px, color,
+               backgroundColor, strokeColor, strokeWidth, textAlign,
+               fontWeight, maxWidth as a fraction of the canvas width)
+      sticker: imageUrl, width (fraction of the canvas width), opacity
+    x / y (the overlay's centre, fractions of the canvas) may be set on the
+    clip or the layer. Raises ValueError on an invalid overlay.
+    """
+    layers = _layers_by_id(composition)
+    overlays: List[Dict[str, Any]] = []
+    for clip in composition.get("clips") or []:
+        if not _is_overlay_clip(clip, layers):
+            continue
+        layer = layers[clip.get("layerId") or clip.get("layer_id")]
+        kind = layer["type"].lower()
+        start = float(clip.get("startTime", 0))
+        end = float(clip.get("endTime", start + float(clip.get("duration", 5))))
+        if end <= start:
+            logger.warning("Overlay clip %s has invalid timing (%.2f-%.2f), skipping", clip.get("id"), start, end)
+            continue
+
+        if kind == "text":
+            text = str(layer.get("text") or layer.get("content") or clip.get("text") or "").strip()
+            if not text:
+                continue
+            if len(text) > overlay_layers.MAX_TEXT_LENGTH:
+                raise ValueError(f"Text layer {layer.get('id')} is longer than {overlay_layers.MAX_TEXT_LENGTH} characters")
+            try:
+                style = overlay_layers.text_style({**(layer.get("style") or {}), **(clip.get("style") or {})})
+            except ValueError as exc:
+                raise ValueError(f"Text layer {layer.get('id')}: {exc}")
+            x, y = _overlay_position(clip, layer, default_y=0.85)
+            overlays.append({"type": "text", "text": text, "style": style, "x": x, "y": y, "start": start, "end": end})
+        else:
+            url = layer.get("imageUrl") or layer.get("image_url") or layer.get("url") or layer.get("src") or ""
+            if not url:
+                logger.warning("Sticker layer %s has no image URL, skipping", layer.get("id"))
+                continue
+            try:
+                size = min(1.0, max(0.01, float(clip.get("width") or layer.get("width") or 0.25)))
+                opacity = min(1.0, max(0.0, float(layer.get("opacity", 1.0))))
+            except (TypeError, ValueError):
+                raise ValueError(f"Sticker layer {layer.get('id')}: width and opacity must be numbers")
+            x, y = _overlay_position(clip, layer, default_y=0.5)
+            overlays.append({
+                "type": "sticker", "url": url, "width": size, "opacity": opacity,
+                "x": x, "y": y, "start": start, "end": end,
+            })
+    return overlays
+
+
+def _parse_tracks(composition: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Clips of the upper video tracks and of the mixed audio tracks (see
+    _video_tracks / _audio_tracks), as stored in the compiled timeline:
+
+      layers: [{"type": "video", "url": "...", "start": 2.0, "end": 6.0,
+                "source_start": 0.0, "x": 0.75, "y": 0.25,
+                "width": 0.4, "height": 0.4, "opacity": 1.0}, ...]
+      mix:    [{"url": "...", "start": 0.0, "end": 30.0,
+                "source_start": 0.0, "volume": 0.3}, ...]
+
+    Layers are ordered bottom to top. x / y (the box's centre), width and
+    height are fractions of the canvas, from the clip or its layer; the
+    default box is the whole canvas. Upper-track clips are muted. Volume
+    is the clip's (or its layer's) times the track's.
+    """
+    layers_by_id = _layers_by_id(composition)
+    tracks = {t["id"]: t for t in composition.get("tracks", []) if "id" in t}
+    _, upper_ids = _video_tracks(composition)
+    _, mix_ids = _audio_tracks(composition)
+    clips = composition.get("clips") or []
+
+    def track_clips(track_id: str):
+        for clip in clips:
+            if (clip.get("trackId") or clip.get("track_id")) != track_id:
+                continue
+            layer_id = clip.get("layerId") or clip.get("layer_id")
+            layer = layers_by_id.get(layer_id, {}) if layer_id else {}
+            start = float(clip.get("startTime", 0))
+            end = float(clip.get("endTime", start + float(clip.get("duration", 5))))
+            if end <= start:
+                logger.warning("Clip %s has invalid timing (%.2f-%.2f), skipping", clip.get("id"), start, end)
+                continue
+            yield clip, layer, start, end
+
+    def fraction(clip: Dict[str, Any], layer: Dict[str, Any], key: str, default: float) -> float:
+        for source in (clip, clip.get("position") or {}, layer, layer.get("position") or {}):
+            if isinstance(source, dict) and source.get(key) is not None:
+                return min(1.0, max(0.0, float(source[key])))
+        return default
+
+    video_layers: List[Dict[str, Any]] = []
+    for track_id in upper_ids:
+        if tracks[track_id].get("hidden"):
+            continue
+        for clip, layer, start, end in track_clips(track_id):
+            if _is_overlay_clip(clip, layers_by_id):
+                continue  # Text / stickers: see _parse_overlays
+            url = layer.get("mediaUrl") or layer.get("media_url") or clip.get("mediaUrl") or clip.get("media_url") or ""
+            if not url:
+                logger.warning("Clip %s has no media URL, skipping", clip.get("id"))
+                continue
+            try:
+                entry = {
+                    "type": _clip_media_type(layer, url),
+                    "url": url,
+                    "start": start,
+                    "end": end,
+                    "source_start": _clip_source_start(clip),
+                    "x": fraction(clip, layer, "x", 0.5),
+                    "y": fraction(clip, layer, "y", 0.5),
+                    "width": max(0.02, fraction(clip, layer, "width", 1.0)),
+                    "height": max(0.02, fraction(clip, layer, "height", 1.0)),
+                    "opacity": fraction(clip, layer, "opacity", 1.0),
+                }
+            except (TypeError, ValueError):
+                raise ValueError(f"Clip {clip.get('id')}: position, size and opacity must be numbers")
+            if entry["type"] == "image":
+                entry["source_start"] = 0.0
+            video_layers.append(entry)
+
+    mix: List[Dict[str, Any]] = []
+    for track_id in mix_ids:
+        track = tracks[track_id]
+        for clip, layer, start, end in track_clips(track_id):
+            url = (
+                layer.get("audioUrl") or layer.get("audio_url")
+                or clip.get("audioUrl") or clip.get("audio_url") or ""
+            )
+            if not url:
+                continue
+            try:
+                volume = float(clip.get("volume", layer.get("volume", 1.0))) * float(track.get("volume", 1.0))
+            except (TypeError, ValueError):
+                raise ValueError(f"Clip {clip.get('id')}: volume must be a number")
+            if volume <= 0:
+                continue
+            mix.append({
+                "url": url, "start": start, "end": end,
+                "source_start": _clip_source_start(clip), "volume": min(4.0, volume),
+            })
+    return video_layers, mix
+
+
+def _output_time(t: float, segments: List[Segment]) -> float:
+    """
+    Position on the rendered output of timeline time `t`: each transition
+    overlaps two clips, so the output runs ahead of the timeline by the
+    transitions before it.
+    """
+    pos = 0.0
+    for i, seg in enumerate(segments):
+        duration = seg.end_time - seg.start_time
+        if t < seg.end_time or i == len(segments) - 1:
+            return pos + min(max(0.0, t - seg.start_time), duration)
+        pos += duration
+        transition = seg.transition_to_next
+        if transition is not None and transition.type != "cut":
+            pos -= transition.duration
+    return pos
+
+
+def _output_layers(
+    segments: List[Segment],
+    timeline: Dict[str, Any],
+    media_paths: Dict[str, str],
+    placed: List[Tuple[Dict[str, Any], str, int, int]],
+    width: int,
+    height: int,
+) -> OutputLayers:
+    """
+    The timeline's upper-track clips, rasterized overlays — (timeline entry,
+    PNG path, x, y) — and mixed audio as output layers. `media_paths` maps
+    the track URLs to local files. Each layer starts where its start time
+    lands on the output and keeps its own length (music and picture-in-
+    picture play on through transitions), cut at the end of the output.
+    """
+    total = _chain_length(segments)
+
+    def window(entry: Dict[str, Any]) -> Tuple[float, float]:
+        start = _output_time(float(entry["start"]), segments)
+        return start, min(total, start + float(entry["end"]) - float(entry["start"]))
+
+    layers = OutputLayers()
+    for entry in timeline.get("layers") or []:
+        start, end = window(entry)
+        if end - start <= 1e-3:
+            continue
+        box_w, box_h = _even(entry["width"] * width), _even(entry["height"] * height)
+        layers.overlays.append(OverlayPlacement(
+            path=media_paths[entry["url"]],
+            x=round(entry["x"] * width - box_w / 2), y=round(entry["y"] * height - box_h / 2),
+            start=start, end=end, media_type=entry["type"],
+            width=max(2, box_w), height=max(2, box_h),
+            source_start=float(entry.get("source_start") or 0.0),
+            opacity=float(entry.get("opacity", 1.0)), url=entry["url"],
+        ))
+    for entry, path, x, y in placed:
+        start, end = window(entry)
+        if end - start > 1e-3:
+            layers.overlays.append(OverlayPlacement(path=path, x=x, y=y, start=start, end=end))
+    for entry in timeline.get("mix") or []:
+        start, end = window(entry)
+        if end - start <= 1e-3:
+            continue
+        layers.audio_mix.append(AudioMix(
+            path=media_paths[entry["url"]], start=start, end=end,
+            source_start=float(entry.get("source_start") or 0.0),
+            volume=float(entry.get("volume", 1.0)), url=entry["url"],
+        ))
+    return layers
+
+
+def _layer_inputs(layers: Optional[OutputLayers]) -> int:
+    """FFmpeg inputs the output layers open (one per clip)."""
+    return len(layers.overlays) + len(layers.audio_mix) if layers else 0
+
+
+async def _download_track_media(timeline: Dict[str, Any], temp_dir: str) -> Dict[str, str]:
+    """
+    Download the media of upper-track clips and mixed audio (each URL once);
+    returns URL -> local path. A failed download fails the job, as for
+    segment media.
+    """
+    urls = list(dict.fromkeys(
+        entry["url"] for key in ("layers", "mix") for entry in timeline.get(key) or []
+    ))
+    paths: Dict[str, str] = {}
+    for k, url in enumerate(urls):
+        path = os.path.join(temp_dir, f"track_{k}{_guess_extension(url)}")
+        await _download_media(url, path)
+        paths[url] = path
+    return paths
+
+
+async def _rasterize_overlays(
+    entries: List[Dict[str, Any]],
+    width: int,
+    height: int,
+    temp_dir: str,
+) -> List[Tuple[Dict[str, Any], str, int, int]]:
+    """
+    Rasterize the timeline's overlays for a width x height canvas (cached
+    PNGs; stickers are downloaded only when not cached). Overlays that fail
+    are logged and left out. Returns (entry, PNG path, x, y) in order.
+    """
+    placed: List[Tuple[Dict[str, Any], str, int, int]] = []
+    for k, entry in enumerate(entries):
+        if entry["type"] == "text":
+            raster = await overlay_layers.rasterize_text(entry["text"], entry["style"], width, height)
+        else:
+            sticker_width = max(2, round(entry["width"] * width))
+            raster = overlay_layers.cached_sticker(entry["url"], sticker_width, entry["opacity"])
+            if raster is None:
+                src = os.path.join(temp_dir, f"sticker_{k}{_guess_extension(entry['url'])}")
+                try:
+                    await _download_media(entry["url"], src)
+                except Exception as exc:
+                    logger.warning("Failed to download sticker %s: %s — skipping", entry["url"], exc)
+                    continue
+                raster = await overlay_layers.rasterize_sticker(
+                    src, entry["url"], sticker_width, entry["opacity"],
+                )
+        if raster is None:
+            continue
+        x, y = overlay_layers.place(raster, entry["x"], entry["y"], width, height)
+        placed.append((entry, raster.path, x, y))
+    return placed
+
+
+# ---------------------------------------------------------------------------
+# Compiled timeline
+# ---------------------------------------------------------------------------
+#
+# A composition is validated and compiled once, at submit time, into the
+# job's `timeline` column:
+#
+#   {"v": 3, "hash": "<sha256>", "width": 1080, "height": 1920, "duration": 42.5,
+#    "segments": [{"type": "video", "url": "...", "start": 0.0, "end": 5.0,
+#                  "source_start": 2.0, "audio_url": "...",
+#                  "transition": {"type": "crossfade", "duration": 0.5}}, ...],
+#    "layers": [{"type": "video", "url": "...", "start": 2.0, "end": 6.0, ...}, ...],
+#    "mix": [{"url": "...", "start": 0.0, "end": 30.0, "volume": 0.3, ...}, ...],
+#    "overlays": [{"type": "text", "text": "...", "start": 1.0, "end": 4.0, ...}, ...]}
+#
+# `segments` come from the base video tracks, `layers` (upper video tracks)
+# and `mix` (further audio tracks) from _parse_tracks, `overlays` (text and
+# stickers) from _parse_overlays; each of the last three is left out when
+# empty, so a single-track timeline renders exactly as before.
+# Segments are in timeline order (their index is their position); optional
+# fields are left out at their defaults. width/height are null when the
+# composition sets neither a size nor an aspect ratio: the worker then uses
+# the first video's resolution. `hash` covers everything but `v`, so
+# compositions that render the same timeline share it whatever their key
+# spelling, clip ids or layer layout.
+#
+# Only the timeline is stored (migration 023): the raw composition is not
+# kept on the row. Each IR version only adds optional keys, so the worker
+# renders a timeline of any version up to TIMELINE_IR_VERSION as it was
+# compiled; only rows queued before compiled timelines existed still carry
+# a composition, which is compiled when they are claimed.
+
+def _compile_timeline(composition: Dict[str, Any]) -> Dict[str, Any]:
+    """Compile a composition into its timeline; raises ValueError if it renders nothing."""
+    segments = _parse_composition(composition)
+    if not segments:
+        raise ValueError("Composition contains no renderable segments")
+    video_layers, mix = _parse_tracks(composition)
+    overlays = _parse_overlays(composition)
+
+    compiled: List[Dict[str, Any]] = []
+    for seg in segments:
+        entry: Dict[str, Any] = {
+            "type": seg.media_type,
+            "url": seg.media_url,
+            "start": seg.start_time,
+            "end": seg.end_time,
+        }
+        if seg.source_start:
+            entry["source_start"] = seg.source_start
+        if seg.audio_overlay_url:
+            entry["audio_url"] = seg.audio_overlay_url
+        if seg.transition_to_next is not None:
+            entry["transition"] = {
+                "type": seg.transition_to_next.type,
+                "duration": seg.transition_to_next.duration,
+            }
+        compiled.append(entry)
+
+    size = _composition_resolution(composition)
+    body = {
+        "width": size[0] - size[0] % 2 if size else None,
+        "height": size[1] - size[1] % 2 if size else None,
+        "duration": round(_chain_length(segments), 3),
+        "segments": compiled,
+    }
+    for key, value in (("layers", video_layers), ("mix", mix), ("overlays", overlays)):
+        if value:
+            body[key] = value
+    digest = hashlib.sha256(
+        json.dumps(body, sort_keys=True, separators=(",", ":")).encode()
+    ).hexdigest()
+    return {"v": TIMELINE_IR_VERSION, "hash": digest, **body}
+
+
+def _timeline_segments(timeline: Dict[str, Any]) -> List[Segment]:
+    """Fresh Segments (no local files yet) from a compiled timeline."""
+    return [
+        Segment(
+            index=i,
+            media_type=entry["type"],
+            media_url=entry["url"],
+            start_time=float(entry["start"]),
+            end_time=float(entry["end"]),
+            source_start=float(entry.get("source_start") or 0.0),
+            audio_overlay_url=entry.get("audio_url") or "",
+            transition_to_next=Transition(**entry["transition"]) if entry.get("transition") else None,
+        )
+        for i, entry in enumerate(timeline["segments"])
+    ]
+
+
+def _job_timeline(supabase, job: Dict[str, Any]) -> Dict[str, Any]:
+    """The compiled timeline of an export_jobs row, compiling older rows on the fly."""
+    timeline = job.get("timeline")
+    if isinstance(timeline, str):
+        timeline = json.loads(timeline)
+    if isinstance(timeline, dict) and 1 <= (timeline.get("v") or 0) <= TIMELINE_IR_VERSION:
+        return timeline
+
+    result = supabase.table("export_jobs").select("composition").eq("id", job["id"]).single().execute()
+    composition = (result.data or {}).get("composition") or {}
+    if isinstance(composition, str):
+        composition = json.loads(composition)
+    return _compile_timeline(composition)
+
+
 # ---------------------------------------------------------------------------
 # FFmpeg command builder
 # ---------------------------------------------------------------------------
 
-def _build_ffmpeg_command(
+def _build_timeline_graph(
     segments: List[Segment],
-    output_path: str,
     width: int,
     height: int,
     has_audio_flags: Dict[int, bool],
-) -> List[str]:
+    input_seek: bool = False,
+    streams: str = "av",
+    layers: Optional[OutputLayers] = None,
+) -> Tuple[List[str], List[str], Optional[str], Optional[str]]:
     """
-    Build the full ffmpeg command for concatenating segments.
-
-    Parameters
-    ----------
-    segments : list of Segment with local_path populated
-    output_path : destination file path
-    width, height : target canvas resolution
-    has_audio_flags : dict mapping segment index -> bool (whether source has audio)
+    Build the inputs and filter graph that composite `segments` onto a
+    width x height canvas, then apply `layers` over the result.
+
+    Returns (input args, filter parts, video out label, audio out label).
+    With `streams` "v" or "a" only that half of the graph is built (the
+    other label is None), and only the inputs it reads are opened: no
+    overlay inputs for "a", no mixed audio for "v", and in "a" the video
+    clips are opened without their video stream, from their in-point.
+    See _build_ffmpeg_command for the parameters.
     """
 
     inputs: List[str] = []
     filter_parts: List[str] = []
+    want_v, want_a = "v" in streams, "a" in streams
+
+    def add_v(part: str) -> None:
+        if want_v:
+            filter_parts.append(part)
+
+    def add_a(part: str) -> None:
+        if want_a:
+            filter_parts.append(part)
     # When a segment has an audio overlay, we add it as an extra ffmpeg input AFTER
     # all the segment media inputs. The first overlay input index = len(segments) + offset.
     overlay_input_indices: Dict[int, int] = {}
@@ -587,9 +1196,22 @@ def _build_ffmpeg_command(
 
     for seg in segments:
         duration = seg.end_time - seg.start_time
+        v_label = f"v{seg.index}"
+        a_label = f"a{seg.index}"
 
         if seg.media_type == "video":
-            inputs.extend(["-i", seg.local_path])
+            seek = input_seek and seg.source_start > 0
+            if not want_v:
+                # Audio only: the video stream is not demuxed, and only the
+                # clip's window of the source is read
+                seek = True
+                inputs.extend([
+                    "-vn", "-ss", f"{seg.source_start:.6f}", "-t", f"{duration:.6f}", "-i", seg.local_path,
+                ])
+            elif seek:
+                inputs.extend(["-ss", f"{seg.source_start:.6f}", "-i", seg.local_path])
+            else:
+                inputs.extend(["-i", seg.local_path])
 
             # Video: trim to clip duration, scale + pad to canvas. Normalised
             # to a common pixel format + framerate + timebase so the downstream
@@ -600,13 +1222,14 @@ def _build_ffmpeg_command(
             # Source window: extract [source_start, source_start+duration] of
             # the input, then setpts resets the clip to start at t=0. With the
             # default source_start=0 this is identical to the prior trim=0:dur.
-            v_in = seg.source_start
-            v_out = seg.source_start + duration
-            filter_parts.append(
+            # With input_seek the input already starts at source_start.
+            v_in = 0.0 if seek else seg.source_start
+            v_out = v_in + duration
+            add_v(
                 f"[{seg.index}:v]trim={v_in}:{v_out},setpts=PTS-STARTPTS,"
                 f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
                 f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,"
-                f"format=yuv420p,fps=30[v{seg.index}]"
+                f"format=yuv420p,fps=30[{v_label}]"
             )
 
             # Audio resolution priority for this segment:
@@ -617,12 +1240,12 @@ def _build_ffmpeg_command(
                 # Will be wired below after we add the overlay input.
                 pass
             elif has_audio_flags.get(seg.index, False):
-                filter_parts.append(
-                    f"[{seg.index}:a]atrim={v_in}:{v_out},asetpts=PTS-STARTPTS[a{seg.index}]"
+                add_a(
+                    f"[{seg.index}:a]atrim={v_in}:{v_out},asetpts=PTS-STARTPTS[{a_label}]"
                 )
             else:
-                filter_parts.append(
-                    f"anullsrc=r=44100:cl=stereo:d={duration}[a{seg.index}]"
+                add_a(
+                    f"anullsrc=r=44100:cl=stereo:d={duration}[{a_label}]"
                 )
         else:
             # Image: loop for the clip duration. Normalisation matches the
@@ -630,18 +1253,35 @@ def _build_ffmpeg_command(
             # compatible streams. The trim+setpts pair guarantees the image
             # loop produces a clean finite stream that terminates at the
             # specified duration — xfade in particular needs a definite EOF.
-            inputs.extend(["-loop", "1", "-t", str(duration), "-i", seg.local_path])
+            if seg.still_path:
+                # Pre-scaled frame: read and converted once, then repeated
+                # by the loop filter for the clip's frame count. The input
+                # is read at 30fps and retimed onto a 1/30 timebase (a PNG
+                # otherwise arrives at 25fps, 1/25), so concat / xfade get
+                # the same frame rate and timebase as the video clips. The
+                # scale/pad run on the single frame and keep the canvas
+                # exact even if the pre-scaled size is off.
+                frames = max(1, int(round(duration * 30)))
+                inputs.extend(["-framerate", "30", "-i", seg.still_path])
+                add_v(
+                    f"[{seg.index}:v]scale={width}:{height}:force_original_aspect_ratio=decrease,"
+                    f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,format=yuv420p,"
+                    f"loop=loop={frames - 1}:size=1:start=0,"
+                    f"settb=1/30,setpts=N/30/TB,trim=0:{duration},fps=30[{v_label}]"
+                )
+            else:
+                inputs.extend(["-loop", "1", "-t", str(duration), "-i", seg.local_path])
 
-            filter_parts.append(
-                f"[{seg.index}:v]trim=0:{duration},setpts=PTS-STARTPTS,"
-                f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
-                f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,"
-                f"format=yuv420p,fps=30[v{seg.index}]"
-            )
+                add_v(
+                    f"[{seg.index}:v]trim=0:{duration},setpts=PTS-STARTPTS,"
+                    f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+                    f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,"
+                    f"format=yuv420p,fps=30[{v_label}]"
+                )
             # Images don't have native audio. Overlay (if any) is wired below.
             if not seg.audio_overlay_local_path:
-                filter_parts.append(
-                    f"anullsrc=r=44100:cl=stereo:d={duration}[a{seg.index}]"
+                add_a(
+                    f"anullsrc=r=44100:cl=stereo:d={duration}[{a_label}]"
                 )
 
     # --- Audio overlay inputs (TTS / voiceover) ---
@@ -651,12 +1291,13 @@ def _build_ffmpeg_command(
             overlay_input_indices[seg.index] = next_extra_input
             duration = seg.end_time - seg.start_time
             ai = next_extra_input
+            a_label = f"a{seg.index}"
             # Take overlay audio, trim to clip duration, pad with silence if shorter.
             # apad ensures the audio stream length matches the video segment so the
             # subsequent concat doesn't desync.
-            filter_parts.append(
+            add_a(
                 f"[{ai}:a]atrim=0:{duration},asetpts=PTS-STARTPTS,"
-                f"apad=pad_dur={duration},atrim=0:{duration}[a{seg.index}]"
+                f"apad=pad_dur={duration},atrim=0:{duration}[{a_label}]"
             )
             next_extra_input += 1
 
@@ -677,8 +1318,14 @@ def _build_ffmpeg_command(
         # Legacy concat path. FFmpeg's concat filter expects inputs
         # INTERLEAVED by segment — i.e. [v0][a0][v1][a1]…[vN][aN] — not
         # grouped by stream type.
-        concat_inputs = "".join(f"[v{seg.index}][a{seg.index}]" for seg in segments)
-        filter_parts.append(f"{concat_inputs}concat=n={n}:v=1:a=1[outv][outa]")
+        concat_inputs = "".join(
+            (f"[v{seg.index}]" if want_v else "") + (f"[a{seg.index}]" if want_a else "")
+            for seg in segments
+        )
+        filter_parts.append(
+            f"{concat_inputs}concat=n={n}:v={int(want_v)}:a={int(want_a)}"
+            + ("[outv]" if want_v else "") + ("[outa]" if want_a else "")
+        )
         out_v_label = "outv"
         out_a_label = "outa"
     else:
@@ -707,10 +1354,10 @@ def _build_ffmpeg_command(
             if transition is None or transition.type == "cut":
                 # Plain cut — splice two-stream concat for video AND audio
                 # separately (concat=n=2 with v=1:a=0 then v=0:a=1).
-                filter_parts.append(
+                add_v(
                     f"[{prev_v}][{next_v}]concat=n=2:v=1:a=0[{new_v}]"
                 )
-                filter_parts.append(
+                add_a(
                     f"[{prev_a}][{next_a}]concat=n=2:v=0:a=1[{new_a}]"
                 )
                 acc_length += d_next
@@ -723,11 +1370,11 @@ def _build_ffmpeg_command(
                 offset = max(0.0, acc_length - td)
                 # Numeric formatting: keep 6 decimal places to avoid round-trip
                 # precision loss on very short clips.
-                filter_parts.append(
+                add_v(
                     f"[{prev_v}][{next_v}]xfade=transition={ffmpeg_type}:"
                     f"duration={td:.6f}:offset={offset:.6f}[{new_v}]"
                 )
-                filter_parts.append(
+                add_a(
                     f"[{prev_a}][{next_a}]acrossfade=d={td:.6f}[{new_a}]"
                 )
                 # Net length after overlap: gain d_next but lose td of overlap.
@@ -739,83 +1386,1456 @@ def _build_ffmpeg_command(
         out_v_label = prev_v
         out_a_label = prev_a
 
-    filter_complex = ";".join(filter_parts)
+    # --- Mixed audio tracks (music, effects) ---
+    # One input per clip, cut to its window before decoding (-ss/-t),
+    # delayed to its start on the output and mixed over the program audio.
+    if want_a and layers and layers.audio_mix:
+        mix_labels = [f"[{out_a_label}]"]
+        for j, mix in enumerate(layers.audio_mix):
+            inputs.extend([
+                "-ss", f"{mix.source_start:.6f}", "-t", f"{mix.end - mix.start:.6f}", "-i", mix.path,
+            ])
+            delay_ms = int(round(mix.start * 1000))
+            filter_parts.append(
+                f"[{next_extra_input}:a]asetpts=PTS-STARTPTS,volume={mix.volume:.3f},"
+                f"adelay={delay_ms}:all=1[m{j}]"
+            )
+            mix_labels.append(f"[m{j}]")
+            next_extra_input += 1
+        filter_parts.append(
+            f"{''.join(mix_labels)}amix=inputs={len(mix_labels)}:duration=first:"
+            f"dropout_transition=0:normalize=0[outmix]"
+        )
+        out_a_label = "outmix"
+
+    # --- Upper-track clips, text and stickers ---
+    # Text / stickers are a single pre-rasterized RGBA frame (overlay_layers),
+    # held by the overlay filter for as long as its window is enabled. Upper
+    # track clips decode only their window (-ss/-t), shifted to its start on
+    # the output and fitted into their box; the overlay passes the program
+    # through outside it, so a layer costs nothing where it is not shown.
+    for j, ov in enumerate(layers.overlays if want_v and layers else []):
+        out = f"outl{j}"
+        window = f"enable='between(t,{ov.start:.3f},{ov.end:.3f})'"
+        if ov.media_type == "frame":
+            inputs.extend(["-i", ov.path])
+            filter_parts.append(
+                f"[{out_v_label}][{next_extra_input}:v]overlay=x={ov.x}:y={ov.y}:format=auto:{window}[{out}]"
+            )
+        else:
+            duration = ov.end - ov.start
+            if ov.media_type == "video":
+                inputs.extend(["-ss", f"{ov.source_start:.6f}", "-t", f"{duration:.6f}", "-i", ov.path])
+            else:
+                inputs.extend(["-loop", "1", "-t", f"{duration:.6f}", "-i", ov.path])
+            alpha = f",colorchannelmixer=aa={ov.opacity:.3f}" if ov.opacity < 1.0 else ""
+            filter_parts.append(
+                f"[{next_extra_input}:v]fps=30,setpts=PTS-STARTPTS+{ov.start:.6f}/TB,"
+                f"scale={ov.width}:{ov.height}:force_original_aspect_ratio=decrease,"
+                f"setsar=1,format=yuva420p{alpha}[l{j}]"
+            )
+            # Centred in its box whatever the source's aspect ratio
+            filter_parts.append(
+                f"[{out_v_label}][l{j}]overlay="
+                f"x={ov.x}+({ov.width}-overlay_w)/2:y={ov.y}+({ov.height}-overlay_h)/2:"
+                f"eof_action=pass:format=auto:{window}[{out}]"
+            )
+        out_v_label = out
+        next_extra_input += 1
 
-    cmd = (
-        ["ffmpeg", "-y"]
-        + inputs
-        + [
-            "-filter_complex", filter_complex,
-            "-map", f"[{out_v_label}]",
-            "-map", f"[{out_a_label}]",
-            "-c:v", "libx264",
-            "-preset", "medium",
-            "-crf", "23",
-            "-c:a", "aac",
-            "-b:a", "128k",
-            "-movflags", "+faststart",
-            "-pix_fmt", "yuv420p",
-            output_path,
-        ]
+    return (
+        inputs, filter_parts,
+        out_v_label if want_v else None,
+        out_a_label if want_a else None,
     )
 
-    return cmd
 
+def _filter_args(filter_parts: List[str], filter_script_path: Optional[str]) -> List[str]:
+    filter_complex = ";".join(filter_parts)
+    if filter_script_path:
+        with open(filter_script_path, "w", encoding="utf-8") as f:
+            f.write(filter_complex)
+        return ["-filter_complex_script", filter_script_path]
+    return ["-filter_complex", filter_complex]
 
-# ---------------------------------------------------------------------------
-# Determine output resolution
-# ---------------------------------------------------------------------------
 
-def _resolve_output_resolution(
-    composition: Dict[str, Any],
-    first_video_resolution: tuple[Optional[int], Optional[int]],
-) -> tuple[int, int]:
+def _build_ffmpeg_command(
+    segments: List[Segment],
+    output_path: str,
+    width: int,
+    height: int,
+    has_audio_flags: Dict[int, bool],
+    filter_script_path: Optional[str] = None,
+    extra_output_args: Optional[List[str]] = None,
+    input_seek: bool = False,
+    streams: str = "av",
+    layers: Optional[OutputLayers] = None,
+) -> List[str]:
     """
-    Pick the target resolution.
+    Build the full ffmpeg command for concatenating segments.
 
-    Priority:
-    1. Explicit width/height in the composition
-    2. Aspect ratio hint in the composition (e.g. "9:16", "16:9")
-    3. First video's actual resolution
-    4. Fallback to 1920x1080
+    Parameters
+    ----------
+    segments : list of Segment with local_path populated
+    output_path : destination file path
+    width, height : target canvas resolution
+    has_audio_flags : dict mapping segment index -> bool (whether source has audio)
+    filter_script_path : when set, the filter graph is written to this file and
+        passed via -filter_complex_script instead of inline (keeps argv short)
+    extra_output_args : encoder options appended after the defaults (e.g. a
+        fixed GOP for smart-render pieces)
+    input_seek : seek video inputs to source_start with -ss before -i instead
+        of decoding from the start and trimming (short windows of long clips)
+    streams : "av" (default), or "v" / "a" for a video-only / audio-only file
+        (see _render_split_av)
+    layers : upper-track clips, text / stickers and mixed audio applied over
+        the concatenated timeline (see OutputLayers)
     """
-    # 1. Explicit dimensions
-    w = composition.get("width")
-    h = composition.get("height")
-    if w and h:
-        return int(w), int(h)
+    inputs, filter_parts, out_v_label, out_a_label = _build_timeline_graph(
+        segments, width, height, has_audio_flags, input_seek=input_seek, streams=streams, layers=layers,
+    )
+    filter_args = _filter_args(filter_parts, filter_script_path)
+
+    cmd = ["ffmpeg", "-y"] + inputs + filter_args
+    if out_v_label:
+        cmd += ["-map", f"[{out_v_label}]"]
+    if out_a_label:
+        cmd += ["-map", f"[{out_a_label}]"]
+    cmd += ["-c:v", "libx264", "-preset", "medium", "-crf", "23"] if out_v_label else ["-vn"]
+    cmd += AUDIO_ENCODE_ARGS if out_a_label else ["-an"]
+    cmd += ["-movflags", "+faststart"]
+    if out_v_label:
+        cmd += ["-pix_fmt", "yuv420p"]
+    return cmd + (extra_output_args or []) + [output_path]
+
+
+def _rendition_video_filter(target: OutputTarget, width: int, height: int) -> str:
+    """Filter mapping the width x height canvas onto one target's frame."""
+    w, h = target.width, target.height
+    if (w, h) == (width, height):
+        return "null"
+    if target.fit == "crop":
+        return f"scale={w}:{h}:force_original_aspect_ratio=increase,crop={w}:{h},setsar=1"
+    return (
+        f"scale={w}:{h}:force_original_aspect_ratio=decrease,"
+        f"pad={w}:{h}:(ow-iw)/2:(oh-ih)/2,setsar=1"
+    )
 
-    # 2. Aspect ratio hint
-    aspect = composition.get("aspectRatio") or composition.get("aspect_ratio")
-    if aspect:
-        aspect_str = str(aspect).strip()
-        if aspect_str in ("9:16", "9/16"):
-            return 1080, 1920
-        if aspect_str in ("16:9", "16/9"):
-            return 1920, 1080
-        if aspect_str in ("1:1", "1/1"):
-            return 1080, 1080
-        if aspect_str in ("4:5", "4/5"):
-            return 1080, 1350
-        if aspect_str in ("4:3", "4/3"):
-            return 1440, 1080
 
-    # 3. First video resolution
-    vw, vh = first_video_resolution
-    if vw and vh:
-        # Ensure even dimensions (FFmpeg requirement for libx264)
-        return vw - (vw % 2), vh - (vh % 2)
+def _build_rendition_command(
+    segments: List[Segment],
+    renditions: List[RenditionFiles],
+    width: int,
+    height: int,
+    has_audio_flags: Dict[int, bool],
+    filter_script_path: Optional[str] = None,
+    input_seek: bool = False,
+    layers: Optional[OutputLayers] = None,
+) -> List[str]:
+    """
+    Build one ffmpeg command that composites `segments` (and `layers`) once
+    and encodes every rendition from it.
+
+    The composited stream is split (split / asplit) into one branch per
+    target, each scaled (pad or crop) to the target and given its own H.264
+    encoder. A target with a poster gets a second branch off its scaled
+    video that keeps the frame at poster_time (and a scaled copy of it as
+    the thumbnail), written as single-frame JPEG outputs of the same run.
+    """
+    inputs, filter_parts, out_v, out_a = _build_timeline_graph(
+        segments, width, height, has_audio_flags, input_seek=input_seek, layers=layers,
+    )
+    n = len(renditions)
+    last_frame = max(0.0, _chain_length(segments) - 1.0 / 30)
+
+    filter_parts.append(f"[{out_v}]split={n}" + "".join(f"[rv{i}]" for i in range(n)))
+    filter_parts.append(f"[{out_a}]asplit={n}" + "".join(f"[ra{i}]" for i in range(n)))
+
+    output_args: List[str] = []
+    for i, files in enumerate(renditions):
+        target = files.target
+        scale = _rendition_video_filter(target, width, height)
+        if files.poster_path or files.thumbnail_path:
+            filter_parts.append(f"[rv{i}]{scale},split=2[ro{i}][rs{i}]")
+            t = min(max(0.0, target.poster_time), last_frame)
+            still = f"[rs{i}]trim=start={t:.6f},setpts=PTS-STARTPTS"
+            thumb_scale = f"scale={target.thumbnail_width}:-2"
+            if files.poster_path and files.thumbnail_path:
+                filter_parts.append(f"{still},split=2[rp{i}][rtin{i}]")
+                filter_parts.append(f"[rtin{i}]{thumb_scale}[rt{i}]")
+            elif files.poster_path:
+                filter_parts.append(f"{still}[rp{i}]")
+            else:
+                filter_parts.append(f"{still},{thumb_scale}[rt{i}]")
+        else:
+            filter_parts.append(f"[rv{i}]{scale}[ro{i}]")
 
-    # 4. Fallback
-    return 1920, 1080
+        if target.video_bitrate:
+            rate = target.video_bitrate
+            video_quality = ["-b:v", rate, "-maxrate", rate, "-bufsize", _double_bitrate(rate)]
+        else:
+            video_quality = ["-crf", "23"]
+        output_args += (
+            ["-map", f"[ro{i}]", "-map", f"[ra{i}]", "-c:v", "libx264", "-preset", "medium"]
+            + video_quality
+            + [
+                "-c:a", "aac",
+                "-b:a", target.audio_bitrate,
+                "-movflags", "+faststart",
+                "-pix_fmt", "yuv420p",
+                files.video_path,
+            ]
+        )
+        if files.poster_path:
+            output_args += ["-map", f"[rp{i}]", "-frames:v", "1", "-q:v", "2", files.poster_path]
+        if files.thumbnail_path:
+            output_args += ["-map", f"[rt{i}]", "-frames:v", "1", "-q:v", "4", files.thumbnail_path]
 
+    return ["ffmpeg", "-y"] + inputs + _filter_args(filter_parts, filter_script_path) + output_args
 
-# ---------------------------------------------------------------------------
-# Progress helper
+
+def _double_bitrate(rate: str) -> str:
+    """'6M' -> '12M' (VBV buffer of two seconds at the target rate)."""
+    suffix = rate[-1] if rate[-1] in "kKmM" else ""
+    number = float(rate[:-1] if suffix else rate)
+    return f"{number * 2:g}{suffix}"
+
+
+# ---------------------------------------------------------------------------
+# Staged render plan (long timelines)
+# ---------------------------------------------------------------------------
+#
+# A single pass over a 300-clip timeline means 300 open decoders, a filter
+# graph of several hundred nodes and an argv that can exceed the OS limit.
+# Instead, segments are grouped into batches of at most
+# _max_inputs_per_pass() inputs. Each batch is rendered to an intermediate
+# MP4 in the job's scratch dir, then the intermediates are merged:
+#
+#   - no transition crosses a batch boundary -> concat demuxer, stream copy
+#     (no re-encode; intermediates share identical encoder settings)
+#   - otherwise the intermediates become the segments of another pass, so
+#     boundary xfades are applied by the same builder. If there are still
+#     too many of them the plan recurses, giving a tree of passes.
+#
+# Finished intermediates are kept under their final name, so a retried job
+# whose scratch dir survived (see job checkpoints) skips completed batches.
+
+def _max_inputs_per_pass(width: int, height: int) -> int:
+    """
+    Inputs one FFmpeg pass may open, from RENDER_MEMORY_BUDGET_MB.
+
+    Rough per-input cost: ~12 decoded yuv420p frames at canvas size (decoder
+    references + filter queues after scaling) plus ~8 MB of demuxer/decoder
+    state. At 1080x1920 that is ~45 MB, i.e. ~34 inputs with the default
+    budget.
+    """
+    if MAX_INPUTS_PER_PASS_OVERRIDE > 0:
+        return max(2, MAX_INPUTS_PER_PASS_OVERRIDE)
+    frame_mb = width * height * 1.5 / (1024 * 1024)
+    per_input_mb = frame_mb * 12 + 8
+    return max(MIN_INPUTS_PER_PASS, min(MAX_INPUTS_PER_PASS, int(RENDER_MEMORY_BUDGET_MB / per_input_mb)))
+
+
+def _segment_inputs(seg: Segment) -> int:
+    """FFmpeg inputs one segment opens: its media and audio overlay."""
+    return 1 + (1 if seg.audio_overlay_local_path else 0)
+
+
+def _count_inputs(segments: List[Segment]) -> int:
+    """FFmpeg inputs a pass over `segments` opens."""
+    return sum(_segment_inputs(seg) for seg in segments)
+
+
+def _chain_length(segments: List[Segment]) -> float:
+    """Rendered length of `segments`: clip durations minus transition overlaps."""
+    total = 0.0
+    for i, seg in enumerate(segments):
+        total += seg.end_time - seg.start_time
+        transition = seg.transition_to_next
+        if i < len(segments) - 1 and transition is not None and transition.type != "cut":
+            total -= transition.duration
+    return total
+
+
+def _has_crossing_transitions(segments: List[Segment]) -> bool:
+    """True if any of `segments` blends (non-cut transition) into its successor."""
+    return any(
+        seg.transition_to_next is not None and seg.transition_to_next.type != "cut"
+        for seg in segments
+    )
+
+
+def _plan_batches(segments: List[Segment], max_inputs: int) -> List[List[Segment]]:
+    """Split segments, in timeline order, into batches of at most `max_inputs` inputs."""
+    batches: List[List[Segment]] = []
+    current: List[Segment] = []
+    current_inputs = 0
+    for seg in segments:
+        seg_inputs = _segment_inputs(seg)
+        if current and current_inputs + seg_inputs > max_inputs:
+            batches.append(current)
+            current, current_inputs = [], 0
+        current.append(seg)
+        current_inputs += seg_inputs
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _reindex_batch(batch: List[Segment]) -> List[Segment]:
+    """
+    Copy a batch for its own pass: input indices restart at 0 and the last
+    segment's transition (which crosses into the next batch) is dropped —
+    it is applied when the batches are merged.
+    """
+    reindexed = [replace(seg, index=i) for i, seg in enumerate(batch)]
+    reindexed[-1] = replace(reindexed[-1], transition_to_next=None)
+    return reindexed
+
+
+async def _concat_copy(paths: List[str], output_path: str, temp_dir: str, label: str) -> None:
+    """Join intermediates with identical encoding via the concat demuxer (no re-encode)."""
+    list_path = output_path + ".concat.txt"
+    with open(list_path, "w", encoding="utf-8") as f:
+        for path in paths:
+            escaped = path.replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    cmd = [
+        "ffmpeg", "-y",
+        "-f", "concat", "-safe", "0", "-i", list_path,
+        "-c", "copy",
+        "-movflags", "+faststart",
+        output_path,
+    ]
+    await run_ffmpeg(cmd, os.path.join(temp_dir, f"ffmpeg-{os.path.basename(output_path)}.log"), label=label)
+
+
+async def _render_pass(
+    segments: List[Segment],
+    output_path: str,
+    width: int,
+    height: int,
+    has_audio_flags: Dict[int, bool],
+    temp_dir: str,
+    label: str,
+    extra_output_args: Optional[List[str]] = None,
+    input_seek: bool = False,
+    streams: str = "av",
+    layers: Optional[OutputLayers] = None,
+    partial_tag: str = "",
+) -> None:
+    """
+    Render one pass to `output_path`, writing via a temp name so only
+    complete files exist. Outputs in the shared node cache pass the job id
+    as `partial_tag`, so jobs rendering the same entry never share a temp
+    file.
+    """
+    base, ext = os.path.splitext(os.path.basename(output_path))
+    # Partial file next to the output: the final rename never crosses filesystems
+    tag = f"-{partial_tag}" if partial_tag else ""
+    partial_path = os.path.join(os.path.dirname(output_path), f"{base}.partial{tag}{ext or '.mp4'}")
+    cmd = _build_ffmpeg_command(
+        segments, partial_path, width, height, has_audio_flags,
+        filter_script_path=os.path.join(temp_dir, f"{base}.filter.txt"),
+        extra_output_args=extra_output_args,
+        input_seek=input_seek,
+        streams=streams,
+        layers=layers,
+    )
+    logger.info("%s: running ffmpeg with %d inputs", label, _count_inputs(segments) + _layer_inputs(layers))
+    logger.debug("%s: full ffmpeg command: %s", label, " ".join(cmd))
+    # stderr goes to a log file, the run is capped at FFMPEG_TIMEOUT_SECONDS,
+    # and a cancelled job kills the subprocess (see app/services/ffmpeg_runner.py).
+    await run_ffmpeg(cmd, os.path.join(temp_dir, f"ffmpeg-{base}.log"), label=label)
+    os.replace(partial_path, output_path)
+
+
+def _partial_path(path: str) -> str:
+    base, ext = os.path.splitext(path)
+    return f"{base}.partial{ext}"
+
+
+async def _render_renditions(
+    segments: List[Segment],
+    renditions: List[RenditionFiles],
+    width: int,
+    height: int,
+    has_audio_flags: Dict[int, bool],
+    temp_dir: str,
+    label: str,
+    layers: Optional[OutputLayers] = None,
+) -> None:
+    """Render every rendition of `segments` in one FFmpeg run (see _build_rendition_command)."""
+    partials = [
+        replace(
+            files,
+            video_path=_partial_path(files.video_path),
+            poster_path=_partial_path(files.poster_path) if files.poster_path else "",
+            thumbnail_path=_partial_path(files.thumbnail_path) if files.thumbnail_path else "",
+        )
+        for files in renditions
+    ]
+    cmd = _build_rendition_command(
+        segments, partials, width, height, has_audio_flags,
+        filter_script_path=os.path.join(temp_dir, "renditions.filter.txt"),
+        layers=layers,
+    )
+    logger.info(
+        "%s: running ffmpeg with %d inputs -> %d renditions (%s)",
+        label, _count_inputs(segments) + _layer_inputs(layers), len(renditions),
+        ", ".join(f"{r.target.name} {r.target.width}x{r.target.height}" for r in renditions),
+    )
+    logger.debug("%s: full ffmpeg command: %s", label, " ".join(cmd))
+    await run_ffmpeg(cmd, os.path.join(temp_dir, "ffmpeg-renditions.log"), label=label)
+    for files, partial in zip(renditions, partials):
+        for final, tmp in (
+            (files.video_path, partial.video_path),
+            (files.poster_path, partial.poster_path),
+            (files.thumbnail_path, partial.thumbnail_path),
+        ):
+            if final:
+                os.replace(tmp, final)
+
+
+async def _render_timeline(
+    supabase,
+    job_id: str,
+    segments: List[Segment],
+    output_path: str,
+    width: int,
+    height: int,
+    has_audio_flags: Dict[int, bool],
+    temp_dir: str,
+    level: int = 0,
+    layers: Optional[OutputLayers] = None,
+) -> None:
+    """
+    Render `segments` to `output_path`, in a single pass when the inputs fit
+    the per-pass budget and as a tree of batched passes otherwise. Output
+    `layers` go into that single pass when they fit it too; otherwise the
+    timeline is rendered on its own first and the layers are applied over
+    it (see _composite_layers).
+    """
+    max_inputs = _max_inputs_per_pass(width, height)
+    if _layer_inputs(layers):
+        if _count_inputs(segments) + _layer_inputs(layers) > max_inputs:
+            base_path = os.path.join(temp_dir, "base.mp4")
+            if os.path.exists(base_path):
+                logger.info("Job %s: reusing rendered base timeline", job_id)
+            else:
+                await _render_timeline(
+                    supabase, job_id, segments, base_path, width, height, has_audio_flags, temp_dir,
+                )
+            await _composite_layers(
+                job_id, base_path, _chain_length(segments), layers, output_path, width, height, temp_dir,
+            )
+            return
+    elif (
+        level == 0
+        and SMART_RENDER_ENABLED
+        and len(segments) > 1
+        and _has_crossing_transitions(segments[:-1])
+    ):
+        # (With layers the whole picture is re-encoded anyway: one pass is cheaper)
+        try:
+            await _smart_render(
+                supabase, job_id, segments, output_path, width, height, has_audio_flags, temp_dir,
+            )
+            return
+        except Exception as exc:
+            logger.warning("Job %s: smart render failed (%s) — falling back to full render", job_id, exc)
+
+    if _count_inputs(segments) + _layer_inputs(layers) <= max_inputs:
+        if level == 0 and SPLIT_AV_ENABLED:
+            try:
+                await _render_split_av(
+                    job_id, segments, output_path, width, height, has_audio_flags, temp_dir,
+                    layers=layers,
+                )
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.warning("Job %s: split A/V render failed (%s) — rendering in one pass", job_id, exc)
+        await _render_pass(
+            segments, output_path, width, height, has_audio_flags, temp_dir,
+            label=f"Job {job_id}" if level == 0 else f"Job {job_id} merge L{level}",
+            layers=layers,
+        )
+        return
+
+    batches = _plan_batches(segments, max_inputs)
+    logger.info(
+        "Job %s: staged render level %d — %d segments in %d batches of <= %d inputs",
+        job_id, level, len(segments), len(batches), max_inputs,
+    )
+
+    intermediates: List[Segment] = []
+    timeline_pos = 0.0
+    for b, batch in enumerate(batches):
+        batch_path = os.path.join(temp_dir, f"batch-L{level}-{b:04d}.mp4")
+        if os.path.exists(batch_path):
+            logger.info("Job %s: reusing rendered batch %s", job_id, os.path.basename(batch_path))
+        elif level > 0 and not _has_crossing_transitions(batch[:-1]):
+            # Already-encoded intermediates joined by plain cuts: no re-encode
+            await _concat_copy(
+                [seg.local_path for seg in batch], batch_path, temp_dir,
+                label=f"Job {job_id} batch L{level}-{b}",
+            )
+        else:
+            batch_segments = _reindex_batch(batch)
+            await _render_pass(
+                batch_segments, batch_path, width, height,
+                {i: has_audio_flags.get(seg.index, False) for i, seg in enumerate(batch)},
+                temp_dir, label=f"Job {job_id} batch L{level}-{b}",
+            )
+        if level == 0:
+            # Rendering spans 35-75%; the final merge takes the rest
+            _update_progress(supabase, job_id, 35 + int(40 * (b + 1) / len(batches)), "rendering")
+
+        length = _chain_length(batch)
+        intermediates.append(Segment(
+            index=b,
+            media_type="video",
+            media_url=batch_path,
+            start_time=timeline_pos,
+            end_time=timeline_pos + length,
+            local_path=batch_path,
+            transition_to_next=batch[-1].transition_to_next,
+        ))
+        timeline_pos += length
+
+    if not _has_crossing_transitions(intermediates[:-1]):
+        await _concat_copy(
+            [seg.local_path for seg in intermediates], output_path, temp_dir,
+            label=f"Job {job_id} concat L{level}",
+        )
+        return
+
+    # Batch outputs always carry an audio track (silence where a clip had none)
+    await _render_timeline(
+        supabase, job_id, intermediates, output_path, width, height,
+        {seg.index: True for seg in intermediates}, temp_dir, level + 1,
+    )
+
+
+async def _composite_layers(
+    job_id: str,
+    base_path: str,
+    length: float,
+    layers: OutputLayers,
+    output_path: str,
+    width: int,
+    height: int,
+    temp_dir: str,
+) -> None:
+    """
+    Apply `layers` over an already rendered timeline (`base_path`, `length`
+    seconds long) in as many passes as the per-pass input budget needs.
+    Each pass draws over the previous one, so the stacking order holds.
+    """
+    per_pass = max(1, _max_inputs_per_pass(width, height) - 1)
+    items = [("v", ov) for ov in layers.overlays] + [("a", mix) for mix in layers.audio_mix]
+    groups = [items[k:k + per_pass] for k in range(0, len(items), per_pass)]
+    src = base_path
+    for g, group in enumerate(groups):
+        last = g == len(groups) - 1
+        dst = output_path if last else os.path.join(temp_dir, f"layers-{g:04d}.mp4")
+        if not last and os.path.exists(dst):
+            logger.info("Job %s: reusing layer pass %s", job_id, os.path.basename(dst))
+        else:
+            base = Segment(
+                index=0, media_type="video", media_url=src,
+                start_time=0.0, end_time=length, local_path=src,
+            )
+            await _render_pass(
+                [base], dst, width, height, {0: True}, temp_dir,
+                label=f"Job {job_id} layers {g + 1}/{len(groups)}",
+                layers=OutputLayers(
+                    overlays=[item for kind, item in group if kind == "v"],
+                    audio_mix=[item for kind, item in group if kind == "a"],
+                ),
+            )
+        src = dst
+
+
+# ---------------------------------------------------------------------------
+# Split audio / video render
+# ---------------------------------------------------------------------------
+#
+# In one FFmpeg process, resampling, mixing and AAC-encoding the audio runs
+# alongside the x264 encode. A single-pass timeline is instead rendered as
+# two files by two concurrent processes, a video-only MP4 in the job's
+# scratch directory and an AAC .m4a, which are muxed with stream copy. The
+# audio process opens the video clips without their video stream and reads
+# only each clip's window (see _build_timeline_graph).
+#
+# The audio track (a few MB at most) is cached on the node, next to the
+# normalized clips and sharing their LRU budget, under a key of only the
+# inputs that shape it: per clip the voiceover, the source audio (video
+# clips with an audio stream) or silence, transitions, mixed audio tracks.
+# Re-exporting a project whose picture changed (text, layers, a still)
+# only renders the video. The video track is not cached: it is as large as
+# the output and would push the normalized clips out of the cache.
+
+def _track_cache_key(
+    segments: List[Segment],
+    has_audio_flags: Dict[int, bool],
+    layers: Optional[OutputLayers] = None,
+) -> str:
+    """Cache key of the audio track of a single-pass timeline."""
+    entries: List[Dict[str, Any]] = []
+    for i, seg in enumerate(segments):
+        entry: Dict[str, Any] = {"duration": round(seg.end_time - seg.start_time, 3)}
+        transition = seg.transition_to_next if i < len(segments) - 1 else None
+        if transition is not None and transition.type != "cut":
+            entry["transition"] = [transition.type, round(transition.duration, 3)]
+        if seg.audio_overlay_local_path:
+            entry["audio"] = ["voiceover", seg.audio_overlay_url]
+        elif seg.media_type == "video" and has_audio_flags.get(seg.index, False):
+            entry["audio"] = ["source", seg.media_url, round(seg.source_start, 3)]
+        entries.append(entry)
+    key_source = json.dumps({
+        "kind": "audio",
+        "segments": entries,
+        "mix": [
+            [mix.url or mix.path, round(mix.start, 3), round(mix.end, 3),
+             round(mix.source_start, 3), mix.volume]
+            for mix in (layers.audio_mix if layers else [])
+        ],
+        "args": AUDIO_ENCODE_ARGS,
+    }, sort_keys=True)
+    return hashlib.sha256(key_source.encode()).hexdigest()[:32]
+
+
+async def _render_split_av(
+    job_id: str,
+    segments: List[Segment],
+    output_path: str,
+    width: int,
+    height: int,
+    has_audio_flags: Dict[int, bool],
+    temp_dir: str,
+    layers: Optional[OutputLayers] = None,
+) -> None:
+    """
+    Render the video track (into `temp_dir`) and the audio track (cached,
+    skipped on a hit) of a single-pass timeline in two concurrent FFmpeg
+    processes and mux them into `output_path` with stream copy.
+    """
+    os.makedirs(NORMALIZED_CACHE_DIR, exist_ok=True)
+    video_path = os.path.join(temp_dir, "track-video.mp4")
+    key = _track_cache_key(segments, has_audio_flags, layers)
+    audio_path = os.path.join(NORMALIZED_CACHE_DIR, f"track-audio-{key}.m4a")
+
+    async def produce_video() -> None:
+        if os.path.exists(video_path):
+            logger.info("Job %s: reusing rendered video track", job_id)
+            return
+        await _render_pass(
+            segments, video_path, width, height, has_audio_flags, temp_dir,
+            label=f"Job {job_id} video", streams="v", layers=layers,
+        )
+
+    async def produce_audio() -> None:
+        if os.path.exists(audio_path):
+            os.utime(audio_path)  # LRU touch
+            logger.info("Job %s: audio track cache hit", job_id)
+            return
+        await _render_pass(
+            segments, audio_path, width, height, has_audio_flags, temp_dir,
+            label=f"Job {job_id} audio", streams="a", layers=layers,
+            partial_tag=job_id,
+        )
+
+    tasks = [asyncio.create_task(produce_video()), asyncio.create_task(produce_audio())]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        # One track failed (or the job was cancelled): stop the other encode
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+    partial_path = _partial_path(output_path)
+    cmd = [
+        "ffmpeg", "-y",
+        "-i", video_path,
+        "-i", audio_path,
+        "-map", "0:v:0", "-map", "1:a:0",
+        "-c", "copy",
+        "-movflags", "+faststart",
+        partial_path,
+    ]
+    await run_ffmpeg(cmd, os.path.join(temp_dir, "ffmpeg-mux.log"), label=f"Job {job_id} mux")
+    os.replace(partial_path, output_path)
+    os.unlink(video_path)
+    _evict_normalized_cache()
+
+
+async def _render_timeline_renditions(
+    supabase,
+    job_id: str,
+    segments: List[Segment],
+    renditions: List[RenditionFiles],
+    width: int,
+    height: int,
+    has_audio_flags: Dict[int, bool],
+    temp_dir: str,
+    layers: Optional[OutputLayers] = None,
+) -> None:
+    """
+    Render every rendition of a timeline. When the sources fit one pass they
+    are decoded once and encoded N times in a single run; otherwise the
+    timeline is first rendered to a canvas-sized master (batched / smart
+    render as usual) and the renditions are encoded from one decode of it.
+    """
+    if _count_inputs(segments) + _layer_inputs(layers) <= _max_inputs_per_pass(width, height):
+        await _render_renditions(
+            segments, renditions, width, height, has_audio_flags, temp_dir, label=f"Job {job_id}",
+            layers=layers,
+        )
+        return
+
+    master_path = os.path.join(temp_dir, "master.mp4")
+    if os.path.exists(master_path):
+        logger.info("Job %s: reusing rendered master", job_id)
+    else:
+        await _render_timeline(
+            supabase, job_id, segments, master_path, width, height, has_audio_flags, temp_dir,
+            layers=layers,
+        )
+    master = Segment(
+        index=0, media_type="video", media_url=master_path,
+        start_time=0.0, end_time=_chain_length(segments), local_path=master_path,
+    )
+    await _render_renditions(
+        [master], renditions, width, height, {0: True}, temp_dir, label=f"Job {job_id} renditions",
+    )
+
+
+# ---------------------------------------------------------------------------
+# Smart render (re-encode transition windows only)
+# ---------------------------------------------------------------------------
+#
+# The xfade chain re-encodes the whole timeline even when a 60s clip only
+# blends with its neighbours for 0.5s at each end. Smart rendering splits
+# every clip into
+#
+#   head window  [0, K1)    re-encoded together with the previous clip's tail
+#   middle       [K1, K2)   stream-copied (K1/K2 are keyframes)
+#   tail window  [K2, d)    re-encoded together with the next clip's head
+#
+# where K1 is the first keyframe after the incoming transition and K2 the
+# last keyframe before the outgoing one. Each tail+head pair (with its xfade
+# or cut) is a small timeline rendered by the normal builder. All pieces are
+# remuxed to MPEG-TS (in-band SPS/PPS, so pieces from different encoders
+# splice cleanly) and joined with the concat demuxer into the final MP4.
+#
+# A middle can be copied straight from the source when the source already
+# has the output format (H.264 High yuv420p at canvas size, 30fps, AAC 44.1k
+# stereo) and no voiceover replaces its audio. Otherwise the clip window is
+# normalized once to that format and cached on the node, keyed by source and
+# canvas, so re-exports of the same project only re-encode the windows.
+
+async def _probe_streams(file_path: str) -> Dict[str, Dict[str, Any]]:
+    """Return the first video and audio stream of a file as {"video": ..., "audio": ...}."""
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            "ffprobe",
+            "-v", "quiet",
+            "-print_format", "json",
+            "-show_streams",
+            file_path,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        stdout, _ = await proc.communicate()
+        if proc.returncode == 0:
+            streams: Dict[str, Dict[str, Any]] = {}
+            for stream in json.loads(stdout.decode()).get("streams", []):
+                kind = stream.get("codec_type")
+                if kind in ("video", "audio") and kind not in streams:
+                    streams[kind] = stream
+            return streams
+    except Exception as exc:
+        logger.warning("ffprobe streams error: %s", exc)
+    return {}
+
+
+async def _probe_keyframes(file_path: str, start: float, end: float) -> List[float]:
+    """Keyframe timestamps (source time, seconds) of the first video stream within [start, end]."""
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            "ffprobe",
+            "-v", "quiet",
+            "-select_streams", "v:0",
+            "-read_intervals", f"{max(0.0, start - 1):.3f}%{end + 1:.3f}",
+            "-show_entries", "packet=pts_time,flags",
+            "-of", "csv=p=0",
+            file_path,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        stdout, _ = await proc.communicate()
+        if proc.returncode != 0:
+            return []
+        keyframes = []
+        for line in stdout.decode().splitlines():
+            parts = line.split(",")
+            if len(parts) >= 2 and "K" in parts[1] and parts[0] not in ("", "N/A"):
+                t = float(parts[0])
+                if start <= t <= end:
+                    keyframes.append(t)
+        return sorted(keyframes)
+    except Exception as exc:
+        logger.warning("ffprobe keyframes error: %s", exc)
+        return []
+
+
+def _is_copy_conformant(streams: Dict[str, Dict[str, Any]], width: int, height: int) -> bool:
+    """True if a source can be stream-copied into the output without re-encoding."""
+    video = streams.get("video") or {}
+    audio = streams.get("audio") or {}
+    return (
+        video.get("codec_name") == "h264"
+        and video.get("profile") == "High"
+        and video.get("pix_fmt") == "yuv420p"
+        and video.get("width") == width
+        and video.get("height") == height
+        and video.get("r_frame_rate") == "30/1"
+        and audio.get("codec_name") == "aac"
+        and str(audio.get("sample_rate")) == "44100"
+        and audio.get("channels") == 2
+    )
+
+
+def _evict_normalized_cache() -> None:
+    """Drop least recently used normalized clips until the cache fits its budget."""
+    try:
+        entries = []
+        for name in os.listdir(NORMALIZED_CACHE_DIR):
+            path = os.path.join(NORMALIZED_CACHE_DIR, name)
+            if name.endswith((".mp4", ".m4a")) and ".partial" not in name and os.path.isfile(path):
+                st = os.stat(path)
+                entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        budget = NORMALIZED_CACHE_MAX_MB * 1024 * 1024
+        for _, size, path in sorted(entries):
+            if total <= budget:
+                break
+            os.unlink(path)
+            total -= size
+    except Exception as exc:
+        logger.warning("Normalized cache eviction error: %s", exc)
+
+
+async def _normalized_clip(
+    seg: Segment,
+    width: int,
+    height: int,
+    has_audio: bool,
+    job_id: str,
+    temp_dir: str,
+) -> str:
+    """
+    Return a cached copy of the segment window in the smart-render output
+    format (audio already resolved: voiceover, source audio or silence),
+    rendering it first on a cache miss.
+    """
+    key_source = json.dumps({
+        "url": seg.media_url,
+        "type": seg.media_type,
+        "source_start": round(seg.source_start, 3),
+        "duration": round(seg.end_time - seg.start_time, 3),
+        "overlay": seg.audio_overlay_url,
+        "canvas": [width, height],
+        "args": SMART_RENDER_OUTPUT_ARGS,
+        # Image clips of earlier builds came out at 25fps
+        "framerate": 30,
+    }, sort_keys=True)
+    key = hashlib.sha256(key_source.encode()).hexdigest()[:32]
+    os.makedirs(NORMALIZED_CACHE_DIR, exist_ok=True)
+    path = os.path.join(NORMALIZED_CACHE_DIR, f"{key}.mp4")
+
+    if os.path.exists(path):
+        os.utime(path)  # LRU touch
+        logger.info("Job %s: normalized clip cache hit for segment %d", job_id, seg.index)
+        return path
+
+    clip = replace(seg, index=0, transition_to_next=None)
+    await _render_pass(
+        [clip], path, width, height, {0: has_audio}, temp_dir,
+        label=f"Job {job_id} normalize seg {seg.index}",
+        extra_output_args=SMART_RENDER_OUTPUT_ARGS, input_seek=True, partial_tag=job_id,
+    )
+    _evict_normalized_cache()
+    return path
+
+
+async def _to_ts(
+    src: str,
+    dst: str,
+    temp_dir: str,
+    label: str,
+    start: Optional[float] = None,
+    duration: Optional[float] = None,
+) -> None:
+    """Stream-copy (a keyframe-aligned window of) an MP4 into MPEG-TS for concatenation."""
+    cmd = ["ffmpeg", "-y"]
+    if start is not None:
+        cmd += ["-ss", f"{start:.6f}"]
+    cmd += ["-i", src]
+    if duration is not None:
+        cmd += ["-t", f"{duration:.6f}"]
+    cmd += [
+        "-map", "0:v:0", "-map", "0:a:0",
+        "-c", "copy",
+        "-bsf:v", "h264_mp4toannexb",
+        "-f", "mpegts",
+        dst,
+    ]
+    await run_ffmpeg(cmd, os.path.join(temp_dir, f"ffmpeg-{os.path.basename(dst)}.log"), label=label)
+
+
+async def _smart_render(
+    supabase,
+    job_id: str,
+    segments: List[Segment],
+    output_path: str,
+    width: int,
+    height: int,
+    has_audio_flags: Dict[int, bool],
+    temp_dir: str,
+) -> None:
+    """Render a timeline with transitions, re-encoding only the transition windows."""
+    frame = 1.0 / 30
+
+    # ------ Copy source (raw or normalized) + keyframes per segment ------
+    sources: List[Tuple[str, float, List[float]]] = []
+    for i, seg in enumerate(segments):
+        duration = seg.end_time - seg.start_time
+        streams = await _probe_streams(seg.local_path) if seg.media_type == "video" else {}
+        if (
+            seg.media_type == "video"
+            and not seg.audio_overlay_local_path
+            and _is_copy_conformant(streams, width, height)
+        ):
+            path, offset = seg.local_path, seg.source_start
+        else:
+            path = await _normalized_clip(
+                seg, width, height, has_audio_flags.get(seg.index, False), job_id, temp_dir,
+            )
+            offset = 0.0
+        keyframes = [k - offset for k in await _probe_keyframes(path, offset, offset + duration)]
+        sources.append((path, offset, keyframes))
+        _update_progress(supabase, job_id, 35 + int(15 * (i + 1) / len(segments)), "rendering")
+
+    # ------ Plan: alternating re-encoded windows and copied middles ------
+    pieces: List[Tuple[str, Any]] = []      # ("render", [Segment]) | ("copy", (path, start, dur))
+    pending: List[Segment] = []
+
+    def window(i: int, a: float, b: float, transition: Optional[Transition]) -> Segment:
+        path, offset, _ = sources[i]
+        return Segment(
+            index=len(pending), media_type="video", media_url=path,
+            start_time=0.0, end_time=b - a, local_path=path,
+            source_start=offset + a, transition_to_next=transition,
+        )
+
+    for i, seg in enumerate(segments):
+        duration = seg.end_time - seg.start_time
+        prev_t = segments[i - 1].transition_to_next if i > 0 else None
+        td_in = prev_t.duration if prev_t is not None and prev_t.type != "cut" else 0.0
+        out_t = seg.transition_to_next if i < len(segments) - 1 else None
+        td_out = out_t.duration if out_t is not None and out_t.type != "cut" else 0.0
+        keyframes = sources[i][2]
+
+        k1 = next((k for k in keyframes if k >= td_in - 1e-6), None)
+        k2 = next((k for k in reversed(keyframes) if k <= duration - td_out + 1e-6), None)
+
+        if k1 is None or k2 is None or k2 - k1 < SMART_MIN_COPY_SECONDS:
+            # No worthwhile middle: the whole clip joins the re-encoded window
+            pending.append(window(i, 0.0, duration, out_t))
+            continue
+
+        if k1 > frame:
+            pending.append(window(i, 0.0, k1, None))
+        if pending:
+            pieces.append(("render", pending))
+        pieces.append(("copy", (sources[i][0], sources[i][1] + k1, k2 - k1)))
+        pending = []
+        if duration - k2 > frame:
+            pending.append(window(i, k2, duration, out_t))
+
+    if pending:
+        pieces.append(("render", pending))
+
+    copied = sum(p[1][2] for p in pieces if p[0] == "copy")
+    logger.info(
+        "Job %s: smart render — %d pieces, %.1fs of %.1fs stream-copied",
+        job_id, len(pieces), copied, _chain_length(segments),
+    )
+
+    # ------ Produce each piece as MPEG-TS ------
+    ts_paths: List[str] = []
+    for p, (kind, payload) in enumerate(pieces):
+        ts_path = os.path.join(temp_dir, f"smart-{p:04d}.ts")
+        ts_paths.append(ts_path)
+        if os.path.exists(ts_path):
+            continue
+        partial_ts = ts_path + ".partial"
+        if kind == "copy":
+            src, start, dur = payload
+            await _to_ts(src, partial_ts, temp_dir, f"Job {job_id} copy {p}", start=start, duration=dur)
+        else:
+            window_path = os.path.join(temp_dir, f"smart-{p:04d}.mp4")
+            flags = {w.index: True for w in payload}
+            if _count_inputs(payload) <= _max_inputs_per_pass(width, height):
+                await _render_pass(
+                    payload, window_path, width, height, flags, temp_dir,
+                    label=f"Job {job_id} window {p}",
+                    extra_output_args=SMART_RENDER_OUTPUT_ARGS, input_seek=True,
+                )
+            else:
+                await _render_timeline(
+                    supabase, job_id, payload, window_path, width, height, flags, temp_dir, level=1,
+                )
+            await _to_ts(window_path, partial_ts, temp_dir, f"Job {job_id} window {p}")
+        os.replace(partial_ts, ts_path)
+        _update_progress(supabase, job_id, 50 + int(25 * (p + 1) / len(pieces)), "rendering")
+
+    # ------ Join ------
+    list_path = os.path.join(temp_dir, "smart-concat.txt")
+    with open(list_path, "w", encoding="utf-8") as f:
+        for path in ts_paths:
+            escaped = path.replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    cmd = [
+        "ffmpeg", "-y",
+        "-f", "concat", "-safe", "0", "-i", list_path,
+        "-c", "copy",
+        "-bsf:a", "aac_adtstoasc",
+        "-movflags", "+faststart",
+        output_path,
+    ]
+    await run_ffmpeg(cmd, os.path.join(temp_dir, "ffmpeg-smart-concat.log"), label=f"Job {job_id} join")
+
+
+# ---------------------------------------------------------------------------
+# Determine output resolution
+# ---------------------------------------------------------------------------
+
+def _resolve_output_resolution(
+    composition: Dict[str, Any],
+    first_video_resolution: tuple[Optional[int], Optional[int]],
+) -> tuple[int, int]:
+    """
+    Pick the target resolution.
+
+    Priority:
+    1. Explicit width/height in the composition
+    2. Aspect ratio hint in the composition (e.g. "9:16", "16:9")
+    3. First video's actual resolution
+    4. Fallback to 1920x1080
+    """
+    # 1-2. Set by the composition
+    size = _composition_resolution(composition)
+    if size:
+        return size
+
+    # 3. First video resolution
+    vw, vh = first_video_resolution
+    if vw and vh:
+        # Ensure even dimensions (FFmpeg requirement for libx264)
+        return vw - (vw % 2), vh - (vh % 2)
+
+    # 4. Fallback
+    return 1920, 1080
+
+
+def _composition_resolution(composition: Dict[str, Any]) -> Optional[Tuple[int, int]]:
+    """Canvas size set by the composition itself (size or aspect ratio), if any."""
+    # 1. Explicit dimensions
+    w = composition.get("width")
+    h = composition.get("height")
+    if w and h:
+        return int(w), int(h)
+
+    # 2. Aspect ratio hint
+    aspect = composition.get("aspectRatio") or composition.get("aspect_ratio")
+    if aspect:
+        aspect_str = str(aspect).strip()
+        if aspect_str in ("9:16", "9/16"):
+            return 1080, 1920
+        if aspect_str in ("16:9", "16/9"):
+            return 1920, 1080
+        if aspect_str in ("1:1", "1/1"):
+            return 1080, 1080
+        if aspect_str in ("4:5", "4/5"):
+            return 1080, 1350
+        if aspect_str in ("4:3", "4/3"):
+            return 1440, 1080
+    return None
+
+
+def _even(value: float) -> int:
+    return max(2, int(round(value / 2.0)) * 2)
+
+
+def _parse_output_targets(
+    specs: Any,
+    canvas_width: int,
+    canvas_height: int,
+) -> List[OutputTarget]:
+    """
+    Turn the `outputs` list of a job into OutputTargets. Raises ValueError on
+    an invalid spec (the POST endpoint validates with a nominal canvas).
+
+    Each spec:
+    {
+        "name": "reels",               (a-z, 0-9, _ and -; default output<N>)
+        "width": 1080, "height": 1920, (or)
+        "aspect_ratio": "9:16",        with optional "resolution": short side
+                                       (default: the canvas's short side)
+        "fit": "pad" | "crop",         (default pad)
+        "video_bitrate": "6M",         (default CRF 23)
+        "audio_bitrate": "128k",
+        "poster": true,                (JPEG frame at poster_time, default 1s)
+        "poster_time": 1.0,
+        "thumbnail_width": 320         (or "thumbnail": true for 320)
+    }
+    A spec without size or aspect ratio renders at the canvas size.
+    """
+    if not isinstance(specs, list) or not specs:
+        raise ValueError("outputs must be a non-empty list")
+    if len(specs) > MAX_OUTPUT_TARGETS:
+        raise ValueError(f"At most {MAX_OUTPUT_TARGETS} outputs per job")
+
+    targets: List[OutputTarget] = []
+    for i, spec in enumerate(specs):
+        if not isinstance(spec, dict):
+            raise ValueError(f"outputs[{i}] must be an object")
+        name = str(spec.get("name") or f"output{i}").lower()
+        if not OUTPUT_TARGET_NAME_RE.match(name):
+            raise ValueError(f"outputs[{i}].name must match {OUTPUT_TARGET_NAME_RE.pattern}")
+        if any(t.name == name for t in targets):
+            raise ValueError(f"Duplicate output name: {name}")
+
+        try:
+            if spec.get("width") and spec.get("height"):
+                width, height = _even(float(spec["width"])), _even(float(spec["height"]))
+            elif spec.get("aspect_ratio") or spec.get("aspectRatio"):
+                aspect = str(spec.get("aspect_ratio") or spec.get("aspectRatio")).strip()
+                aw, ah = (float(x) for x in re.split(r"[:/]", aspect))
+                if aw <= 0 or ah <= 0:
+                    raise ValueError
+                short = float(spec.get("resolution") or min(canvas_width, canvas_height))
+                if aw >= ah:
+                    width, height = _even(short * aw / ah), _even(short)
+                else:
+                    width, height = _even(short), _even(short * ah / aw)
+            else:
+                width, height = canvas_width, canvas_height
+        except (TypeError, ValueError):
+            raise ValueError(f"outputs[{i}]: invalid width/height or aspect_ratio")
+        if not (MIN_TARGET_SIDE <= width <= MAX_TARGET_SIDE and MIN_TARGET_SIDE <= height <= MAX_TARGET_SIDE):
+            raise ValueError(
+                f"outputs[{i}]: {width}x{height} is outside {MIN_TARGET_SIDE}-{MAX_TARGET_SIDE}px"
+            )
+
+        fit = str(spec.get("fit") or "pad").lower()
+        if fit not in ("pad", "crop"):
+            raise ValueError(f"outputs[{i}].fit must be 'pad' or 'crop'")
+
+        video_bitrate = str(spec.get("video_bitrate") or "")
+        audio_bitrate = str(spec.get("audio_bitrate") or "128k")
+        for field_name, value in (("video_bitrate", video_bitrate), ("audio_bitrate", audio_bitrate)):
+            if value and not BITRATE_RE.match(value):
+                raise ValueError(f"outputs[{i}].{field_name} must look like '6M' or '128k'")
+
+        thumbnail = spec.get("thumbnail_width") or (320 if spec.get("thumbnail") else 0)
+        try:
+            thumbnail_width = _even(float(thumbnail)) if thumbnail else 0
+            poster_time = float(spec.get("poster_time", 1.0))
+        except (TypeError, ValueError):
+            raise ValueError(f"outputs[{i}]: invalid thumbnail_width or poster_time")
+
+        targets.append(OutputTarget(
+            name=name,
+            width=width,
+            height=height,
+            fit=fit,
+            video_bitrate=video_bitrate,
+            audio_bitrate=audio_bitrate,
+            poster=bool(spec.get("poster")),
+            poster_time=poster_time,
+            thumbnail_width=min(thumbnail_width, width),
+        ))
+    return targets
+
+
+# ---------------------------------------------------------------------------
+# Render planning (dry run / cost estimate)
+# ---------------------------------------------------------------------------
+#
+# Mirrors the strategy choices of _render_timeline / _render_timeline_renditions
+# without touching any media, so a job's cost can be estimated before it is
+# queued (POST /plan) and the worker can record the work it actually planned
+# (`stage_timings`, the data the cost model is fitted on). Each pass records
+# the timeline seconds it encodes and the megapixels of the outputs it writes;
+# their product, summed, is the plan's encode work in MP-seconds.
+#
+# What the plan cannot know without the files: the first video's resolution
+# (1920x1080 is assumed unless the composition sets a size or aspect ratio),
+# whether clips carry audio (assumed yes) and, for smart render, the real
+# keyframe positions (SMART_PLAN_KEYFRAME_SECONDS apart) and which sources
+# are copy-conformant (video middles are counted as copied, stills and
+# voiceover clips as normalized).
+
+def _planning_segments(timeline: Dict[str, Any]) -> List[Segment]:
+    """Segments of a compiled timeline, with the local paths the worker would download to."""
+    segments = _timeline_segments(timeline)
+    for seg in segments:
+        ext = _guess_extension(seg.media_url)
+        if _is_image_ext(ext) and seg.media_type == "video":
+            seg.media_type = "image"
+        seg.local_path = f"seg_{seg.index}{ext}"
+        if seg.audio_overlay_url:
+            aud_ext = _guess_extension(seg.audio_overlay_url) or ".webm"
+            seg.audio_overlay_local_path = f"overlay_{seg.index}{aud_ext}"
+    return segments
+
+
+def _planning_layers(timeline: Dict[str, Any], segments: List[Segment], width: int, height: int) -> OutputLayers:
+    """Output layers of a compiled timeline, with the local paths the worker would use."""
+    urls = [entry["url"] for key in ("layers", "mix") for entry in timeline.get(key) or []]
+    paths = {url: f"track_{k}{_guess_extension(url)}" for k, url in enumerate(dict.fromkeys(urls))}
+    placed = [(entry, f"layer_{k}.png", 0, 0) for k, entry in enumerate(timeline.get("overlays") or [])]
+    return _output_layers(segments, timeline, paths, placed, width, height)
+
+
+def _plan_smart_render(
+    segments: List[Segment],
+    megapixels: float,
+    passes: List[Dict[str, Any]],
+) -> None:
+    """Passes of a smart render: normalized clips, re-encoded windows, the join."""
+    gop = SMART_PLAN_KEYFRAME_SECONDS
+    window_seconds = 0.0
+    for i, seg in enumerate(segments):
+        duration = seg.end_time - seg.start_time
+        prev_t = segments[i - 1].transition_to_next if i > 0 else None
+        td_in = prev_t.duration if prev_t is not None and prev_t.type != "cut" else 0.0
+        out_t = seg.transition_to_next if i < len(segments) - 1 else None
+        td_out = out_t.duration if out_t is not None and out_t.type != "cut" else 0.0
+        # Windows run from the clip edge to the nearest keyframe past the
+        # transition: on average half a GOP beyond it
+        head = min(duration, td_in + gop / 2) if i > 0 else 0.0
+        tail = min(duration, td_out + gop / 2) if out_t is not None else 0.0
+        middle = duration - head - tail
+        if middle < SMART_MIN_COPY_SECONDS:
+            window_seconds += duration
+            continue
+        window_seconds += head + tail
+        if seg.media_type != "video" or seg.audio_overlay_local_path:
+            passes.append({
+                "kind": "normalize", "level": 0, "inputs": 1 + (1 if seg.audio_overlay_local_path else 0),
+                "seconds": round(duration, 3), "megapixels": megapixels,
+            })
+    passes.append({
+        "kind": "encode", "level": 0, "inputs": _count_inputs(segments),
+        "seconds": round(window_seconds, 3),
+        "megapixels": megapixels, "windows": True,
+    })
+    passes.append({"kind": "copy", "level": 0, "inputs": 1, "seconds": round(_chain_length(segments), 3)})
+
+
+def _plan_timeline(
+    segments: List[Segment],
+    width: int,
+    height: int,
+    passes: List[Dict[str, Any]],
+    level: int = 0,
+    layers: Optional[OutputLayers] = None,
+) -> str:
+    """
+    Append the passes _render_timeline would run for `segments` to `passes`;
+    returns the strategy (single_pass | split_av | batched | smart_render |
+    base_then_layers).
+    """
+    megapixels = width * height / 1e6
+    max_inputs = _max_inputs_per_pass(width, height)
+    layer_inputs = _layer_inputs(layers)
+    if layer_inputs:
+        if _count_inputs(segments) + layer_inputs > max_inputs:
+            _plan_timeline(segments, width, height, passes)
+            seconds = round(_chain_length(segments), 3)
+            per_pass = max(1, max_inputs - 1)
+            for k in range(0, layer_inputs, per_pass):
+                passes.append({
+                    "kind": "encode", "level": 0, "inputs": 1 + min(per_pass, layer_inputs - k),
+                    "seconds": seconds, "megapixels": megapixels, "layers": True,
+                })
+            return "base_then_layers"
+    elif (
+        level == 0
+        and SMART_RENDER_ENABLED
+        and len(segments) > 1
+        and _has_crossing_transitions(segments[:-1])
+    ):
+        _plan_smart_render(segments, megapixels, passes)
+        return "smart_render"
+
+    if _count_inputs(segments) + layer_inputs <= max_inputs:
+        seconds = round(_chain_length(segments), 3)
+        if level == 0 and SPLIT_AV_ENABLED:
+            # Video and audio tracks encoded concurrently, then muxed
+            passes.append({
+                "kind": "encode", "level": 0,
+                "inputs": _count_inputs(segments) + (len(layers.overlays) if layers else 0),
+                "seconds": seconds, "megapixels": megapixels, "streams": "video",
+            })
+            passes.append({
+                "kind": "encode", "level": 0,
+                "inputs": _count_inputs(segments) + (len(layers.audio_mix) if layers else 0),
+                "seconds": seconds, "megapixels": 0.0, "streams": "audio",
+            })
+            passes.append({"kind": "copy", "level": 0, "inputs": 2, "seconds": seconds})
+            return "split_av"
+        passes.append({
+            "kind": "encode", "level": level, "inputs": _count_inputs(segments) + layer_inputs,
+            "seconds": seconds, "megapixels": megapixels,
+        })
+        return "single_pass"
+
+    intermediates: List[Segment] = []
+    timeline_pos = 0.0
+    for b, batch in enumerate(_plan_batches(segments, max_inputs)):
+        length = _chain_length(batch)
+        copy = level > 0 and not _has_crossing_transitions(batch[:-1])
+        passes.append({
+            "kind": "copy" if copy else "encode", "level": level, "inputs": _count_inputs(batch),
+            "seconds": round(length, 3), **({} if copy else {"megapixels": megapixels}),
+        })
+        intermediates.append(Segment(
+            index=b, media_type="video", media_url=f"batch-L{level}-{b:04d}.mp4",
+            start_time=timeline_pos, end_time=timeline_pos + length,
+            local_path=f"batch-L{level}-{b:04d}.mp4",
+            transition_to_next=batch[-1].transition_to_next,
+        ))
+        timeline_pos += length
+
+    if not _has_crossing_transitions(intermediates[:-1]):
+        passes.append({
+            "kind": "copy", "level": level, "inputs": len(intermediates),
+            "seconds": round(_chain_length(intermediates), 3),
+        })
+    else:
+        _plan_timeline(intermediates, width, height, passes, level + 1)
+    return "batched"
+
+
+def _plan_render(
+    segments: List[Segment],
+    width: int,
+    height: int,
+    targets: Optional[List[OutputTarget]] = None,
+    input_bytes: Optional[int] = None,
+    layers: Optional[OutputLayers] = None,
+) -> Tuple[Dict[str, Any], render_estimator.RenderFeatures]:
+    """
+    Plan the render of `segments` (and output `layers`) on a width x height
+    canvas, optionally to several rendition `targets`. Returns the plan (strategy, passes and, for
+    single-pass renders, the FFmpeg command with placeholder paths; split
+    A/V renders give the video and the audio command) and the cost features
+    of it.
+    """
+    passes: List[Dict[str, Any]] = []
+    flags = {seg.index: seg.media_type == "video" for seg in segments}
+    seconds = _chain_length(segments)
+    input_count = _count_inputs(segments) + _layer_inputs(layers)
+    command: Optional[List[str]] = None
+    audio_command: Optional[List[str]] = None
+    master_strategy: Optional[str] = None
+
+    if not targets:
+        strategy = _plan_timeline(segments, width, height, passes, layers=layers)
+        output_megapixels = width * height / 1e6
+        if strategy == "single_pass":
+            command = _build_ffmpeg_command(segments, "output.mp4", width, height, flags, layers=layers)
+        elif strategy == "split_av":
+            command = _build_ffmpeg_command(
+                segments, "video.mp4", width, height, flags, streams="v", layers=layers,
+            )
+            audio_command = _build_ffmpeg_command(
+                segments, "audio.m4a", width, height, flags, streams="a", layers=layers,
+            )
+    else:
+        output_megapixels = sum(t.width * t.height for t in targets) / 1e6
+        renditions = [
+            RenditionFiles(
+                target=t,
+                video_path=f"{t.name}.mp4",
+                poster_path=f"{t.name}-poster.jpg" if t.poster else "",
+                thumbnail_path=f"{t.name}-thumb.jpg" if t.thumbnail_width else "",
+            )
+            for t in targets
+        ]
+        if input_count <= _max_inputs_per_pass(width, height):
+            strategy = "renditions_single_pass"
+            command = _build_rendition_command(segments, renditions, width, height, flags, layers=layers)
+        else:
+            strategy = "master_then_renditions"
+            master_strategy = _plan_timeline(segments, width, height, passes, layers=layers)
+        passes.append({
+            "kind": "encode", "level": 0,
+            "inputs": input_count if strategy == "renditions_single_pass" else 1,
+            "seconds": round(seconds, 3), "megapixels": round(output_megapixels, 4),
+            "renditions": [t.name for t in targets],
+        })
+
+    encode_work = sum(
+        p["seconds"] * p["megapixels"] for p in passes if p["kind"] in ("encode", "normalize")
+    )
+    features = render_estimator.RenderFeatures(
+        output_seconds=seconds,
+        output_megapixels=output_megapixels,
+        encode_work=encode_work,
+        input_count=input_count,
+        input_bytes=int(input_bytes if input_bytes is not None else _estimate_input_bytes(segments, layers)),
+    )
+    plan = {
+        "strategy": strategy,
+        "master_strategy": master_strategy,
+        "width": width,
+        "height": height,
+        "segments": len(segments),
+        "inputs": input_count,
+        "max_inputs_per_pass": _max_inputs_per_pass(width, height),
+        "output_seconds": round(seconds, 3),
+        "outputs": [
+            {"name": t.name, "width": t.width, "height": t.height} for t in (targets or [])
+        ] or [{"name": "output", "width": width, "height": height}],
+        "passes": passes,
+        "encode_work": round(encode_work, 2),
+        "command": command,
+        "audio_command": audio_command,
+    }
+    return plan, features
+
+
+# ---------------------------------------------------------------------------
+# Progress helper
 # ---------------------------------------------------------------------------
 
 def _update_progress(supabase, job_id: str, progress: int, stage: str) -> None:
-    """Update the job's progress and stage in the database."""
+    """Update the job's progress and stage in the database (and SSE streams)."""
+    job_events.publish(
+        "export_jobs", job_id, "progress",
+        status="processing", progress=progress, progress_stage=stage,
+    )
     try:
         supabase.table("export_jobs").update({
             "progress": progress,
@@ -830,10 +2850,248 @@ def _update_progress(supabase, job_id: str, progress: int, stage: str) -> None:
 # Job processing (called by the worker loop, NOT by BackgroundTask)
 # ---------------------------------------------------------------------------
 
+def _estimate_scratch_bytes(
+    segments: List[Segment],
+    output_count: int = 1,
+    input_bytes: Optional[int] = None,
+    layers: Optional[OutputLayers] = None,
+) -> int:
+    """
+    Scratch bytes a render needs: downloaded sources plus ~3x the output
+    (batch intermediates, smart-render pieces or the split A/V video track,
+    the partial file and the final MP4), plus one more output-sized file
+    per extra rendition.
+    `input_bytes` (measured at preflight) replaces the per-second source
+    estimate when known.
+    """
+    inputs = float(input_bytes) if input_bytes else _estimate_input_bytes(segments, layers)
+    output = _chain_length(segments) * OUTPUT_BYTES_PER_SECOND
+    return int(inputs + (2 + max(1, output_count)) * output)
+
+
+def _estimate_input_bytes(segments: List[Segment], layers: Optional[OutputLayers] = None) -> float:
+    """Bytes the sources of `segments` and `layers` are likely to weigh (whole files are downloaded)."""
+    inputs = 0.0
+    for seg in segments:
+        duration = seg.end_time - seg.start_time
+        if seg.media_type == "image":
+            inputs += SOURCE_IMAGE_BYTES
+        else:
+            inputs += (seg.source_start + duration) * SOURCE_VIDEO_BYTES_PER_SECOND
+        if seg.audio_overlay_url:
+            inputs += duration * AUDIO_OVERLAY_BYTES_PER_SECOND
+    for ov in layers.overlays if layers else []:
+        if ov.media_type == "video":
+            inputs += (ov.source_start + ov.end - ov.start) * SOURCE_VIDEO_BYTES_PER_SECOND
+        elif ov.media_type == "image":
+            inputs += SOURCE_IMAGE_BYTES
+    for mix in layers.audio_mix if layers else []:
+        inputs += (mix.source_start + mix.end - mix.start) * AUDIO_OVERLAY_BYTES_PER_SECOND
+    return inputs
+
+
+async def _render_composition(
+    supabase,
+    job_id: str,
+    timeline: Dict[str, Any],
+    temp_dir: str,
+    output_path: str,
+    output_specs: Optional[List[Dict[str, Any]]] = None,
+    timings: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Download a compiled timeline's media into `temp_dir` and render it to
+    `output_path` (progress 2-80%). Media already present in `temp_dir` from
+    an earlier attempt is not downloaded again.
+
+    With `output_specs` (the job's `outputs`), every target is rendered in
+    the same pass instead and the rendered files are returned as rendition
+    records (name, size, local paths); the first target is written to
+    `output_path`. Without, the result is an empty list.
+
+    `timings`, when given, receives the download and render durations, the
+    downloaded bytes and the cost features of the render plan.
+    """
+    # ------ 2. Segments of the compiled timeline ------
+    _update_progress(supabase, job_id, 2, "initializing")
+    segments = _timeline_segments(timeline)
+    if not segments:
+        raise ValueError("Composition contains no renderable segments")
+    logger.info("Job %s: loaded %d segments (timeline %s)", job_id, len(segments), timeline["hash"][:12])
+
+    # ------ 3. Download media files ------
+    _update_progress(supabase, job_id, 5, "downloading")
+    stage_start = time.monotonic()
+    for i, seg in enumerate(segments):
+        ext = _guess_extension(seg.media_url)
+        # Override type detection based on extension when ambiguous
+        if _is_image_ext(ext) and seg.media_type == "video":
+            seg.media_type = "image"
+        local_path = os.path.join(temp_dir, f"seg_{seg.index}{ext}")
+        await _download_media(seg.media_url, local_path)
+        seg.local_path = local_path
+
+        # Download audio overlay (TTS) if attached to this segment.
+        if seg.audio_overlay_url:
+            aud_ext = _guess_extension(seg.audio_overlay_url) or ".webm"
+            overlay_path = os.path.join(temp_dir, f"overlay_{seg.index}{aud_ext}")
+            try:
+                await _download_media(seg.audio_overlay_url, overlay_path)
+                seg.audio_overlay_local_path = overlay_path
+            except Exception as exc:
+                logger.warning(
+                    "Failed to download audio overlay for seg %d (%s): %s — falling back to source audio",
+                    seg.index, seg.audio_overlay_url, exc,
+                )
+
+        # Progress: downloading is 5-30% range
+        dl_progress = 5 + int(25 * (i + 1) / len(segments))
+        _update_progress(supabase, job_id, dl_progress, "downloading")
+
+    # Upper-track clips and mixed audio
+    track_media = await _download_track_media(timeline, temp_dir)
+
+    save_checkpoint(supabase, "export_jobs", job_id, "downloaded", scratch_dir=temp_dir)
+    if timings is not None:
+        timings["download_seconds"] = time.monotonic() - stage_start
+        timings["input_bytes"] = sum(
+            os.path.getsize(path)
+            for seg in segments
+            for path in (seg.local_path, seg.audio_overlay_local_path)
+            if path
+        ) + sum(os.path.getsize(path) for path in track_media.values())
+
+    # ------ 4. Determine output resolution ------
+    if timeline.get("width") and timeline.get("height"):
+        width, height = int(timeline["width"]), int(timeline["height"])
+    else:
+        # Not set by the composition: follow the first video
+        first_video_res: tuple[Optional[int], Optional[int]] = (None, None)
+        for seg in segments:
+            if seg.media_type == "video":
+                first_video_res = await _get_video_resolution(seg.local_path)
+                if first_video_res[0]:
+                    break
+        width, height = _resolve_output_resolution({}, first_video_res)
+    # Ensure even dimensions
+    width = width - (width % 2)
+    height = height - (height % 2)
+    logger.info("Job %s: output resolution %dx%d", job_id, width, height)
+
+    # ------ 4b. Pre-scale stills to the canvas (decoded once, in a pool) ------
+    image_segments = [seg for seg in segments if seg.media_type == "image"]
+    if image_segments:
+        stills = await asyncio.gather(*(
+            prescale_still(seg.local_path, width, height, "fit") for seg in image_segments
+        ))
+        for seg, still in zip(image_segments, stills):
+            seg.still_path = still or ""
+
+    # ------ 4c. Upper tracks and mixed audio, then text / stickers on top ------
+    placed: List[Tuple[Dict[str, Any], str, int, int]] = []
+    if timeline.get("overlays"):
+        placed = await _rasterize_overlays(timeline["overlays"], width, height, temp_dir)
+        logger.info("Job %s: %d of %d overlays rasterized", job_id, len(placed), len(timeline["overlays"]))
+    layers = _output_layers(segments, timeline, track_media, placed, width, height)
+
+    # ------ 5. Check audio streams ------
+    has_audio_flags: Dict[int, bool] = {}
+    for seg in segments:
+        if seg.media_type == "video":
+            has_audio_flags[seg.index] = await _has_audio_stream(seg.local_path)
+        else:
+            has_audio_flags[seg.index] = False
+
+    # ------ 6. Build and run FFmpeg (batched for long timelines) ------
+    _update_progress(supabase, job_id, 35, "rendering")
+    targets = _parse_output_targets(output_specs, width, height) if output_specs else []
+    stage_start = time.monotonic()
+    if timings is not None:
+        timings["features"] = _plan_render(
+            segments, width, height, targets, input_bytes=timings.get("input_bytes"), layers=layers,
+        )[1]
+    if not output_specs:
+        await _render_timeline(
+            supabase, job_id, segments, output_path, width, height, has_audio_flags, temp_dir,
+            layers=layers,
+        )
+        logger.info("Job %s: FFmpeg completed successfully", job_id)
+        if timings is not None:
+            timings["render_seconds"] = time.monotonic() - stage_start
+        return []
+
+    renditions: List[RenditionFiles] = []
+    for i, target in enumerate(targets):
+        stem = os.path.join(temp_dir, f"export-{job_id}-{target.name}")
+        renditions.append(RenditionFiles(
+            target=target,
+            video_path=output_path if i == 0 else f"{stem}.mp4",
+            poster_path=f"{stem}-poster.jpg" if target.poster else "",
+            thumbnail_path=f"{stem}-thumb.jpg" if target.thumbnail_width else "",
+        ))
+    await _render_timeline_renditions(
+        supabase, job_id, segments, renditions, width, height, has_audio_flags, temp_dir,
+        layers=layers,
+    )
+    logger.info("Job %s: FFmpeg completed successfully (%d renditions)", job_id, len(renditions))
+    if timings is not None:
+        timings["render_seconds"] = time.monotonic() - stage_start
+    return [
+        {
+            "name": r.target.name,
+            "width": r.target.width,
+            "height": r.target.height,
+            "video_path": r.video_path,
+            "poster_path": r.poster_path,
+            "thumbnail_path": r.thumbnail_path,
+        }
+        for r in renditions
+    ]
+
+
+async def _upload_renditions(
+    user_id: str,
+    job_id: str,
+    renditions: List[Dict[str, Any]],
+) -> List[Dict[str, Any]]:
+    """Upload every rendered file of a multi-output job; returns the public records."""
+    async def upload(rendition: Dict[str, Any]) -> Dict[str, Any]:
+        key_stem = f"{user_id}/exports/export-{job_id}-{rendition['name']}"
+        video_key = f"{key_stem}.mp4"
+        uploads = [storage.put_file(rendition["video_path"], video_key, "video/mp4")]
+        for suffix, path_field in (("poster", "poster_path"), ("thumb", "thumbnail_path")):
+            if rendition.get(path_field):
+                uploads.append(storage.put_file(rendition[path_field], f"{key_stem}-{suffix}.jpg", "image/jpeg"))
+        urls = await asyncio.gather(*uploads)
+        urls_iter = iter(urls[1:])
+        return {
+            "name": rendition["name"],
+            "width": rendition["width"],
+            "height": rendition["height"],
+            "url": urls[0],
+            "r2_key": video_key,
+            "file_size_bytes": os.path.getsize(rendition["video_path"]),
+            "poster_url": next(urls_iter) if rendition.get("poster_path") else None,
+            "thumbnail_url": next(urls_iter) if rendition.get("thumbnail_path") else None,
+        }
+
+    return list(await asyncio.gather(*(upload(r) for r in renditions)))
+
+
 async def _process_job(job_id: str) -> None:
     """
     Render a single composition job into an MP4 and upload to R2.
     Called by the worker loop after claiming the job.
+
+    Stages are checkpointed (downloaded, rendered, uploaded) in the row's
+    `checkpoint` column. A retry on the node that rendered the job resumes
+    from its scratch directory (skipping finished downloads, or the whole
+    render); a retry on any node reuses an output that was already uploaded.
+
+    If the job is cancelled mid-run the task is cancelled: FFmpeg is killed,
+    the temp dir is removed, and the row keeps its 'cancelled' status
+    (completion/failure updates only apply while the row is 'processing').
+    The temp dir is kept when the job is handed back to the queue instead.
     """
     supabase = None
     temp_dir = None
@@ -843,155 +3101,101 @@ async def _process_job(job_id: str) -> None:
         supabase = get_db(admin_access=True)()
 
         # ------ 1. Read job row ------
-        job_resp = supabase.table("export_jobs").select("*").eq("id", job_id).single().execute()
+        job_resp = supabase.table("export_jobs").select(JOB_COLUMNS).eq("id", job_id).single().execute()
         if not job_resp.data:
             logger.error("Job %s not found in database", job_id)
             return
         job = job_resp.data
 
         user_id = job["user_id"]
-        composition = job.get("composition") or {}
-        if isinstance(composition, str):
-            composition = json.loads(composition)
-
-        # ------ 2. Parse composition into segments ------
-        _update_progress(supabase, job_id, 2, "initializing")
-        segments = _parse_composition(composition)
-        if not segments:
-            raise ValueError("Composition contains no renderable segments")
-        logger.info("Job %s: parsed %d segments", job_id, len(segments))
-
-        # ------ 3. Download media files ------
-        _update_progress(supabase, job_id, 5, "downloading")
-        temp_dir = tempfile.mkdtemp(prefix="agdoc_compose_")
-        for i, seg in enumerate(segments):
-            ext = _guess_extension(seg.media_url)
-            # Override type detection based on extension when ambiguous
-            if _is_image_ext(ext) and seg.media_type == "video":
-                seg.media_type = "image"
-            local_path = os.path.join(temp_dir, f"seg_{seg.index}{ext}")
-            await _download_media(seg.media_url, local_path)
-            seg.local_path = local_path
-
-            # Download audio overlay (TTS) if attached to this segment.
-            if seg.audio_overlay_url:
-                aud_ext = _guess_extension(seg.audio_overlay_url) or ".webm"
-                overlay_path = os.path.join(temp_dir, f"overlay_{seg.index}{aud_ext}")
-                try:
-                    await _download_media(seg.audio_overlay_url, overlay_path)
-                    seg.audio_overlay_local_path = overlay_path
-                except Exception as exc:
-                    logger.warning(
-                        "Failed to download audio overlay for seg %d (%s): %s — falling back to source audio",
-                        seg.index, seg.audio_overlay_url, exc,
-                    )
-
-            # Progress: downloading is 5-30% range
-            dl_progress = 5 + int(25 * (i + 1) / len(segments))
-            _update_progress(supabase, job_id, dl_progress, "downloading")
-
-        # ------ 4. Determine output resolution ------
-        first_video_res: tuple[Optional[int], Optional[int]] = (None, None)
-        for seg in segments:
-            if seg.media_type == "video":
-                first_video_res = await _get_video_resolution(seg.local_path)
-                if first_video_res[0]:
-                    break
+        timeline = _job_timeline(supabase, job)
 
-        width, height = _resolve_output_resolution(composition, first_video_res)
-        # Ensure even dimensions
-        width = width - (width % 2)
-        height = height - (height % 2)
-        logger.info("Job %s: output resolution %dx%d", job_id, width, height)
-
-        # ------ 5. Check audio streams ------
-        has_audio_flags: Dict[int, bool] = {}
-        for seg in segments:
-            if seg.media_type == "video":
-                has_audio_flags[seg.index] = await _has_audio_stream(seg.local_path)
-            else:
-                has_audio_flags[seg.index] = False
-
-        # ------ 6. Build and run FFmpeg ------
-        _update_progress(supabase, job_id, 35, "rendering")
-        output_path = os.path.join(temp_dir, f"export-{job_id}.mp4")
-        stderr_log_path = os.path.join(temp_dir, f"ffmpeg-{job_id}.log")
-
-        cmd = _build_ffmpeg_command(segments, output_path, width, height, has_audio_flags)
-        logger.info("Job %s: running ffmpeg with %d inputs", job_id, len(segments))
-        logger.info("Job %s: full ffmpeg command: %s", job_id, " ".join(cmd))
-
-        # Redirect stderr to a file rather than a pipe. FFmpeg can write a lot
-        # of progress/log output to stderr, and a full PIPE buffer is a
-        # well-known cause of subprocess deadlocks. With a file, the kernel
-        # never blocks the writer.
-        with open(stderr_log_path, "wb") as stderr_file:
-            proc = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdout=asyncio.subprocess.DEVNULL,
-                stderr=stderr_file,
+        output_specs = job.get("outputs") or None
+        checkpoint = load_checkpoint(job)
+        r2_key = f"{user_id}/exports/export-{job_id}.mp4"
+        rendition_results: Optional[List[Dict[str, Any]]] = None
+        # Stage durations of a run from scratch (the cost model's samples)
+        timings: Optional[Dict[str, Any]] = None
+
+        if stage_reached(checkpoint, "uploaded") and checkpoint.get("output_url"):
+            # The output already reached storage on a previous attempt
+            # (possibly on another node) — only the final update is missing.
+            logger.info("Job %s: resuming from 'uploaded' checkpoint", job_id)
+            output_url = checkpoint["output_url"]
+            r2_key = checkpoint.get("output_r2_key") or r2_key
+            file_size_bytes = checkpoint.get("file_size_bytes")
+            duration_seconds = checkpoint.get("duration_seconds")
+            rendition_results = checkpoint.get("renditions")
+        else:
+            # Admission against free scratch space (raises ScratchSpaceError)
+            estimate_segments = _timeline_segments(timeline)
+            temp_dir = await asyncio.to_thread(
+                scratch.allocate, "compose", job_id, _estimate_scratch_bytes(
+                    estimate_segments, len(output_specs or []), job.get("input_bytes"),
+                    _planning_layers(timeline, estimate_segments, 1920, 1080),
+                ),
             )
-
-            # Cap a single FFmpeg run at 10 minutes. A 12-second 1080p clip
-            # finishes in well under 60s, so 10 min is a generous safety net
-            # that still kicks in when FFmpeg deadlocks. Without this, a
-            # hung FFmpeg blocks the worker forever and the job sits at
-            # status='processing' indefinitely.
-            FFMPEG_TIMEOUT_SECONDS = 600
-            try:
-                await asyncio.wait_for(proc.wait(), timeout=FFMPEG_TIMEOUT_SECONDS)
-            except asyncio.TimeoutError:
-                logger.error(
-                    "Job %s: FFmpeg exceeded %ds — killing subprocess",
-                    job_id, FFMPEG_TIMEOUT_SECONDS,
-                )
-                try:
-                    proc.kill()
-                    await proc.wait()
-                except Exception:
-                    pass
-                # Read whatever FFmpeg wrote to stderr before the kill so the
-                # job's `error` field carries an actionable message.
-                stderr_tail = ""
-                try:
-                    with open(stderr_log_path, "rb") as f:
-                        stderr_tail = f.read()[-2000:].decode(errors="replace")
-                except Exception:
-                    pass
-                raise RuntimeError(
-                    f"FFmpeg timed out after {FFMPEG_TIMEOUT_SECONDS}s. "
-                    f"stderr tail: {stderr_tail[-500:]}"
+            output_path = os.path.join(temp_dir, f"export-{job_id}.mp4")
+            renditions: List[Dict[str, Any]] = checkpoint.get("renditions") or []
+
+            if (
+                stage_reached(checkpoint, "rendered")
+                and checkpoint_is_local(checkpoint, temp_dir)
+                and os.path.exists(output_path)
+                and all(os.path.exists(r["video_path"]) for r in renditions)
+            ):
+                logger.info("Job %s: resuming from 'rendered' checkpoint, skipping render", job_id)
+                duration_seconds = checkpoint.get("duration_seconds")
+            else:
+                if checkpoint_is_local(checkpoint, temp_dir):
+                    logger.info(
+                        "Job %s: resuming from '%s' checkpoint in %s",
+                        job_id, checkpoint.get("stage"), temp_dir,
+                    )
+                else:
+                    timings = {}
+                renditions = await _render_composition(
+                    supabase, job_id, timeline, temp_dir, output_path, output_specs, timings,
                 )
 
-        if proc.returncode != 0:
-            stderr_tail = ""
-            try:
-                with open(stderr_log_path, "rb") as f:
-                    stderr_tail = f.read()[-4000:].decode(errors="replace")
-            except Exception:
-                pass
-            logger.error("FFmpeg failed (rc=%d): %s", proc.returncode, stderr_tail[-2000:])
-            raise RuntimeError(f"FFmpeg exited with code {proc.returncode}: {stderr_tail[-500:]}")
-
-        logger.info("Job %s: FFmpeg completed successfully", job_id)
-
-        # ------ 7. Upload to R2 ------
-        _update_progress(supabase, job_id, 80, "uploading")
-        r2_key = f"{user_id}/exports/export-{job_id}.mp4"
-        with open(output_path, "rb") as f:
-            output_content = f.read()
-
-        output_url = await _upload_to_r2(output_content, r2_key, "video/mp4")
-        file_size_bytes = len(output_content)
+                # ------ Get output duration via ffprobe ------
+                duration_seconds = await _get_video_duration(output_path)
+                save_checkpoint(
+                    supabase, "export_jobs", job_id, "rendered",
+                    scratch_dir=temp_dir,
+                    output_path=output_path,
+                    duration_seconds=duration_seconds,
+                    renditions=renditions or None,
+                )
 
-        # ------ 8. Get output duration via ffprobe ------
-        duration_seconds = await _get_video_duration(output_path)
+            # ------ 7. Upload to R2 ------
+            _update_progress(supabase, job_id, 80, "uploading")
+            upload_start = time.monotonic()
+            if renditions:
+                # The first target doubles as the job's primary output
+                rendition_results = await _upload_renditions(user_id, job_id, renditions)
+                primary = rendition_results[0]
+                output_url, r2_key = primary["url"], primary["r2_key"]
+                file_size_bytes = primary["file_size_bytes"]
+            else:
+                file_size_bytes = os.path.getsize(output_path)
+                output_url = await storage.put_file(output_path, r2_key, "video/mp4")
+            if timings and "render_seconds" in timings:
+                timings["upload_seconds"] = time.monotonic() - upload_start
+            save_checkpoint(
+                supabase, "export_jobs", job_id, "uploaded",
+                output_url=output_url,
+                output_r2_key=r2_key,
+                file_size_bytes=file_size_bytes,
+                duration_seconds=duration_seconds,
+                renditions=rendition_results,
+            )
 
-        # ------ 9. Update job as completed ------
+        # ------ 8. Update job as completed ------
         elapsed = time.monotonic() - start_ts
         now_iso = datetime.now(timezone.utc).isoformat()
 
-        supabase.table("export_jobs").update({
+        completed = {
             "status": "completed",
             "progress": 100,
             "progress_stage": "completed",
@@ -1002,221 +3206,508 @@ async def _process_job(job_id: str) -> None:
             "processing_time_seconds": round(elapsed, 2),
             "completed_at": now_iso,
             "updated_at": now_iso,
-        }).eq("id", job_id).execute()
+        }
+        if rendition_results:
+            completed["renditions"] = rendition_results
+        if timings and "upload_seconds" in timings:
+            completed["stage_timings"] = render_estimator.stage_timings(
+                timings["features"],
+                download_seconds=timings["download_seconds"],
+                render_seconds=timings["render_seconds"],
+                upload_seconds=timings["upload_seconds"],
+                input_bytes=timings["input_bytes"],
+                output_bytes=sum(r["file_size_bytes"] for r in rendition_results or [])
+                or file_size_bytes or 0,
+            )
+        finalized = (
+            supabase.table("export_jobs").update(completed)
+            .eq("id", job_id).eq("status", "processing").eq("worker_id", WORKER_ID).execute()
+        )
+        if not finalized.data:
+            # Lease lost (reclaimed by another worker) or cancelled meanwhile:
+            # the row is no longer ours to finish
+            logger.warning("Job %s: no longer owned by this worker, result discarded", job_id)
+            return
+        job_events.publish(
+            "export_jobs", job_id, "completed",
+            status="completed", progress=100, progress_stage="completed", output_url=output_url,
+        )
+        if job.get("callback_url"):
+            webhooks.notify_job(supabase, "export_jobs", job_id)
 
         logger.info(
             "Job %s: completed in %.1fs  output=%s  size=%d  duration=%.1fs",
-            job_id, elapsed, output_url, file_size_bytes, duration_seconds or 0,
+            job_id, elapsed, output_url, file_size_bytes or 0, duration_seconds or 0,
         )
 
+    except scratch.ScratchSpaceError as exc:
+        # Not a job failure: this node is short on disk right now
+        defer_job("export_jobs", job_id, SCRATCH_RETRY_SECONDS, str(exc))
+
     except Exception as exc:
         logger.exception("Job %s failed: %s", job_id, exc)
         try:
             if supabase:
                 now_iso = datetime.now(timezone.utc).isoformat()
-                supabase.table("export_jobs").update({
+                failed = supabase.table("export_jobs").update({
                     "status": "failed",
                     "progress": 0,
                     "progress_stage": "failed",
                     "error": str(exc)[:2000],
                     "completed_at": now_iso,
                     "updated_at": now_iso,
-                }).eq("id", job_id).execute()
+                }).eq("id", job_id).eq("status", "processing").eq("worker_id", WORKER_ID).execute()
+                if failed.data:
+                    webhooks.notify_job(supabase, "export_jobs", job_id)
+            # A job cancelled meanwhile already published its terminal event
+            if job_events.is_local("export_jobs", job_id):
+                job_events.publish(
+                    "export_jobs", job_id, "failed",
+                    status="failed", progress=0, progress_stage="failed", error=str(exc)[:2000],
+                )
         except Exception as db_exc:
             logger.error("Failed to update job %s status to failed: %s", job_id, db_exc)
 
     finally:
-        # ------ Cleanup temp files ------
+        # ------ Cleanup temp files (unless a retry here can resume from them) ------
         if temp_dir:
-            try:
-                for fname in os.listdir(temp_dir):
-                    fpath = os.path.join(temp_dir, fname)
-                    try:
-                        os.unlink(fpath)
-                    except OSError:
-                        pass
-                os.rmdir(temp_dir)
-                logger.debug("Cleaned up temp dir %s", temp_dir)
-            except Exception as cleanup_exc:
-                logger.warning("Temp cleanup error: %s", cleanup_exc)
+            keep = should_keep_scratch("export_jobs", job_id)
+            if keep:
+                logger.info("Job %s: handed back, keeping scratch dir %s", job_id, temp_dir)
+            scratch.release(temp_dir, keep=keep)
+
+
+# ---------------------------------------------------------------------------
+# Database-backed worker loop
+# ---------------------------------------------------------------------------
+
+def _claim_next_job(supabase, lanes: Optional[Sequence[str]] = None) -> Optional[str]:
+    """
+    Claim the next queued export job from the given priority lanes.
+
+    Ordering is lane priority, then weighted fair share across user_id (see
+    app/services/job_queue.py) rather than plain FIFO, so one user
+    bulk-submitting exports cannot hold everyone else behind them.
+
+    Returns the job_id if claimed, None otherwise.
+    """
+    job = claim_next_job(supabase, "export_jobs", lanes)
+    return job["id"] if job else None
+
+
+async def _worker_loop(slot: int = 0, lanes: Sequence[str] = ()) -> None:
+    """
+    Continuously poll the database for queued export jobs and process them.
+    Runs as a long-lived asyncio task per worker slot started on app startup;
+    each slot only claims jobs from its own priority lanes.
+    """
+    logger.info("Compose worker slot %d started (lanes=%s)", slot, ",".join(lanes))
+
+    # Short initial delay to let the app finish startup
+    await asyncio.sleep(2)
+
+    while True:
+        try:
+            supabase = get_db(admin_access=True)()
+            job_id = _claim_next_job(supabase, lanes)
+
+            if job_id:
+                logger.info("Worker slot %d processing job %s", slot, job_id)
+                # Runs as its own task so a cancel (from any node) can stop it
+                await run_claimed_job("export_jobs", job_id, _process_job(job_id))
+                # Immediately check for more jobs (no sleep)
+                continue
+            else:
+                # No jobs available, wait before polling again
+                await asyncio.sleep(WORKER_POLL_INTERVAL)
+
+        except asyncio.CancelledError:
+            logger.info("Compose worker slot %d shutting down", slot)
+            break
+        except Exception as exc:
+            logger.error("Worker loop error (slot %d): %s", slot, exc)
+            await asyncio.sleep(WORKER_POLL_INTERVAL)
+
+
+def start_worker() -> None:
+    """Start one background worker loop per lane slot. Called from main.py on app startup."""
+    global _worker_tasks
+    _worker_tasks = [t for t in _worker_tasks if not t.done()]
+    if _worker_tasks:
+        return
+    for slot, lanes in enumerate(WORKER_LANES):
+        _worker_tasks.append(asyncio.create_task(_worker_loop(slot, lanes)))
+    # Continuously requeue jobs whose worker lease expired (any node's crash)
+    _worker_tasks.append(asyncio.create_task(lease_reaper_loop("export_jobs")))
+    logger.info("Compose worker tasks created: %d slots", len(WORKER_LANES))
+
+
+def stop_worker() -> None:
+    """Stop the background worker loops. Called from main.py on app shutdown."""
+    for task in _worker_tasks:
+        if not task.done():
+            task.cancel()
+    logger.info("Compose worker tasks cancelled")
+
 
+# ---------------------------------------------------------------------------
+# Endpoints
+# ---------------------------------------------------------------------------
+
+@public_router.post("")
+async def create_compose_job(
+    request: Request,
+    supabase=Depends(db_admin),
+):
+    """
+    Start a new video composition / export job.
+
+    Secured by x-api-key header (for Next.js backend calls).
+    When the queue is over capacity (depth, estimated wait for the lane or
+    the user's jobs in progress; see app/services/admission.py) the job is
+    refused with 429, a Retry-After header and the estimated start time.
+    Every media URL is preflighted first (see app/services/preflight.py):
+    unreachable, mistyped or oversized inputs fail with 422 before queueing.
+    Inserts a row with status='queued' — the background worker picks it up.
+
+    Request body (JSON):
+    {
+        "user_id": "uuid",
+        "project_id": "uuid",
+        "composition": { ... },
+        "priority": "interactive" (optional: interactive | standard | batch)
+        "callback_url": "https://..." (optional, POSTed on completion/failure)
+        "outputs": [              (optional, up to 6 renditions from one pass)
+            {"name": "reels", "aspect_ratio": "9:16", "fit": "crop",
+             "video_bitrate": "6M", "poster": true, "thumbnail_width": 320},
+            {"name": "youtube", "width": 1920, "height": 1080},
+            {"name": "preview", "aspect_ratio": "16:9", "resolution": 720}
+        ]
+    }
+
+    With `outputs`, every target is encoded from a single decode of the
+    sources; the first one is also reported as the job's output_url and
+    all of them appear in `renditions` once the job completes (see
+    _parse_output_targets for the target fields).
+
+    Returns:
+    {
+        "job_id": "uuid",
+        "status": "queued",
+        "priority": "standard",
+        "estimated_seconds": 42.8,
+        "estimated_start_at": "2026-...",
+        "eta": "2026-..."
+    }
+    """
+    _verify_api_key(request)
+
+    try:
+        body = await request.json()
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid JSON body",
+        )
+
+    try:
+        row = _build_job_row(body, datetime.now(timezone.utc).isoformat())
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(exc),
+        )
+    job_id, user_id, priority = row["id"], row["user_id"], row["priority"]
+
+    decision = _admit(supabase, user_id, priority)
+
+    rejected = await preflight.annotate_rows([row], _media_inputs)
+    if rejected:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail={"message": "Composition inputs failed preflight", "errors": rejected[0]["errors"]},
+        )
+    await _annotate_estimates(supabase, [row])
+
+    try:
+        result = supabase.table("export_jobs").insert(row).execute()
+
+        if not result.data:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to create export job record",
+            )
+    except HTTPException:
+        raise
+    except Exception as exc:
+        logger.error("DB insert failed for compose job: %s", exc)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to create export job: {str(exc)}",
+        )
 
-# ---------------------------------------------------------------------------
-# Database-backed worker loop
-# ---------------------------------------------------------------------------
+    job_events.publish(
+        "export_jobs", job_id, "queued", user_id=user_id,
+        status="queued", progress=0, progress_stage="queued",
+    )
+    logger.info("Queued compose job %s for user %s (lane=%s)", job_id, user_id, priority)
 
-def _claim_next_job(supabase) -> Optional[str]:
-    """
-    Claim the oldest queued job using optimistic locking.
+    return {
+        "job_id": job_id,
+        "status": "queued",
+        "priority": priority,
+        "estimated_seconds": row.get("estimated_seconds"),
+        "estimated_start_at": decision.estimated_start_at,
+        "eta": _eta_after(decision, row.get("estimated_seconds")),
+    }
 
-    1. SELECT the oldest queued job
-    2. UPDATE its status to 'processing' WHERE status='queued' (atomic check)
-    3. If another worker claimed it first, the update returns no rows -> return None
 
-    Returns the job_id if claimed, None otherwise.
+def _admit(supabase, user_id: str, priority: str, new_jobs: int = 1) -> admission.Admission:
     """
-    try:
-        result = (
-            supabase.table("export_jobs")
-            .select("id")
-            .eq("status", "queued")
-            .order("created_at")
-            .limit(1)
-            .execute()
+    Admission check for new jobs; raises 429 with Retry-After when refused,
+    or 413 (not retryable) when the jobs could never fit.
+    """
+    decision = admission.check(supabase, user_id, priority, WORKER_LANES, new_jobs)
+    if not decision.accepted and decision.retry_after is None:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail={"message": decision.message, "reason": decision.reason},
         )
-
-        if not result.data:
-            return None
-
-        job_id = result.data[0]["id"]
-        now_iso = datetime.now(timezone.utc).isoformat()
-
-        # Optimistic lock: only claim if still queued
-        claim_result = (
-            supabase.table("export_jobs")
-            .update({
-                "status": "processing",
-                "progress": 0,
-                "progress_stage": "initializing",
-                "updated_at": now_iso,
-            })
-            .eq("id", job_id)
-            .eq("status", "queued")
-            .execute()
+    if not decision.accepted:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail={
+                "message": decision.message,
+                "reason": decision.reason,
+                "retry_after": decision.retry_after,
+                "estimated_start_at": decision.estimated_start_at,
+            },
+            headers={"Retry-After": str(decision.retry_after)},
         )
+    return decision
 
-        if claim_result.data:
-            logger.info("Claimed job %s", job_id)
-            return job_id
 
-        # Another worker claimed it between SELECT and UPDATE
-        logger.debug("Job %s was already claimed by another worker", job_id)
+def _eta_after(decision: admission.Admission, estimated_seconds: Optional[float]) -> Optional[str]:
+    """Estimated completion of a job admitted with `decision`."""
+    if estimated_seconds is None:
         return None
+    start = datetime.fromisoformat(decision.estimated_start_at)
+    return (start + timedelta(seconds=float(estimated_seconds))).isoformat()
 
-    except Exception as exc:
-        logger.error("Error claiming next job: %s", exc)
-        return None
 
-
-def _recover_stale_jobs(supabase) -> int:
+def _build_job_row(body: Dict[str, Any], now_iso: str) -> Dict[str, Any]:
     """
-    On startup, mark jobs stuck in 'processing' for too long as failed.
-    This handles the case where the server crashed mid-processing.
-    Returns the number of recovered jobs.
+    Validate one job spec (the POST body) and build its export_jobs row.
+    Raises ValueError with a client-facing message.
     """
+    if not isinstance(body, dict):
+        raise ValueError("job spec must be an object")
+
+    user_id = body.get("user_id")
+    if not user_id:
+        raise ValueError("user_id is required")
+
+    composition = body.get("composition")
+    if not composition or not isinstance(composition, dict):
+        raise ValueError("composition object is required")
     try:
-        cutoff = (datetime.now(timezone.utc) - timedelta(minutes=STALE_JOB_TIMEOUT_MINUTES)).isoformat()
-        now_iso = datetime.now(timezone.utc).isoformat()
+        timeline = _compile_timeline(composition)
+    except (AttributeError, KeyError, TypeError, ValueError) as exc:
+        raise ValueError(f"Invalid composition: {exc}")
 
-        result = (
-            supabase.table("export_jobs")
-            .update({
-                "status": "failed",
-                "progress": 0,
-                "progress_stage": "failed",
-                "error": f"Job timed out or server restarted (stale after {STALE_JOB_TIMEOUT_MINUTES}min)",
-                "completed_at": now_iso,
-                "updated_at": now_iso,
-            })
-            .eq("status", "processing")
-            .lt("updated_at", cutoff)
-            .execute()
-        )
+    priority = normalize_priority(body.get("priority"))
 
-        count = len(result.data) if result.data else 0
-        if count > 0:
-            logger.warning("Recovered %d stale processing jobs", count)
-        return count
+    outputs = body.get("outputs")
+    if outputs is not None:
+        # Nominal canvas: sizes that follow the canvas are resolved at render time
+        _parse_output_targets(outputs, 1920, 1080)
 
-    except Exception as exc:
-        logger.error("Error recovering stale jobs: %s", exc)
-        return 0
+    callback_url = webhooks.validate_callback_url(body.get("callback_url"))
+
+    row = {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "project_id": body.get("project_id"),
+        "timeline": timeline,
+        "timeline_hash": timeline["hash"],
+        "status": "queued",
+        "progress": 0,
+        "priority": priority,
+        "created_at": now_iso,
+        "updated_at": now_iso,
+    }
+    if outputs:
+        row["outputs"] = outputs
+    if callback_url:
+        row["callback_url"] = callback_url
+    return row
+
+
+def _media_inputs(row: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """(url, role) of every source a job row's compiled timeline downloads."""
+    inputs: List[Tuple[str, str]] = []
+    for seg in _timeline_segments(row["timeline"]):
+        inputs.append((seg.media_url, seg.media_type))
+        if seg.audio_overlay_url:
+            inputs.append((seg.audio_overlay_url, "audio"))
+    for entry in row["timeline"].get("layers") or []:
+        inputs.append((entry["url"], entry["type"]))
+    for entry in row["timeline"].get("mix") or []:
+        inputs.append((entry["url"], "audio"))
+    for entry in row["timeline"].get("overlays") or []:
+        if entry["type"] == "sticker":
+            inputs.append((entry["url"], "image"))
+    return inputs
+
+
+def _plan_timeline_render(
+    timeline: Dict[str, Any],
+    outputs: Any = None,
+    input_bytes: Optional[int] = None,
+) -> Tuple[Dict[str, Any], render_estimator.RenderFeatures]:
+    """Plan the render of a compiled timeline without its media (see _plan_render)."""
+    segments = _planning_segments(timeline)
+    # Without a size or aspect ratio the worker uses the first video's resolution
+    width, height = timeline.get("width") or 1920, timeline.get("height") or 1080
+    layers = _planning_layers(timeline, segments, width, height)
+    targets = _parse_output_targets(outputs, width, height) if outputs else []
+    plan, features = _plan_render(segments, width, height, targets, input_bytes, layers)
+    plan["resolution_source"] = "composition" if timeline.get("width") else "assumed"
+    plan["timeline_hash"] = timeline["hash"]
+    return plan, features
+
+
+async def _annotate_estimates(supabase, rows: Sequence[Dict[str, Any]]) -> None:
+    """Store each job row's predicted processing time as `estimated_seconds`."""
+    model = await render_estimator.get_model(supabase)
+    for row in rows:
+        try:
+            _, features = _plan_timeline_render(row["timeline"], row.get("outputs"), row.get("input_bytes"))
+        except ValueError:
+            continue  # outputs that only fail on the real canvas: left to the worker
+        row["estimated_seconds"] = render_estimator.estimate(features, model)["total_seconds"]
 
 
-async def _worker_loop() -> None:
-    """
-    Continuously poll the database for queued export jobs and process them.
-    Runs as a long-lived asyncio task started on app startup.
+@public_router.post("/plan")
+async def plan_compose_job(
+    request: Request,
+    supabase=Depends(db_admin),
+):
     """
-    logger.info("Compose worker started")
+    Dry run of a composition: how it would be rendered and what it would
+    cost, without queueing anything.
 
-    # Short initial delay to let the app finish startup
-    await asyncio.sleep(2)
+    Secured by x-api-key header.
 
-    # Recover any stale jobs from a previous crash
-    try:
-        supabase = get_db(admin_access=True)()
-        recovered = _recover_stale_jobs(supabase)
-        if recovered:
-            logger.info("Startup recovery: marked %d stale jobs as failed", recovered)
-    except Exception as exc:
-        logger.error("Startup recovery failed: %s", exc)
+    Request body (JSON):
+    {
+        "composition": { ... },
+        "outputs": [ ... ],   (optional, as on POST /api/v1/compose)
+        "probe": true         (optional: HEAD the media URLs for real sizes)
+    }
 
-    while True:
-        try:
-            supabase = get_db(admin_access=True)()
-            job_id = _claim_next_job(supabase)
+    Without `probe`, download sizes are estimated from clip durations.
 
-            if job_id:
-                logger.info("Worker processing job %s", job_id)
-                await _process_job(job_id)
-                # Immediately check for more jobs (no sleep)
-                continue
-            else:
-                # No jobs available, wait before polling again
-                await asyncio.sleep(WORKER_POLL_INTERVAL)
+    Returns:
+    {
+        "plan": {
+            "strategy": "single_pass" | "split_av" | "batched" | "smart_render"
+                      | "base_then_layers" | "renditions_single_pass"
+                      | "master_then_renditions",
+            "width": 1080, "height": 1920, "resolution_source": "composition",
+            "passes": [{"kind": "encode", "level": 0, "inputs": 5,
+                        "seconds": 42.5, "megapixels": 2.07}, ...],
+            "encode_work": 88.1,
+            "command": ["ffmpeg", ...]   (single-pass strategies only)
+            "audio_command": ["ffmpeg", ...]   (split_av: the audio track)
+            ...
+        },
+        "estimate": {
+            "download_bytes": ..., "download_seconds": ...,
+            "encode_seconds": ..., "upload_seconds": ...,
+            "output_bytes": ..., "total_seconds": ...
+        },
+        "model": {"source": "stage_timings", "samples": 214, ...},
+        "preflight": null   (findings, with `probe`)
+    }
+    """
+    _verify_api_key(request)
 
-        except asyncio.CancelledError:
-            logger.info("Compose worker shutting down")
-            break
-        except Exception as exc:
-            logger.error("Worker loop error: %s", exc)
-            await asyncio.sleep(WORKER_POLL_INTERVAL)
+    try:
+        body = await request.json()
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid JSON body",
+        )
 
+    composition = body.get("composition") if isinstance(body, dict) else None
+    if not composition or not isinstance(composition, dict):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="composition object is required",
+        )
 
-def start_worker() -> None:
-    """Start the background worker loop. Called from main.py on app startup."""
-    global _worker_task
-    if _worker_task is None or _worker_task.done():
-        _worker_task = asyncio.create_task(_worker_loop())
-        logger.info("Compose worker task created")
+    try:
+        timeline = _compile_timeline(composition)
+    except (AttributeError, KeyError, TypeError, ValueError) as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid composition: {exc}",
+        )
 
+    report = None
+    if body.get("probe"):
+        report = await preflight.check(_media_inputs({"timeline": timeline}))
 
-def stop_worker() -> None:
-    """Stop the background worker loop. Called from main.py on app shutdown."""
-    global _worker_task
-    if _worker_task and not _worker_task.done():
-        _worker_task.cancel()
-        logger.info("Compose worker task cancelled")
+    try:
+        plan, features = _plan_timeline_render(
+            timeline, body.get("outputs"), report.input_bytes if report else None,
+        )
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(exc),
+        )
 
+    model = await render_estimator.get_model(supabase)
+    return {
+        "plan": plan,
+        "estimate": render_estimator.estimate(features, model),
+        "model": model.to_dict(),
+        "preflight": report.record() if report else None,
+    }
 
-# ---------------------------------------------------------------------------
-# Endpoints
-# ---------------------------------------------------------------------------
 
-@public_router.post("")
-async def create_compose_job(
+@public_router.post("/batch")
+async def create_compose_batch(
     request: Request,
     supabase=Depends(db_admin),
 ):
     """
-    Start a new video composition / export job.
+    Queue many composition / export jobs in one call.
 
     Secured by x-api-key header (for Next.js backend calls).
-    Inserts a row with status='queued' — the background worker picks it up.
+    Every spec is validated before anything is queued (all or nothing) and
+    the rows are inserted in a single statement. Top-level fields other
+    than `jobs` are defaults for every spec (a spec's own value wins).
+    Admission control counts the whole batch per user (all lanes together):
+    429 when it does not fit now, 413 when a user has more jobs in it than
+    they may ever have outstanding.
 
     Request body (JSON):
     {
-        "user_id": "uuid",
-        "project_id": "uuid",
-        "composition": { ... }
+        "jobs": [ {same fields as POST /}, ... ],   (up to 100)
+        "user_id": "uuid", "priority": "batch",
+        "callback_url": "https://..."              (optional defaults)
     }
 
     Returns:
     {
-        "job_id": "uuid",
-        "status": "queued"
+        "batch_id": "uuid",
+        "jobs": [{"job_id": "uuid", "status": "queued", "priority": "batch"}, ...]
     }
+    Poll GET /batch/{batch_id} for the status of the whole group.
     """
     _verify_api_key(request)
 
@@ -1228,59 +3719,222 @@ async def create_compose_job(
             detail="Invalid JSON body",
         )
 
-    user_id = body.get("user_id")
-    if not user_id:
+    try:
+        specs = batch_job_specs(body)
+    except ValueError as exc:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="user_id is required",
+            detail=str(exc),
         )
 
-    composition = body.get("composition")
-    if not composition or not isinstance(composition, dict):
+    batch_id = str(uuid.uuid4())
+    now_iso = datetime.now(timezone.utc).isoformat()
+    rows: List[Dict[str, Any]] = []
+    errors: List[Dict[str, Any]] = []
+    for index, spec in enumerate(specs):
+        try:
+            rows.append({**_build_job_row(spec, now_iso), "batch_id": batch_id})
+        except ValueError as exc:
+            errors.append({"index": index, "error": str(exc)})
+    if errors:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="composition object is required",
+            detail={"message": "Invalid job specs, nothing was queued", "errors": errors},
         )
 
-    project_id = body.get("project_id")
-    job_id = str(uuid.uuid4())
-    now_iso = datetime.now(timezone.utc).isoformat()
+    # One check per user: the per-user limit counts every lane. The wait is
+    # checked against the most urgent lane the user's jobs are queued in.
+    counts: Dict[str, int] = {}
+    user_lanes: Dict[str, str] = {}
+    for row in rows:
+        user_id = row["user_id"]
+        counts[user_id] = counts.get(user_id, 0) + 1
+        lane = user_lanes.get(user_id)
+        if lane is None or PRIORITY_LANES.index(row["priority"]) < PRIORITY_LANES.index(lane):
+            user_lanes[user_id] = row["priority"]
+    for user_id, count in counts.items():
+        _admit(supabase, user_id, user_lanes[user_id], count)
+
+    rejected = await preflight.annotate_rows(rows, _media_inputs)
+    if rejected:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail={"message": "Job inputs failed preflight, nothing was queued", "errors": rejected},
+        )
+    await _annotate_estimates(supabase, rows)
 
     try:
-        row = {
-            "id": job_id,
-            "user_id": user_id,
-            "project_id": project_id,
-            "composition": composition,
-            "status": "queued",
-            "progress": 0,
-            "created_at": now_iso,
-            "updated_at": now_iso,
-        }
-        result = supabase.table("export_jobs").insert(row).execute()
-
-        if not result.data:
+        result = supabase.table("export_jobs").insert(rows).execute()
+        if len(result.data or []) != len(rows):
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to create export job record",
+                detail="Failed to create export job records",
             )
     except HTTPException:
         raise
     except Exception as exc:
-        logger.error("DB insert failed for compose job: %s", exc)
+        logger.error("DB insert failed for compose batch: %s", exc)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to create export job: {str(exc)}",
+            detail=f"Failed to create export jobs: {str(exc)}",
         )
 
-    logger.info("Queued compose job %s for user %s", job_id, user_id)
+    for row in rows:
+        job_events.publish(
+            "export_jobs", row["id"], "queued", user_id=row["user_id"],
+            status="queued", progress=0, progress_stage="queued",
+        )
+    logger.info("Queued compose batch %s: %d jobs", batch_id, len(rows))
 
     return {
-        "job_id": job_id,
-        "status": "queued",
+        "batch_id": batch_id,
+        "jobs": [
+            {"job_id": row["id"], "status": "queued", "priority": row["priority"]}
+            for row in rows
+        ],
+    }
+
+
+@public_router.get("/batch/{batch_id}")
+async def get_compose_batch(
+    batch_id: str,
+    request: Request,
+    supabase=Depends(db_admin),
+):
+    """
+    Status of a batch created by POST /batch: per-status counts, whether
+    every job has finished, and each job's progress and output.
+
+    Secured by x-api-key header (for Next.js backend calls).
+    """
+    _verify_api_key(request)
+
+    try:
+        summary = batch_status(supabase, "export_jobs", batch_id)
+    except Exception as exc:
+        logger.error("Failed to fetch compose batch %s: %s", batch_id, exc)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to get batch: {str(exc)}",
+        )
+    if summary is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Batch not found",
+        )
+    return summary
+
+
+@public_router.get("/worker/status")
+async def get_worker_status(request: Request):
+    """
+    Report this worker process: slots, running jobs, the FFmpeg CPU
+    allocation (threads per process, priority, core pinning), scratch
+    disk usage and object-storage latencies.
+
+    Secured by x-api-key header. Describes only the node that answers.
+    """
+    _verify_api_key(request)
+
+    return {
+        "node_id": NODE_ID,
+        "worker_id": WORKER_ID,
+        "compose_slots": [list(lanes) for lanes in WORKER_LANES],
+        "running_jobs": running_jobs(),
+        "cpu": cpu_budget.snapshot(),
+        "scratch": await asyncio.to_thread(scratch.usage),
+        "storage": storage.metrics(),
+        "events": job_events.stats(),
     }
 
 
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+@public_router.get("/events")
+async def stream_user_job_events(
+    user_id: str,
+    request: Request,
+    supabase=Depends(db_admin),
+):
+    """
+    Server-Sent Events stream of every compose and video job of `user_id`.
+
+    Secured by x-api-key header (for Next.js backend calls).
+    Starts with a "snapshot" event per queued/running job, then sends
+    queued/started/progress/completed/failed/cancelled/released events as
+    they happen. Replaces polling GET /{job_id} for job lists.
+    """
+    _verify_api_key(request)
+
+    return StreamingResponse(
+        job_events.sse(job_events.stream_user(supabase, user_id)),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+
+@public_router.get("/{job_id}/events")
+async def stream_compose_job_events(
+    job_id: str,
+    request: Request,
+    supabase=Depends(db_admin),
+):
+    """
+    Server-Sent Events stream of one composition / export job.
+
+    Secured by x-api-key header (for Next.js backend calls).
+    Starts with a "snapshot" event (the same fields as GET /{job_id}
+    progress) and closes after the terminal completed/failed/cancelled event.
+    """
+    _verify_api_key(request)
+
+    try:
+        initial = await job_events.snapshot(supabase, "export_jobs", job_id)
+    except Exception as exc:
+        logger.error("Failed to fetch compose job %s: %s", job_id, exc)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to get export job: {str(exc)}",
+        )
+    if initial is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Export job not found",
+        )
+
+    return StreamingResponse(
+        job_events.sse(job_events.stream_job(supabase, "export_jobs", job_id, initial)),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+
+@public_router.get("/{job_id}/webhooks")
+async def list_job_webhook_deliveries(
+    job_id: str,
+    request: Request,
+    supabase=Depends(db_admin),
+):
+    """
+    Webhook delivery log of a job (compose, video or YouTube ingest): one
+    entry per event with its status, attempts and last response.
+
+    Secured by x-api-key header (for Next.js backend calls).
+    """
+    _verify_api_key(request)
+
+    try:
+        deliveries = webhooks.list_deliveries(supabase, job_id)
+    except Exception as exc:
+        logger.error("Failed to list webhook deliveries for job %s: %s", job_id, exc)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to list webhook deliveries: {str(exc)}",
+        )
+    return {"job_id": job_id, "deliveries": deliveries}
+
+
 @public_router.get("/{job_id}")
 async def get_compose_job(
     job_id: str,
@@ -1291,27 +3945,36 @@ async def get_compose_job(
     Get the status of a composition / export job.
 
     Secured by x-api-key header (for Next.js backend calls).
+    `estimated_start_at` (queued jobs) and `eta` (estimated completion,
+    queued and processing jobs) come from the current queue load.
     """
     _verify_api_key(request)
 
     try:
-        result = supabase.table("export_jobs").select("*").eq("id", job_id).execute()
+        job = job_archive.find_job(supabase, "export_jobs", job_id)
 
-        if not result.data:
+        if job is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Export job not found",
             )
 
-        job = result.data[0]
-
+        eta = await asyncio.to_thread(admission.job_eta, supabase, job, WORKER_LANES)
         return {
             "job_id": job["id"],
             "status": job.get("status"),
+            "priority": job.get("priority"),
+            "attempts": job.get("attempts"),
             "progress": job.get("progress", 0),
             "progress_stage": job.get("progress_stage"),
             "output_url": job.get("output_url"),
+            "renditions": job.get("renditions"),
             "error": job.get("error"),
+            "input_bytes": job.get("input_bytes"),
+            "preflight": job.get("preflight"),
+            "timeline_hash": job.get("timeline_hash"),
+            "estimated_seconds": job.get("estimated_seconds"),
+            **eta,
             "duration_seconds": job.get("duration_seconds"),
             "file_size_bytes": job.get("file_size_bytes"),
             "processing_time_seconds": job.get("processing_time_seconds"),
@@ -1329,41 +3992,123 @@ async def get_compose_job(
         )
 
 
+@public_router.delete("/{job_id}")
+async def cancel_compose_job(
+    job_id: str,
+    request: Request,
+    supabase=Depends(db_admin),
+):
+    """
+    Cancel a queued or running composition / export job.
+
+    Secured by x-api-key header (for Next.js backend calls).
+    Queued jobs are dropped before any worker claims them. Running jobs are
+    stopped by the worker that owns them (on whichever node): FFmpeg is
+    killed, temp files are cleaned up and the worker slot is released.
+
+    Returns:
+    {
+        "job_id": "uuid",
+        "status": "cancelled",
+        "previous_status": "processing"
+    }
+    """
+    _verify_api_key(request)
+
+    try:
+        outcome = cancel_job(supabase, "export_jobs", job_id)
+    except Exception as exc:
+        logger.error("Failed to cancel compose job %s: %s", job_id, exc)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to cancel export job: {str(exc)}",
+        )
+
+    if outcome is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Export job not found",
+        )
+    if not outcome["cancelled"]:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Export job is already {outcome['status']}",
+        )
+
+    return {
+        "job_id": job_id,
+        "status": outcome["status"],
+        "previous_status": outcome["previous_status"],
+    }
+
+
+@router.get("/my-jobs/events")
+async def stream_my_job_events(
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    supabase=Depends(db_admin),
+):
+    """
+    Server-Sent Events stream of the current user's compose and video jobs
+    (authenticated). Same events as GET /events.
+    """
+    return StreamingResponse(
+        job_events.sse(job_events.stream_user(supabase, current_user["id"])),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+
+MY_JOBS_COLUMNS = (
+    "id,user_id,project_id,status,progress,progress_stage,output_url,renditions,error,"
+    "duration_seconds,file_size_bytes,processing_time_seconds,created_at,completed_at,updated_at"
+)
+MY_JOBS_MAX_LIMIT = 100
+
+
 @router.get("/my-jobs")
 async def list_my_compose_jobs(
     limit: int = 20,
+    cursor: Optional[str] = None,
     offset: int = 0,
     status_filter: Optional[str] = None,
     current_user: Dict[str, Any] = Depends(get_current_user),
     supabase=Depends(db_admin),
 ):
     """
-    List the current user's export jobs (authenticated).
+    List the current user's export jobs (authenticated), newest first.
 
     Query params:
-      - limit (default 20)
-      - offset (default 0)
-      - status_filter: optional, one of queued/processing/completed/failed
+      - limit (default 20, max 100)
+      - cursor: `next_cursor` of the previous page (keyset pagination)
+      - offset: deprecated, only used without a cursor
+      - status_filter: optional, one of queued/processing/completed/failed/cancelled
+
+    Returns {"jobs", "count", "has_more", "next_cursor"}; has_more is exact.
+    Archived jobs (older than the retention window) are included, with
+    `archived_at`.
     """
+    limit = max(1, min(limit, MY_JOBS_MAX_LIMIT))
+    if status_filter not in ("queued", "processing", "completed", "failed", "cancelled"):
+        status_filter = None
     try:
-        query = (
-            supabase.table("export_jobs")
-            .select("id,user_id,project_id,status,progress,progress_stage,output_url,error,duration_seconds,file_size_bytes,processing_time_seconds,created_at,completed_at,updated_at")
-            .eq("user_id", current_user["id"])
+        # Jobs past the retention window are read back from job_archive
+        rows = await asyncio.to_thread(
+            job_archive.list_jobs, supabase, "export_jobs", current_user["id"], MY_JOBS_COLUMNS,
+            cursor, limit, offset, status_filter,
         )
-
-        if status_filter and status_filter in ("queued", "processing", "completed", "failed"):
-            query = query.eq("status", status_filter)
-
-        query = query.order("created_at", desc=True).range(offset, offset + limit - 1)
-        result = query.execute()
-
+        listing = pagination.page(rows, limit)
         return {
-            "jobs": result.data or [],
-            "count": len(result.data or []),
-            "has_more": len(result.data or []) == limit,
+            "jobs": listing["items"],
+            "count": listing["count"],
+            "has_more": listing["has_more"],
+            "next_cursor": listing["next_cursor"],
         }
 
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(exc),
+        )
     except Exception as exc:
         logger.error("Failed to list compose jobs for user %s: %s", current_user["id"], exc)
         raise HTTPException(
@@ -4,16 +4,16 @@ import uuid
 import os
 import json
 from datetime import datetime
-import boto3
-from botocore.exceptions import ClientError
 import aiofiles
 import tempfile
+import shutil
 from PIL import Image
 import io
 import subprocess
 import asyncio
 
 from app.dependencies.auth import get_current_user
+from app.services import pagination, storage
 from app.utils.database import get_db
 from app.utils.encryption import encrypt_token, decrypt_token
 
@@ -32,21 +32,7 @@ public_router = APIRouter(
 # Create database dependency with admin access
 db_admin = get_db(admin_access=True)
 
-# Cloudflare R2 Configuration
-R2_ENDPOINT_URL = os.getenv("R2_ENDPOINT_URL")
-R2_ACCESS_KEY_ID = os.getenv("R2_ACCESS_KEY_ID")
-R2_SECRET_ACCESS_KEY = os.getenv("R2_SECRET_ACCESS_KEY")
-R2_BUCKET_NAME = os.getenv("R2_BUCKET_NAME")
-CDN_DOMAIN = os.getenv("CDN_DOMAIN", "cdn.multivio.com")
-
-# Initialize R2 client
-r2_client = boto3.client(
-    's3',
-    endpoint_url=R2_ENDPOINT_URL,
-    aws_access_key_id=R2_ACCESS_KEY_ID,
-    aws_secret_access_key=R2_SECRET_ACCESS_KEY,
-    region_name='auto'  # Cloudflare R2 uses 'auto'
-)
+# Object storage (Cloudflare R2 by default) goes through app/services/storage.py
 
 def get_platform_compatibility(file_type: str) -> List[str]:
     """Get list of platforms that support this file type"""
@@ -98,33 +84,9 @@ def validate_file(file: UploadFile) -> Dict[str, Any]:
 async def upload_to_r2(file_content: bytes, key: str, content_type: str) -> str:
     """Upload file to Cloudflare R2"""
     try:
-        print(f"Uploading to R2: Bucket={R2_BUCKET_NAME}, Key={key}, ContentType={content_type}")
-        print(f"R2 Endpoint: {R2_ENDPOINT_URL}")
-        
-        response = r2_client.put_object(
-            Bucket=R2_BUCKET_NAME,
-            Key=key,
-            Body=file_content,
-            ContentType=content_type
-        )
-        
-        print(f"R2 Upload Response: {response}")
-        # For now, return the CDN URL but also log the R2 public URL for debugging
-        cdn_url = f"https://{CDN_DOMAIN}/{key}"
-        
-        # Also calculate R2 public URL for debugging
-        account_id = R2_ENDPOINT_URL.split('//')[1].split('.')[0] if R2_ENDPOINT_URL else ''
-        r2_public_url = f"https://{R2_BUCKET_NAME}.{account_id}.r2.cloudflarestorage.com/{key}"
-        
-        print(f"CDN URL: {cdn_url}")
-        print(f"R2 Public URL (alternative): {r2_public_url}")
-        print(f"R2 Dev URL (alternative): https://{R2_BUCKET_NAME}.r2.dev/{key}")
-        
-        # Return CDN URL since it's properly configured
-        return cdn_url
-    except ClientError as e:
+        return await storage.put_bytes(key, file_content, content_type)
+    except storage.StorageError as e:
         print(f"Error uploading to R2: {e}")
-        print(f"Error details: {e.response}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to upload file to storage"
@@ -448,19 +410,29 @@ async def get_media_status(
             detail=f"Failed to get media status: {str(e)}"
         )
 
+# Library listing columns (the grid also reads `metadata`: dimensions,
+# duration, processing details)
+LIBRARY_COLUMNS = (
+    "id,user_id,original_filename,file_type,file_size,r2_key,cdn_url,thumbnail_url,"
+    "processing_status,platform_compatibility,metadata,created_at,updated_at"
+)
+LIBRARY_MAX_LIMIT = 200
+
 @router.get("/library")
 async def get_media_library(
     limit: int = 50,
-    offset: int = 0,
+    cursor: Optional[str] = None,
+    offset: int = 0,  # deprecated, only used without a cursor
     file_type: Optional[str] = None,  # 'image' or 'video'
     current_user: Dict[str, Any] = Depends(get_current_user),
     supabase = Depends(db_admin)
 ):
-    """Get user's media library"""
+    """Get user's media library, newest first (pass next_cursor as cursor for the next page)"""
     
+    limit = max(1, min(limit, LIBRARY_MAX_LIMIT))
     try:
         # Build query
-        query = supabase.table("media_files").select("*").eq("user_id", current_user["id"])
+        query = supabase.table("media_files").select(LIBRARY_COLUMNS).eq("user_id", current_user["id"])
         
         # Filter by file type if specified
         if file_type == 'image':
@@ -468,17 +440,24 @@ async def get_media_library(
         elif file_type == 'video':
             query = query.like("file_type", "video/%")
         
-        # Apply pagination and ordering
-        query = query.order("created_at", desc=True).range(offset, offset + limit - 1)
+        # Apply keyset pagination and ordering
+        query = pagination.apply(query, cursor, limit, offset)
         
         result = query.execute()
         
+        listing = pagination.page(result.data, limit)
         return {
-            "media_files": result.data or [],
-            "count": len(result.data or []),
-            "has_more": len(result.data or []) == limit
+            "media_files": listing["items"],
+            "count": listing["count"],
+            "has_more": listing["has_more"],
+            "next_cursor": listing["next_cursor"]
         }
         
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         print(f"Error getting media library: {e}")
         raise HTTPException(
@@ -509,14 +488,13 @@ async def delete_media(
         # Delete from R2 storage
         try:
             # Delete main file
-            r2_client.delete_object(Bucket=R2_BUCKET_NAME, Key=media_file["r2_key"])
+            await storage.delete(media_file["r2_key"])
             
             # Delete thumbnail if exists
             if media_file.get("thumbnail_url"):
-                thumb_key = media_file["thumbnail_url"].replace(f"https://{CDN_DOMAIN}/", "")
-                r2_client.delete_object(Bucket=R2_BUCKET_NAME, Key=thumb_key)
+                await storage.delete(storage.key_from_url(media_file["thumbnail_url"]))
                 
-        except ClientError as e:
+        except storage.StorageError as e:
             print(f"Error deleting from R2: {e}")
             # Continue with database deletion even if R2 deletion fails
         
@@ -666,6 +644,8 @@ async def create_zip(
         - Max 50 files per request
         - Max 500MB total size
         - Temp files cleaned up after zip creation
+        - Files that cannot be read are left out (file_count says how many
+          made it); 404 if none could be read
     """
     # Verify API key
     if not INTERNAL_API_KEY:
@@ -737,50 +717,65 @@ async def create_zip(
         total_size = 0
         max_total_size = 500 * 1024 * 1024  # 500MB
 
+        file_count = 0
+        part_path = os.path.join(temp_dir, "part")
         with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
             for i, r2_key in enumerate(keys_list):
+                # Streamed chunk by chunk to a temp file first: the archive
+                # entry is only written once the whole object was read, so
+                # a failed download can't leave a truncated entry behind
+                part_size = 0
                 try:
-                    response = r2_client.get_object(
-                        Bucket=R2_BUCKET_NAME,
-                        Key=r2_key
-                    )
-                    file_content = response['Body'].read()
-                    total_size += len(file_content)
-
-                    if total_size > max_total_size:
-                        raise HTTPException(
-                            status_code=status.HTTP_400_BAD_REQUEST,
-                            detail="Total file size exceeds 500MB limit"
-                        )
-
-                    zf.writestr(unique_names[i], file_content)
-                except ClientError as e:
+                    async with aiofiles.open(part_path, 'wb') as part:
+                        async for chunk in storage.iter_object(r2_key):
+                            part_size += len(chunk)
+                            if total_size + part_size > max_total_size:
+                                raise HTTPException(
+                                    status_code=status.HTTP_400_BAD_REQUEST,
+                                    detail="Total file size exceeds 500MB limit"
+                                )
+                            await part.write(chunk)
+                except HTTPException:
+                    raise
+                except Exception as e:
+                    # Missing key, backend error or a stream cut mid-read
                     print(f"Failed to download R2 key {r2_key}: {e}")
                     # Skip files that fail to download
                     continue
+                await asyncio.to_thread(zf.write, part_path, unique_names[i])
+                total_size += part_size
+                file_count += 1
+
+        if os.path.exists(part_path):
+            os.unlink(part_path)
+        if file_count == 0:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="None of the requested files could be read"
+            )
 
         # Upload zip to R2
         zip_key = f"downloads/{zip_id}.zip"
-        with open(zip_path, 'rb') as zf:
-            zip_content = zf.read()
-
-        await upload_to_r2(zip_content, zip_key, "application/zip")
+        try:
+            await storage.put_file(zip_path, zip_key, "application/zip")
+        except storage.StorageError as e:
+            print(f"Error uploading zip to R2: {e}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to upload file to storage"
+            )
 
         # Generate presigned download URL (1 hour)
-        download_url = r2_client.generate_presigned_url(
-            'get_object',
-            Params={
-                'Bucket': R2_BUCKET_NAME,
-                'Key': zip_key,
-                'ResponseContentDisposition': 'attachment; filename="multivio-media.zip"',
-            },
-            ExpiresIn=3600,
+        download_url = storage.presigned_get_url(
+            zip_key,
+            expires_in=3600,
+            ResponseContentDisposition='attachment; filename="multivio-media.zip"',
         )
 
         return {
             "success": True,
             "download_url": download_url,
-            "file_count": len(keys_list),
+            "file_count": file_count,
             "total_size": total_size,
         }
 
@@ -795,10 +790,8 @@ async def create_zip(
     finally:
         # Clean up temp files
         try:
-            if zip_path and os.path.exists(zip_path):
-                os.unlink(zip_path)
             if temp_dir and os.path.exists(temp_dir):
-                os.rmdir(temp_dir)
+                shutil.rmtree(temp_dir, ignore_errors=True)
         except Exception:
             pass
 
@@ -3,27 +3,47 @@ Video Processing Router
 
 Endpoints for video-specific operations:
   - POST /api/v1/videos/slideshow — Create Ken Burns slideshow from images
+  - POST /api/v1/videos/batch — Queue many slideshow / subtitle jobs at once
+  - DELETE /api/v1/videos/jobs/{job_id} — Cancel a queued or running job
 
 Uses the same job queue pattern as compose.py: inserts a DB row with
 status='queued', background worker picks it up and processes via FFmpeg.
 """
 
 from fastapi import APIRouter, Depends, HTTPException, Request, status
-from typing import Any, Dict, List, Optional
+from fastapi.responses import StreamingResponse
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
 from datetime import datetime, timezone
 import asyncio
 import json
 import logging
 import os
-import shutil
-import tempfile
 import time
 import uuid
 
-import boto3
-from botocore.exceptions import ClientError
 import httpx
 
+from app.services import job_archive, job_events, preflight, scratch, storage, webhooks
+from app.services.ffmpeg_runner import run_ffmpeg
+from app.services.still_images import prescale_still
+from app.services.job_queue import (
+    DEFAULT_WORKER_LANES,
+    WORKER_ID,
+    batch_job_specs,
+    batch_status,
+    cancel_job,
+    checkpoint_is_local,
+    claim_next_job,
+    defer_job,
+    lease_reaper_loop,
+    load_checkpoint,
+    normalize_priority,
+    parse_worker_lanes,
+    run_claimed_job,
+    save_checkpoint,
+    should_keep_scratch,
+    stage_reached,
+)
 from app.utils.database import get_db
 
 # ---------------------------------------------------------------------------
@@ -41,29 +61,23 @@ public_router = APIRouter(
 )
 
 # ---------------------------------------------------------------------------
-# Database + R2 setup
+# Database setup (object storage: app/services/storage.py)
 # ---------------------------------------------------------------------------
 db_admin = get_db(admin_access=True)
 
-R2_ENDPOINT_URL = os.getenv("R2_ENDPOINT_URL")
-R2_ACCESS_KEY_ID = os.getenv("R2_ACCESS_KEY_ID")
-R2_SECRET_ACCESS_KEY = os.getenv("R2_SECRET_ACCESS_KEY")
-R2_BUCKET_NAME = os.getenv("R2_BUCKET_NAME")
-CDN_DOMAIN = os.getenv("CDN_DOMAIN", "cdn.multivio.com")
-
-r2_client = boto3.client(
-    "s3",
-    endpoint_url=R2_ENDPOINT_URL,
-    aws_access_key_id=R2_ACCESS_KEY_ID,
-    aws_secret_access_key=R2_SECRET_ACCESS_KEY,
-    region_name="auto",
-)
-
 INTERNAL_API_KEY = os.getenv("INTERNAL_API_KEY")
 
-# Worker config
+# Worker config — one slot per ";"-separated lane list (see compose.py)
 WORKER_POLL_INTERVAL = 5
-_worker_task: Optional[asyncio.Task] = None
+WORKER_LANES = parse_worker_lanes(os.getenv("VIDEO_WORKER_LANES", DEFAULT_WORKER_LANES))
+_worker_tasks: List[asyncio.Task] = []
+
+# Scratch-space estimates used for admission (see app/services/scratch.py)
+SLIDE_SCRATCH_BYTES = 8 * 1024 * 1024             # downloaded image + share of output
+SLIDESHOW_BASE_SCRATCH_BYTES = 64 * 1024 * 1024   # audio track + container overhead
+SUBTITLE_SCRATCH_BYTES = 1024 * 1024 * 1024       # source video + re-encoded copy
+YT_SCRATCH_BYTES_PER_SECOND = 512 * 1024          # <=720p download
+SCRATCH_RETRY_SECONDS = 60
 
 
 # ---------------------------------------------------------------------------
@@ -79,22 +93,22 @@ def _verify_api_key(request: Request) -> None:
 
 
 async def _download_file(url: str, dest: str) -> None:
+    # Written to .part and renamed, so a complete file left in a job's
+    # scratch dir by an earlier attempt can be reused as-is.
+    if os.path.exists(dest) and os.path.getsize(dest) > 0:
+        logger.info("Reusing downloaded %s", dest)
+        return
+    part = dest + ".part"
     async with httpx.AsyncClient(timeout=httpx.Timeout(120.0, connect=30.0)) as client:
         async with client.stream("GET", url) as resp:
             resp.raise_for_status()
-            with open(dest, "wb") as f:
+            with open(part, "wb") as f:
                 async for chunk in resp.aiter_bytes(chunk_size=256 * 1024):
                     f.write(chunk)
+    os.replace(part, dest)
     logger.info("Downloaded %s -> %s", url, dest)
 
 
-async def _upload_to_r2(data: bytes, key: str, content_type: str) -> str:
-    r2_client.put_object(Bucket=R2_BUCKET_NAME, Key=key, Body=data, ContentType=content_type)
-    cdn_url = f"https://{CDN_DOMAIN}/{key}"
-    logger.info("Uploaded to R2: %s (%d bytes)", cdn_url, len(data))
-    return cdn_url
-
-
 # ---------------------------------------------------------------------------
 # YouTube ingest (Distill source) — yt-dlp download -> R2  [ASYNC]
 #
@@ -120,12 +134,17 @@ class _YtTooLong(Exception):
 
 
 def _yt_set(job_id: str, fields: dict) -> None:
-    """Update a youtube_ingest_jobs row (best-effort, sync supabase client)."""
+    """Update a youtube_ingest_jobs row (best-effort, sync supabase client).
+    A final status also fires the job's completion webhook, if it has one."""
     try:
         fields = {**fields, "updated_at": datetime.now(timezone.utc).isoformat()}
-        db_admin().table("youtube_ingest_jobs").update(fields).eq("id", job_id).execute()
+        supabase = db_admin()
+        supabase.table("youtube_ingest_jobs").update(fields).eq("id", job_id).execute()
     except Exception as exc:  # noqa: BLE001
         logger.error("yt job %s update failed: %s", job_id, exc)
+        return
+    if fields.get("status") in webhooks.STATUS_EVENTS:
+        webhooks.notify_job(supabase, "youtube_ingest_jobs", job_id)
 
 
 async def _run_youtube_ingest(job_id: str, url: str, user_id: str, max_duration: int) -> None:
@@ -133,7 +152,14 @@ async def _run_youtube_ingest(job_id: str, url: str, user_id: str, max_duration:
     _yt_set(job_id, {"status": "processing"})
 
     import yt_dlp  # lazy import — a yt-dlp issue can't break module import
-    tmpdir = tempfile.mkdtemp(prefix="agdoc_yt_")
+    try:
+        tmpdir = await asyncio.to_thread(
+            scratch.allocate, "yt", job_id, max_duration * YT_SCRATCH_BYTES_PER_SECOND,
+        )
+    except scratch.ScratchSpaceError as e:
+        logger.error("YouTube ingest job %s: %s", job_id, e)
+        _yt_set(job_id, {"status": "failed", "error": "Server is low on disk space, please retry shortly"})
+        return
     out_tmpl = os.path.join(tmpdir, "src.%(ext)s")
     asset_id = str(uuid.uuid4())
 
@@ -165,11 +191,11 @@ async def _run_youtube_ingest(job_id: str, url: str, user_id: str, max_duration:
     try:
         info, duration = await asyncio.to_thread(_run)
     except _YtTooLong as e:
-        shutil.rmtree(tmpdir, ignore_errors=True)
+        scratch.release(tmpdir)
         _yt_set(job_id, {"status": "failed", "error": str(e)})
         return
     except Exception as e:  # noqa: BLE001
-        shutil.rmtree(tmpdir, ignore_errors=True)
+        scratch.release(tmpdir)
         msg = str(e)
         logger.error("yt-dlp ingest failed for %s: %s", url, msg)
         low = msg.lower()
@@ -187,28 +213,19 @@ async def _run_youtube_ingest(job_id: str, url: str, user_id: str, max_duration:
             produced = os.path.join(tmpdir, name)
             break
     if not produced or not os.path.exists(produced):
-        shutil.rmtree(tmpdir, ignore_errors=True)
+        scratch.release(tmpdir)
         _yt_set(job_id, {"status": "failed", "error": "Download produced no output file"})
         return
 
     key = f"{user_id}/distill/youtube-{asset_id}.mp4"
     try:
-        # boto3 upload_file ExtraArgs is keyword-only — wrap in a lambda so
-        # asyncio.to_thread can pass it.
-        await asyncio.to_thread(
-            lambda: r2_client.upload_file(
-                produced, R2_BUCKET_NAME, key,
-                ExtraArgs={"ContentType": "video/mp4"},
-            )
-        )
+        r2_url = await storage.put_file(produced, key, "video/mp4")
     except Exception as e:  # noqa: BLE001
-        shutil.rmtree(tmpdir, ignore_errors=True)
         _yt_set(job_id, {"status": "failed", "error": f"R2 upload failed: {str(e)[:200]}"})
         return
     finally:
-        shutil.rmtree(tmpdir, ignore_errors=True)
+        scratch.release(tmpdir)
 
-    r2_url = f"https://{CDN_DOMAIN}/{key}"
     logger.info("YouTube ingest job %s -> %s (%ds)", job_id, r2_url, duration)
     _yt_set(job_id, {
         "status": "completed",
@@ -223,7 +240,7 @@ async def _run_youtube_ingest(job_id: str, url: str, user_id: str, max_duration:
 async def youtube_ingest(request: Request, supabase=Depends(db_admin)):
     """Queue a YouTube download. Returns immediately with a job_id to poll.
 
-    Body: { url, user_id, max_duration_sec? }
+    Body: { url, user_id, max_duration_sec?, callback_url? }
     Returns: { job_id, status: 'queued' }
     """
     _verify_api_key(request)
@@ -236,6 +253,10 @@ async def youtube_ingest(request: Request, supabase=Depends(db_admin)):
 
     if not url or not user_id:
         raise HTTPException(status_code=400, detail="url and user_id are required")
+    try:
+        callback_url = webhooks.validate_callback_url(body.get("callback_url"))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
 
     job_id = str(uuid.uuid4())
     now_iso = datetime.now(timezone.utc).isoformat()
@@ -247,6 +268,7 @@ async def youtube_ingest(request: Request, supabase=Depends(db_admin)):
             "status": "queued",
             "created_at": now_iso,
             "updated_at": now_iso,
+            **({"callback_url": callback_url} if callback_url else {}),
         }).execute()
     except Exception as exc:  # noqa: BLE001
         logger.error("Failed to create yt ingest job: %s", exc)
@@ -262,10 +284,9 @@ async def youtube_ingest(request: Request, supabase=Depends(db_admin)):
 async def youtube_ingest_status(job_id: str, request: Request, supabase=Depends(db_admin)):
     """Poll a YouTube ingest job."""
     _verify_api_key(request)
-    result = supabase.table("youtube_ingest_jobs").select("*").eq("id", job_id).execute()
-    if not result.data:
+    job = job_archive.find_job(supabase, "youtube_ingest_jobs", job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Ingest job not found")
-    job = result.data[0]
     return {
         "job_id": job["id"],
         "status": job.get("status"),
@@ -315,19 +336,29 @@ def _build_slideshow_command(
         effect = slide.get("effect", "zoom_in")
         frames = int(duration * fps)
 
-        inputs.extend(["-loop", "1", "-t", str(duration), "-framerate", str(fps), "-i", local_path])
-
         # Apply Ken Burns effect
         zp_template = KEN_BURNS_EFFECTS.get(effect, KEN_BURNS_EFFECTS["zoom_in"])
         zp_filter = zp_template.format(frames=frames, w=width, h=height, fps=fps)
 
-        # Scale input to target, apply zoompan, ensure format
-        filter_parts.append(
-            f"[{i}:v]scale={width}:{height}:force_original_aspect_ratio=increase,"
-            f"crop={width}:{height},"
-            f"{zp_filter},"
-            f"setpts=PTS-STARTPTS,format=yuva420p[v{i}]"
-        )
+        still_path = slide.get("still_path")
+        if still_path:
+            # Pre-scaled canvas-sized frame (app/services/still_images.py):
+            # one input frame, zoompan generates all `frames` output frames.
+            inputs.extend(["-i", still_path])
+            filter_parts.append(
+                f"[{i}:v]{zp_filter},"
+                f"setpts=PTS-STARTPTS,format=yuva420p[v{i}]"
+            )
+        else:
+            inputs.extend(["-loop", "1", "-t", str(duration), "-framerate", str(fps), "-i", local_path])
+
+            # Scale input to target, apply zoompan, ensure format
+            filter_parts.append(
+                f"[{i}:v]scale={width}:{height}:force_original_aspect_ratio=increase,"
+                f"crop={width}:{height},"
+                f"{zp_filter},"
+                f"setpts=PTS-STARTPTS,format=yuva420p[v{i}]"
+            )
 
     # Apply crossfade transitions between consecutive slides
     if n == 1:
@@ -377,7 +408,6 @@ def _build_slideshow_command(
 
 async def _process_slideshow_job(job_id: str) -> None:
     supabase = None
-    temp_dir = None
     start_ts = time.monotonic()
 
     try:
@@ -402,99 +432,170 @@ async def _process_slideshow_job(job_id: str) -> None:
         if not slides_input or len(slides_input) < 2:
             raise ValueError("Need at least 2 slides")
 
-        # Download images
-        temp_dir = tempfile.mkdtemp(prefix="agdoc_slideshow_")
-        _update_job(supabase, job_id, 5, "downloading")
-
-        for i, slide in enumerate(slides_input):
-            url = slide["url"]
-            ext = ".jpg"
-            if "png" in url.lower():
-                ext = ".png"
-            elif "webp" in url.lower():
-                ext = ".webp"
-            local = os.path.join(temp_dir, f"slide_{i}{ext}")
-            await _download_file(url, local)
-            slide["local_path"] = local
-            _update_job(supabase, job_id, 5 + int(25 * (i + 1) / len(slides_input)), "downloading")
-
-        # Download audio if provided
-        audio_path = None
-        if audio_url:
-            audio_path = os.path.join(temp_dir, "audio.mp3")
-            await _download_file(audio_url, audio_path)
-
-        # Build + run FFmpeg
-        _update_job(supabase, job_id, 35, "rendering")
-        output_path = os.path.join(temp_dir, f"slideshow-{job_id}.mp4")
-
-        cmd = _build_slideshow_command(
-            slides_input, output_path, width, height, fps, transition_duration, audio_path
-        )
-        logger.info("Slideshow job %s: running ffmpeg with %d slides", job_id, len(slides_input))
-        logger.debug("FFmpeg cmd: %s", " ".join(cmd))
-
-        proc = await asyncio.create_subprocess_exec(
-            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
-        )
-        stdout, stderr = await proc.communicate()
-
-        if proc.returncode != 0:
-            err = stderr.decode(errors="replace")
-            logger.error("FFmpeg failed (rc=%d): %s", proc.returncode, err[-2000:])
-            raise RuntimeError(f"FFmpeg failed: {err[-500:]}")
+        async def render(temp_dir: str, output_path: str) -> None:
+            # Download images
+            _update_job(supabase, job_id, 5, "downloading")
+
+            for i, slide in enumerate(slides_input):
+                url = slide["url"]
+                ext = ".jpg"
+                if "png" in url.lower():
+                    ext = ".png"
+                elif "webp" in url.lower():
+                    ext = ".webp"
+                local = os.path.join(temp_dir, f"slide_{i}{ext}")
+                await _download_file(url, local)
+                slide["local_path"] = local
+                _update_job(supabase, job_id, 5 + int(25 * (i + 1) / len(slides_input)), "downloading")
+
+            # Decode + cover-crop each photo once (thread pool) instead of
+            # per output frame inside FFmpeg
+            stills = await asyncio.gather(*(
+                prescale_still(slide["local_path"], width, height, "cover") for slide in slides_input
+            ))
+            for slide, still in zip(slides_input, stills):
+                if still:
+                    slide["still_path"] = still
+
+            # Download audio if provided
+            audio_path = None
+            if audio_url:
+                audio_path = os.path.join(temp_dir, "audio.mp3")
+                await _download_file(audio_url, audio_path)
+            save_checkpoint(supabase, "video_jobs", job_id, "downloaded", scratch_dir=temp_dir)
+
+            # Build + run FFmpeg
+            _update_job(supabase, job_id, 35, "rendering")
+            cmd = _build_slideshow_command(
+                slides_input, output_path, width, height, fps, transition_duration, audio_path
+            )
+            logger.info("Slideshow job %s: running ffmpeg with %d slides", job_id, len(slides_input))
+            logger.debug("FFmpeg cmd: %s", " ".join(cmd))
 
-        # Upload to R2
-        _update_job(supabase, job_id, 80, "uploading")
-        r2_key = f"{user_id}/generated/videos/slideshow-{job_id}.mp4"
-        with open(output_path, "rb") as f:
-            content = f.read()
-        output_url = await _upload_to_r2(content, r2_key, "video/mp4")
+            await run_ffmpeg(
+                cmd, os.path.join(temp_dir, f"ffmpeg-{job_id}.log"), label=f"Slideshow job {job_id}",
+            )
 
-        # Get duration
-        duration = await _get_duration(output_path)
+        output_url, file_size_bytes, duration = await _render_and_upload(
+            supabase, job, "slideshow",
+            len(slides_input) * SLIDE_SCRATCH_BYTES + SLIDESHOW_BASE_SCRATCH_BYTES,
+            f"slideshow-{job_id}.mp4",
+            f"{user_id}/generated/videos/slideshow-{job_id}.mp4",
+            render,
+        )
 
         # Mark completed
         elapsed = time.monotonic() - start_ts
         now_iso = datetime.now(timezone.utc).isoformat()
-        supabase.table("video_jobs").update({
+        finalized = supabase.table("video_jobs").update({
             "status": "completed",
             "progress": 100,
             "output_url": output_url,
             "download_url": output_url,
             "duration_seconds": duration,
-            "file_size_bytes": len(content),
+            "file_size_bytes": file_size_bytes,
             "processing_time_seconds": round(elapsed, 2),
             "completed_at": now_iso,
             "updated_at": now_iso,
-        }).eq("id", job_id).execute()
+        }).eq("id", job_id).eq("status", "processing").eq("worker_id", WORKER_ID).execute()
+        if not finalized.data:
+            # Lease lost (reclaimed by another worker) or cancelled meanwhile
+            logger.warning("Slideshow job %s: no longer owned by this worker, result discarded", job_id)
+            return
+        job_events.publish(
+            "video_jobs", job_id, "completed",
+            status="completed", progress=100, progress_stage="completed", output_url=output_url,
+        )
+        if job.get("callback_url"):
+            webhooks.notify_job(supabase, "video_jobs", job_id)
 
         logger.info("Slideshow job %s: completed in %.1fs → %s", job_id, elapsed, output_url)
 
+    except scratch.ScratchSpaceError as exc:
+        defer_job("video_jobs", job_id, SCRATCH_RETRY_SECONDS, str(exc))
     except Exception as exc:
         logger.exception("Slideshow job %s failed: %s", job_id, exc)
         if supabase:
             now_iso = datetime.now(timezone.utc).isoformat()
             try:
-                supabase.table("video_jobs").update({
+                failed = supabase.table("video_jobs").update({
                     "status": "failed",
                     "error": str(exc)[:2000],
                     "completed_at": now_iso,
                     "updated_at": now_iso,
-                }).eq("id", job_id).execute()
+                }).eq("id", job_id).eq("status", "processing").eq("worker_id", WORKER_ID).execute()
+                if failed.data:
+                    webhooks.notify_job(supabase, "video_jobs", job_id)
             except Exception:
                 pass
+        if job_events.is_local("video_jobs", job_id):
+            job_events.publish(
+                "video_jobs", job_id, "failed",
+                status="failed", progress_stage="failed", error=str(exc)[:2000],
+            )
+
+
+async def _render_and_upload(
+    supabase,
+    job: Dict[str, Any],
+    kind: str,
+    estimated_bytes: int,
+    output_name: str,
+    r2_key: str,
+    render: Callable[[str, str], Awaitable[None]],
+) -> Tuple[str, Optional[int], Optional[float]]:
+    """
+    Run the render + upload stages of a video job, resuming from its
+    checkpoint. `render(temp_dir, output_path)` downloads the inputs and
+    runs FFmpeg; it is skipped when this node already rendered the output,
+    and the upload is skipped when the output already reached R2 (from any
+    node). Returns (output_url, file_size_bytes, duration).
+
+    Scratch space is admitted against `estimated_bytes` (ScratchSpaceError
+    when the node is short on disk) and released afterwards, unless the job
+    was handed back and a retry here can reuse it.
+    """
+    job_id = job["id"]
+    checkpoint = load_checkpoint(job)
+
+    if stage_reached(checkpoint, "uploaded") and checkpoint.get("output_url"):
+        logger.info("Video job %s: resuming from 'uploaded' checkpoint", job_id)
+        return (
+            checkpoint["output_url"],
+            checkpoint.get("file_size_bytes"),
+            checkpoint.get("duration_seconds"),
+        )
+
+    temp_dir = await asyncio.to_thread(scratch.allocate, kind, job_id, estimated_bytes)
+    try:
+        output_path = os.path.join(temp_dir, output_name)
+        if (
+            stage_reached(checkpoint, "rendered")
+            and checkpoint_is_local(checkpoint, temp_dir)
+            and os.path.exists(output_path)
+        ):
+            logger.info("Video job %s: resuming from 'rendered' checkpoint, skipping render", job_id)
+            duration = checkpoint.get("duration_seconds")
+        else:
+            await render(temp_dir, output_path)
+            duration = await _get_duration(output_path)
+            save_checkpoint(
+                supabase, "video_jobs", job_id, "rendered",
+                scratch_dir=temp_dir, output_path=output_path, duration_seconds=duration,
+            )
+
+        # Upload to R2
+        _update_job(supabase, job_id, 80, "uploading")
+        file_size = os.path.getsize(output_path)
+        output_url = await storage.put_file(output_path, r2_key, "video/mp4")
+        save_checkpoint(
+            supabase, "video_jobs", job_id, "uploaded",
+            output_url=output_url, output_r2_key=r2_key,
+            file_size_bytes=file_size, duration_seconds=duration,
+        )
+        return output_url, file_size, duration
     finally:
-        if temp_dir:
-            try:
-                for f in os.listdir(temp_dir):
-                    try:
-                        os.unlink(os.path.join(temp_dir, f))
-                    except OSError:
-                        pass
-                os.rmdir(temp_dir)
-            except Exception:
-                pass
+        scratch.release(temp_dir, keep=should_keep_scratch("video_jobs", job_id))
 
 
 async def _get_duration(path: str) -> Optional[float]:
@@ -513,6 +614,10 @@ async def _get_duration(path: str) -> Optional[float]:
 
 
 def _update_job(supabase, job_id: str, progress: int, stage: str):
+    job_events.publish(
+        "video_jobs", job_id, "progress",
+        status="processing", progress=progress, progress_stage=stage,
+    )
     try:
         supabase.table("video_jobs").update({
             "progress": progress,
@@ -527,73 +632,55 @@ def _update_job(supabase, job_id: str, progress: int, stage: str):
 # Worker loop (same pattern as compose.py)
 # ---------------------------------------------------------------------------
 
-async def _worker_loop() -> None:
-    logger.info("Video worker started")
+async def _worker_loop(slot: int = 0, lanes: Sequence[str] = ()) -> None:
+    logger.info("Video worker slot %d started (lanes=%s)", slot, ",".join(lanes))
     await asyncio.sleep(3)
 
     while True:
         try:
             supabase = get_db(admin_access=True)()
 
-            # Claim oldest queued video_job
-            result = (
-                supabase.table("video_jobs")
-                .select("id,job_type")
-                .eq("status", "queued")
-                .order("created_at")
-                .limit(1)
-                .execute()
-            )
+            # Claim the next video_job from this slot's lanes
+            # (lane priority, then weighted fair share across users)
+            job = claim_next_job(supabase, "video_jobs", lanes)
 
-            if result.data:
-                job = result.data[0]
+            if job:
                 job_id = job["id"]
-                job_type = job.get("job_type", "slideshow")
-
-                # Claim it
-                claim = (
-                    supabase.table("video_jobs")
-                    .update({
-                        "status": "processing",
-                        "progress": 0,
-                        "updated_at": datetime.now(timezone.utc).isoformat(),
-                    })
-                    .eq("id", job_id)
-                    .eq("status", "queued")
-                    .execute()
-                )
-
-                if claim.data:
-                    logger.info("Claimed video job %s (type=%s)", job_id, job_type)
-                    if job_type == "slideshow":
-                        await _process_slideshow_job(job_id)
-                    elif job_type == "subtitle_burn":
-                        await _process_subtitle_job(job_id)
-                    else:
-                        logger.warning("Unknown job type: %s", job_type)
-                    continue
+                job_type = job.get("job_type") or "slideshow"
+                logger.info("Slot %d claimed video job %s (type=%s)", slot, job_id, job_type)
+                processor = _JOB_PROCESSORS.get(job_type)
+                if processor:
+                    # Runs as its own task so a cancel (from any node) can stop it
+                    await run_claimed_job("video_jobs", job_id, processor(job_id))
+                else:
+                    logger.warning("Unknown job type: %s", job_type)
+                continue
 
             await asyncio.sleep(WORKER_POLL_INTERVAL)
 
         except asyncio.CancelledError:
-            logger.info("Video worker shutting down")
+            logger.info("Video worker slot %d shutting down", slot)
             break
         except Exception as exc:
-            logger.error("Video worker error: %s", exc)
+            logger.error("Video worker error (slot %d): %s", slot, exc)
             await asyncio.sleep(WORKER_POLL_INTERVAL)
 
 
 def start_worker() -> None:
-    global _worker_task
-    if _worker_task is None or _worker_task.done():
-        _worker_task = asyncio.create_task(_worker_loop())
-        logger.info("Video worker task created")
+    global _worker_tasks
+    _worker_tasks = [t for t in _worker_tasks if not t.done()]
+    if _worker_tasks:
+        return
+    for slot, lanes in enumerate(WORKER_LANES):
+        _worker_tasks.append(asyncio.create_task(_worker_loop(slot, lanes)))
+    _worker_tasks.append(asyncio.create_task(lease_reaper_loop("video_jobs")))
+    logger.info("Video worker tasks created: %d slots", len(WORKER_LANES))
 
 
 def stop_worker() -> None:
-    global _worker_task
-    if _worker_task and not _worker_task.done():
-        _worker_task.cancel()
+    for task in _worker_tasks:
+        if not task.done():
+            task.cancel()
 
 
 # ---------------------------------------------------------------------------
@@ -602,7 +689,6 @@ def stop_worker() -> None:
 
 async def _process_subtitle_job(job_id: str) -> None:
     supabase = None
-    temp_dir = None
     start_ts = time.monotonic()
 
     try:
@@ -622,136 +708,266 @@ async def _process_subtitle_job(job_id: str) -> None:
         if not video_url or not srt_content:
             raise ValueError("video_url and srt_content required")
 
-        temp_dir = tempfile.mkdtemp(prefix="agdoc_subtitle_")
-        _update_job(supabase, job_id, 5, "downloading")
-
-        # Download video
-        video_path = os.path.join(temp_dir, "input.mp4")
-        await _download_file(video_url, video_path)
-
-        # Write subtitle file (SRT or ASS)
-        is_ass = subtitle_format == "ass"
-        sub_ext = "ass" if is_ass else "srt"
-        sub_path = os.path.join(temp_dir, f"subs.{sub_ext}")
-        with open(sub_path, "w", encoding="utf-8") as f:
-            f.write(srt_content)
-
-        _update_job(supabase, job_id, 30, "rendering")
-
-        output_path = os.path.join(temp_dir, f"subtitled-{job_id}.mp4")
-
-        if is_ass:
-            # ASS file already contains full styling + karaoke tags
-            # Use ass filter directly (no force_style override)
-            cmd = [
-                "ffmpeg", "-y",
-                "-i", video_path,
-                "-vf", f"ass={sub_path}",
-                "-c:v", "libx264", "-preset", "medium", "-crf", "23",
-                "-c:a", "copy",
-                "-pix_fmt", "yuv420p",
-                "-movflags", "+faststart",
-                output_path,
-            ]
-        else:
-            # SRT mode: build FFmpeg subtitle filter with force_style
-            # Use Noto Sans CJK for full Unicode/CJK support (installed in Dockerfile)
-            font_family = style.get("font_family", "Noto Sans CJK SC")
-            font_size = style.get("font_size", 24)
-            font_color = style.get("font_color", "&HFFFFFF")
-            outline_color = style.get("outline_color", "&H000000")
-            outline_width = style.get("outline_width", 2)
-            bold = 1 if style.get("bold", False) else 0
-            margin_v = style.get("margin_bottom", 40)
-
-            force_style = (
-                f"FontName={font_family},"
-                f"FontSize={font_size},"
-                f"PrimaryColour={font_color},"
-                f"OutlineColour={outline_color},"
-                f"Outline={outline_width},"
-                f"Bold={bold},"
-                f"MarginV={margin_v},"
-                f"Alignment=2"
+        async def render(temp_dir: str, output_path: str) -> None:
+            _update_job(supabase, job_id, 5, "downloading")
+
+            # Download video
+            video_path = os.path.join(temp_dir, "input.mp4")
+            await _download_file(video_url, video_path)
+
+            # Write subtitle file (SRT or ASS)
+            is_ass = subtitle_format == "ass"
+            sub_ext = "ass" if is_ass else "srt"
+            sub_path = os.path.join(temp_dir, f"subs.{sub_ext}")
+            with open(sub_path, "w", encoding="utf-8") as f:
+                f.write(srt_content)
+            save_checkpoint(supabase, "video_jobs", job_id, "downloaded", scratch_dir=temp_dir)
+
+            _update_job(supabase, job_id, 30, "rendering")
+
+            if is_ass:
+                # ASS file already contains full styling + karaoke tags
+                # Use ass filter directly (no force_style override)
+                cmd = [
+                    "ffmpeg", "-y",
+                    "-i", video_path,
+                    "-vf", f"ass={sub_path}",
+                    "-c:v", "libx264", "-preset", "medium", "-crf", "23",
+                    "-c:a", "copy",
+                    "-pix_fmt", "yuv420p",
+                    "-movflags", "+faststart",
+                    output_path,
+                ]
+            else:
+                # SRT mode: build FFmpeg subtitle filter with force_style
+                # Use Noto Sans CJK for full Unicode/CJK support (installed in Dockerfile)
+                font_family = style.get("font_family", "Noto Sans CJK SC")
+                font_size = style.get("font_size", 24)
+                font_color = style.get("font_color", "&HFFFFFF")
+                outline_color = style.get("outline_color", "&H000000")
+                outline_width = style.get("outline_width", 2)
+                bold = 1 if style.get("bold", False) else 0
+                margin_v = style.get("margin_bottom", 40)
+
+                force_style = (
+                    f"FontName={font_family},"
+                    f"FontSize={font_size},"
+                    f"PrimaryColour={font_color},"
+                    f"OutlineColour={outline_color},"
+                    f"Outline={outline_width},"
+                    f"Bold={bold},"
+                    f"MarginV={margin_v},"
+                    f"Alignment=2"
+                )
+
+                cmd = [
+                    "ffmpeg", "-y",
+                    "-i", video_path,
+                    "-vf", f"subtitles={sub_path}:force_style='{force_style}'",
+                    "-c:v", "libx264", "-preset", "medium", "-crf", "23",
+                    "-c:a", "copy",
+                    "-pix_fmt", "yuv420p",
+                    "-movflags", "+faststart",
+                    output_path,
+                ]
+
+            logger.info("Subtitle job %s: running ffmpeg", job_id)
+            await run_ffmpeg(
+                cmd, os.path.join(temp_dir, f"ffmpeg-{job_id}.log"), label=f"Subtitle job {job_id}",
             )
 
-            cmd = [
-                "ffmpeg", "-y",
-                "-i", video_path,
-                "-vf", f"subtitles={sub_path}:force_style='{force_style}'",
-                "-c:v", "libx264", "-preset", "medium", "-crf", "23",
-                "-c:a", "copy",
-                "-pix_fmt", "yuv420p",
-                "-movflags", "+faststart",
-                output_path,
-            ]
-
-        logger.info("Subtitle job %s: running ffmpeg", job_id)
-        proc = await asyncio.create_subprocess_exec(
-            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+        output_url, file_size_bytes, duration = await _render_and_upload(
+            supabase, job, "subtitle", SUBTITLE_SCRATCH_BYTES,
+            f"subtitled-{job_id}.mp4",
+            f"{user_id}/generated/videos/subtitled-{job_id}.mp4",
+            render,
         )
-        stdout, stderr = await proc.communicate()
-
-        if proc.returncode != 0:
-            err = stderr.decode(errors="replace")
-            logger.error("FFmpeg subtitle failed (rc=%d): %s", proc.returncode, err[-1000:])
-            raise RuntimeError(f"FFmpeg failed: {err[-300:]}")
-
-        # Upload to R2
-        _update_job(supabase, job_id, 80, "uploading")
-        r2_key = f"{user_id}/generated/videos/subtitled-{job_id}.mp4"
-        with open(output_path, "rb") as f:
-            content = f.read()
-        output_url = await _upload_to_r2(content, r2_key, "video/mp4")
-
-        duration = await _get_duration(output_path)
 
         elapsed = time.monotonic() - start_ts
         now_iso = datetime.now(timezone.utc).isoformat()
-        supabase.table("video_jobs").update({
+        finalized = supabase.table("video_jobs").update({
             "status": "completed",
             "progress": 100,
             "output_url": output_url,
             "download_url": output_url,
             "duration_seconds": duration,
-            "file_size_bytes": len(content),
+            "file_size_bytes": file_size_bytes,
             "processing_time_seconds": round(elapsed, 2),
             "completed_at": now_iso,
             "updated_at": now_iso,
-        }).eq("id", job_id).execute()
+        }).eq("id", job_id).eq("status", "processing").eq("worker_id", WORKER_ID).execute()
+        if not finalized.data:
+            # Lease lost (reclaimed by another worker) or cancelled meanwhile
+            logger.warning("Subtitle job %s: no longer owned by this worker, result discarded", job_id)
+            return
+        job_events.publish(
+            "video_jobs", job_id, "completed",
+            status="completed", progress=100, progress_stage="completed", output_url=output_url,
+        )
+        if job.get("callback_url"):
+            webhooks.notify_job(supabase, "video_jobs", job_id)
 
         logger.info("Subtitle job %s: completed in %.1fs → %s", job_id, elapsed, output_url)
 
+    except scratch.ScratchSpaceError as exc:
+        defer_job("video_jobs", job_id, SCRATCH_RETRY_SECONDS, str(exc))
     except Exception as exc:
         logger.exception("Subtitle job %s failed: %s", job_id, exc)
         if supabase:
             now_iso = datetime.now(timezone.utc).isoformat()
             try:
-                supabase.table("video_jobs").update({
+                failed = supabase.table("video_jobs").update({
                     "status": "failed",
                     "error": str(exc)[:2000],
                     "completed_at": now_iso,
                     "updated_at": now_iso,
-                }).eq("id", job_id).execute()
-            except Exception:
-                pass
-    finally:
-        if temp_dir:
-            try:
-                for f in os.listdir(temp_dir):
-                    try:
-                        os.unlink(os.path.join(temp_dir, f))
-                    except OSError:
-                        pass
-                os.rmdir(temp_dir)
+                }).eq("id", job_id).eq("status", "processing").eq("worker_id", WORKER_ID).execute()
+                if failed.data:
+                    webhooks.notify_job(supabase, "video_jobs", job_id)
             except Exception:
                 pass
+        if job_events.is_local("video_jobs", job_id):
+            job_events.publish(
+                "video_jobs", job_id, "failed",
+                status="failed", progress_stage="failed", error=str(exc)[:2000],
+            )
+
+
+# job_type -> processing coroutine, used by the worker loop
+_JOB_PROCESSORS = {
+    "slideshow": _process_slideshow_job,
+    "subtitle_burn": _process_subtitle_job,
+}
 
 
 # ---------------------------------------------------------------------------
 # Endpoints
 # ---------------------------------------------------------------------------
 
+def _hex_to_ass(hex_color: str) -> str:
+    """Convert a hex color to ASS format (&HBBGGRR)."""
+    hex_color = hex_color.lstrip("#")
+    if len(hex_color) == 6:
+        r, g, b = hex_color[0:2], hex_color[2:4], hex_color[4:6]
+        return f"&H00{b}{g}{r}"
+    return "&H00FFFFFF"
+
+
+def _new_job_row(body: Dict[str, Any], job_type: str, params: Dict[str, Any], now_iso: str) -> Dict[str, Any]:
+    """video_jobs row for a validated spec (raises ValueError on bad priority / callback)."""
+    priority = normalize_priority(body.get("priority"))
+    callback_url = webhooks.validate_callback_url(body.get("callback_url"))
+    row = {
+        "id": str(uuid.uuid4()),
+        "user_id": body.get("user_id", "anonymous"),
+        "job_type": job_type,
+        "status": "queued",
+        "progress": 0,
+        "priority": priority,
+        "params": params,
+        "created_at": now_iso,
+        "updated_at": now_iso,
+    }
+    if callback_url:
+        row["callback_url"] = callback_url
+    return row
+
+
+def _subtitle_job_row(body: Dict[str, Any], now_iso: str) -> Dict[str, Any]:
+    """Validate a subtitle burn spec and build its row (raises ValueError)."""
+    video_url = body.get("video_url")
+    srt_content = body.get("subtitle_content")
+    if not video_url or not srt_content:
+        raise ValueError("video_url and subtitle_content required")
+
+    style = {
+        "font_family": body.get("font_family", "Arial"),
+        "font_size": body.get("font_size", 24),
+        "font_color": _hex_to_ass(body.get("font_color", "#FFFFFF")),
+        "outline_color": _hex_to_ass(body.get("outline_color", "#000000")),
+        "outline_width": body.get("outline_width", 2),
+        "bold": body.get("bold", False),
+        "margin_bottom": body.get("margin_bottom", 40),
+    }
+    return _new_job_row(body, "subtitle_burn", {
+        "video_url": video_url,
+        "srt_content": srt_content,
+        "subtitle_format": body.get("subtitle_format", "srt"),
+        "style": style,
+    }, now_iso)
+
+
+def _slideshow_job_row(body: Dict[str, Any], now_iso: str) -> Dict[str, Any]:
+    """Validate a slideshow spec and build its row (raises ValueError)."""
+    slides = body.get("slides", [])
+    if not slides or len(slides) < 2:
+        raise ValueError("At least 2 slides required")
+    if len(slides) > 20:
+        raise ValueError("Maximum 20 slides")
+
+    for i, s in enumerate(slides):
+        if not s.get("url"):
+            raise ValueError(f"Slide {i} missing url")
+
+    transition = body.get("transition", {})
+    output = body.get("output", {})
+    return _new_job_row(body, "slideshow", {
+        "slides": slides,
+        "width": output.get("width", 1080),
+        "height": output.get("height", 1920),
+        "fps": output.get("fps", 30),
+        "transition_duration": transition.get("duration", 0.5),
+        "audio_url": body.get("audio_url"),
+    }, now_iso)
+
+
+# Batch spec "type" -> row builder
+_JOB_ROW_BUILDERS = {
+    "subtitle": _subtitle_job_row,
+    "slideshow": _slideshow_job_row,
+}
+
+
+def _video_inputs(row: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """(url, role) of every source a video_jobs row downloads."""
+    params = row["params"]
+    if row["job_type"] == "subtitle_burn":
+        return [(params["video_url"], "video")]
+    inputs = [(slide["url"], "image") for slide in params["slides"]]
+    if params.get("audio_url"):
+        inputs.append((params["audio_url"], "audio"))
+    return inputs
+
+
+async def _insert_jobs(supabase, rows: List[Dict[str, Any]], label: str) -> None:
+    """
+    Preflight video_jobs rows, insert them in one statement and announce
+    them (raises HTTPException; nothing is inserted if any input fails).
+    """
+    rejected = await preflight.annotate_rows(rows, _video_inputs)
+    if rejected:
+        raise HTTPException(status_code=422, detail={
+            "message": "Job inputs failed preflight, nothing was queued",
+            "errors": rejected if len(rows) > 1 else rejected[0]["errors"],
+        })
+
+    try:
+        result = supabase.table("video_jobs").insert(rows if len(rows) > 1 else rows[0]).execute()
+        if len(result.data or []) != len(rows):
+            raise HTTPException(status_code=500, detail="Failed to create job")
+    except HTTPException:
+        raise
+    except Exception as exc:
+        logger.error("DB insert failed for %s: %s", label, exc)
+        raise HTTPException(status_code=500, detail=str(exc))
+
+    for row in rows:
+        job_events.publish(
+            "video_jobs", row["id"], "queued", user_id=row["user_id"],
+            status="queued", progress=0, progress_stage="queued",
+        )
+
+
 @public_router.post("/subtitle")
 async def create_subtitle_burn(
     request: Request,
@@ -772,10 +988,12 @@ async def create_subtitle_burn(
         "outline_width": 2,
         "bold": false,
         "margin_bottom": 40,
-        "user_id": "uuid"
+        "user_id": "uuid",
+        "priority": "batch" (optional: interactive | standard | batch),
+        "callback_url": "https://..." (optional, POSTed on completion/failure)
     }
 
-    Returns: {"job_id": "uuid", "status": "queued"}
+    Returns: {"job_id": "uuid", "status": "queued", "priority": "standard"}
     """
     _verify_api_key(request)
 
@@ -784,63 +1002,14 @@ async def create_subtitle_burn(
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid JSON")
 
-    video_url = body.get("video_url")
-    srt_content = body.get("subtitle_content")
-    if not video_url or not srt_content:
-        raise HTTPException(status_code=400, detail="video_url and subtitle_content required")
-
-    user_id = body.get("user_id", "anonymous")
-
-    # Convert hex colors to ASS format (&HBBGGRR)
-    def hex_to_ass(hex_color: str) -> str:
-        hex_color = hex_color.lstrip("#")
-        if len(hex_color) == 6:
-            r, g, b = hex_color[0:2], hex_color[2:4], hex_color[4:6]
-            return f"&H00{b}{g}{r}"
-        return "&H00FFFFFF"
-
-    subtitle_format = body.get("subtitle_format", "srt")
-
-    style = {
-        "font_family": body.get("font_family", "Arial"),
-        "font_size": body.get("font_size", 24),
-        "font_color": hex_to_ass(body.get("font_color", "#FFFFFF")),
-        "outline_color": hex_to_ass(body.get("outline_color", "#000000")),
-        "outline_width": body.get("outline_width", 2),
-        "bold": body.get("bold", False),
-        "margin_bottom": body.get("margin_bottom", 40),
-    }
-
-    job_id = str(uuid.uuid4())
-    now_iso = datetime.now(timezone.utc).isoformat()
-
     try:
-        row = {
-            "id": job_id,
-            "user_id": user_id,
-            "job_type": "subtitle_burn",
-            "status": "queued",
-            "progress": 0,
-            "params": {
-                "video_url": video_url,
-                "srt_content": srt_content,
-                "subtitle_format": subtitle_format,
-                "style": style,
-            },
-            "created_at": now_iso,
-            "updated_at": now_iso,
-        }
-        result = supabase.table("video_jobs").insert(row).execute()
-        if not result.data:
-            raise HTTPException(status_code=500, detail="Failed to create job")
-    except HTTPException:
-        raise
-    except Exception as exc:
-        logger.error("DB insert failed for subtitle job: %s", exc)
-        raise HTTPException(status_code=500, detail=str(exc))
+        row = _subtitle_job_row(body, datetime.now(timezone.utc).isoformat())
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
 
-    logger.info("Queued subtitle job %s", job_id)
-    return {"job_id": job_id, "status": "queued"}
+    await _insert_jobs(supabase, [row], "subtitle job")
+    logger.info("Queued subtitle job %s (lane=%s)", row["id"], row["priority"])
+    return {"job_id": row["id"], "status": "queued", "priority": row["priority"]}
 
 
 @public_router.post("/slideshow")
@@ -860,10 +1029,12 @@ async def create_slideshow(
         "transition": {"type": "crossfade", "duration": 0.5},
         "audio_url": "https://..." (optional),
         "output": {"width": 1080, "height": 1920, "fps": 30},
-        "user_id": "uuid" (optional, for R2 path)
+        "user_id": "uuid" (optional, for R2 path),
+        "priority": "batch" (optional: interactive | standard | batch),
+        "callback_url": "https://..." (optional, POSTed on completion/failure)
     }
 
-    Returns: {"job_id": "uuid", "status": "queued"}
+    Returns: {"job_id": "uuid", "status": "queued", "priority": "standard"}
     """
     _verify_api_key(request)
 
@@ -872,53 +1043,100 @@ async def create_slideshow(
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid JSON")
 
-    slides = body.get("slides", [])
-    if not slides or len(slides) < 2:
-        raise HTTPException(status_code=400, detail="At least 2 slides required")
-    if len(slides) > 20:
-        raise HTTPException(status_code=400, detail="Maximum 20 slides")
+    try:
+        row = _slideshow_job_row(body, datetime.now(timezone.utc).isoformat())
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
 
-    for i, s in enumerate(slides):
-        if not s.get("url"):
-            raise HTTPException(status_code=400, detail=f"Slide {i} missing url")
+    await _insert_jobs(supabase, [row], "slideshow job")
+    logger.info(
+        "Queued slideshow job %s: %d slides (lane=%s)",
+        row["id"], len(row["params"]["slides"]), row["priority"],
+    )
+    return {"job_id": row["id"], "status": "queued", "priority": row["priority"]}
 
-    transition = body.get("transition", {})
-    output = body.get("output", {})
-    user_id = body.get("user_id", "anonymous")
-    audio_url = body.get("audio_url")
 
-    job_id = str(uuid.uuid4())
-    now_iso = datetime.now(timezone.utc).isoformat()
+@public_router.post("/batch")
+async def create_video_batch(
+    request: Request,
+    supabase=Depends(db_admin),
+):
+    """
+    Queue many slideshow / subtitle jobs in one call.
+
+    Every spec is validated before anything is queued (all or nothing) and
+    the rows are inserted in a single statement. Top-level fields other
+    than `jobs` are defaults for every spec.
+
+    Request body:
+    {
+        "jobs": [
+            {"type": "slideshow", ...same fields as POST /slideshow},
+            {"type": "subtitle", ...same fields as POST /subtitle}
+        ],                                          (up to 100)
+        "user_id": "uuid", "priority": "batch",
+        "callback_url": "https://..."              (optional defaults)
+    }
+
+    Returns: {"batch_id": "uuid", "jobs": [{"job_id", "type", "status", "priority"}, ...]}
+    Poll GET /batch/{batch_id} for the status of the whole group.
+    """
+    _verify_api_key(request)
 
     try:
-        row = {
-            "id": job_id,
-            "user_id": user_id,
-            "job_type": "slideshow",
-            "status": "queued",
-            "progress": 0,
-            "params": {
-                "slides": slides,
-                "width": output.get("width", 1080),
-                "height": output.get("height", 1920),
-                "fps": output.get("fps", 30),
-                "transition_duration": transition.get("duration", 0.5),
-                "audio_url": audio_url,
-            },
-            "created_at": now_iso,
-            "updated_at": now_iso,
-        }
-        result = supabase.table("video_jobs").insert(row).execute()
-        if not result.data:
-            raise HTTPException(status_code=500, detail="Failed to create job")
-    except HTTPException:
-        raise
-    except Exception as exc:
-        logger.error("DB insert failed for slideshow job: %s", exc)
-        raise HTTPException(status_code=500, detail=str(exc))
+        body = await request.json()
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid JSON")
 
-    logger.info("Queued slideshow job %s: %d slides", job_id, len(slides))
-    return {"job_id": job_id, "status": "queued"}
+    try:
+        specs = batch_job_specs(body)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    batch_id = str(uuid.uuid4())
+    now_iso = datetime.now(timezone.utc).isoformat()
+    rows: List[Dict[str, Any]] = []
+    errors: List[Dict[str, Any]] = []
+    for index, spec in enumerate(specs):
+        try:
+            if not isinstance(spec, dict):
+                raise ValueError("job spec must be an object")
+            builder = _JOB_ROW_BUILDERS.get(spec.get("type"))
+            if builder is None:
+                raise ValueError(f"type must be one of {', '.join(_JOB_ROW_BUILDERS)}")
+            rows.append({**builder(spec, now_iso), "batch_id": batch_id})
+        except ValueError as exc:
+            errors.append({"index": index, "error": str(exc)})
+    if errors:
+        raise HTTPException(
+            status_code=400,
+            detail={"message": "Invalid job specs, nothing was queued", "errors": errors},
+        )
+
+    await _insert_jobs(supabase, rows, "video batch")
+    logger.info("Queued video batch %s: %d jobs", batch_id, len(rows))
+    return {
+        "batch_id": batch_id,
+        "jobs": [
+            {"job_id": row["id"], "type": spec["type"], "status": "queued", "priority": row["priority"]}
+            for row, spec in zip(rows, specs)
+        ],
+    }
+
+
+@public_router.get("/batch/{batch_id}")
+async def get_video_batch(
+    batch_id: str,
+    request: Request,
+    supabase=Depends(db_admin),
+):
+    """Status of a batch created by POST /batch (counts, done, per-job progress)."""
+    _verify_api_key(request)
+
+    summary = batch_status(supabase, "video_jobs", batch_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return summary
 
 
 @public_router.get("/jobs/{job_id}")
@@ -930,21 +1148,82 @@ async def get_video_job(
     """Get status of a video processing job."""
     _verify_api_key(request)
 
-    result = supabase.table("video_jobs").select("*").eq("id", job_id).execute()
-    if not result.data:
+    job = job_archive.find_job(supabase, "video_jobs", job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
 
-    job = result.data[0]
     return {
         "job_id": job["id"],
         "status": job.get("status"),
+        "priority": job.get("priority"),
+        "attempts": job.get("attempts"),
         "progress": job.get("progress", 0),
         "progress_stage": job.get("progress_stage"),
         "output_url": job.get("output_url"),
         "download_url": job.get("download_url"),
         "error": job.get("error"),
+        "input_bytes": job.get("input_bytes"),
+        "preflight": job.get("preflight"),
         "duration_seconds": job.get("duration_seconds"),
         "file_size_bytes": job.get("file_size_bytes"),
         "created_at": job.get("created_at"),
         "completed_at": job.get("completed_at"),
     }
+
+
+@public_router.get("/jobs/{job_id}/events")
+async def stream_video_job_events(
+    job_id: str,
+    request: Request,
+    supabase=Depends(db_admin),
+):
+    """
+    Server-Sent Events stream of a video processing job: a "snapshot"
+    event, then progress until the terminal completed/failed/cancelled event.
+    """
+    _verify_api_key(request)
+
+    initial = await job_events.snapshot(supabase, "video_jobs", job_id)
+    if initial is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return StreamingResponse(
+        job_events.sse(job_events.stream_job(supabase, "video_jobs", job_id, initial)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@public_router.delete("/jobs/{job_id}")
+async def cancel_video_job(
+    job_id: str,
+    request: Request,
+    supabase=Depends(db_admin),
+):
+    """
+    Cancel a queued or running video processing job.
+
+    Queued jobs are dropped before a worker claims them; running jobs are
+    stopped by the owning worker on whichever node (FFmpeg killed, temp
+    files removed, slot released).
+
+    Returns: {"job_id": "uuid", "status": "cancelled", "previous_status": "queued"}
+    """
+    _verify_api_key(request)
+
+    try:
+        outcome = cancel_job(supabase, "video_jobs", job_id)
+    except Exception as exc:
+        logger.error("Failed to cancel video job %s: %s", job_id, exc)
+        raise HTTPException(status_code=500, detail=str(exc))
+
+    if outcome is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not outcome["cancelled"]:
+        raise HTTPException(status_code=409, detail=f"Job is already {outcome['status']}")
+
+    return {
+        "job_id": job_id,
+        "status": outcome["status"],
+        "previous_status": outcome["previous_status"],
+    }
@@ -0,0 +1,356 @@
+"""
+Admission control for the export queue.
+
+Submissions used to be accepted unconditionally: during a spike the queue
+grew without bound and users waited half an hour with no signal. Now each
+submission is checked against the current load first and refused with
+429 (Retry-After and the estimated start time) when the queue is over
+capacity, so the jobs that are accepted keep reasonable latency.
+
+Load is read in one round trip through the `export_queue_load` Postgres
+function (migration 018): per lane and status, the number of jobs and
+their outstanding work in seconds (each job's `estimated_seconds` from the
+render cost model; what is left of it for running jobs). Without the
+function, the queued/processing rows are scanned instead.
+
+A job is refused when:
+  - the queue already holds ADMISSION_MAX_QUEUED_JOBS queued jobs
+  - its user already has ADMISSION_MAX_USER_OUTSTANDING jobs queued or
+    running
+  - the estimated wait before it would start exceeds its lane's limit
+    (ADMISSION_MAX_WAIT_SECONDS)
+
+The estimated wait treats the queue as fluid: running work plus the queued
+work of its own and higher lanes, shared by the worker slots that serve
+its lane (ADMISSION_WORKER_NODES nodes with the local slot layout). Lane
+ordering and fair share make the real start time differ per tenant; the
+estimate is meant for backpressure and for the `eta` of job status, not as
+a promise.
+
+Load that cannot be read (database error) admits the job.
+
+Job status polls read the load for their ETA through a short-lived cache
+(ADMISSION_ETA_CACHE_SECONDS per queued job), so clients polling every few
+seconds do not each cost a queue-load round trip. Admission decisions
+always read fresh load: a user's own submissions of the last seconds must
+count toward their limit.
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import logging
+import math
+import os
+import threading
+import time
+
+from app.services.job_queue import PRIORITY_LANES
+
+logger = logging.getLogger("agdoc.admission")
+logger.setLevel(logging.INFO)
+
+# ---------------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------------
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1").lower() not in ("0", "false", "no")
+ADMISSION_MAX_QUEUED_JOBS = int(os.getenv("ADMISSION_MAX_QUEUED_JOBS", "1000"))
+ADMISSION_MAX_USER_OUTSTANDING = int(os.getenv("ADMISSION_MAX_USER_OUTSTANDING", "25"))
+# Longest acceptable wait before a job starts, per lane
+ADMISSION_MAX_WAIT_SECONDS: Dict[str, int] = {
+    "interactive": int(os.getenv("ADMISSION_MAX_WAIT_INTERACTIVE", "300")),
+    "standard": int(os.getenv("ADMISSION_MAX_WAIT_STANDARD", "1800")),
+    "batch": int(os.getenv("ADMISSION_MAX_WAIT_BATCH", "21600")),
+}
+# Nodes running compose workers with this node's slot layout
+ADMISSION_WORKER_NODES = max(1, int(os.getenv("ADMISSION_WORKER_NODES", "1")))
+# Work assumed for jobs without an estimate (submitted before migration 017)
+ADMISSION_DEFAULT_JOB_SECONDS = 120
+# Rows read by the fallback scan
+ADMISSION_SCAN_LIMIT = 5000
+# How long a job status ETA reuses the queue load it was computed from
+ADMISSION_ETA_CACHE_SECONDS = float(os.getenv("ADMISSION_ETA_CACHE_SECONDS", "10"))
+RETRY_AFTER_MIN_SECONDS = 5
+RETRY_AFTER_MAX_SECONDS = 3600
+
+_LOAD_COLUMNS = "priority,status,user_id,progress,estimated_seconds,created_at"
+
+
+@dataclass
+class LaneLoad:
+    queued: int = 0
+    queued_seconds: float = 0.0
+    processing: int = 0
+    remaining_seconds: float = 0.0
+    # Queued jobs of the lane created before the reference time (status ETA)
+    queued_before: int = 0
+    seconds_before: float = 0.0
+
+
+@dataclass
+class QueueLoad:
+    lanes: Dict[str, LaneLoad] = field(default_factory=lambda: {lane: LaneLoad() for lane in PRIORITY_LANES})
+    user_outstanding: int = 0
+
+    @property
+    def queued(self) -> int:
+        return sum(lane.queued for lane in self.lanes.values())
+
+    @property
+    def processing(self) -> int:
+        return sum(lane.processing for lane in self.lanes.values())
+
+    def mean_job_seconds(self) -> float:
+        jobs = self.queued + self.processing
+        work = sum(lane.queued_seconds + lane.remaining_seconds for lane in self.lanes.values())
+        return work / jobs if jobs else float(ADMISSION_DEFAULT_JOB_SECONDS)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "queued": self.queued,
+            "processing": self.processing,
+            "lanes": {
+                name: {
+                    "queued": lane.queued,
+                    "processing": lane.processing,
+                    "queued_seconds": round(lane.queued_seconds),
+                    "remaining_seconds": round(lane.remaining_seconds),
+                }
+                for name, lane in self.lanes.items()
+            },
+        }
+
+
+@dataclass
+class Admission:
+    accepted: bool
+    wait_seconds: float
+    estimated_start_at: str
+    reason: Optional[str] = None
+    message: Optional[str] = None
+    retry_after: Optional[int] = None
+
+
+# ---------------------------------------------------------------------------
+# Load
+# ---------------------------------------------------------------------------
+
+def _add(load: QueueLoad, lane: str, status: str, jobs: int, user_jobs: int,
+         seconds: float, jobs_before: int = 0, seconds_before: float = 0.0) -> None:
+    entry = load.lanes.setdefault(lane, LaneLoad())
+    if status == "processing":
+        entry.processing += jobs
+        entry.remaining_seconds += seconds
+    else:
+        entry.queued += jobs
+        entry.queued_seconds += seconds
+        entry.queued_before += jobs_before
+        entry.seconds_before += seconds_before
+    load.user_outstanding += user_jobs
+
+
+def _scan_load(supabase, user_id: Optional[str], before: Optional[str]) -> QueueLoad:
+    """Fallback: aggregate the queued / processing rows in Python."""
+    result = (
+        supabase.table("export_jobs").select(_LOAD_COLUMNS)
+        .in_("status", ["queued", "processing"])
+        .limit(ADMISSION_SCAN_LIMIT)
+        .execute()
+    )
+    load = QueueLoad()
+    before_ts = datetime.fromisoformat(before.replace("Z", "+00:00")) if before else None
+    for row in result.data or []:
+        estimate = float(row.get("estimated_seconds") or ADMISSION_DEFAULT_JOB_SECONDS)
+        is_before = False
+        if row.get("status") == "processing":
+            estimate *= (100 - min(int(row.get("progress") or 0), 99)) / 100.0
+        elif before_ts and row.get("created_at"):
+            created = datetime.fromisoformat(str(row["created_at"]).replace("Z", "+00:00"))
+            is_before = created < before_ts
+        _add(
+            load, row.get("priority") or "standard", row.get("status"), 1,
+            1 if user_id and row.get("user_id") == user_id else 0,
+            estimate, 1 if is_before else 0, estimate if is_before else 0.0,
+        )
+    return load
+
+
+def load(supabase, user_id: Optional[str] = None, before: Optional[str] = None) -> QueueLoad:
+    """
+    Current export queue load. `user_id` fills `user_outstanding`; `before`
+    (a created_at) fills the per-lane counts of queued jobs older than it.
+    """
+    try:
+        result = supabase.rpc("export_queue_load", {
+            "p_user_id": user_id,
+            "p_before": before,
+            "p_default_seconds": ADMISSION_DEFAULT_JOB_SECONDS,
+        }).execute()
+    except Exception as exc:
+        logger.warning("export_queue_load unavailable (%s) — scanning the queue", exc)
+        return _scan_load(supabase, user_id, before)
+
+    queue_load = QueueLoad()
+    for row in result.data or []:
+        _add(
+            queue_load, row.get("priority") or "standard", row.get("status"),
+            int(row.get("jobs") or 0), int(row.get("user_jobs") or 0),
+            float(row.get("work_seconds") or 0),
+            int(row.get("jobs_before") or 0), float(row.get("work_before") or 0),
+        )
+    return queue_load
+
+
+_eta_cache_lock = threading.Lock()
+# created_at of a queued job -> (expiry, load of the queue ahead of it)
+_eta_cache: Dict[Optional[str], Tuple[float, QueueLoad]] = {}
+
+
+def _load_before(supabase, before: Optional[str]) -> QueueLoad:
+    """load(before=...) cached for ADMISSION_ETA_CACHE_SECONDS."""
+    now = time.monotonic()
+    with _eta_cache_lock:
+        cached = _eta_cache.get(before)
+        if cached and cached[0] > now:
+            return cached[1]
+    queue_load = load(supabase, before=before)
+    with _eta_cache_lock:
+        for key in [k for k, (expires, _) in _eta_cache.items() if expires <= now]:
+            del _eta_cache[key]
+        _eta_cache[before] = (now + ADMISSION_ETA_CACHE_SECONDS, queue_load)
+    return queue_load
+
+
+# ---------------------------------------------------------------------------
+# Decisions
+# ---------------------------------------------------------------------------
+
+def lane_slots(lane: str, worker_lanes: Sequence[Tuple[str, ...]]) -> int:
+    """Worker slots across the deployment that claim from `lane`."""
+    return max(1, ADMISSION_WORKER_NODES * sum(1 for lanes in worker_lanes if lane in lanes))
+
+
+def wait_seconds(
+    queue_load: QueueLoad,
+    lane: str,
+    worker_lanes: Sequence[Tuple[str, ...]],
+    own_lane_before_only: bool = False,
+) -> float:
+    """
+    Estimated seconds until a job of `lane` starts: running work plus the
+    queued work of higher lanes and of its own (only the part queued before
+    it with `own_lane_before_only`), over the slots serving the lane.
+    """
+    rank = PRIORITY_LANES.index(lane) if lane in PRIORITY_LANES else len(PRIORITY_LANES)
+    work = sum(entry.remaining_seconds for entry in queue_load.lanes.values())
+    for name, entry in queue_load.lanes.items():
+        name_rank = PRIORITY_LANES.index(name) if name in PRIORITY_LANES else len(PRIORITY_LANES)
+        if name_rank < rank:
+            work += entry.queued_seconds
+        elif name == lane:
+            work += entry.seconds_before if own_lane_before_only else entry.queued_seconds
+    return work / lane_slots(lane, worker_lanes)
+
+
+def _retry_after(seconds: float) -> int:
+    return int(min(RETRY_AFTER_MAX_SECONDS, max(RETRY_AFTER_MIN_SECONDS, math.ceil(seconds))))
+
+
+def _at(seconds: float) -> str:
+    return (datetime.now(timezone.utc) + timedelta(seconds=seconds)).isoformat()
+
+
+def check(
+    supabase,
+    user_id: str,
+    lane: str,
+    worker_lanes: Sequence[Tuple[str, ...]],
+    new_jobs: int = 1,
+) -> Admission:
+    """
+    Decide whether `new_jobs` jobs of `user_id` may be queued in `lane` now.
+    More new jobs than a user may have outstanding at all are refused
+    without a retry_after: no amount of waiting makes them fit.
+    """
+    if not ADMISSION_ENABLED:
+        return Admission(accepted=True, wait_seconds=0.0, estimated_start_at=_at(0))
+    if new_jobs > ADMISSION_MAX_USER_OUTSTANDING:
+        logger.info(
+            "Refused %d %s job(s) for user %s: over the per-user limit of %d",
+            new_jobs, lane, user_id, ADMISSION_MAX_USER_OUTSTANDING,
+        )
+        return Admission(
+            accepted=False, wait_seconds=0.0, estimated_start_at=_at(0),
+            reason="too_many_jobs",
+            message=(
+                f"{new_jobs} jobs exceed the limit of {ADMISSION_MAX_USER_OUTSTANDING} "
+                f"outstanding jobs per user; submit them in smaller batches"
+            ),
+        )
+    try:
+        queue_load = load(supabase, user_id)
+    except Exception as exc:
+        logger.warning("Could not read queue load, admitting: %s", exc)
+        return Admission(accepted=True, wait_seconds=0.0, estimated_start_at=_at(0))
+
+    wait = wait_seconds(queue_load, lane, worker_lanes)
+    slots = lane_slots(lane, worker_lanes)
+    decision = Admission(accepted=True, wait_seconds=wait, estimated_start_at=_at(wait))
+
+    if queue_load.queued + new_jobs > ADMISSION_MAX_QUEUED_JOBS:
+        excess = queue_load.queued + new_jobs - ADMISSION_MAX_QUEUED_JOBS
+        decision.reason = "queue_full"
+        decision.message = f"The render queue is full ({queue_load.queued} jobs waiting)"
+        decision.retry_after = _retry_after(excess * queue_load.mean_job_seconds() / slots)
+    elif queue_load.user_outstanding + new_jobs > ADMISSION_MAX_USER_OUTSTANDING:
+        excess = queue_load.user_outstanding + new_jobs - ADMISSION_MAX_USER_OUTSTANDING
+        decision.reason = "user_limit"
+        decision.message = (
+            f"Too many jobs in progress for this user ({queue_load.user_outstanding} "
+            f"+ {new_jobs} new, limit {ADMISSION_MAX_USER_OUTSTANDING})"
+        )
+        decision.retry_after = _retry_after(excess * queue_load.mean_job_seconds())
+    elif wait > ADMISSION_MAX_WAIT_SECONDS.get(lane, ADMISSION_MAX_WAIT_SECONDS["standard"]):
+        max_wait = ADMISSION_MAX_WAIT_SECONDS.get(lane, ADMISSION_MAX_WAIT_SECONDS["standard"])
+        decision.reason = "overloaded"
+        decision.message = (
+            f"Estimated wait of {int(wait)}s exceeds the {max_wait}s limit of the {lane} lane"
+        )
+        decision.retry_after = _retry_after(wait - max_wait)
+
+    if decision.reason:
+        decision.accepted = False
+        logger.info(
+            "Refused %d %s job(s) for user %s: %s (queued=%d, wait=%.0fs, retry in %ds)",
+            new_jobs, lane, user_id, decision.reason, queue_load.queued, wait, decision.retry_after,
+        )
+    return decision
+
+
+def job_eta(
+    supabase,
+    job: Dict[str, Any],
+    worker_lanes: Sequence[Tuple[str, ...]],
+) -> Dict[str, Optional[str]]:
+    """
+    `estimated_start_at` (queued jobs) and `eta` (estimated completion) of
+    an export_jobs row; both None for finished jobs or when unknown.
+    Blocking (reads the queue load): call it via asyncio.to_thread.
+    """
+    estimate = float(job.get("estimated_seconds") or ADMISSION_DEFAULT_JOB_SECONDS)
+    status = job.get("status")
+    if status == "processing":
+        remaining = estimate * (100 - min(int(job.get("progress") or 0), 99)) / 100.0
+        return {"estimated_start_at": None, "eta": _at(remaining)}
+    if status != "queued":
+        return {"estimated_start_at": None, "eta": None}
+    try:
+        queue_load = _load_before(supabase, job.get("created_at"))
+    except Exception as exc:
+        logger.warning("Could not read queue load for job %s ETA: %s", job.get("id"), exc)
+        return {"estimated_start_at": None, "eta": None}
+    wait = wait_seconds(
+        queue_load, job.get("priority") or "standard", worker_lanes, own_lane_before_only=True,
+    )
+    return {"estimated_start_at": _at(wait), "eta": _at(wait + estimate)}
@@ -0,0 +1,209 @@
+"""
+CPU budget for FFmpeg subprocesses.
+
+FFmpeg defaults to one thread per core for both decoding/encoding and
+filter graphs, and it inherits the scheduling priority of the uvicorn
+process. Two concurrent renders therefore each try to use every core, and
+both compete on equal terms with the event loop serving API requests.
+
+Every FFmpeg run (see app/services/ffmpeg_runner.py) takes an allocation
+from this module instead:
+
+  - RENDER_CPU_RESERVED cores are kept free for the API process; the rest
+    is split evenly across the FFmpeg processes running at that moment, and
+    each gets `-threads` / `-filter_complex_threads` set to its share
+  - the process runs at a lower CPU priority (nice RENDER_NICE) and, when
+    the `ionice` binary exists, in the best-effort I/O class at the lowest
+    priority, so API requests win any contention
+  - with RENDER_CPU_AFFINITY=1 each process is pinned to its own cores,
+    taken from the least used cores and never the reserved ones
+
+Priority and affinity are set by prefixing the command (nice, ionice,
+taskset) rather than on the running process: on Linux both are per
+thread, and FFmpeg's encoder threads would otherwise keep the defaults.
+
+`snapshot()` reports the current allocation (exposed by
+GET /api/v1/compose/worker/status).
+"""
+
+from typing import Any, Dict, List, Optional
+from dataclasses import dataclass, field
+import itertools
+import logging
+import os
+import shutil
+import threading
+
+logger = logging.getLogger("agdoc.cpu_budget")
+logger.setLevel(logging.INFO)
+
+# ---------------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------------
+
+# Cores left to uvicorn (API traffic, event loop, uploads)
+RENDER_CPU_RESERVED = int(os.getenv("RENDER_CPU_RESERVED", "1"))
+# Hard cap on threads given to one FFmpeg process (0 = no cap)
+RENDER_MAX_THREADS = int(os.getenv("RENDER_MAX_THREADS", "0"))
+# Scheduling priority of FFmpeg processes (0 = same as the API, 19 = lowest)
+RENDER_NICE = int(os.getenv("RENDER_NICE", "10"))
+# Pin each FFmpeg process to its own cores
+RENDER_CPU_AFFINITY = os.getenv("RENDER_CPU_AFFINITY", "0").lower() in ("1", "true", "yes")
+
+IONICE_BIN = shutil.which("ionice")
+NICE_BIN = shutil.which("nice")
+TASKSET_BIN = shutil.which("taskset")
+
+# FFmpeg options that take no value. Any other option consumes the next
+# argument, and an argument that is neither is an output path.
+_FFMPEG_FLAGS = frozenset((
+    "-y", "-n", "-an", "-vn", "-sn", "-dn", "-shortest", "-nostdin",
+    "-hide_banner", "-nostats", "-stats", "-re", "-copyts",
+))
+
+
+def _available_cores() -> List[int]:
+    """Cores this process may run on (respects container cpusets)."""
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        return list(range(os.cpu_count() or 1))
+
+
+ALL_CORES = _available_cores()
+# The reserved cores are the lowest-numbered ones; renders get the rest
+# (at least one core, even on a single-core machine).
+RENDER_CORES = ALL_CORES[min(RENDER_CPU_RESERVED, len(ALL_CORES) - 1):]
+
+
+@dataclass
+class CpuAllocation:
+    """CPU share handed to one FFmpeg process."""
+    id: int
+    label: str
+    threads: int
+    cores: List[int] = field(default_factory=list)
+    pid: Optional[int] = None
+
+
+_lock = threading.Lock()
+_ids = itertools.count(1)
+_active: Dict[int, CpuAllocation] = {}
+_core_load: Dict[int, int] = {core: 0 for core in RENDER_CORES}
+
+
+def _threads_per_process(active_count: int) -> int:
+    threads = max(1, len(RENDER_CORES) // max(active_count, 1))
+    if RENDER_MAX_THREADS > 0:
+        threads = min(threads, RENDER_MAX_THREADS)
+    return threads
+
+
+def acquire(label: str = "") -> CpuAllocation:
+    """Allocate a CPU share for a new FFmpeg process. Pair with release()."""
+    with _lock:
+        threads = _threads_per_process(len(_active) + 1)
+        cores: List[int] = []
+        if RENDER_CPU_AFFINITY:
+            cores = sorted(_core_load, key=lambda c: (_core_load[c], c))[:threads]
+            for core in cores:
+                _core_load[core] += 1
+        allocation = CpuAllocation(id=next(_ids), label=label, threads=threads, cores=cores)
+        _active[allocation.id] = allocation
+    logger.debug(
+        "%s: %d threads%s", label or "ffmpeg", threads,
+        f" on cores {cores}" if cores else "",
+    )
+    return allocation
+
+
+def release(allocation: CpuAllocation) -> None:
+    """Return an allocation once its FFmpeg process exited."""
+    with _lock:
+        if _active.pop(allocation.id, None) is None:
+            return
+        for core in allocation.cores:
+            if core in _core_load and _core_load[core] > 0:
+                _core_load[core] -= 1
+
+
+def _output_positions(cmd: List[str]) -> List[int]:
+    """Indexes of the output paths of an ffmpeg argv."""
+    positions: List[int] = []
+    i = 1
+    while i < len(cmd):
+        arg = cmd[i]
+        if arg.startswith("-") and len(arg) > 1:
+            i += 1 if arg in _FFMPEG_FLAGS else 2
+        else:
+            positions.append(i)
+            i += 1
+    return positions
+
+
+def apply_to_command(cmd: List[str], allocation: CpuAllocation) -> List[str]:
+    """
+    Return `cmd` with the allocation's thread limits and its nice / ionice /
+    taskset prefix. Commands that already set -threads keep their own.
+    """
+    limited = list(cmd)
+    if cmd and os.path.basename(cmd[0]) == "ffmpeg" and "-threads" not in cmd:
+        n = str(allocation.threads)
+        # -threads is an output option: it goes in front of every output
+        # (several with renditions); the filter thread counts are global.
+        for position in reversed(_output_positions(cmd)):
+            limited[position:position] = ["-threads", n]
+        limited[1:1] = ["-filter_complex_threads", n, "-filter_threads", n]
+    if allocation.cores and TASKSET_BIN:
+        limited = [TASKSET_BIN, "-c", ",".join(str(core) for core in allocation.cores)] + limited
+    if RENDER_NICE > 0 and NICE_BIN:
+        limited = [NICE_BIN, "-n", str(RENDER_NICE)] + limited
+    if IONICE_BIN:
+        limited = [IONICE_BIN, "-c", "2", "-n", "7"] + limited
+    return limited
+
+
+def apply_to_process(pid: int, allocation: CpuAllocation) -> None:
+    """
+    Record the pid of a freshly started process. Only when the nice /
+    taskset binaries are missing is its priority lowered (and its affinity
+    set) here, which on Linux reaches the main thread only.
+    """
+    allocation.pid = pid
+    if RENDER_NICE > 0 and not NICE_BIN:
+        try:
+            os.setpriority(os.PRIO_PROCESS, pid, RENDER_NICE)
+        except (AttributeError, OSError) as exc:
+            logger.debug("Could not renice pid %s: %s", pid, exc)
+    if allocation.cores and not TASKSET_BIN:
+        try:
+            os.sched_setaffinity(pid, allocation.cores)
+        except (AttributeError, OSError) as exc:
+            logger.debug("Could not pin pid %s to %s: %s", pid, allocation.cores, exc)
+
+
+def snapshot() -> Dict[str, Any]:
+    """Current CPU allocation, for the worker status endpoint."""
+    with _lock:
+        active = [
+            {
+                "label": a.label,
+                "pid": a.pid,
+                "threads": a.threads,
+                "cores": a.cores,
+            }
+            for a in _active.values()
+        ]
+        core_load = dict(_core_load)
+    return {
+        "total_cores": len(ALL_CORES),
+        "reserved_cores": len(ALL_CORES) - len(RENDER_CORES),
+        "render_cores": RENDER_CORES,
+        "nice": RENDER_NICE,
+        "ionice": bool(IONICE_BIN),
+        "affinity": RENDER_CPU_AFFINITY,
+        "max_threads_per_process": RENDER_MAX_THREADS or None,
+        "next_allocation_threads": _threads_per_process(len(active) + 1),
+        "active_processes": active,
+        "core_load": core_load if RENDER_CPU_AFFINITY else None,
+    }
@@ -0,0 +1,108 @@
+"""
+FFmpeg subprocess runner shared by the render workers (compose + videos).
+
+Every render goes through `run_ffmpeg` so timeouts, stderr handling and
+cancellation behave the same for exports, slideshows and subtitle burns:
+
+  - stderr goes to a log file, never a PIPE (a full pipe buffer is a
+    well-known cause of FFmpeg subprocess deadlocks)
+  - a single run is capped at FFMPEG_TIMEOUT_SECONDS and killed afterwards
+  - if the awaiting task is cancelled (job cancelled by the user, worker
+    shutdown) the subprocess is killed immediately instead of being left to
+    finish a render nobody wants
+  - thread counts, CPU/I-O priority and core affinity come from the CPU
+    budget (app/services/cpu_budget.py), so renders neither oversubscribe
+    the cores nor starve the API process
+"""
+
+from typing import List
+import asyncio
+import logging
+
+from app.services import cpu_budget
+
+logger = logging.getLogger("agdoc.ffmpeg")
+logger.setLevel(logging.INFO)
+
+# Cap a single FFmpeg run at 10 minutes. A 12-second 1080p clip finishes in
+# well under 60s, so 10 min is a generous safety net that still kicks in when
+# FFmpeg deadlocks. Without this, a hung FFmpeg blocks the worker forever and
+# the job sits at status='processing' indefinitely.
+FFMPEG_TIMEOUT_SECONDS = 600
+
+
+def _read_stderr_tail(stderr_log_path: str, max_bytes: int) -> str:
+    """Return the last `max_bytes` of an FFmpeg stderr log (best-effort)."""
+    try:
+        with open(stderr_log_path, "rb") as f:
+            return f.read()[-max_bytes:].decode(errors="replace")
+    except Exception:
+        return ""
+
+
+async def _kill(proc: asyncio.subprocess.Process) -> None:
+    """Kill an FFmpeg subprocess and reap it, ignoring already-exited races."""
+    try:
+        proc.kill()
+        await proc.wait()
+    except Exception:
+        pass
+
+
+async def run_ffmpeg(
+    cmd: List[str],
+    stderr_log_path: str,
+    label: str = "",
+    timeout_seconds: int = FFMPEG_TIMEOUT_SECONDS,
+) -> None:
+    """
+    Run an FFmpeg command to completion.
+
+    Raises RuntimeError (carrying the stderr tail, so the job's `error` field
+    is actionable) on timeout or non-zero exit. On cancellation the
+    subprocess is killed and CancelledError is re-raised.
+    """
+    allocation = cpu_budget.acquire(label)
+    try:
+        await _run(cmd, stderr_log_path, label, timeout_seconds, allocation)
+    finally:
+        cpu_budget.release(allocation)
+
+
+async def _run(
+    cmd: List[str],
+    stderr_log_path: str,
+    label: str,
+    timeout_seconds: int,
+    allocation: "cpu_budget.CpuAllocation",
+) -> None:
+    with open(stderr_log_path, "wb") as stderr_file:
+        proc = await asyncio.create_subprocess_exec(
+            *cpu_budget.apply_to_command(cmd, allocation),
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=stderr_file,
+        )
+        cpu_budget.apply_to_process(proc.pid, allocation)
+
+        try:
+            await asyncio.wait_for(proc.wait(), timeout=timeout_seconds)
+        except asyncio.TimeoutError:
+            logger.error(
+                "%s: FFmpeg exceeded %ds — killing subprocess",
+                label or "ffmpeg", timeout_seconds,
+            )
+            await _kill(proc)
+            stderr_tail = _read_stderr_tail(stderr_log_path, 2000)
+            raise RuntimeError(
+                f"FFmpeg timed out after {timeout_seconds}s. "
+                f"stderr tail: {stderr_tail[-500:]}"
+            )
+        except asyncio.CancelledError:
+            logger.info("%s: cancelled — killing FFmpeg (pid=%s)", label or "ffmpeg", proc.pid)
+            await _kill(proc)
+            raise
+
+    if proc.returncode != 0:
+        stderr_tail = _read_stderr_tail(stderr_log_path, 4000)
+        logger.error("FFmpeg failed (rc=%d): %s", proc.returncode, stderr_tail[-2000:])
+        raise RuntimeError(f"FFmpeg exited with code {proc.returncode}: {stderr_tail[-500:]}")
@@ -0,0 +1,264 @@
+"""
+Archival of finished job rows.
+
+export_jobs, video_jobs and youtube_ingest_jobs are the tables the workers
+poll and the clients list, and every finished job used to stay there for
+good, with its full composition / params JSON. An archiver loop on every
+worker process moves terminal rows (completed, failed, cancelled) created
+more than JOB_ARCHIVE_RETENTION_DAYS ago into `job_archive` (migration
+020), JOB_ARCHIVE_BATCH_SIZE rows per statement, so the hot tables only
+hold recent history:
+
+  - archive_terminal_jobs() moves a batch in one statement (DELETE ...
+    RETURNING into job_archive); rows are picked with FOR UPDATE SKIP
+    LOCKED, so archivers on several nodes never contend for a row
+  - without the function, the same is done with a select, an idempotent
+    upsert into job_archive and a delete of the copied rows, in chunks of
+    JOB_ARCHIVE_FALLBACK_CHUNK rows (the delete lists the ids in its URL)
+  - the whole row is kept as JSONB (`row`), so archived jobs read back
+    exactly as they were stored whatever columns the hot tables gain later
+
+find_job() and batch_jobs() read a job (or a batch) from its hot table and
+fall back to the archive, so status endpoints answer the same before and
+after a job is archived. list_jobs() merges a user's archived jobs into
+their newest-first listing, so exports stay listed past the retention
+window.
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+import asyncio
+import logging
+import os
+import random
+
+from app.services import pagination
+from app.utils.database import get_db
+
+logger = logging.getLogger("agdoc.job_archive")
+logger.setLevel(logging.INFO)
+
+# ---------------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------------
+
+JOB_ARCHIVE_ENABLED = os.getenv("JOB_ARCHIVE_ENABLED", "1").lower() not in ("0", "false", "no")
+JOB_ARCHIVE_RETENTION_DAYS = float(os.getenv("JOB_ARCHIVE_RETENTION_DAYS", "30"))
+JOB_ARCHIVE_BATCH_SIZE = int(os.getenv("JOB_ARCHIVE_BATCH_SIZE", "500"))
+JOB_ARCHIVE_INTERVAL = int(os.getenv("JOB_ARCHIVE_INTERVAL_SECONDS", "3600"))
+# Batches per table in one run, so a large backlog is drained over a few runs
+JOB_ARCHIVE_MAX_BATCHES = 20
+# Rows per copy + delete without archive_terminal_jobs(): the delete sends
+# the ids in its query string (~37 bytes each)
+JOB_ARCHIVE_FALLBACK_CHUNK = 100
+
+ARCHIVE_TABLE = "job_archive"
+ARCHIVED_TABLES = ("export_jobs", "video_jobs", "youtube_ingest_jobs")
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+
+
+# ---------------------------------------------------------------------------
+# Archiving
+# ---------------------------------------------------------------------------
+
+def _archive_rows(table: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [
+        {
+            "job_table": table,
+            "id": row["id"],
+            "user_id": str(row["user_id"]) if row.get("user_id") is not None else None,
+            "status": row.get("status"),
+            "batch_id": row.get("batch_id"),
+            "created_at": row.get("created_at"),
+            "row": row,
+        }
+        for row in rows
+    ]
+
+
+def _archive_batch_fallback(supabase, table: str, before: str, limit: int) -> int:
+    """
+    Python equivalent of archive_terminal_jobs(): copy, then delete the
+    copied rows, JOB_ARCHIVE_FALLBACK_CHUNK rows at a time.
+    """
+    moved = 0
+    while moved < limit:
+        chunk = min(JOB_ARCHIVE_FALLBACK_CHUNK, limit - moved)
+        result = (
+            supabase.table(table).select("*")
+            .in_("status", list(TERMINAL_STATUSES)).lt("created_at", before)
+            .order("created_at").limit(chunk).execute()
+        )
+        rows = result.data or []
+        if not rows:
+            break
+        supabase.table(ARCHIVE_TABLE).upsert(
+            _archive_rows(table, rows), on_conflict="job_table,id", ignore_duplicates=True,
+        ).execute()
+        # Only rows still terminal: a row is never lost if it changed meanwhile
+        supabase.table(table).delete().in_("id", [row["id"] for row in rows]).in_(
+            "status", list(TERMINAL_STATUSES),
+        ).execute()
+        moved += len(rows)
+        if len(rows) < chunk:
+            break
+    return moved
+
+
+def archive_batch(supabase, table: str, before: str, limit: int = JOB_ARCHIVE_BATCH_SIZE) -> int:
+    """Move up to `limit` terminal rows of `table` created before `before`; returns the count."""
+    if table not in ARCHIVED_TABLES:
+        raise ValueError(f"Unsupported job table: {table}")
+    try:
+        result = supabase.rpc("archive_terminal_jobs", {
+            "p_table": table, "p_before": before, "p_limit": limit,
+        }).execute()
+        return int(result.data or 0)
+    except Exception as exc:
+        logger.debug("archive_terminal_jobs rpc unavailable (%s), archiving via table API", exc)
+    return _archive_batch_fallback(supabase, table, before, limit)
+
+
+def archive_finished_jobs(supabase, retention_days: float = JOB_ARCHIVE_RETENTION_DAYS) -> Dict[str, int]:
+    """Archive every table's terminal rows older than the retention window; rows moved per table."""
+    before = (datetime.now(timezone.utc) - timedelta(days=retention_days)).isoformat()
+    moved: Dict[str, int] = {}
+    for table in ARCHIVED_TABLES:
+        total = 0
+        try:
+            for _ in range(JOB_ARCHIVE_MAX_BATCHES):
+                count = archive_batch(supabase, table, before)
+                total += count
+                if count < JOB_ARCHIVE_BATCH_SIZE:
+                    break
+        except Exception as exc:
+            logger.error("Archiving %s failed after %d rows: %s", table, total, exc)
+        if total:
+            logger.info("Archived %d finished %s rows created before %s", total, table, before)
+        moved[table] = total
+    return moved
+
+
+async def archiver_loop() -> None:
+    """Archive finished jobs every JOB_ARCHIVE_INTERVAL seconds. Every worker process runs one."""
+    if not JOB_ARCHIVE_ENABLED:
+        logger.info("Job archiver disabled")
+        return
+    # Spread the nodes' runs
+    await asyncio.sleep(random.uniform(30, 300))
+    while True:
+        try:
+            await asyncio.to_thread(archive_finished_jobs, get_db(admin_access=True)())
+            await asyncio.sleep(JOB_ARCHIVE_INTERVAL)
+        except asyncio.CancelledError:
+            logger.info("Job archiver shutting down")
+            break
+        except Exception as exc:
+            logger.error("Job archiver error: %s", exc)
+            await asyncio.sleep(JOB_ARCHIVE_INTERVAL)
+
+
+# ---------------------------------------------------------------------------
+# Lookups
+# ---------------------------------------------------------------------------
+
+def find_job(supabase, table: str, job_id: str, columns: str = "*") -> Optional[Dict[str, Any]]:
+    """
+    A job row from its hot table, or from the archive once it was moved
+    there (with `archived_at`); None if neither has it.
+    """
+    result = supabase.table(table).select(columns).eq("id", job_id).execute()
+    if result.data:
+        return result.data[0]
+    try:
+        archived = (
+            supabase.table(ARCHIVE_TABLE).select("row,archived_at")
+            .eq("job_table", table).eq("id", job_id).execute()
+        )
+    except Exception as exc:
+        logger.warning("Could not read archived %s job %s: %s", table, job_id, exc)
+        return None
+    if not archived.data:
+        return None
+    entry = archived.data[0]
+    row = dict(entry["row"])
+    if columns != "*":
+        row = {column: row.get(column) for column in columns.split(",")}
+    row["archived_at"] = entry.get("archived_at")
+    return row
+
+
+def batch_jobs(supabase, table: str, batch_id: str, columns: str) -> List[Dict[str, Any]]:
+    """Archived jobs of a batch, as `columns` of their stored rows."""
+    try:
+        result = (
+            supabase.table(ARCHIVE_TABLE).select("row")
+            .eq("job_table", table).eq("batch_id", batch_id).execute()
+        )
+    except Exception as exc:
+        logger.warning("Could not read archived jobs of %s batch %s: %s", table, batch_id, exc)
+        return []
+    return [
+        {column: entry["row"].get(column) for column in columns.split(",")}
+        for entry in result.data or []
+    ]
+
+
+def _newest_first(row: Dict[str, Any]):
+    try:
+        created_at = datetime.fromisoformat(str(row.get("created_at")).replace("Z", "+00:00"))
+    except ValueError:
+        created_at = datetime.min.replace(tzinfo=timezone.utc)
+    return created_at, str(row.get("id"))
+
+
+def list_jobs(
+    supabase,
+    table: str,
+    user_id: str,
+    columns: str,
+    cursor: Optional[str],
+    limit: int,
+    offset: int = 0,
+    status: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Up to limit + 1 of a user's jobs (for pagination.page), newest first,
+    from the hot table and the archive merged: the archive is read with the
+    same cursor on (user_id, created_at), so older pages simply continue
+    into it. Archived rows carry `archived_at`. Raises ValueError for a
+    malformed cursor.
+    """
+    # The deprecated offset is applied after the merge
+    fetch = limit + offset if offset > 0 and not cursor else limit
+
+    query = supabase.table(table).select(columns).eq("user_id", user_id)
+    if status:
+        query = query.eq("status", status)
+    rows = pagination.apply(query, cursor, fetch).execute().data or []
+
+    try:
+        archived = supabase.table(ARCHIVE_TABLE).select("id,created_at,row,archived_at").eq(
+            "job_table", table,
+        ).eq("user_id", str(user_id))
+        if status:
+            archived = archived.eq("status", status)
+        entries = pagination.apply(archived, cursor, fetch).execute().data or []
+    except ValueError:
+        raise
+    except Exception as exc:
+        logger.warning("Could not read archived %s jobs of user %s: %s", table, user_id, exc)
+        entries = []
+    # A row the fallback archiver has copied but not yet deleted is listed once
+    listed = {str(row.get("id")) for row in rows}
+    for entry in entries:
+        if str(entry["id"]) in listed:
+            continue
+        row = {column: entry["row"].get(column) for column in columns.split(",")}
+        row["id"], row["created_at"] = entry["id"], entry["created_at"]
+        row["archived_at"] = entry.get("archived_at")
+        rows.append(row)
+
+    rows.sort(key=_newest_first, reverse=True)
+    start = offset if offset > 0 and not cursor else 0
+    return rows[start:start + limit + 1]
@@ -0,0 +1,365 @@
+"""
+Live job progress for Server-Sent Events streams.
+
+Clients used to poll GET /api/v1/compose/{job_id} and
+GET /api/v1/videos/jobs/{job_id} every few seconds, one Supabase read per
+poll. Workers now publish every state change of a job (queued, started,
+progress, completed, failed, cancelled, released) to this in-process bus,
+and the SSE endpoints forward them to subscribers as they happen:
+
+  - stream_job(): one job until it reaches a terminal status
+  - stream_user(): every job of one user (both tables), until disconnect
+
+Only jobs running in this process publish here. A job claimed by a worker
+on another node is invisible to the bus, so while a stream follows such a
+job it re-reads the row every JOB_EVENTS_POLL_SECONDS (server-side, one
+small select) and emits only changes. Streams of jobs running locally never
+touch the database after the initial snapshot.
+
+A user stream polls at that rate only while the user has active jobs that
+are not running here. Otherwise it only looks for jobs submitted through
+other nodes, backing off to one read every JOB_EVENTS_IDLE_POLL_SECONDS
+(on the (user_id, updated_at) indexes of migration 022).
+
+Events are plain dicts:
+  {"type", "kind" ("compose" | "video"), "job_id", "status", "progress",
+   "progress_stage", "output_url", "error", "at"}
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+import asyncio
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger("agdoc.job_events")
+logger.setLevel(logging.INFO)
+
+# ---------------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------------
+
+# Fallback re-read interval for jobs not running in this process (seconds)
+JOB_EVENTS_POLL_SECONDS = float(os.getenv("JOB_EVENTS_POLL_SECONDS", "5"))
+# Longest re-read interval of a user stream with no remote active job
+JOB_EVENTS_IDLE_POLL_SECONDS = float(os.getenv("JOB_EVENTS_IDLE_POLL_SECONDS", "60"))
+# SSE comment sent on idle streams so proxies keep the connection open
+KEEPALIVE_SECONDS = 15.0
+SUBSCRIBER_QUEUE_SIZE = 256
+
+TABLE_KINDS = {"export_jobs": "compose", "video_jobs": "video"}
+KIND_TABLES = {kind: table for table, kind in TABLE_KINDS.items()}
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+ACTIVE_STATUSES = ("queued", "processing")
+EVENT_FIELDS = ("status", "progress", "progress_stage", "output_url", "error")
+_ROW_COLUMNS = "id,user_id," + ",".join(EVENT_FIELDS)
+
+JobKey = Tuple[str, str]
+
+
+@dataclass(eq=False)
+class _Subscriber:
+    loop: asyncio.AbstractEventLoop
+    queue: asyncio.Queue
+    job: Optional[JobKey] = None
+    user_id: Optional[str] = None
+
+
+@dataclass
+class _JobState:
+    user_id: Optional[str]
+    event: Dict[str, Any] = field(default_factory=dict)
+
+
+_lock = threading.Lock()
+_subscribers: Set[_Subscriber] = set()
+# Jobs running in this process and their latest event
+_local_jobs: Dict[JobKey, _JobState] = {}
+
+
+# ---------------------------------------------------------------------------
+# Publishing (called by the workers / endpoints)
+# ---------------------------------------------------------------------------
+
+def _event(table: str, job_id: str, event_type: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+    event = {"type": event_type, "kind": TABLE_KINDS.get(table, table), "job_id": job_id}
+    event.update({k: fields.get(k) for k in EVENT_FIELDS if k in fields})
+    event["at"] = datetime.now(timezone.utc).isoformat()
+    return event
+
+
+def publish(
+    table: str,
+    job_id: str,
+    event_type: str,
+    user_id: Optional[str] = None,
+    **fields: Any,
+) -> None:
+    """
+    Publish a state change of a job. `fields` are any of EVENT_FIELDS.
+
+    "started" marks the job as running here (pass user_id); a terminal
+    status or "released" (handed back to the queue) ends that.
+    """
+    key = (table, job_id)
+    with _lock:
+        state = _local_jobs.get(key)
+        if event_type == "started":
+            state = _local_jobs[key] = _JobState(user_id=user_id)
+        user_id = user_id or (state.user_id if state else None)
+        event = _event(table, job_id, event_type, fields)
+        if state is not None:
+            merged = {**state.event, **event}
+            state.event = merged
+            event = merged
+        if event_type == "released" or fields.get("status") in TERMINAL_STATUSES:
+            _local_jobs.pop(key, None)
+        targets = [
+            s for s in _subscribers
+            if s.job == key or (user_id is not None and s.user_id == user_id)
+        ]
+
+    for sub in targets:
+        sub.loop.call_soon_threadsafe(_offer, sub.queue, event)
+
+
+def _offer(queue: asyncio.Queue, event: Dict[str, Any]) -> None:
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        # A stalled client: drop the oldest progress update, keep the newest
+        try:
+            queue.get_nowait()
+            queue.put_nowait(event)
+        except (asyncio.QueueEmpty, asyncio.QueueFull):
+            pass
+
+
+def forget(table: str, job_id: str) -> None:
+    """Stop treating a job as running here (its task ended)."""
+    with _lock:
+        _local_jobs.pop((table, job_id), None)
+
+
+def is_local(table: str, job_id: str) -> bool:
+    with _lock:
+        return (table, job_id) in _local_jobs
+
+
+def _subscribe(job: Optional[JobKey] = None, user_id: Optional[str] = None) -> _Subscriber:
+    sub = _Subscriber(
+        loop=asyncio.get_running_loop(),
+        queue=asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE),
+        job=job,
+        user_id=user_id,
+    )
+    with _lock:
+        _subscribers.add(sub)
+    return sub
+
+
+def _unsubscribe(sub: _Subscriber) -> None:
+    with _lock:
+        _subscribers.discard(sub)
+
+
+def stats() -> Dict[str, Any]:
+    """Subscriber and local-job counts, for the worker status endpoint."""
+    with _lock:
+        return {"subscribers": len(_subscribers), "local_jobs": len(_local_jobs)}
+
+
+# ---------------------------------------------------------------------------
+# Database snapshots (initial state + fallback for remote jobs)
+# ---------------------------------------------------------------------------
+
+def _row_event(table: str, row: Dict[str, Any], event_type: str) -> Dict[str, Any]:
+    return _event(table, row["id"], event_type, row)
+
+
+def _polled_type(status: Optional[str]) -> str:
+    return status if status in TERMINAL_STATUSES else "progress"
+
+
+def _changed(previous: Optional[Dict[str, Any]], event: Dict[str, Any]) -> bool:
+    if previous is None:
+        return True
+    return any(previous.get(k) != event.get(k) for k in EVENT_FIELDS)
+
+
+async def snapshot(supabase, table: str, job_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Current state of a job as a "snapshot" event (None if it does not
+    exist). Served from memory for jobs running here.
+    """
+    with _lock:
+        state = _local_jobs.get((table, job_id))
+        if state is not None and state.event:
+            return {**state.event, "type": "snapshot"}
+    result = await asyncio.to_thread(
+        lambda: supabase.table(table).select(_ROW_COLUMNS).eq("id", job_id).execute()
+    )
+    if not result.data:
+        return None
+    return _row_event(table, result.data[0], "snapshot")
+
+
+# ---------------------------------------------------------------------------
+# Streams
+# ---------------------------------------------------------------------------
+
+async def stream_job(
+    supabase,
+    table: str,
+    job_id: str,
+    initial: Dict[str, Any],
+) -> AsyncIterator[Optional[Dict[str, Any]]]:
+    """
+    Events of one job, starting with `initial` (see snapshot()) and ending
+    after its terminal event. Yields None when idle (keep-alive).
+    """
+    key = (table, job_id)
+    sub = _subscribe(job=key)
+    try:
+        last = initial
+        yield initial
+        if initial.get("status") in TERMINAL_STATUSES:
+            return
+
+        idle = 0.0
+        while True:
+            local = is_local(table, job_id)
+            timeout = KEEPALIVE_SECONDS if local else min(JOB_EVENTS_POLL_SECONDS, KEEPALIVE_SECONDS)
+            try:
+                event = await asyncio.wait_for(sub.queue.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                event = None
+                if not local:
+                    current = await snapshot(supabase, table, job_id)
+                    if current is not None and _changed(last, current):
+                        event = {**current, "type": _polled_type(current.get("status"))}
+            if event is None:
+                idle += timeout
+                if idle >= KEEPALIVE_SECONDS:
+                    idle = 0.0
+                    yield None
+                continue
+
+            idle = 0.0
+            last = event
+            yield event
+            if event.get("status") in TERMINAL_STATUSES:
+                return
+    finally:
+        _unsubscribe(sub)
+
+
+async def stream_user(supabase, user_id: str) -> AsyncIterator[Optional[Dict[str, Any]]]:
+    """
+    Events of every job of `user_id` in both tables: a snapshot of each
+    active job first, then changes until the client disconnects. Yields
+    None when idle (keep-alive).
+    """
+    sub = _subscribe(user_id=user_id)
+    last: Dict[JobKey, Dict[str, Any]] = {}
+
+    def read_active() -> List[Tuple[str, Dict[str, Any]]]:
+        rows = []
+        for table in TABLE_KINDS:
+            result = (
+                supabase.table(table).select(_ROW_COLUMNS)
+                .eq("user_id", user_id).in_("status", list(ACTIVE_STATUSES))
+                .order("created_at").execute()
+            )
+            rows.extend((table, row) for row in result.data or [])
+        return rows
+
+    def read_changed(since: str) -> List[Tuple[str, Dict[str, Any]]]:
+        rows = []
+        for table in TABLE_KINDS:
+            result = (
+                supabase.table(table).select(_ROW_COLUMNS)
+                .eq("user_id", user_id).gte("updated_at", since).execute()
+            )
+            rows.extend((table, row) for row in result.data or [])
+        return rows
+
+    # Jobs of the user still queued / processing, as far as this stream knows
+    active: Set[JobKey] = set()
+
+    def track(key: JobKey, event: Dict[str, Any]) -> None:
+        last[key] = event
+        if event.get("status") in ACTIVE_STATUSES:
+            active.add(key)
+        else:
+            active.discard(key)
+
+    def poll_interval(idle_polls: int) -> float:
+        if any(not is_local(*key) for key in active):
+            return JOB_EVENTS_POLL_SECONDS
+        return min(JOB_EVENTS_POLL_SECONDS * 2 ** idle_polls, JOB_EVENTS_IDLE_POLL_SECONDS)
+
+    try:
+        loop = asyncio.get_running_loop()
+        poll_from = datetime.now(timezone.utc)
+        for table, row in await asyncio.to_thread(read_active):
+            event = _row_event(table, row, "snapshot")
+            track((table, row["id"]), event)
+            yield event
+
+        idle_polls = 0
+        next_poll = loop.time() + poll_interval(idle_polls)
+        last_sent = loop.time()
+        while True:
+            wait = max(0.0, min(next_poll, last_sent + KEEPALIVE_SECONDS) - loop.time())
+            try:
+                events = [await asyncio.wait_for(sub.queue.get(), timeout=wait)]
+            except asyncio.TimeoutError:
+                events = []
+                if loop.time() >= next_poll:
+                    # Jobs submitted or claimed on other nodes never reach the
+                    # bus: pick up rows changed since the last read (with
+                    # slack for clock skew), skipping what was already sent.
+                    since = (poll_from - timedelta(seconds=2)).isoformat()
+                    poll_from = datetime.now(timezone.utc)
+                    for table, row in await asyncio.to_thread(read_changed, since):
+                        if is_local(table, row["id"]):
+                            continue
+                        event = _row_event(table, row, _polled_type(row.get("status")))
+                        if _changed(last.get((table, row["id"])), event):
+                            events.append(event)
+                    idle_polls = 0 if events else idle_polls + 1
+                    next_poll = loop.time() + poll_interval(idle_polls)
+
+            if not events:
+                if loop.time() - last_sent >= KEEPALIVE_SECONDS:
+                    last_sent = loop.time()
+                    yield None
+                continue
+
+            for event in events:
+                key = (KIND_TABLES.get(event["kind"], event["kind"]), event["job_id"])
+                if key not in active and event.get("status") in ACTIVE_STATUSES:
+                    # New job: back to the fast rate if it runs elsewhere
+                    idle_polls = 0
+                    next_poll = min(next_poll, loop.time() + poll_interval(idle_polls))
+                track(key, event)
+                yield event
+            last_sent = loop.time()
+    finally:
+        _unsubscribe(sub)
+
+
+async def sse(events: AsyncIterator[Optional[Dict[str, Any]]]) -> AsyncIterator[str]:
+    """Format a stream of events as text/event-stream."""
+    event_id = 0
+    yield "retry: 3000\n\n"
+    async for event in events:
+        if event is None:
+            yield ": keepalive\n\n"
+            continue
+        event_id += 1
+        yield f"id: {event_id}\nevent: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
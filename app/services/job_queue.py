@@ -0,0 +1,680 @@
+"""
+Shared render-queue helpers for the compose and videos workers.
+
+Both `export_jobs` and `video_jobs` are database-backed queues polled by
+in-process worker loops. Claiming goes through the `claim_render_job`
+Postgres function (migrations 006-007) so lane and fair-share ordering is
+decided in one statement on the database instead of by scanning the queue
+in Python:
+
+  - jobs sit in one of three priority lanes (interactive, standard, batch)
+    and a worker slot only claims from the lanes it serves
+  - each tenant's oldest queued job per lane is a candidate
+  - the highest lane with work wins; within it, the tenant with the least
+    recent service (running + recently claimed jobs, divided by its plan
+    weight, which the database sets on insert from the user's subscription,
+    migration 021) wins
+  - ties fall back to FIFO on created_at
+
+Worker slots that do not serve the batch lane are capacity reserved for
+user-facing renders, so automated bulk work never sits in front of a user
+watching a progress bar.
+
+If the function is not deployed yet the helpers fall back to the previous
+oldest-first claim so a code deploy never stalls the queue.
+
+Ownership: a claim records this worker's id (host:pid) and a lease on the
+row. While the job runs, `run_claimed_job` renews the lease every
+HEARTBEAT_INTERVAL seconds. Every worker process also runs a lease reaper
+that requeues jobs whose lease expired (crash, OOM kill, deploy) with
+exponential backoff, failing them only after max_attempts. A graceful
+shutdown hands running jobs straight back to the queue.
+
+Cancellation: a cancel request flips the row to status='cancelled'. Queued
+rows are then never claimed. A running job is executed as its own task by
+`run_claimed_job`, which polls the row while the job runs; as soon as it is
+cancelled (from any node) or the lease was lost the task is cancelled,
+which kills its FFmpeg subprocess and cleans its temp files. Cancels that
+land on the node running the job cancel the task directly, without waiting
+for the next poll.
+
+Checkpoints: a job records each completed stage (downloaded, rendered,
+uploaded) in its `checkpoint` column together with the artifacts of that
+stage. Node-local artifacts (scratch files) carry the NODE_ID that owns
+them; uploaded results live in object storage and are usable from any
+node. A retried job on the same node resumes from its scratch directory,
+which is kept whenever the job is handed back rather than finished, and a
+retry anywhere else reuses an already uploaded output instead of rendering
+it again.
+
+Claims, releases and cancels are also published to the in-process event
+bus (app/services/job_events.py) that feeds the SSE progress streams.
+"""
+
+from typing import Any, Awaitable, Dict, List, Optional, Sequence, Set, Tuple
+from datetime import datetime, timedelta, timezone
+import asyncio
+import json
+import logging
+import os
+import socket
+import uuid
+
+from app.services import job_archive, job_events, webhooks
+from app.utils.database import get_db
+
+logger = logging.getLogger("agdoc.job_queue")
+logger.setLevel(logging.INFO)
+
+# ---------------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------------
+
+# Tables the render workers poll. Anything else is rejected by the SQL side too.
+RENDER_TABLES = ("export_jobs", "video_jobs")
+
+# Statuses a job can still be cancelled from.
+CANCELLABLE_STATUSES = ("queued", "processing")
+
+# How often a running job re-reads its row to notice a cancel from another node.
+CANCEL_POLL_INTERVAL = 3
+
+# Lease / heartbeat timings (seconds). The lease must comfortably outlive a
+# few missed heartbeats so a slow DB round-trip doesn't requeue a live job.
+LEASE_SECONDS = 90
+HEARTBEAT_INTERVAL = 20
+REAPER_INTERVAL = 30
+# First retry waits this long, doubling per attempt (30s, 60s, 120s, ...)
+RETRY_BACKOFF_SECONDS = 30
+# Rows claimed before leases existed have no lease_expires_at; they are
+# considered lost after this long without an update (the old startup cutoff).
+STALE_JOB_TIMEOUT_MINUTES = 15
+
+# Identity of this worker process. NODE_ID names the machine (scratch files
+# and checkpoints are node-local); WORKER_ID additionally names the process
+# so two uvicorn workers on one host never share a lease.
+NODE_ID = os.getenv("NODE_ID") or socket.gethostname()
+WORKER_ID = f"{NODE_ID}:{os.getpid()}"
+
+# Job stages that are checkpointed, in order. Each stage implies the
+# previous ones.
+CHECKPOINT_STAGES = ("downloaded", "rendered", "uploaded")
+
+# Recent-service window used by the fair-share score (minutes).
+FAIR_SHARE_WINDOW_MINUTES = 15
+
+# Priority lanes, highest first. "interactive" is for previews and anything a
+# user is actively waiting on, "standard" for ordinary exports, "batch" for
+# automated / bulk generation.
+PRIORITY_LANES = ("interactive", "standard", "batch")
+DEFAULT_PRIORITY = "standard"
+
+# Default worker slot layout: a single slot serving every lane, highest
+# first, so a process runs one FFmpeg job at a time as it always has.
+# Override per worker with COMPOSE_WORKER_LANES / VIDEO_WORKER_LANES, using
+# ";" between slots and "," between the lanes a slot serves. Reserving
+# capacity for user-facing renders takes a second slot, e.g.
+# "interactive,standard;interactive,standard,batch" (one slot that never
+# takes batch work plus a general one) — size memory and CPU for two
+# concurrent renders per process before enabling it.
+DEFAULT_WORKER_LANES = "interactive,standard,batch"
+
+
+def normalize_priority(priority: Optional[str]) -> str:
+    """
+    Validate an optional `priority` from a request body.
+
+    Returns the lane name (DEFAULT_PRIORITY when omitted) and raises
+    ValueError for anything that is not a known lane.
+    """
+    if priority is None or priority == "":
+        return DEFAULT_PRIORITY
+    lane = str(priority).strip().lower()
+    if lane not in PRIORITY_LANES:
+        raise ValueError(
+            f"priority must be one of {', '.join(PRIORITY_LANES)}"
+        )
+    return lane
+
+
+def parse_worker_lanes(spec: Optional[str]) -> List[Tuple[str, ...]]:
+    """
+    Parse a worker slot layout such as "interactive,standard;interactive,standard,batch"
+    into one tuple of lanes per slot. Unknown lane names are dropped; an
+    empty or invalid spec falls back to DEFAULT_WORKER_LANES.
+    """
+    slots: List[Tuple[str, ...]] = []
+    for slot_spec in (spec or "").split(";"):
+        lanes = tuple(
+            lane for lane in (part.strip().lower() for part in slot_spec.split(","))
+            if lane in PRIORITY_LANES
+        )
+        if lanes:
+            slots.append(lanes)
+    if not slots and spec != DEFAULT_WORKER_LANES:
+        if spec:
+            logger.warning("Invalid worker lane spec %r, using default", spec)
+        return parse_worker_lanes(DEFAULT_WORKER_LANES)
+    return slots
+
+
+# ---------------------------------------------------------------------------
+# Batches
+# ---------------------------------------------------------------------------
+
+# Jobs accepted by one batch submission
+MAX_BATCH_JOBS = 100
+# Top-level batch fields applied to every job spec that doesn't set them
+BATCH_DEFAULT_FIELDS = ("user_id", "priority", "callback_url")
+BATCH_STATUS_COLUMNS = "id,status,progress,progress_stage,output_url,error,created_at,completed_at"
+
+
+def batch_job_specs(body: Any) -> List[Dict[str, Any]]:
+    """
+    The job specs of a batch submission body, with the batch-level defaults
+    filled in. Raises ValueError if the body is not a usable batch.
+    """
+    if not isinstance(body, dict):
+        raise ValueError("Request body must be an object")
+    specs = body.get("jobs")
+    if not isinstance(specs, list) or not specs:
+        raise ValueError("jobs must be a non-empty list")
+    if len(specs) > MAX_BATCH_JOBS:
+        raise ValueError(f"A batch holds at most {MAX_BATCH_JOBS} jobs")
+    defaults = {k: body[k] for k in BATCH_DEFAULT_FIELDS if body.get(k) is not None}
+    return [{**defaults, **spec} if isinstance(spec, dict) else spec for spec in specs]
+
+
+def batch_status(supabase, table: str, batch_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Group status of the jobs of one batch in `table` (None if there are
+    none, or `batch_id` is not a UUID): per-status counts, `done` once every
+    job is terminal, and the jobs.
+    """
+    try:
+        uuid.UUID(batch_id)
+    except (TypeError, ValueError):
+        # PostgREST would reject the uuid filter with an error
+        return None
+    result = (
+        supabase.table(table).select(BATCH_STATUS_COLUMNS)
+        .eq("batch_id", batch_id).order("created_at").order("id").execute()
+    )
+    archived = job_archive.batch_jobs(supabase, table, batch_id, BATCH_STATUS_COLUMNS)
+    jobs = result.data or []
+    if archived:
+        jobs = sorted(jobs + archived, key=lambda job: (job.get("created_at") or "", job.get("id")))
+    if not jobs:
+        return None
+    counts: Dict[str, int] = {}
+    for job in jobs:
+        counts[job.get("status")] = counts.get(job.get("status"), 0) + 1
+    return {
+        "batch_id": batch_id,
+        "total": len(jobs),
+        "counts": counts,
+        "done": all(job.get("status") in ("completed", "failed", "cancelled") for job in jobs),
+        "jobs": [{"job_id": job.pop("id"), **job} for job in jobs],
+    }
+
+
+# ---------------------------------------------------------------------------
+# Claiming
+# ---------------------------------------------------------------------------
+
+def claim_next_job(
+    supabase,
+    table: str,
+    lanes: Optional[Sequence[str]] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Claim the next job from `table` using lane priority + weighted fair share.
+
+    `lanes` restricts the claim to those priority lanes (None = all lanes).
+
+    Returns a dict with `id`, `user_id`, `job_type` (None for export_jobs)
+    and `priority` for the claimed row, or None when nothing was claimed
+    (empty queue, or another worker won the race — the caller just polls
+    again).
+    """
+    if table not in RENDER_TABLES:
+        raise ValueError(f"Unsupported render table: {table}")
+
+    try:
+        result = supabase.rpc("claim_render_job", {
+            "p_table": table,
+            "p_lanes": list(lanes) if lanes else None,
+            "p_window_minutes": FAIR_SHARE_WINDOW_MINUTES,
+            "p_worker_id": WORKER_ID,
+            "p_lease_seconds": LEASE_SECONDS,
+        }).execute()
+    except Exception as exc:
+        if not _is_missing_function(exc):
+            # A timeout may still have claimed a job on the server: never
+            # claim a second one on top of it (its lease expires and the
+            # reaper requeues it)
+            logger.error("claim_render_job failed for %s: %s", table, exc)
+            return None
+        logger.warning(
+            "claim_render_job unavailable for %s (%s) — falling back to FIFO claim",
+            table, exc,
+        )
+        job = _claim_fifo(supabase, table, lanes)
+    else:
+        if not result.data:
+            return None
+        job = result.data[0]
+        logger.info(
+            "Claimed %s job %s for user %s (lane=%s, attempt=%s)",
+            table, job.get("id"), job.get("user_id"), job.get("priority"), job.get("attempts"),
+        )
+
+    if job:
+        job_events.publish(
+            table, job["id"], "started", user_id=job.get("user_id"),
+            status="processing", progress=0, progress_stage="initializing",
+        )
+    return job
+
+
+def _is_missing_function(exc: Exception) -> bool:
+    """True if a PostgREST rpc failed because the SQL function is not installed."""
+    code = str(getattr(exc, "code", "") or "")
+    message = str(exc)
+    return code in ("PGRST202", "42883") or "PGRST202" in message or "42883" in message
+
+
+def _claim_fifo(
+    supabase,
+    table: str,
+    lanes: Optional[Sequence[str]] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Legacy oldest-first claim with optimistic locking.
+
+    1. SELECT the oldest queued job
+    2. UPDATE its status to 'processing' WHERE status='queued' (atomic check),
+       taking the lease like claim_render_job (worker_id, lease_expires_at,
+       attempts + 1), so heartbeats, release and the owner-checked
+       finalize / fail updates match the row
+    3. If another worker claimed it first, the update returns no rows -> None
+    """
+    columns = "id,user_id,attempts,job_type" if table == "video_jobs" else "id,user_id,attempts"
+    try:
+        query = supabase.table(table).select(columns).eq("status", "queued")
+        if lanes:
+            query = query.in_("priority", list(lanes))
+        result = query.order("created_at").limit(1).execute()
+        if not result.data:
+            return None
+
+        job = result.data[0]
+        now = datetime.now(timezone.utc)
+        attempts = int(job.get("attempts") or 0) + 1
+
+        claim_result = (
+            supabase.table(table)
+            .update({
+                "status": "processing",
+                "progress": 0,
+                "progress_stage": "initializing",
+                "worker_id": WORKER_ID,
+                "lease_expires_at": (now + timedelta(seconds=LEASE_SECONDS)).isoformat(),
+                "attempts": attempts,
+                "updated_at": now.isoformat(),
+            })
+            .eq("id", job["id"])
+            .eq("status", "queued")
+            .execute()
+        )
+
+        if claim_result.data:
+            logger.info("Claimed %s job %s (FIFO)", table, job["id"])
+            return {"job_type": None, "priority": None, **job, "attempts": attempts}
+
+        logger.debug("%s job %s was already claimed by another worker", table, job["id"])
+        return None
+
+    except Exception as exc:
+        logger.error("Error claiming next %s job: %s", table, exc)
+        return None
+
+
+# ---------------------------------------------------------------------------
+# Running jobs + cancellation
+# ---------------------------------------------------------------------------
+
+# (table, job_id) -> task processing that job on this node
+_running_jobs: Dict[Tuple[str, str], asyncio.Task] = {}
+
+# Jobs stopped on this node without being finished (shutdown release, lease
+# lost or requeued). Their scratch directories are kept so a retry here can
+# resume from the last checkpoint.
+_handed_back_jobs: Set[Tuple[str, str]] = set()
+
+
+def _heartbeat(supabase, table: str, job_id: str) -> Optional[str]:
+    """
+    Renew this worker's lease on a running job.
+
+    Returns 'processing' while the lease is held, otherwise the job's status
+    ('cancelled', 'lost' when another worker owns it, ...) or None if the
+    row is gone. Returns 'processing' when the heartbeat itself fails, so a
+    DB blip doesn't abort a healthy render (the lease covers a few misses).
+    """
+    try:
+        result = supabase.rpc("heartbeat_render_job", {
+            "p_table": table,
+            "p_job_id": job_id,
+            "p_worker_id": WORKER_ID,
+            "p_lease_seconds": LEASE_SECONDS,
+        }).execute()
+    except Exception as exc:
+        logger.debug("Heartbeat failed for %s job %s: %s", table, job_id, exc)
+        return "processing"
+    return result.data
+
+
+def _poll_status(supabase, table: str, job_id: str) -> Optional[str]:
+    """Cheap status read between heartbeats (same return contract as _heartbeat)."""
+    try:
+        result = supabase.table(table).select("status,worker_id").eq("id", job_id).execute()
+    except Exception as exc:
+        logger.debug("Status poll failed for %s job %s: %s", table, job_id, exc)
+        return "processing"
+    if not result.data:
+        return None
+    row = result.data[0]
+    owner = row.get("worker_id")
+    if row.get("status") == "processing" and owner and owner != WORKER_ID:
+        return "lost"
+    return row.get("status")
+
+
+async def _watch_job(table: str, job_id: str, task: asyncio.Task) -> None:
+    """
+    Keep the lease on a running job alive and stop the job's task when it
+    was cancelled (from any node), handed to another worker, or deleted.
+    """
+    last_heartbeat = asyncio.get_running_loop().time()
+    while not task.done():
+        await asyncio.sleep(CANCEL_POLL_INTERVAL)
+        supabase = get_db(admin_access=True)()
+        now = asyncio.get_running_loop().time()
+        # Off the event loop: every running job polls, and the loop also
+        # serves the API
+        if now - last_heartbeat >= HEARTBEAT_INTERVAL:
+            job_status = await asyncio.to_thread(_heartbeat, supabase, table, job_id)
+            last_heartbeat = now
+        else:
+            job_status = await asyncio.to_thread(_poll_status, supabase, table, job_id)
+        if job_status in ("cancelled", "lost", "queued", None) and not task.done():
+            logger.info(
+                "%s job %s is %s — stopping local work",
+                table, job_id, job_status or "deleted",
+            )
+            if job_status in ("lost", "queued"):
+                _handed_back_jobs.add((table, job_id))
+            task.cancel()
+            return
+
+
+def _release_job(table: str, job_id: str, delay_seconds: int = 0) -> None:
+    """
+    Hand a running job back to the queue (graceful shutdown, or deferral),
+    best-effort. With `delay_seconds` it is not claimable again before then.
+    """
+    try:
+        get_db(admin_access=True)().rpc("release_render_job", {
+            "p_table": table,
+            "p_job_id": job_id,
+            "p_worker_id": WORKER_ID,
+            "p_delay_seconds": delay_seconds,
+        }).execute()
+        logger.info("Released %s job %s back to the queue", table, job_id)
+        job_events.publish(
+            table, job_id, "released", status="queued",
+            progress_stage="deferred" if delay_seconds > 0 else "queued",
+        )
+    except Exception as exc:
+        logger.warning(
+            "Could not release %s job %s (%s); it will be requeued when its lease expires",
+            table, job_id, exc,
+        )
+
+
+async def run_claimed_job(table: str, job_id: str, job: Awaitable[None]) -> None:
+    """
+    Run the processing coroutine of a claimed job as a cancellable task,
+    heart-beating its lease until it finishes.
+
+    Returns once the job finished, failed or was cancelled; a cancelled job
+    never propagates CancelledError into the worker loop. If the worker loop
+    itself is cancelled (shutdown) the job task is cancelled with it and the
+    job is released back to the queue for another worker.
+    """
+    key = (table, job_id)
+    task = asyncio.create_task(job)
+    _running_jobs[key] = task
+    watcher = asyncio.create_task(_watch_job(table, job_id, task))
+    try:
+        await asyncio.wait({task})
+    except asyncio.CancelledError:
+        _handed_back_jobs.add(key)
+        task.cancel()
+        # Let the job unwind (kill FFmpeg, decide what scratch to keep)
+        # before the row goes back to the queue.
+        await asyncio.wait({task}, timeout=10)
+        _release_job(table, job_id)
+        raise
+    finally:
+        watcher.cancel()
+        _running_jobs.pop(key, None)
+        _handed_back_jobs.discard(key)
+        job_events.forget(table, job_id)
+
+    if task.cancelled():
+        logger.info("%s job %s stopped; worker slot released", table, job_id)
+    elif task.exception() is not None:
+        logger.error("%s job %s raised: %s", table, job_id, task.exception())
+
+
+def defer_job(table: str, job_id: str, delay_seconds: int, reason: str) -> None:
+    """
+    Give a claimed job back to the queue from inside its own processing
+    (e.g. no scratch space on this node) without counting the attempt.
+    """
+    logger.warning("Deferring %s job %s by %ds: %s", table, job_id, delay_seconds, reason)
+    _handed_back_jobs.add((table, job_id))
+    _release_job(table, job_id, delay_seconds)
+
+
+def running_jobs() -> List[Dict[str, str]]:
+    """Jobs currently executing in this worker process."""
+    return [
+        {"table": table, "job_id": job_id}
+        for (table, job_id), task in list(_running_jobs.items())
+        if not task.done()
+    ]
+
+
+def cancel_job(supabase, table: str, job_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Cancel a queued or running job.
+
+    Returns None if the job does not exist, otherwise a dict with
+    `previous_status`, the resulting `status` and whether this call
+    `cancelled` it (False when the job had already reached a terminal state).
+    """
+    if table not in RENDER_TABLES:
+        raise ValueError(f"Unsupported render table: {table}")
+
+    existing = supabase.table(table).select("id,status").eq("id", job_id).execute()
+    if not existing.data:
+        return None
+
+    previous_status = existing.data[0].get("status")
+    if previous_status not in CANCELLABLE_STATUSES:
+        return {"previous_status": previous_status, "status": previous_status, "cancelled": False}
+
+    now_iso = datetime.now(timezone.utc).isoformat()
+    result = (
+        supabase.table(table)
+        .update({
+            "status": "cancelled",
+            "progress_stage": "cancelled",
+            "error": "Cancelled by request",
+            "completed_at": now_iso,
+            "updated_at": now_iso,
+        })
+        .eq("id", job_id)
+        .in_("status", list(CANCELLABLE_STATUSES))
+        .execute()
+    )
+
+    if not result.data:
+        # Finished (or was cancelled) between the read and the update
+        current = supabase.table(table).select("status").eq("id", job_id).execute()
+        current_status = current.data[0].get("status") if current.data else previous_status
+        return {"previous_status": previous_status, "status": current_status, "cancelled": False}
+
+    job_events.publish(
+        table, job_id, "cancelled",
+        status="cancelled", progress_stage="cancelled", error="Cancelled by request",
+    )
+
+    # Running here? Stop it now rather than waiting for the next poll.
+    task = _running_jobs.get((table, job_id))
+    if task and not task.done():
+        task.cancel()
+
+    logger.info("Cancelled %s job %s (was %s)", table, job_id, previous_status)
+    return {"previous_status": previous_status, "status": "cancelled", "cancelled": True}
+
+
+# ---------------------------------------------------------------------------
+# Checkpoints
+# ---------------------------------------------------------------------------
+
+def should_keep_scratch(table: str, job_id: str) -> bool:
+    """
+    True when a job was stopped without finishing (released on shutdown,
+    lease lost or requeued), so its scratch files should survive for a
+    retry. Call from the job's own cleanup code (see app/services/scratch.py).
+    """
+    return (table, job_id) in _handed_back_jobs
+
+
+def load_checkpoint(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the job row's checkpoint as a dict ({} when none was recorded)."""
+    checkpoint = job.get("checkpoint") or {}
+    if isinstance(checkpoint, str):
+        try:
+            checkpoint = json.loads(checkpoint)
+        except ValueError:
+            return {}
+    return checkpoint if isinstance(checkpoint, dict) else {}
+
+
+def stage_reached(checkpoint: Dict[str, Any], stage: str) -> bool:
+    """True when `checkpoint` records `stage` or a later one."""
+    recorded = checkpoint.get("stage")
+    if recorded not in CHECKPOINT_STAGES:
+        return False
+    return CHECKPOINT_STAGES.index(recorded) >= CHECKPOINT_STAGES.index(stage)
+
+
+def checkpoint_is_local(checkpoint: Dict[str, Any], scratch_dir: str) -> bool:
+    """
+    True when the checkpoint's node-local artifacts were written on this
+    node into `scratch_dir` and that directory still exists.
+    """
+    return (
+        checkpoint.get("node_id") == NODE_ID
+        and checkpoint.get("scratch_dir") == scratch_dir
+        and os.path.isdir(scratch_dir)
+    )
+
+
+def save_checkpoint(
+    supabase,
+    table: str,
+    job_id: str,
+    stage: str,
+    **artifacts: Any,
+) -> Dict[str, Any]:
+    """
+    Record that `job_id` completed `stage`, along with that stage's
+    artifacts (scratch paths, storage keys, ...). Best-effort: a failed
+    write only costs redoing the stage on a retry.
+    """
+    if stage not in CHECKPOINT_STAGES:
+        raise ValueError(f"Unknown checkpoint stage: {stage}")
+
+    checkpoint = {
+        "stage": stage,
+        "node_id": NODE_ID,
+        "worker_id": WORKER_ID,
+        "recorded_at": datetime.now(timezone.utc).isoformat(),
+        **artifacts,
+    }
+    try:
+        supabase.table(table).update({"checkpoint": checkpoint}).eq("id", job_id).execute()
+        logger.info("%s job %s: checkpoint '%s' recorded", table, job_id, stage)
+    except Exception as exc:
+        logger.warning("Could not checkpoint %s job %s at '%s': %s", table, job_id, stage, exc)
+    return checkpoint
+
+
+# ---------------------------------------------------------------------------
+# Lease reaper
+# ---------------------------------------------------------------------------
+
+def requeue_expired_jobs(supabase, table: str) -> int:
+    """
+    Requeue jobs in `table` whose worker lease expired, with backoff; jobs
+    that already used max_attempts are marked failed instead.
+    Returns the number of rows touched.
+    """
+    try:
+        result = supabase.rpc("requeue_expired_render_jobs", {
+            "p_table": table,
+            "p_backoff_seconds": RETRY_BACKOFF_SECONDS,
+            "p_legacy_stale_minutes": STALE_JOB_TIMEOUT_MINUTES,
+        }).execute()
+    except Exception as exc:
+        logger.error("Error requeueing expired %s jobs: %s", table, exc)
+        return 0
+
+    rows = result.data or []
+    for row in rows:
+        if row.get("status") == "failed":
+            logger.warning(
+                "%s job %s lost its worker %s times — marked failed",
+                table, row.get("id"), row.get("attempts"),
+            )
+            webhooks.notify_job(supabase, table, row["id"])
+        else:
+            logger.warning(
+                "%s job %s lost its worker (attempt %s) — requeued with backoff",
+                table, row.get("id"), row.get("attempts"),
+            )
+    return len(rows)
+
+
+async def lease_reaper_loop(table: str) -> None:
+    """
+    Periodically requeue expired leases. Every worker process runs one per
+    table, so recovery doesn't depend on any particular node restarting.
+    """
+    logger.info("Lease reaper started for %s (worker %s)", table, WORKER_ID)
+    while True:
+        try:
+            requeue_expired_jobs(get_db(admin_access=True)(), table)
+            await asyncio.sleep(REAPER_INTERVAL)
+        except asyncio.CancelledError:
+            logger.info("Lease reaper for %s shutting down", table)
+            break
+        except Exception as exc:
+            logger.error("Lease reaper error (%s): %s", table, exc)
+            await asyncio.sleep(REAPER_INTERVAL)
@@ -0,0 +1,340 @@
+"""
+Rasterized text and sticker overlays for the compose renderer.
+
+Captions, titles and stickers are drawn onto the video as overlay layers.
+Rendering text with FFmpeg's drawtext would shape and rasterize it again
+for every frame; instead each overlay is rasterized once with Pillow into a
+tight transparent PNG, and the renderer composites that single frame with
+a time-windowed `overlay` filter (see compose._build_timeline_graph).
+
+Text uses the Noto Sans CJK fonts installed in the Docker image (Latin,
+Chinese, Japanese and Korean in one face), wrapped to a maximum width:
+between words for spaced scripts, between characters for CJK.
+
+PNGs are cached on the node (OVERLAY_CACHE_DIR) under a hash of everything
+that affects their pixels: the text and its resolved style, the font and
+the canvas size for text; the source URL, width and opacity for stickers.
+The same caption in another job, a retried job, or every rendition of one
+job reuses the file. The cache is trimmed to OVERLAY_CACHE_MAX_MB, oldest
+first.
+
+Rasterizing runs on a small thread pool, off the event loop.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+
+from PIL import Image, ImageColor, ImageDraw, ImageFont, ImageOps
+
+from app.services.scratch import SCRATCH_ROOT
+
+logger = logging.getLogger("agdoc.overlay_layers")
+logger.setLevel(logging.INFO)
+
+# ---------------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------------
+
+OVERLAY_CACHE_DIR = os.path.join(SCRATCH_ROOT, "agdoc_overlay_cache")
+OVERLAY_CACHE_MAX_MB = int(os.getenv("OVERLAY_CACHE_MAX_MB", "256"))
+OVERLAY_WORKERS = int(os.getenv("OVERLAY_WORKERS", "2"))
+
+# fonts-noto-cjk (see Dockerfile); OVERLAY_FONT_PATH overrides both weights
+FONT_PATHS = {
+    False: os.getenv("OVERLAY_FONT_PATH") or "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    True: os.getenv("OVERLAY_FONT_PATH") or "/usr/share/fonts/opentype/noto/NotoSansCJK-Bold.ttc",
+}
+# Face inside the .ttc collection: 0 JP, 1 KR, 2 SC, 3 TC, 4 HK. SC matches
+# the subtitle default (Noto Sans CJK SC) of the videos router.
+FONT_INDEX = int(os.getenv("OVERLAY_FONT_INDEX", "2"))
+
+# Default font size as a fraction of the canvas height
+DEFAULT_FONT_SIZE_RATIO = 0.045
+TEXT_ALIGNMENTS = ("left", "center", "right")
+MAX_TEXT_LENGTH = 1000
+
+_executor = ThreadPoolExecutor(max_workers=OVERLAY_WORKERS, thread_name_prefix="agdoc-overlay")
+
+
+@dataclass
+class RasterizedOverlay:
+    path: str
+    width: int
+    height: int
+
+
+# ---------------------------------------------------------------------------
+# Styles
+# ---------------------------------------------------------------------------
+
+def _pick(raw: Dict[str, Any], *keys: str) -> Any:
+    for key in keys:
+        if raw.get(key) not in (None, ""):
+            return raw[key]
+    return None
+
+
+def _color(value: Any, field_name: str) -> Optional[str]:
+    if value is None:
+        return None
+    try:
+        ImageColor.getrgb(str(value))
+    except ValueError:
+        raise ValueError(f"{field_name} is not a valid color: {value!r}")
+    return str(value)
+
+
+def text_style(raw: Any) -> Dict[str, Any]:
+    """
+    Normalize a text layer's style (camelCase or snake_case keys) into the
+    stored form. Raises ValueError on invalid values. `font_size` (px on the
+    output canvas) stays None when unset: it is derived from the canvas.
+    """
+    raw = raw if isinstance(raw, dict) else {}
+    weight = str(_pick(raw, "fontWeight", "font_weight") or "").lower()
+    align = str(_pick(raw, "textAlign", "text_align", "align") or "center").lower()
+    if align not in TEXT_ALIGNMENTS:
+        raise ValueError(f"align must be one of {', '.join(TEXT_ALIGNMENTS)}")
+    try:
+        font_size = _pick(raw, "fontSize", "font_size")
+        stroke_width = _pick(raw, "strokeWidth", "stroke_width")
+        max_width = float(_pick(raw, "maxWidth", "max_width") or 0.9)
+        padding = _pick(raw, "padding")
+        style = {
+            "font_size": int(font_size) if font_size else None,
+            "bold": bool(raw.get("bold")) or weight in ("bold", "600", "700", "800", "900"),
+            "color": _color(_pick(raw, "color", "fontColor", "font_color") or "#FFFFFF", "color"),
+            "background": _color(
+                _pick(raw, "backgroundColor", "background_color", "background"), "background",
+            ),
+            "stroke_color": _color(_pick(raw, "strokeColor", "stroke_color"), "stroke_color"),
+            "stroke_width": int(stroke_width) if stroke_width else 0,
+            "align": align,
+            "max_width": min(1.0, max(0.1, max_width)),
+            "padding": int(padding) if padding is not None else None,
+        }
+    except (TypeError, ValueError) as exc:
+        if isinstance(exc, ValueError) and "color" in str(exc):
+            raise
+        raise ValueError(f"invalid text style ({exc})")
+    if style["font_size"] is not None and not 4 <= style["font_size"] <= 1000:
+        raise ValueError("font_size must be between 4 and 1000")
+    return style
+
+
+# ---------------------------------------------------------------------------
+# Cache
+# ---------------------------------------------------------------------------
+
+def _cache_path(key_data: Dict[str, Any]) -> str:
+    digest = hashlib.sha256(
+        json.dumps(key_data, sort_keys=True, separators=(",", ":")).encode()
+    ).hexdigest()
+    return os.path.join(OVERLAY_CACHE_DIR, f"{digest}.png")
+
+
+def _cached(path: str) -> Optional[RasterizedOverlay]:
+    try:
+        with Image.open(path) as img:
+            size = img.size
+        os.utime(path)  # recently used: evicted last
+    except (OSError, ValueError):
+        return None
+    return RasterizedOverlay(path=path, width=size[0], height=size[1])
+
+
+def _evict() -> None:
+    """Trim the overlay cache to OVERLAY_CACHE_MAX_MB, least recently used first."""
+    try:
+        entries = [
+            entry for entry in os.scandir(OVERLAY_CACHE_DIR)
+            if entry.is_file() and entry.name.endswith(".png")
+        ]
+    except FileNotFoundError:
+        return
+    stats = sorted(((e.stat().st_mtime, e.stat().st_size, e.path) for e in entries))
+    total = sum(size for _, size, _ in stats)
+    limit = OVERLAY_CACHE_MAX_MB * 1024 * 1024
+    for _, size, path in stats:
+        if total <= limit:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+def _save(img: Image.Image, dst: str) -> RasterizedOverlay:
+    os.makedirs(OVERLAY_CACHE_DIR, exist_ok=True)
+    tmp = f"{dst}.{os.getpid()}.tmp"
+    img.save(tmp, format="PNG", compress_level=1)
+    os.replace(tmp, dst)
+    _evict()
+    return RasterizedOverlay(path=dst, width=img.width, height=img.height)
+
+
+# ---------------------------------------------------------------------------
+# Rasterizing
+# ---------------------------------------------------------------------------
+
+def _load_font(size: int, bold: bool) -> ImageFont.FreeTypeFont:
+    path = FONT_PATHS[bold]
+    if os.path.exists(path):
+        try:
+            return ImageFont.truetype(path, size, index=FONT_INDEX)
+        except OSError:
+            return ImageFont.truetype(path, size)
+    logger.warning("Overlay font %s not found, using Pillow's default font", path)
+    return ImageFont.load_default(size=size)
+
+
+# Latin words (kept whole), runs of spaces, or any other single character
+# (CJK text wraps between characters)
+_TOKEN_RE = re.compile(r"[^\s\u2e80-\u9fff\uac00-\ud7af\uff00-\uffef]+|\s+|.")
+
+
+def _wrap(text: str, font: ImageFont.FreeTypeFont, max_width: float) -> List[str]:
+    lines: List[str] = []
+    for paragraph in text.split("\n"):
+        line = ""
+        for token in _TOKEN_RE.findall(paragraph):
+            candidate = line + token
+            if not line.strip() or font.getlength(candidate) <= max_width:
+                line = candidate
+            else:
+                lines.append(line.rstrip())
+                line = token.lstrip()
+        lines.append(line.rstrip())
+    return lines
+
+
+def _render_text(text: str, style: Dict[str, Any], canvas_width: int, dst: str) -> RasterizedOverlay:
+    size = style["font_size"]
+    font = _load_font(size, style["bold"])
+    body = "\n".join(_wrap(text, font, style["max_width"] * canvas_width))
+    spacing = max(1, size // 4)
+    stroke = style["stroke_width"] if style["stroke_color"] else 0
+
+    probe = ImageDraw.Draw(Image.new("RGBA", (1, 1)))
+    bbox = probe.multiline_textbbox(
+        (0, 0), body, font=font, spacing=spacing, align=style["align"], stroke_width=stroke,
+    )
+    left, top = math.floor(bbox[0]), math.floor(bbox[1])
+    right, bottom = math.ceil(bbox[2]), math.ceil(bbox[3])
+    pad = style["padding"] if style["padding"] is not None else (size * 2 // 5 if style["background"] else 0)
+    width, height = max(1, right - left + 2 * pad), max(1, bottom - top + 2 * pad)
+
+    img = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    if style["background"]:
+        draw.rounded_rectangle(
+            (0, 0, width - 1, height - 1), radius=size // 4,
+            fill=ImageColor.getrgb(style["background"]),
+        )
+    draw.multiline_text(
+        (pad - left, pad - top), body, font=font,
+        fill=ImageColor.getrgb(style["color"]),
+        spacing=spacing, align=style["align"],
+        stroke_width=stroke,
+        stroke_fill=ImageColor.getrgb(style["stroke_color"]) if stroke else None,
+    )
+    return _save(img, dst)
+
+
+def _render_sticker(src: str, width: int, opacity: float, dst: str) -> RasterizedOverlay:
+    with Image.open(src) as img:
+        img = ImageOps.exif_transpose(img).convert("RGBA")
+        height = max(1, round(img.height * width / img.width))
+        img = img.resize((width, height), Image.Resampling.LANCZOS)
+    if opacity < 1.0:
+        img.putalpha(img.getchannel("A").point(lambda a: int(a * opacity)))
+    return _save(img, dst)
+
+
+def _resolved_text_style(style: Dict[str, Any], canvas_height: int) -> Dict[str, Any]:
+    return {
+        **style,
+        "font_size": style.get("font_size") or max(8, round(canvas_height * DEFAULT_FONT_SIZE_RATIO)),
+    }
+
+
+async def rasterize_text(
+    text: str,
+    style: Dict[str, Any],
+    canvas_width: int,
+    canvas_height: int,
+) -> Optional[RasterizedOverlay]:
+    """
+    PNG of `text` in `style` (see text_style) for a canvas of the given
+    size, from the cache when possible. None if it cannot be rendered.
+    """
+    resolved = _resolved_text_style(style, canvas_height)
+    dst = _cache_path({
+        "kind": "text", "text": text, "style": resolved,
+        "font": FONT_PATHS[resolved["bold"]], "font_index": FONT_INDEX, "canvas": [canvas_width, canvas_height],
+    })
+    cached = _cached(dst)
+    if cached:
+        return cached
+
+    loop = asyncio.get_running_loop()
+    try:
+        result = await loop.run_in_executor(_executor, _render_text, text, resolved, canvas_width, dst)
+    except Exception as exc:
+        logger.warning("Could not rasterize text overlay %r: %s", text[:40], exc)
+        return None
+    logger.info("Rasterized text overlay %r -> %dx%d", text[:40], result.width, result.height)
+    return result
+
+
+def sticker_path(url: str, width: int, opacity: float) -> str:
+    """Cache path of a sticker rendered at `width` px with `opacity`."""
+    return _cache_path({"kind": "sticker", "url": url, "width": width, "opacity": opacity})
+
+
+def cached_sticker(url: str, width: int, opacity: float) -> Optional[RasterizedOverlay]:
+    """The cached sticker, if this node already rendered it (no download needed)."""
+    return _cached(sticker_path(url, width, opacity))
+
+
+async def rasterize_sticker(
+    src: str,
+    url: str,
+    width: int,
+    opacity: float = 1.0,
+) -> Optional[RasterizedOverlay]:
+    """PNG of the downloaded sticker image `src` (from `url`) scaled to `width` px."""
+    dst = sticker_path(url, width, opacity)
+    loop = asyncio.get_running_loop()
+    try:
+        result = await loop.run_in_executor(_executor, _render_sticker, src, width, opacity, dst)
+    except Exception as exc:
+        logger.warning("Could not rasterize sticker %s: %s", url, exc)
+        return None
+    logger.info("Rasterized sticker %s -> %dx%d", os.path.basename(src), result.width, result.height)
+    return result
+
+
+def place(
+    overlay: RasterizedOverlay,
+    x: float,
+    y: float,
+    canvas_width: int,
+    canvas_height: int,
+) -> Tuple[int, int]:
+    """Top-left pixel position of an overlay centred at (x, y) (fractions of the canvas)."""
+    left = round(x * canvas_width - overlay.width / 2)
+    top = round(y * canvas_height - overlay.height / 2)
+    # Keep it on screen when it fits
+    left = min(max(0, left), max(0, canvas_width - overlay.width))
+    top = min(max(0, top), max(0, canvas_height - overlay.height))
+    return left, top
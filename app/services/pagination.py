@@ -0,0 +1,76 @@
+"""
+Keyset (cursor) pagination for newest-first listings.
+
+Listings used to page with `range(offset, offset + limit - 1)`: Postgres
+still has to walk and discard every skipped row, so page 200 of a large
+media library costs 200 pages of work, and rows inserted meanwhile shift
+the window (duplicates / gaps). Here each page continues strictly after the
+last row of the previous one on the (created_at, id) ordering, so every
+page is a single index range scan on (user_id, created_at DESC, id DESC)
+(migration 014) no matter how deep it is.
+
+The cursor is opaque to clients: base64url of {"c": created_at, "i": id}
+from the last row of a page. One extra row is fetched to tell whether a
+next page exists, so `has_more` / `next_cursor` are exact.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+import base64
+import binascii
+import json
+
+Cursor = Tuple[str, str]
+
+
+def encode_cursor(row: Dict[str, Any]) -> str:
+    raw = json.dumps({"c": row["created_at"], "i": row["id"]}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    """Parse a cursor from a previous page; raises ValueError if malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        created_at, row_id = data["c"], data["i"]
+    except (binascii.Error, ValueError, TypeError, KeyError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(created_at, str) or not isinstance(row_id, str):
+        raise ValueError("Invalid cursor")
+    # Values end up inside a PostgREST filter expression
+    if any(ch in created_at + row_id for ch in '",()\\'):
+        raise ValueError("Invalid cursor")
+    return created_at, row_id
+
+
+def apply(query, cursor: Optional[str], limit: int, offset: int = 0):
+    """
+    Order `query` newest first and restrict it to the page after `cursor`
+    (None = first page). Fetches limit + 1 rows; pass the result to page().
+
+    `offset` is the deprecated way of paging, honoured only without a
+    cursor: the limit + 1 rows then start `offset` rows in.
+    """
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.or_(
+            f'created_at.lt."{created_at}",'
+            f'and(created_at.eq."{created_at}",id.lt."{row_id}")'
+        )
+    query = query.order("created_at", desc=True).order("id", desc=True)
+    if offset > 0 and not cursor:
+        return query.range(offset, offset + limit)
+    return query.limit(limit + 1)
+
+
+def page(rows: Optional[List[Dict[str, Any]]], limit: int) -> Dict[str, Any]:
+    """Split the limit + 1 fetched rows into a page and its next cursor."""
+    rows = rows or []
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "items": rows,
+        "count": len(rows),
+        "has_more": has_more,
+        "next_cursor": encode_cursor(rows[-1]) if has_more else None,
+    }
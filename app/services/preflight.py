@@ -0,0 +1,269 @@
+"""
+Preflight checks of job inputs, run before a job is queued.
+
+A composition with a dead CDN URL, an HTML error page behind a media URL
+or a multi-gigabyte upload used to be discovered only after a worker had
+claimed the job and started downloading: a wasted slot, and minutes of
+queue time before the user learned the job could never succeed.
+
+The submit endpoints now check every media URL first, concurrently, with
+HEAD requests on one pooled HTTP client (short timeout). Servers that
+refuse HEAD (405 / 501, or 403 from URLs presigned for GET only) get a
+one-byte ranged GET instead. Each input must:
+
+  - answer 2xx
+  - carry a content type that fits its role (a video clip must not be
+    text/html); missing or generic octet-stream types are accepted
+  - not exceed PREFLIGHT_MAX_INPUT_BYTES (and not be empty)
+
+Definite problems (404, wrong type, too large) are errors. Transient ones
+(timeout, connection error, 5xx, 429) are only warnings: the worker's own
+download retries may still succeed, so they never reject a job.
+
+PREFLIGHT_MODE selects what errors do:
+  - "reject" (default): the submission fails with 422 and the reasons
+  - "flag":  the job is queued anyway, with the findings in its
+             `preflight` column
+  - "off":   no checks
+
+The summed Content-Length of the inputs is stored as the job's
+`input_bytes` (migration 016); the compose worker sizes its scratch
+reservation from it instead of from per-second estimates.
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse
+import asyncio
+import logging
+import os
+
+import httpx
+
+logger = logging.getLogger("agdoc.preflight")
+logger.setLevel(logging.INFO)
+
+# ---------------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------------
+
+PREFLIGHT_MODE = os.getenv("PREFLIGHT_MODE", "reject").strip().lower()
+PREFLIGHT_TIMEOUT_SECONDS = float(os.getenv("PREFLIGHT_TIMEOUT_SECONDS", "5"))
+PREFLIGHT_CONCURRENCY = int(os.getenv("PREFLIGHT_CONCURRENCY", "16"))
+PREFLIGHT_MAX_INPUT_BYTES = int(os.getenv("PREFLIGHT_MAX_INPUT_BYTES", str(4 * 1024 ** 3)))
+
+# Content types accepted per input role (prefix match). Generic binary
+# types are accepted everywhere: many buckets serve uploads that way.
+GENERIC_CONTENT_TYPES = ("application/octet-stream", "binary/octet-stream")
+ACCEPTED_CONTENT_TYPES: Dict[str, Tuple[str, ...]] = {
+    "video": ("video/", "application/mp4", "application/x-mpegurl", "application/vnd.apple.mpegurl"),
+    "image": ("image/",),
+    # Voiceovers and music are often served from .mp4 / .webm containers
+    "audio": ("audio/", "video/", "application/ogg"),
+}
+
+# Statuses after which HEAD is retried as a ranged GET
+HEAD_UNSUPPORTED = (403, 405, 501)
+
+MediaInput = Tuple[str, str]  # (url, role: video | image | audio)
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def enabled() -> bool:
+    return PREFLIGHT_MODE != "off"
+
+
+def rejects() -> bool:
+    """True if preflight errors fail the submission (PREFLIGHT_MODE=reject)."""
+    return PREFLIGHT_MODE not in ("flag", "off")
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(PREFLIGHT_TIMEOUT_SECONDS),
+            limits=httpx.Limits(
+                max_connections=PREFLIGHT_CONCURRENCY,
+                max_keepalive_connections=PREFLIGHT_CONCURRENCY,
+            ),
+            follow_redirects=True,
+        )
+    return _client
+
+
+async def close() -> None:
+    """Close the pooled client (app shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+# ---------------------------------------------------------------------------
+# Results
+# ---------------------------------------------------------------------------
+
+@dataclass
+class MediaCheck:
+    url: str
+    status_code: Optional[int] = None
+    content_type: Optional[str] = None
+    size: Optional[int] = None
+    # Network-level failure / unexpected status (None = reachable)
+    error: Optional[str] = None
+    transient: bool = False
+
+
+@dataclass
+class PreflightReport:
+    errors: List[Dict[str, Any]] = field(default_factory=list)
+    warnings: List[Dict[str, Any]] = field(default_factory=list)
+    input_bytes: Optional[int] = None
+    checked: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def record(self) -> Optional[Dict[str, Any]]:
+        """Findings for the job's `preflight` column (None if clean)."""
+        if not self.errors and not self.warnings:
+            return None
+        return {"checked": self.checked, "errors": self.errors, "warnings": self.warnings}
+
+
+# ---------------------------------------------------------------------------
+# Checks
+# ---------------------------------------------------------------------------
+
+def _size_from(response: httpx.Response) -> Optional[int]:
+    content_range = response.headers.get("content-range", "")
+    if "/" in content_range:
+        total = content_range.rsplit("/", 1)[1].strip()
+        if total.isdigit():
+            return int(total)
+    length = response.headers.get("content-length")
+    # A GET answered 200 (Range ignored) announces the whole file too
+    full = response.request.method == "HEAD" or response.status_code == 200
+    if full and length and length.isdigit():
+        return int(length)
+    return None
+
+
+async def _probe(url: str, semaphore: asyncio.Semaphore) -> MediaCheck:
+    check = MediaCheck(url=url)
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        check.error = "not an http(s) URL"
+        return check
+
+    client = _get_client()
+    async with semaphore:
+        try:
+            response = await client.head(url)
+            if response.status_code in HEAD_UNSUPPORTED:
+                # Streamed and closed unread: only the status and headers
+                # are used, and a server that ignores Range would otherwise
+                # send the whole file
+                async with client.stream("GET", url, headers={"Range": "bytes=0-0"}) as response:
+                    pass
+        except httpx.TimeoutException:
+            check.error, check.transient = "timed out", True
+            return check
+        except httpx.HTTPError as exc:
+            check.error, check.transient = f"unreachable ({type(exc).__name__})", True
+            return check
+
+    check.status_code = response.status_code
+    check.content_type = response.headers.get("content-type", "").split(";")[0].strip().lower() or None
+    check.size = _size_from(response)
+    if not 200 <= response.status_code < 300:
+        check.error = f"HTTP {response.status_code}"
+        check.transient = response.status_code >= 500 or response.status_code == 429
+    return check
+
+
+def _findings(check: MediaCheck, role: str) -> Tuple[Optional[str], bool]:
+    """(problem, transient) of one input in its role, or (None, False)."""
+    if check.error:
+        return check.error, check.transient
+    content_type = check.content_type
+    if content_type and content_type not in GENERIC_CONTENT_TYPES:
+        accepted = ACCEPTED_CONTENT_TYPES.get(role, ())
+        if not content_type.startswith(accepted):
+            return f"content type {content_type} is not a usable {role}", False
+    if check.size is not None:
+        if check.size == 0:
+            return "file is empty", False
+        if check.size > PREFLIGHT_MAX_INPUT_BYTES:
+            return (
+                f"file is {check.size // (1024 * 1024)} MB, above the "
+                f"{PREFLIGHT_MAX_INPUT_BYTES // (1024 * 1024)} MB limit"
+            ), False
+    return None, False
+
+
+async def check_many(jobs: Sequence[Iterable[MediaInput]]) -> List[PreflightReport]:
+    """
+    Check the inputs of several jobs at once (a batch): every distinct URL
+    is requested once, all concurrently. One report per job, in order.
+    """
+    job_inputs = [list(dict.fromkeys(inputs)) for inputs in jobs]
+    urls = list(dict.fromkeys(url for inputs in job_inputs for url, _ in inputs))
+    semaphore = asyncio.Semaphore(PREFLIGHT_CONCURRENCY)
+    probes = await asyncio.gather(*(_probe(url, semaphore) for url in urls))
+    by_url = dict(zip(urls, probes))
+
+    reports = []
+    for inputs in job_inputs:
+        report = PreflightReport(checked=len(inputs))
+        sizes: Dict[str, int] = {}
+        for url, role in inputs:
+            check = by_url[url]
+            if check.size:
+                sizes[url] = check.size
+            problem, transient = _findings(check, role)
+            if problem:
+                entry = {"url": url, "role": role, "error": problem}
+                (report.warnings if transient else report.errors).append(entry)
+        report.input_bytes = sum(sizes.values()) if sizes else None
+        reports.append(report)
+
+    if urls:
+        failed = sum(1 for r in reports if r.errors)
+        logger.info(
+            "Preflight: %d URL(s) for %d job(s), %d job(s) with errors",
+            len(urls), len(reports), failed,
+        )
+    return reports
+
+
+async def check(inputs: Iterable[MediaInput]) -> PreflightReport:
+    """Check the inputs of one job."""
+    return (await check_many([inputs]))[0]
+
+
+async def annotate_rows(
+    rows: Sequence[Dict[str, Any]],
+    inputs_of: Callable[[Dict[str, Any]], Iterable[MediaInput]],
+) -> List[Dict[str, Any]]:
+    """
+    Preflight the job rows about to be inserted: sets `input_bytes` and,
+    when there are findings, `preflight` on each row. Returns the jobs that
+    must be rejected as [{"index", "errors"}] (always empty unless
+    PREFLIGHT_MODE=reject). No-op when preflight is off.
+    """
+    if not enabled():
+        return []
+    reports = await check_many([inputs_of(row) for row in rows])
+    rejected = []
+    for index, (row, report) in enumerate(zip(rows, reports)):
+        if report.input_bytes is not None:
+            row["input_bytes"] = report.input_bytes
+        if report.record():
+            row["preflight"] = report.record()
+        if not report.ok and rejects():
+            rejected.append({"index": index, "errors": report.errors})
+    return rejected
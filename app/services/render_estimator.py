@@ -0,0 +1,253 @@
+"""
+Render cost model for export jobs.
+
+Predicts, before a job runs, how long it will take and what it produces:
+
+  download_seconds = input_bytes / download throughput + per-input latency
+  encode_seconds   = overhead + seconds_per_work * encode_work
+  upload_seconds   = output_bytes / upload throughput
+  output_bytes     = output_bytes_per_mp_second * output megapixel-seconds
+
+`encode_work` is the planned encoding effort in megapixel-seconds: for
+every FFmpeg pass, the seconds of timeline it encodes times the summed
+frame size (MP) of the outputs it writes. The compose router derives it
+from its render plan (single pass, batched tree, smart render, renditions;
+see compose._plan_render), so one coefficient covers every strategy.
+
+The coefficients are fitted from finished jobs:
+
+  - jobs completed since migration 017 carry `stage_timings` (download,
+    render and upload seconds plus the plan's encode_work and the byte
+    counts); with enough of them, encode cost is a least-squares line and
+    the throughputs are plain ratios
+  - until then, the default coefficients are scaled so that they reproduce
+    the historical `processing_time_seconds` of jobs of known duration
+
+The fitted model is cached per process for ESTIMATOR_MODEL_TTL seconds.
+"""
+
+from dataclasses import asdict, dataclass, field, replace
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+import asyncio
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger("agdoc.render_estimator")
+logger.setLevel(logging.INFO)
+
+# ---------------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------------
+
+ESTIMATOR_MODEL_TTL = int(os.getenv("ESTIMATOR_MODEL_TTL", "900"))
+# Completed jobs read to fit the model
+ESTIMATOR_HISTORY_ROWS = 500
+# Fewer samples than this and a fit is not trusted
+ESTIMATOR_MIN_SAMPLES = 10
+# Megapixels of the 1080p canvas assumed for jobs without stage timings
+LEGACY_CANVAS_MEGAPIXELS = 1920 * 1080 / 1e6
+
+_HISTORY_COLUMNS = "duration_seconds,file_size_bytes,processing_time_seconds,input_bytes,stage_timings"
+
+
+@dataclass
+class CostModel:
+    # Fixed per-job cost of the encode stage (probing, FFmpeg startup, muxing)
+    overhead_seconds: float = 6.0
+    # x264 "medium" on a 2-vCPU worker: ~1080p at 1x realtime
+    seconds_per_work: float = 0.5
+    download_bytes_per_second: float = 25 * 1024 * 1024
+    per_input_seconds: float = 0.4
+    upload_bytes_per_second: float = 20 * 1024 * 1024
+    # ~8 Mbps at 1080p (CRF 23)
+    output_bytes_per_mp_second: float = 500 * 1024
+    source: str = "default"
+    samples: int = 0
+    fitted_at: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass
+class RenderFeatures:
+    """What a render plan amounts to, as far as cost is concerned."""
+    output_seconds: float
+    # Summed frame size of the delivered outputs (MP)
+    output_megapixels: float
+    # Megapixel-seconds encoded across all passes
+    encode_work: float
+    input_count: int
+    input_bytes: int
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+
+# ---------------------------------------------------------------------------
+# Estimating
+# ---------------------------------------------------------------------------
+
+def estimate(features: RenderFeatures, model: CostModel) -> Dict[str, Any]:
+    """Predicted stage durations and output size for one job."""
+    download = (
+        features.input_bytes / model.download_bytes_per_second
+        + features.input_count * model.per_input_seconds
+    )
+    encode = model.overhead_seconds + model.seconds_per_work * features.encode_work
+    output_bytes = model.output_bytes_per_mp_second * features.output_megapixels * features.output_seconds
+    upload = output_bytes / model.upload_bytes_per_second
+    return {
+        "download_bytes": int(features.input_bytes),
+        "download_seconds": round(download, 1),
+        "encode_seconds": round(encode, 1),
+        "upload_seconds": round(upload, 1),
+        "output_bytes": int(output_bytes),
+        "total_seconds": round(download + encode + upload, 1),
+    }
+
+
+def stage_timings(
+    features: RenderFeatures,
+    download_seconds: float,
+    render_seconds: float,
+    upload_seconds: float,
+    input_bytes: int,
+    output_bytes: int,
+) -> Dict[str, Any]:
+    """`stage_timings` record of a finished job (the fitting data)."""
+    return {
+        "download_seconds": round(download_seconds, 2),
+        "render_seconds": round(render_seconds, 2),
+        "upload_seconds": round(upload_seconds, 2),
+        "input_bytes": int(input_bytes),
+        "input_count": features.input_count,
+        "output_bytes": int(output_bytes),
+        "output_seconds": round(features.output_seconds, 2),
+        "output_megapixels": round(features.output_megapixels, 4),
+        "encode_work": round(features.encode_work, 2),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Fitting
+# ---------------------------------------------------------------------------
+
+def _least_squares(xs: List[float], ys: List[float]) -> Optional[tuple]:
+    """(intercept, slope) of the least-squares line, None if degenerate."""
+    n = len(xs)
+    mean_x, mean_y = sum(xs) / n, sum(ys) / n
+    sxx = sum((x - mean_x) ** 2 for x in xs)
+    if sxx <= 0:
+        return None
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / sxx
+    return mean_y - slope * mean_x, slope
+
+
+def _ratio(numerators: List[float], denominators: List[float]) -> Optional[float]:
+    total = sum(denominators)
+    return sum(numerators) / total if total > 0 else None
+
+
+def fit(rows: List[Dict[str, Any]]) -> CostModel:
+    """Fit a CostModel to completed export_jobs rows (see _HISTORY_COLUMNS)."""
+    model = CostModel()
+    now_iso = datetime.now(timezone.utc).isoformat()
+    timed = [
+        r["stage_timings"] for r in rows
+        if isinstance(r.get("stage_timings"), dict) and r["stage_timings"].get("encode_work")
+    ]
+
+    if len(timed) >= ESTIMATOR_MIN_SAMPLES:
+        line = _least_squares(
+            [t["encode_work"] for t in timed], [t["render_seconds"] for t in timed],
+        )
+        if line and line[1] > 0:
+            model = replace(model, overhead_seconds=max(0.0, line[0]), seconds_per_work=line[1])
+
+        download = _ratio(
+            [t["input_bytes"] for t in timed], [t["download_seconds"] for t in timed],
+        )
+        upload = _ratio(
+            [t["output_bytes"] for t in timed], [t["upload_seconds"] for t in timed],
+        )
+        output = _ratio(
+            [t["output_bytes"] for t in timed],
+            [t["output_megapixels"] * t["output_seconds"] for t in timed],
+        )
+        return replace(
+            model,
+            download_bytes_per_second=download or model.download_bytes_per_second,
+            upload_bytes_per_second=upload or model.upload_bytes_per_second,
+            output_bytes_per_mp_second=output or model.output_bytes_per_mp_second,
+            source="stage_timings",
+            samples=len(timed),
+            fitted_at=now_iso,
+        )
+
+    # No stage timings yet: scale the defaults to match the recorded totals
+    legacy = [
+        r for r in rows
+        if r.get("processing_time_seconds") and r.get("duration_seconds")
+    ]
+    if len(legacy) < ESTIMATOR_MIN_SAMPLES:
+        return model
+    predicted, actual = [], []
+    for r in legacy:
+        seconds = float(r["duration_seconds"])
+        features = RenderFeatures(
+            output_seconds=seconds,
+            output_megapixels=LEGACY_CANVAS_MEGAPIXELS,
+            encode_work=seconds * LEGACY_CANVAS_MEGAPIXELS,
+            input_count=1,
+            input_bytes=int(r.get("input_bytes") or 0),
+        )
+        predicted.append(estimate(features, model)["total_seconds"])
+        actual.append(float(r["processing_time_seconds"]))
+    scale = _ratio(actual, predicted) or 1.0
+    return replace(
+        model,
+        overhead_seconds=model.overhead_seconds * scale,
+        seconds_per_work=model.seconds_per_work * scale,
+        source="processing_time",
+        samples=len(legacy),
+        fitted_at=now_iso,
+    )
+
+
+_model: Optional[CostModel] = None
+_model_expires = 0.0
+_model_lock = threading.Lock()
+
+
+def _load_model(supabase) -> CostModel:
+    global _model, _model_expires
+    with _model_lock:
+        if _model is not None and time.monotonic() < _model_expires:
+            return _model
+        try:
+            result = (
+                supabase.table("export_jobs").select(_HISTORY_COLUMNS)
+                .eq("status", "completed")
+                .order("completed_at", desc=True)
+                .limit(ESTIMATOR_HISTORY_ROWS)
+                .execute()
+            )
+            _model = fit(result.data or [])
+            logger.info(
+                "Render cost model fitted from %d jobs (%s): %.2fs/MP-s + %.1fs",
+                _model.samples, _model.source, _model.seconds_per_work, _model.overhead_seconds,
+            )
+        except Exception as exc:
+            logger.warning("Could not fit render cost model, using defaults: %s", exc)
+            _model = _model or CostModel()
+        _model_expires = time.monotonic() + ESTIMATOR_MODEL_TTL
+        return _model
+
+
+async def get_model(supabase) -> CostModel:
+    """The current cost model (refitted at most every ESTIMATOR_MODEL_TTL seconds)."""
+    if _model is not None and time.monotonic() < _model_expires:
+        return _model
+    return await asyncio.to_thread(_load_model, supabase)
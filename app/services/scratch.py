@@ -0,0 +1,329 @@
+"""
+Scratch space for render jobs (downloads, intermediates, outputs).
+
+Jobs used to mkdtemp under the default temp dir with no idea whether the
+disk could hold a multi-GB source, and directories of crashed jobs were
+never removed. All job scratch directories now come from this module:
+
+  - a configurable root (SCRATCH_ROOT), plus an optional fast root
+    (SCRATCH_FAST_ROOT, e.g. a tmpfs such as /dev/shm) used for jobs whose
+    estimate is below SCRATCH_FAST_MAX_MB
+  - admission: a job states an estimated size and only gets a directory if
+    the root's free space, minus SCRATCH_MIN_FREE_MB headroom and minus what
+    other running jobs have reserved but not yet written, can hold it;
+    otherwise ScratchSpaceError is raised and the worker defers the job
+  - job directories are deterministic (<root>/agdoc_<kind>_<job_id>) so a
+    retried job finds the files of its previous attempt (see checkpoints
+    in app/services/job_queue.py)
+  - a sweeper removes job directories not owned by a running job once they
+    have been idle for SCRATCH_ORPHAN_MINUTES (crashed or handed-back jobs
+    whose retry went elsewhere), at startup and periodically. Ownership is
+    an flock on a lock file inside the directory, held from allocate() to
+    release(), so the sweepers of the other worker processes on the host
+    see it too, and the kernel drops it when the owner crashes
+  - allocate() walks the reserved directories to measure them, so callers
+    run it in a thread (asyncio.to_thread), never on the event loop
+  - `usage()` reports disk and reservation metrics per root
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Set
+from dataclasses import dataclass
+import asyncio
+import fcntl
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger("agdoc.scratch")
+logger.setLevel(logging.INFO)
+
+# ---------------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------------
+
+SCRATCH_ROOT = os.getenv("SCRATCH_ROOT") or tempfile.gettempdir()
+# Optional small/fast root (tmpfs) for jobs with small estimates
+SCRATCH_FAST_ROOT = os.getenv("SCRATCH_FAST_ROOT") or None
+SCRATCH_FAST_MAX_MB = int(os.getenv("SCRATCH_FAST_MAX_MB", "256"))
+# Free space that admission always leaves untouched on a root
+SCRATCH_MIN_FREE_MB = int(os.getenv("SCRATCH_MIN_FREE_MB", "1024"))
+# Idle time after which a directory without a running job is swept
+SCRATCH_ORPHAN_MINUTES = int(os.getenv("SCRATCH_ORPHAN_MINUTES", "60"))
+SCRATCH_SWEEP_INTERVAL = 600  # seconds
+
+# Job kinds that own scratch directories; the sweeper only touches
+# directories named agdoc_<kind>_..., so shared caches are never swept.
+SCRATCH_KINDS = ("compose", "slideshow", "subtitle", "yt")
+_DIR_PATTERN = re.compile(r"^agdoc_(%s)_(.+)$" % "|".join(SCRATCH_KINDS))
+
+MB = 1024 * 1024
+
+# Lock file held (flock) by the process owning a job directory
+OWNER_LOCK_FILE = ".owner.lock"
+
+
+class ScratchSpaceError(RuntimeError):
+    """Not enough free scratch space to admit a job right now."""
+
+
+@dataclass
+class _Reservation:
+    path: str
+    root: str
+    estimated_bytes: int
+    created: float
+    lock_fd: int = -1
+
+
+_lock = threading.Lock()
+_reservations: Dict[str, _Reservation] = {}
+_stats = {"admitted": 0, "rejected": 0, "swept_dirs": 0, "swept_bytes": 0}
+
+
+def _roots() -> List[str]:
+    roots = [SCRATCH_ROOT]
+    if SCRATCH_FAST_ROOT and os.path.isdir(SCRATCH_FAST_ROOT):
+        roots.insert(0, SCRATCH_FAST_ROOT)
+    return roots
+
+
+def dir_size(path: str) -> int:
+    """Bytes currently used under `path` (best-effort)."""
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def _lock_owner(path: str) -> int:
+    """
+    Take the owner lock of a job directory without waiting; returns the fd
+    holding it. Raises OSError when another process holds it, or when the
+    directory was swept while the lock was being taken.
+    """
+    lock_path = os.path.join(path, OWNER_LOCK_FILE)
+    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        if os.fstat(fd).st_ino != os.stat(lock_path).st_ino:
+            raise OSError(f"{path} was removed meanwhile")
+    except OSError:
+        os.close(fd)
+        raise
+    return fd
+
+
+def _unlock_owner(fd: int) -> None:
+    if fd >= 0:
+        try:
+            os.close(fd)
+        except OSError:
+            pass
+
+
+def _outstanding_bytes(root: str) -> int:
+    """Reserved but not yet written bytes of running jobs on `root`."""
+    outstanding = 0
+    for r in _reservations.values():
+        if r.root == root:
+            outstanding += max(0, r.estimated_bytes - dir_size(r.path))
+    return outstanding
+
+
+def _admissible_bytes(root: str) -> int:
+    try:
+        free = shutil.disk_usage(root).free
+    except OSError:
+        return 0
+    return free - SCRATCH_MIN_FREE_MB * MB - _outstanding_bytes(root)
+
+
+def allocate(kind: str, job_id: str, estimated_bytes: int) -> str:
+    """
+    Return the scratch directory for a job, creating it after checking that
+    `estimated_bytes` fit. A directory left by an earlier attempt of the same
+    job is reused (its existing contents count toward the estimate).
+
+    Raises ScratchSpaceError when no root can take the job. Blocking (it
+    measures the reserved directories): call it via asyncio.to_thread.
+    """
+    if kind not in SCRATCH_KINDS:
+        raise ValueError(f"Unknown scratch kind: {kind}")
+    name = f"agdoc_{kind}_{job_id}"
+    estimated_bytes = max(0, int(estimated_bytes))
+
+    with _lock:
+        existing = next(
+            (root for root in _roots() if os.path.isdir(os.path.join(root, name))), None,
+        )
+        if existing:
+            candidates = [existing]
+        elif estimated_bytes <= SCRATCH_FAST_MAX_MB * MB:
+            candidates = _roots()
+        else:
+            candidates = [SCRATCH_ROOT]
+
+        for root in candidates:
+            path = os.path.join(root, name)
+            needed = estimated_bytes - (dir_size(path) if root == existing else 0)
+            if needed <= _admissible_bytes(root):
+                os.makedirs(path, exist_ok=True)
+                try:
+                    lock_fd = _lock_owner(path)
+                except OSError as exc:
+                    # Being swept, or still held by a previous attempt
+                    raise ScratchSpaceError(f"Scratch dir {path} is busy: {exc}")
+                os.utime(path)
+                _reservations[path] = _Reservation(path, root, estimated_bytes, time.time(), lock_fd)
+                _stats["admitted"] += 1
+                logger.info(
+                    "Scratch for %s job %s: %s (estimate %.0f MB)",
+                    kind, job_id, path, estimated_bytes / MB,
+                )
+                return path
+
+        _stats["rejected"] += 1
+
+    raise ScratchSpaceError(
+        f"Not enough scratch space for {kind} job {job_id}: "
+        f"needs ~{estimated_bytes / MB:.0f} MB"
+    )
+
+
+def release(path: Optional[str], keep: bool = False) -> None:
+    """
+    Drop a job's reservation and remove its directory, or leave the files in
+    place with keep=True (job handed back for a retry; the sweeper removes
+    them if the retry never comes back to this node).
+    """
+    if not path:
+        return
+    with _lock:
+        reservation = _reservations.pop(path, None)
+    lock_fd = reservation.lock_fd if reservation else -1
+    if keep:
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        _unlock_owner(lock_fd)
+        return
+    shutil.rmtree(path, ignore_errors=True)
+    _unlock_owner(lock_fd)
+    logger.debug("Removed scratch dir %s", path)
+
+
+# ---------------------------------------------------------------------------
+# Sweeper
+# ---------------------------------------------------------------------------
+
+def _last_activity(path: str) -> float:
+    latest = os.path.getmtime(path)
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                latest = max(latest, os.lstat(os.path.join(dirpath, name)).st_mtime)
+            except OSError:
+                pass
+    return latest
+
+
+def sweep(active_job_ids: Optional[Set[str]] = None) -> int:
+    """
+    Remove idle job directories that no running job on this host owns
+    (jobs of other processes hold their directory's owner lock). Returns
+    the number of directories removed.
+    """
+    active_job_ids = active_job_ids or set()
+    cutoff = time.time() - SCRATCH_ORPHAN_MINUTES * 60
+    removed = 0
+    for root in _roots():
+        try:
+            names = os.listdir(root)
+        except OSError:
+            continue
+        for name in names:
+            match = _DIR_PATTERN.match(name)
+            path = os.path.join(root, name)
+            if not match or not os.path.isdir(path):
+                continue
+            with _lock:
+                reserved = path in _reservations
+            if reserved or match.group(2) in active_job_ids:
+                continue
+            try:
+                if _last_activity(path) > cutoff:
+                    continue
+                lock_fd = _lock_owner(path)
+            except OSError:
+                # Gone, or owned by a live job of another process
+                continue
+            try:
+                size = dir_size(path)
+                shutil.rmtree(path, ignore_errors=True)
+            finally:
+                _unlock_owner(lock_fd)
+            removed += 1
+            _stats["swept_dirs"] += 1
+            _stats["swept_bytes"] += size
+            logger.info("Swept orphaned scratch dir %s (%.1f MB)", path, size / MB)
+    return removed
+
+
+async def sweeper_loop(active_job_ids: Callable[[], Set[str]]) -> None:
+    """Sweep at startup and every SCRATCH_SWEEP_INTERVAL seconds."""
+    while True:
+        try:
+            await asyncio.to_thread(sweep, active_job_ids())
+            await asyncio.sleep(SCRATCH_SWEEP_INTERVAL)
+        except asyncio.CancelledError:
+            break
+        except Exception as exc:
+            logger.error("Scratch sweeper error: %s", exc)
+            await asyncio.sleep(SCRATCH_SWEEP_INTERVAL)
+
+
+# ---------------------------------------------------------------------------
+# Metrics
+# ---------------------------------------------------------------------------
+
+def usage() -> Dict[str, Any]:
+    """Disk and reservation metrics per scratch root."""
+    roots = []
+    with _lock:
+        reservations = list(_reservations.values())
+        for root in _roots():
+            try:
+                disk = shutil.disk_usage(root)
+                total, used, free = disk.total, disk.used, disk.free
+            except OSError:
+                total = used = free = 0
+            roots.append({
+                "path": root,
+                "total_mb": round(total / MB),
+                "used_mb": round(used / MB),
+                "free_mb": round(free / MB),
+                "admissible_mb": round(max(0, _admissible_bytes(root)) / MB),
+            })
+    return {
+        "roots": roots,
+        "min_free_mb": SCRATCH_MIN_FREE_MB,
+        "fast_max_mb": SCRATCH_FAST_MAX_MB if SCRATCH_FAST_ROOT else None,
+        "active_jobs": [
+            {
+                "path": r.path,
+                "estimated_mb": round(r.estimated_bytes / MB, 1),
+                "used_mb": round(dir_size(r.path) / MB, 1),
+            }
+            for r in reservations
+        ],
+        **_stats,
+    }
@@ -0,0 +1,95 @@
+"""
+Still-image pre-processing for the render workers (compose + slideshows).
+
+An image segment used to be fed to FFmpeg as `-loop 1 -t <duration> -i
+photo.jpg`: the image2 demuxer re-reads and re-decodes the file for every
+output frame, and each of those frames is then scaled from the original
+size (often a 12-megapixel phone photo) down to the canvas. A 5s still at
+30fps meant 150 full decodes and 150 large rescales.
+
+Instead each still is decoded once with Pillow (JPEG draft mode decodes
+straight at a reduced size), EXIF-rotated, resized to the canvas and
+written as a canvas-sized PNG. The renderer then reads that single frame
+and repeats it in the filter graph (`loop` filter, or zoompan's own frame
+generation for Ken Burns slides), so per-frame cost drops to a copy.
+
+Decoding runs on a small thread pool (Pillow releases the GIL while
+decoding and resampling), off the event loop.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+import asyncio
+import logging
+import os
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger("agdoc.still_images")
+logger.setLevel(logging.INFO)
+
+STILL_IMAGE_WORKERS = int(os.getenv("STILL_IMAGE_WORKERS", "0")) or min(4, os.cpu_count() or 1)
+
+_executor = ThreadPoolExecutor(max_workers=STILL_IMAGE_WORKERS, thread_name_prefix="agdoc-still")
+
+# "fit": scale down to fit inside the canvas, pad with black (compose,
+#        matches scale=...:decrease + pad)
+# "cover": scale to cover the canvas, centre-crop the overflow (slideshows,
+#        matches scale=...:increase + crop)
+STILL_MODES = ("fit", "cover")
+
+
+def _prescale(src: str, dst: str, width: int, height: int, mode: str) -> None:
+    with Image.open(src) as img:
+        # JPEG: let the decoder downscale by 1/2, 1/4 or 1/8 while decoding
+        img.draft("RGB", (width, height))
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+
+        if mode == "cover":
+            frame = ImageOps.fit(img, (width, height), method=Image.Resampling.LANCZOS)
+        else:
+            scaled = ImageOps.contain(img, (width, height), method=Image.Resampling.LANCZOS)
+            frame = Image.new("RGB", (width, height), (0, 0, 0))
+            offset = ((width - scaled.width) // 2, (height - scaled.height) // 2)
+            frame.paste(scaled, offset, scaled if scaled.mode == "RGBA" else None)
+
+        if frame.mode != "RGB":
+            background = Image.new("RGB", frame.size, (0, 0, 0))
+            background.paste(frame, (0, 0), frame)
+            frame = background
+
+        tmp = dst + ".tmp"
+        # Fast, lightly compressed PNG: FFmpeg decodes it exactly once
+        frame.save(tmp, format="PNG", compress_level=1)
+    os.replace(tmp, dst)
+
+
+async def prescale_still(
+    src: str,
+    width: int,
+    height: int,
+    mode: str = "fit",
+) -> Optional[str]:
+    """
+    Return the path of a canvas-sized PNG of the image at `src`, rendering it
+    next to `src` unless it already exists (retried jobs reuse it).
+
+    Returns None if Pillow cannot handle the file; callers then fall back to
+    letting FFmpeg decode the original.
+    """
+    if mode not in STILL_MODES:
+        raise ValueError(f"Unknown still mode: {mode}")
+    dst = f"{os.path.splitext(src)[0]}.{mode}-{width}x{height}.png"
+    if os.path.exists(dst):
+        return dst
+
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(_executor, _prescale, src, dst, width, height, mode)
+    except Exception as exc:
+        logger.warning("Could not pre-scale still %s (%s); FFmpeg will decode it", src, exc)
+        return None
+    logger.info("Pre-scaled still %s -> %dx%d (%s)", os.path.basename(src), width, height, mode)
+    return dst
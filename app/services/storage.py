@@ -0,0 +1,552 @@
+"""
+Object storage shared by every router.
+
+media.py, compose.py and videos.py each used to build their own boto3
+client (only compose had timeouts/retries) and several call sites ran
+boto3 directly on the event loop. This module owns storage access:
+
+  - tuned once: connection pool size, connect/read timeouts, retries
+  - every blocking call runs on a bounded thread pool behind an async
+    facade, with an overall deadline (STORAGE_OPERATION_TIMEOUT) on top of
+    the socket timeouts, so a stalled transfer fails instead of hanging
+  - streaming helpers (put_file / download_file / iter_object) move large
+    objects between disk and storage in chunks instead of whole-file bytes
+  - per-operation latency, error and byte counters (`metrics()`)
+
+The backend is chosen with STORAGE_BACKEND:
+
+  r2      Cloudflare R2 / any S3-compatible endpoint (default)
+  local   files under STORAGE_LOCAL_ROOT
+  memory  a dict in this process (lost on restart)
+
+`local` and `memory` need no network, for load tests and render
+benchmarks on a laptop or CI box. Their objects are served by a small
+HTTP server on STORAGE_LOCAL_PORT (started from the app lifespan), so the
+URLs they return work like CDN URLs: workers download job inputs from
+them and clients can fetch outputs.
+
+All failures surface as StorageError (a RuntimeError, as upload timeouts
+always were).
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, AsyncIterator, BinaryIO, Callable, Deque, Dict, Optional, Tuple
+from urllib.parse import quote, unquote, urlsplit
+import asyncio
+import io
+import logging
+import mimetypes
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger("agdoc.storage")
+logger.setLevel(logging.INFO)
+
+# ---------------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------------
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "r2").lower()
+
+R2_ENDPOINT_URL = os.getenv("R2_ENDPOINT_URL")
+R2_ACCESS_KEY_ID = os.getenv("R2_ACCESS_KEY_ID")
+R2_SECRET_ACCESS_KEY = os.getenv("R2_SECRET_ACCESS_KEY")
+R2_BUCKET_NAME = os.getenv("R2_BUCKET_NAME")
+CDN_DOMAIN = os.getenv("CDN_DOMAIN", "cdn.multivio.com")
+
+# local / memory backends
+STORAGE_LOCAL_ROOT = os.getenv("STORAGE_LOCAL_ROOT") or os.path.join(
+    tempfile.gettempdir(), "agdoc_storage",
+)
+STORAGE_LOCAL_HOST = os.getenv("STORAGE_LOCAL_HOST", "127.0.0.1")
+STORAGE_LOCAL_PORT = int(os.getenv("STORAGE_LOCAL_PORT", "8787"))
+# Base of the URLs handed out by local / memory (default: the local server)
+STORAGE_PUBLIC_URL = (
+    os.getenv("STORAGE_PUBLIC_URL") or f"http://{STORAGE_LOCAL_HOST}:{STORAGE_LOCAL_PORT}"
+).rstrip("/")
+
+# Threads running storage calls; also the HTTP connection pool size so no
+# thread ever waits for a pooled connection.
+STORAGE_MAX_CONCURRENCY = int(os.getenv("STORAGE_MAX_CONCURRENCY", "16"))
+# Overall deadline for one storage operation (seconds), on top of the
+# per-request socket timeouts of the R2 client.
+STORAGE_OPERATION_TIMEOUT = int(os.getenv("STORAGE_OPERATION_TIMEOUT", "180"))
+# Large files go up to R2 as parallel multipart uploads
+MULTIPART_THRESHOLD = 16 * 1024 * 1024
+MULTIPART_CHUNK_SIZE = 16 * 1024 * 1024
+STREAM_CHUNK_SIZE = 256 * 1024
+
+_executor = ThreadPoolExecutor(
+    max_workers=STORAGE_MAX_CONCURRENCY, thread_name_prefix="agdoc-storage",
+)
+
+
+class StorageError(RuntimeError):
+    """A storage operation failed (missing object, backend error, timeout)."""
+
+    def __init__(self, message: str, code: str = "") -> None:
+        super().__init__(message)
+        self.code = code
+
+
+# ---------------------------------------------------------------------------
+# Backends
+#
+# Synchronous; the async facade below runs them on the storage pool.
+# ---------------------------------------------------------------------------
+
+class StorageBackend:
+    """Interface every backend implements."""
+
+    name = ""
+
+    def public_url(self, key: str) -> str:
+        raise NotImplementedError
+
+    def key_from_url(self, url: str) -> str:
+        raise NotImplementedError
+
+    def put_bytes(self, key: str, data: bytes, content_type: str) -> None:
+        raise NotImplementedError
+
+    def put_file(self, path: str, key: str, content_type: str) -> None:
+        raise NotImplementedError
+
+    def open(self, key: str) -> Tuple[BinaryIO, int, str]:
+        """Readable stream, size and content type of an object."""
+        raise NotImplementedError
+
+    def download_file(self, key: str, path: str) -> None:
+        stream, _, _ = self.open(key)
+        with stream, open(path, "wb") as f:
+            shutil.copyfileobj(stream, f, STREAM_CHUNK_SIZE)
+
+    def get_bytes(self, key: str) -> bytes:
+        stream, _, _ = self.open(key)
+        with stream:
+            return stream.read()
+
+    def head(self, key: str) -> Dict[str, Any]:
+        """{"size": bytes, "content_type": str}"""
+        stream, size, content_type = self.open(key)
+        stream.close()
+        return {"size": size, "content_type": content_type}
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def presigned_get_url(self, key: str, expires_in: int, params: Dict[str, Any]) -> str:
+        raise NotImplementedError
+
+
+class R2Backend(StorageBackend):
+    """Cloudflare R2 (or any S3-compatible endpoint) through one pooled boto3 client."""
+
+    name = "r2"
+
+    def __init__(self) -> None:
+        import boto3
+        from boto3.s3.transfer import TransferConfig
+        from botocore.config import Config as BotoConfig
+        from botocore.exceptions import BotoCoreError, ClientError
+
+        self._errors = (BotoCoreError, ClientError)
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=R2_ENDPOINT_URL,
+            aws_access_key_id=R2_ACCESS_KEY_ID,
+            aws_secret_access_key=R2_SECRET_ACCESS_KEY,
+            region_name="auto",  # Cloudflare R2 uses 'auto'
+            config=BotoConfig(
+                connect_timeout=15,        # 15s to establish TCP / TLS handshake
+                read_timeout=120,          # 2 min ceiling for a single S3 request
+                retries={"max_attempts": 3, "mode": "standard"},
+                max_pool_connections=STORAGE_MAX_CONCURRENCY,
+                tcp_keepalive=True,
+                signature_version="s3v4",
+            ),
+        )
+        self.transfer_config = TransferConfig(
+            multipart_threshold=MULTIPART_THRESHOLD,
+            multipart_chunksize=MULTIPART_CHUNK_SIZE,
+            max_concurrency=4,
+            use_threads=True,
+        )
+
+    def _call(self, fn: Callable[[], Any], key: str) -> Any:
+        try:
+            return fn()
+        except self._errors as exc:
+            code = getattr(exc, "response", {}).get("Error", {}).get("Code", "")
+            raise StorageError(f"R2 error for key={key}: {exc}", code=code) from exc
+
+    def public_url(self, key: str) -> str:
+        return f"https://{CDN_DOMAIN}/{key}"
+
+    def key_from_url(self, url: str) -> str:
+        return url.replace(f"https://{CDN_DOMAIN}/", "", 1)
+
+    def put_bytes(self, key: str, data: bytes, content_type: str) -> None:
+        self._call(lambda: self.client.put_object(
+            Bucket=R2_BUCKET_NAME, Key=key, Body=data, ContentType=content_type,
+        ), key)
+
+    def put_file(self, path: str, key: str, content_type: str) -> None:
+        self._call(lambda: self.client.upload_file(
+            path, R2_BUCKET_NAME, key,
+            ExtraArgs={"ContentType": content_type},
+            Config=self.transfer_config,
+        ), key)
+
+    def open(self, key: str) -> Tuple[BinaryIO, int, str]:
+        response = self._call(
+            lambda: self.client.get_object(Bucket=R2_BUCKET_NAME, Key=key), key,
+        )
+        return response["Body"], response.get("ContentLength", 0), response.get("ContentType", "")
+
+    def download_file(self, key: str, path: str) -> None:
+        self._call(lambda: self.client.download_file(
+            R2_BUCKET_NAME, key, path, Config=self.transfer_config,
+        ), key)
+
+    def head(self, key: str) -> Dict[str, Any]:
+        response = self._call(
+            lambda: self.client.head_object(Bucket=R2_BUCKET_NAME, Key=key), key,
+        )
+        return {"size": response.get("ContentLength", 0), "content_type": response.get("ContentType", "")}
+
+    def delete(self, key: str) -> None:
+        self._call(lambda: self.client.delete_object(Bucket=R2_BUCKET_NAME, Key=key), key)
+
+    def presigned_get_url(self, key: str, expires_in: int, params: Dict[str, Any]) -> str:
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": R2_BUCKET_NAME, "Key": key, **params},
+            ExpiresIn=expires_in,
+        )
+
+
+class _ServedBackend(StorageBackend):
+    """Backends whose objects are served by the local HTTP server."""
+
+    def public_url(self, key: str) -> str:
+        return f"{STORAGE_PUBLIC_URL}/{quote(key)}"
+
+    def key_from_url(self, url: str) -> str:
+        prefix = f"{STORAGE_PUBLIC_URL}/"
+        return unquote(url[len(prefix):]) if url.startswith(prefix) else url
+
+    def presigned_get_url(self, key: str, expires_in: int, params: Dict[str, Any]) -> str:
+        # No signing locally; the download filename is honoured by the server
+        disposition = params.get("ResponseContentDisposition")
+        url = self.public_url(key)
+        return f"{url}?response-content-disposition={quote(disposition)}" if disposition else url
+
+
+class LocalBackend(_ServedBackend):
+    """Objects as files under STORAGE_LOCAL_ROOT (content types in a .meta sidecar)."""
+
+    name = "local"
+
+    def __init__(self, root: str = STORAGE_LOCAL_ROOT) -> None:
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise StorageError(f"Invalid key: {key}", code="InvalidKey")
+        return path
+
+    def _write(self, key: str, content_type: str, writer: Callable[[str], None]) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        writer(tmp)
+        os.replace(tmp, path)
+        with open(path + ".meta", "w") as f:
+            f.write(content_type)
+
+    def put_bytes(self, key: str, data: bytes, content_type: str) -> None:
+        def writer(tmp: str) -> None:
+            with open(tmp, "wb") as f:
+                f.write(data)
+        self._write(key, content_type, writer)
+
+    def put_file(self, path: str, key: str, content_type: str) -> None:
+        self._write(key, content_type, lambda tmp: shutil.copyfile(path, tmp))
+
+    def open(self, key: str) -> Tuple[BinaryIO, int, str]:
+        path = self._path(key)
+        try:
+            stream = open(path, "rb")
+        except FileNotFoundError:
+            raise StorageError(f"No such key: {key}", code="NoSuchKey")
+        try:
+            with open(path + ".meta") as f:
+                content_type = f.read()
+        except OSError:
+            content_type = mimetypes.guess_type(key)[0] or "application/octet-stream"
+        return stream, os.fstat(stream.fileno()).st_size, content_type
+
+    def delete(self, key: str) -> None:
+        path = self._path(key)
+        for p in (path, path + ".meta"):
+            try:
+                os.remove(p)
+            except FileNotFoundError:
+                pass
+
+
+class MemoryBackend(_ServedBackend):
+    """Objects in a dict of this process."""
+
+    name = "memory"
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._objects: Dict[str, Tuple[bytes, str]] = {}
+
+    def put_bytes(self, key: str, data: bytes, content_type: str) -> None:
+        with self._lock:
+            self._objects[key] = (bytes(data), content_type)
+
+    def put_file(self, path: str, key: str, content_type: str) -> None:
+        with open(path, "rb") as f:
+            self.put_bytes(key, f.read(), content_type)
+
+    def open(self, key: str) -> Tuple[BinaryIO, int, str]:
+        with self._lock:
+            obj = self._objects.get(key)
+        if obj is None:
+            raise StorageError(f"No such key: {key}", code="NoSuchKey")
+        data, content_type = obj
+        return io.BytesIO(data), len(data), content_type
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._objects.pop(key, None)
+
+
+_BACKENDS = {"r2": R2Backend, "local": LocalBackend, "memory": MemoryBackend}
+
+if STORAGE_BACKEND not in _BACKENDS:
+    raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND} (expected one of {sorted(_BACKENDS)})")
+
+backend: StorageBackend = _BACKENDS[STORAGE_BACKEND]()
+
+
+# ---------------------------------------------------------------------------
+# Local CDN emulation
+# ---------------------------------------------------------------------------
+
+class _ObjectRequestHandler(BaseHTTPRequestHandler):
+    """GET/HEAD /<key> from the active backend, like the CDN would."""
+
+    def _serve(self, send_body: bool) -> None:
+        url = urlsplit(self.path)
+        key = unquote(url.path.lstrip("/"))
+        try:
+            stream, size, content_type = backend.open(key)
+        except StorageError:
+            self.send_error(404, "Not Found")
+            return
+        with stream:
+            self.send_response(200)
+            self.send_header("Content-Type", content_type or "application/octet-stream")
+            self.send_header("Content-Length", str(size))
+            if url.query.startswith("response-content-disposition="):
+                self.send_header("Content-Disposition", unquote(url.query.split("=", 1)[1]))
+            self.end_headers()
+            if send_body:
+                shutil.copyfileobj(stream, self.wfile, STREAM_CHUNK_SIZE)
+
+    def do_GET(self) -> None:  # noqa: N802
+        self._serve(send_body=True)
+
+    def do_HEAD(self) -> None:  # noqa: N802
+        self._serve(send_body=False)
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        logger.debug("local storage server: " + format, *args)
+
+
+def start_local_server() -> Optional[ThreadingHTTPServer]:
+    """
+    Serve local / memory objects at STORAGE_PUBLIC_URL from a daemon
+    thread. No-op for R2, or if the port is taken (another worker process
+    on this box is already serving the same local root).
+    """
+    if not isinstance(backend, _ServedBackend):
+        return None
+    try:
+        server = ThreadingHTTPServer((STORAGE_LOCAL_HOST, STORAGE_LOCAL_PORT), _ObjectRequestHandler)
+    except OSError as exc:
+        logger.warning("Local storage server not started on port %d: %s", STORAGE_LOCAL_PORT, exc)
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="agdoc-storage-http", daemon=True).start()
+    logger.info("Serving %s storage at %s", backend.name, STORAGE_PUBLIC_URL)
+    return server
+
+
+# ---------------------------------------------------------------------------
+# Metrics
+# ---------------------------------------------------------------------------
+
+class _OperationStats:
+    """Counters plus a window of recent latencies for one operation type."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.errors = 0
+        self.bytes = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.recent: Deque[float] = deque(maxlen=512)
+
+    def record(self, seconds: float, nbytes: int, ok: bool) -> None:
+        self.count += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.recent.append(seconds)
+        if ok:
+            self.bytes += nbytes
+        else:
+            self.errors += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        recent = sorted(self.recent)
+
+        def pct(p: float) -> Optional[float]:
+            if not recent:
+                return None
+            return round(recent[min(len(recent) - 1, int(p * len(recent)))] * 1000, 1)
+
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "bytes": self.bytes,
+            "avg_ms": round(self.total_seconds / self.count * 1000, 1) if self.count else None,
+            "p50_ms": pct(0.50),
+            "p95_ms": pct(0.95),
+            "max_ms": round(self.max_seconds * 1000, 1) if self.count else None,
+        }
+
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, _OperationStats] = {}
+
+
+def _record(op: str, seconds: float, nbytes: int, ok: bool) -> None:
+    with _stats_lock:
+        _stats.setdefault(op, _OperationStats()).record(seconds, nbytes, ok)
+
+
+def metrics() -> Dict[str, Any]:
+    """Per-operation storage latency / error / byte counters for this process."""
+    with _stats_lock:
+        return {
+            "backend": backend.name,
+            "max_concurrency": STORAGE_MAX_CONCURRENCY,
+            "operations": {op: stats.snapshot() for op, stats in sorted(_stats.items())},
+        }
+
+
+async def _run(op: str, fn: Callable[[], Any], nbytes: int = 0, key: str = "") -> Any:
+    """Run a blocking storage call on the storage pool, timed and deadline-bound."""
+    loop = asyncio.get_running_loop()
+    start = time.monotonic()
+    ok = False
+    try:
+        result = await asyncio.wait_for(
+            loop.run_in_executor(_executor, fn), timeout=STORAGE_OPERATION_TIMEOUT,
+        )
+        ok = True
+        if isinstance(result, bytes):
+            nbytes += len(result)
+        return result
+    except asyncio.TimeoutError:
+        logger.error("Storage %s timed out after %ds (key=%s)", op, STORAGE_OPERATION_TIMEOUT, key)
+        raise StorageError(
+            f"Storage {op} timed out after {STORAGE_OPERATION_TIMEOUT}s for key={key}", code="Timeout",
+        )
+    finally:
+        _record(op, time.monotonic() - start, nbytes, ok)
+
+
+# ---------------------------------------------------------------------------
+# Async facade
+# ---------------------------------------------------------------------------
+
+def public_url(key: str) -> str:
+    """URL an object is served from (CDN for R2, the local server otherwise)."""
+    return backend.public_url(key)
+
+
+def key_from_url(url: str) -> str:
+    """Inverse of public_url (returns the input unchanged for foreign URLs)."""
+    return backend.key_from_url(url)
+
+
+async def put_bytes(key: str, data: bytes, content_type: str) -> str:
+    """Upload an in-memory object and return its public URL."""
+    await _run("put", lambda: backend.put_bytes(key, data, content_type), nbytes=len(data), key=key)
+    url = public_url(key)
+    logger.info("Uploaded to %s: %s (%d bytes)", backend.name, url, len(data))
+    return url
+
+
+async def put_file(path: str, key: str, content_type: str) -> str:
+    """Stream a local file to storage (multipart above 16 MB on R2) and return its public URL."""
+    size = os.path.getsize(path)
+    await _run("put_file", lambda: backend.put_file(path, key, content_type), nbytes=size, key=key)
+    url = public_url(key)
+    logger.info("Uploaded to %s: %s (%d bytes)", backend.name, url, size)
+    return url
+
+
+async def get_bytes(key: str) -> bytes:
+    """Download an object into memory (small objects only)."""
+    return await _run("get", lambda: backend.get_bytes(key), key=key)
+
+
+async def download_file(key: str, path: str) -> None:
+    """Stream an object to a local file."""
+    await _run("download_file", lambda: backend.download_file(key, path), key=key)
+
+
+async def iter_object(key: str, chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Yield an object's bytes in chunks without holding it in memory."""
+    stream, _, _ = await _run("get_stream", lambda: backend.open(key), key=key)
+    try:
+        while True:
+            chunk = await _run("read", lambda: stream.read(chunk_size), key=key)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        stream.close()
+
+
+async def delete(key: str) -> None:
+    """Delete an object (no error if it does not exist)."""
+    await _run("delete", lambda: backend.delete(key), key=key)
+
+
+async def head(key: str) -> Dict[str, Any]:
+    """{"size", "content_type"} of an object (StorageError if it does not exist)."""
+    return await _run("head", lambda: backend.head(key), key=key)
+
+
+def presigned_get_url(key: str, expires_in: int = 3600, **params: Any) -> str:
+    """
+    Time-limited download URL. Signing is local (no network), so this is
+    safe to call on the event loop.
+    """
+    return backend.presigned_get_url(key, expires_in, params)
@@ -0,0 +1,335 @@
+"""
+Completion webhooks for render and ingest jobs.
+
+Compose, video and YouTube-ingest submissions accept an optional
+`callback_url`. When such a job completes or fails, the worker calls
+notify_job(), which reads the finished row and records a delivery in the
+`webhook_deliveries` table (migration 013). That table is both the outbox
+and the delivery log:
+
+  - a dispatcher loop on every worker process picks up due deliveries and
+    POSTs the JSON payload to the callback URL
+  - a 2xx answer marks the delivery delivered; anything else (or a network
+    error / timeout) schedules a retry with exponential backoff, up to
+    WEBHOOK_MAX_ATTEMPTS, after which it is marked failed
+  - a delivery is claimed by bumping its `attempts` counter with a
+    conditional update, so with several nodes each attempt is made once;
+    the claim pushes `next_attempt_at` out by the request timeout, so a
+    delivery whose dispatcher died mid-request becomes due again by itself
+  - (job table, job id, event) is unique, so a job finished twice (retry
+    after a lost lease) is announced once
+
+Every request is signed so the receiver can verify it came from us:
+
+    X-Agdoc-Event:     job.completed | job.failed
+    X-Agdoc-Delivery:  <delivery id>  (stable across retries, for dedup)
+    X-Agdoc-Signature: t=<unix seconds>,v1=<hex HMAC-SHA256>
+
+v1 is HMAC-SHA256(WEBHOOK_SIGNING_SECRET, "<t>.<raw body>"). The secret
+defaults to INTERNAL_API_KEY, which the Next.js backend already holds.
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import random
+import time
+import uuid
+
+import httpx
+
+from app.utils.database import get_db
+
+logger = logging.getLogger("agdoc.webhooks")
+logger.setLevel(logging.INFO)
+
+# ---------------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------------
+
+WEBHOOK_SIGNING_SECRET = os.getenv("WEBHOOK_SIGNING_SECRET") or os.getenv("INTERNAL_API_KEY") or ""
+# Optional comma-separated allow-list of callback hosts (exact or *.suffix)
+WEBHOOK_ALLOWED_HOSTS = [
+    h.strip().lower() for h in os.getenv("WEBHOOK_ALLOWED_HOSTS", "").split(",") if h.strip()
+]
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "8"))
+WEBHOOK_TIMEOUT_SECONDS = float(os.getenv("WEBHOOK_TIMEOUT_SECONDS", "10"))
+# Retry n waits BACKOFF_BASE * 2^(n-1) seconds (+/- 20% jitter), capped
+WEBHOOK_BACKOFF_BASE_SECONDS = 15
+WEBHOOK_BACKOFF_MAX_SECONDS = 3600
+# Idle poll interval of the dispatcher; new deliveries made here wake it up
+WEBHOOK_POLL_INTERVAL = 5
+WEBHOOK_BATCH_SIZE = 20
+MAX_CALLBACK_URL_LENGTH = 2048
+
+# Events sent for a job's final status (cancellations are initiated by the
+# caller, so they are not announced back)
+STATUS_EVENTS = {"completed": "job.completed", "failed": "job.failed"}
+
+# Per job table: the kind reported in the payload and the columns sent
+JOB_TABLES: Dict[str, Dict[str, Any]] = {
+    "export_jobs": {
+        "kind": "compose",
+        "columns": (
+            "output_url", "renditions", "error", "duration_seconds",
+            "file_size_bytes", "processing_time_seconds", "completed_at",
+        ),
+    },
+    "video_jobs": {
+        "kind": "video",
+        "columns": (
+            "job_type", "output_url", "error", "duration_seconds",
+            "file_size_bytes", "processing_time_seconds", "completed_at",
+        ),
+    },
+    "youtube_ingest_jobs": {
+        "kind": "youtube_ingest",
+        "columns": ("r2_url", "r2_key", "duration", "title", "error"),
+    },
+}
+
+_wake: Optional[asyncio.Event] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+# ---------------------------------------------------------------------------
+# Submission side
+# ---------------------------------------------------------------------------
+
+def validate_callback_url(url: Any) -> Optional[str]:
+    """
+    Normalise a submitted callback_url (None / "" = no webhook).
+    Raises ValueError with a client-facing message if it is unusable.
+    """
+    if url is None or url == "":
+        return None
+    if not isinstance(url, str) or len(url) > MAX_CALLBACK_URL_LENGTH:
+        raise ValueError("callback_url must be a URL string")
+    url = url.strip()
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise ValueError("callback_url must be an absolute http(s) URL")
+    if WEBHOOK_ALLOWED_HOSTS:
+        host = parsed.hostname.lower()
+        allowed = any(
+            host == pattern or (pattern.startswith("*.") and host.endswith(pattern[1:]))
+            for pattern in WEBHOOK_ALLOWED_HOSTS
+        )
+        if not allowed:
+            raise ValueError(f"callback_url host {host} is not allowed")
+    return url
+
+
+def sign(body: bytes, timestamp: Optional[int] = None) -> str:
+    """X-Agdoc-Signature header value for a request body."""
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    digest = hmac.new(
+        WEBHOOK_SIGNING_SECRET.encode(), f"{timestamp}.".encode() + body, hashlib.sha256,
+    ).hexdigest()
+    return f"t={timestamp},v1={digest}"
+
+
+# ---------------------------------------------------------------------------
+# Worker side
+# ---------------------------------------------------------------------------
+
+def _payload(table: str, job: Dict[str, Any], event: str) -> Dict[str, Any]:
+    spec = JOB_TABLES[table]
+    payload = {
+        "event": event,
+        "kind": spec["kind"],
+        "job_id": job["id"],
+        "user_id": job.get("user_id"),
+        "status": job.get("status"),
+    }
+    payload.update({column: job.get(column) for column in spec["columns"]})
+    return payload
+
+
+def notify_job(supabase, table: str, job_id: str) -> Optional[str]:
+    """
+    Record the webhook delivery for a job that just reached its final
+    status, if it was submitted with a callback_url. Reads the row so the
+    payload reflects what was actually stored (a job cancelled meanwhile
+    is not announced). Never raises; returns the delivery id.
+    """
+    try:
+        spec = JOB_TABLES[table]
+        columns = ",".join(("id", "user_id", "status", "callback_url") + spec["columns"])
+        result = supabase.table(table).select(columns).eq("id", job_id).execute()
+        if not result.data:
+            return None
+        job = result.data[0]
+        event = STATUS_EVENTS.get(job.get("status"))
+        if not job.get("callback_url") or not event:
+            return None
+
+        delivery_id = str(uuid.uuid4())
+        now_iso = datetime.now(timezone.utc).isoformat()
+        inserted = supabase.table("webhook_deliveries").upsert({
+            "id": delivery_id,
+            "job_table": table,
+            "job_id": job_id,
+            "user_id": job.get("user_id"),
+            "event": event,
+            "url": job["callback_url"],
+            "payload": _payload(table, job, event),
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": now_iso,
+            "created_at": now_iso,
+            "updated_at": now_iso,
+        }, on_conflict="job_table,job_id,event", ignore_duplicates=True).execute()
+        if not inserted.data:
+            return None  # already announced by an earlier attempt
+    except Exception as exc:
+        logger.error("Could not record webhook for %s job %s: %s", table, job_id, exc)
+        return None
+
+    logger.info("Webhook %s queued for %s job %s -> %s", event, table, job_id, job["callback_url"])
+    _wake_dispatcher()
+    return delivery_id
+
+
+def _wake_dispatcher() -> None:
+    if _loop is not None and _wake is not None:
+        try:
+            _loop.call_soon_threadsafe(_wake.set)
+        except RuntimeError:
+            pass  # loop closed (shutdown)
+
+
+# ---------------------------------------------------------------------------
+# Dispatcher
+# ---------------------------------------------------------------------------
+
+def _backoff_seconds(attempts: int) -> float:
+    delay = min(WEBHOOK_BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), WEBHOOK_BACKOFF_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _claim_due(supabase) -> List[Dict[str, Any]]:
+    now = datetime.now(timezone.utc)
+    due = (
+        supabase.table("webhook_deliveries")
+        .select("id,url,event,payload,attempts")
+        .in_("status", ["pending", "delivering"])
+        .lte("next_attempt_at", now.isoformat())
+        .order("next_attempt_at")
+        .limit(WEBHOOK_BATCH_SIZE)
+        .execute()
+    )
+    lease_until = (now + timedelta(seconds=WEBHOOK_TIMEOUT_SECONDS * 3)).isoformat()
+    claimed = []
+    for row in due.data or []:
+        result = (
+            supabase.table("webhook_deliveries")
+            .update({
+                "status": "delivering",
+                "attempts": row["attempts"] + 1,
+                "next_attempt_at": lease_until,
+                "updated_at": now.isoformat(),
+            })
+            .eq("id", row["id"])
+            .eq("attempts", row["attempts"])
+            .execute()
+        )
+        if result.data:
+            claimed.append({**row, "attempts": row["attempts"] + 1})
+    return claimed
+
+
+async def _deliver(client: httpx.AsyncClient, supabase, delivery: Dict[str, Any]) -> None:
+    body = json.dumps(delivery["payload"], default=str, separators=(",", ":")).encode()
+    headers = {
+        "Content-Type": "application/json",
+        "User-Agent": "agdoc-webhooks/1",
+        "X-Agdoc-Event": delivery["event"],
+        "X-Agdoc-Delivery": delivery["id"],
+        "X-Agdoc-Signature": sign(body),
+    }
+    status_code: Optional[int] = None
+    error: Optional[str] = None
+    try:
+        response = await client.post(delivery["url"], content=body, headers=headers)
+        status_code = response.status_code
+        if not 200 <= status_code < 300:
+            error = f"HTTP {status_code}: {response.text[:500]}"
+    except httpx.HTTPError as exc:
+        error = f"{type(exc).__name__}: {exc}"[:500]
+
+    now = datetime.now(timezone.utc)
+    attempts = delivery["attempts"]
+    update: Dict[str, Any] = {
+        "last_status_code": status_code,
+        "last_error": error,
+        "updated_at": now.isoformat(),
+    }
+    if error is None:
+        update.update({"status": "delivered", "delivered_at": now.isoformat()})
+        logger.info("Webhook %s delivered (attempt %d)", delivery["id"], attempts)
+    elif attempts >= WEBHOOK_MAX_ATTEMPTS or status_code == 410:
+        update["status"] = "failed"
+        logger.warning("Webhook %s gave up after %d attempts: %s", delivery["id"], attempts, error)
+    else:
+        retry_at = now + timedelta(seconds=_backoff_seconds(attempts))
+        update.update({"status": "pending", "next_attempt_at": retry_at.isoformat()})
+        logger.info(
+            "Webhook %s attempt %d failed (%s); retrying at %s",
+            delivery["id"], attempts, error, retry_at.isoformat(),
+        )
+
+    await asyncio.to_thread(
+        lambda: supabase.table("webhook_deliveries").update(update)
+        .eq("id", delivery["id"]).eq("attempts", attempts).execute()
+    )
+
+
+async def dispatcher_loop() -> None:
+    """Deliver due webhooks until cancelled. Every worker process runs one."""
+    global _wake, _loop
+    _loop = asyncio.get_running_loop()
+    _wake = asyncio.Event()
+    logger.info("Webhook dispatcher started")
+
+    async with httpx.AsyncClient(
+        timeout=httpx.Timeout(WEBHOOK_TIMEOUT_SECONDS), follow_redirects=False,
+    ) as client:
+        while True:
+            try:
+                _wake.clear()
+                supabase = get_db(admin_access=True)()
+                claimed = await asyncio.to_thread(_claim_due, supabase)
+                if claimed:
+                    await asyncio.gather(*(_deliver(client, supabase, d) for d in claimed))
+                    continue
+                try:
+                    await asyncio.wait_for(_wake.wait(), timeout=WEBHOOK_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                logger.info("Webhook dispatcher shutting down")
+                break
+            except Exception as exc:
+                logger.error("Webhook dispatcher error: %s", exc)
+                await asyncio.sleep(WEBHOOK_POLL_INTERVAL)
+
+    _loop = _wake = None
+
+
+def list_deliveries(supabase, job_id: str) -> List[Dict[str, Any]]:
+    """Delivery log of one job (newest first), without payloads."""
+    result = (
+        supabase.table("webhook_deliveries")
+        .select("id,job_table,event,url,status,attempts,last_status_code,last_error,next_attempt_at,delivered_at,created_at,updated_at")
+        .eq("job_id", job_id)
+        .order("created_at", desc=True)
+        .execute()
+    )
+    return result.data or []
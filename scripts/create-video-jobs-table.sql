@@ -5,7 +5,7 @@ CREATE TABLE IF NOT EXISTS video_jobs (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
     user_id TEXT NOT NULL,
     job_type TEXT NOT NULL DEFAULT 'slideshow',  -- 'slideshow', 'subtitle_burn', etc.
-    status TEXT NOT NULL DEFAULT 'queued' CHECK (status IN ('queued', 'processing', 'completed', 'failed')),
+    status TEXT NOT NULL DEFAULT 'queued' CHECK (status IN ('queued', 'processing', 'completed', 'failed', 'cancelled')),
     progress INTEGER DEFAULT 0,
     progress_stage TEXT,
     params JSONB,              -- job-specific parameters (slides, effects, etc.)
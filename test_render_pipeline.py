@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+Unit checks for the pure parts of the render pipeline (filter graphs,
+compiled timelines, queue helpers, estimators).
+Runs without FFmpeg, a database or object storage: nothing is rendered,
+only the commands, graphs and plans are inspected.
+
+Run with `python test_render_pipeline.py` or `pytest test_render_pipeline.py`.
+"""
+import sys
+import os
+import asyncio
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi import HTTPException
+
+from app.routers import compose
+from app.services import admission, job_queue, pagination, render_estimator
+
+
+def _image_segment(index=0, start=0.0, end=4.0, still_path="still.png"):
+    return compose.Segment(
+        index=index, media_type="image", media_url=f"https://cdn.example.com/{index}.jpg",
+        start_time=start, end_time=end, local_path=f"seg_{index}.jpg", still_path=still_path,
+    )
+
+
+def _video_segment(index=0, start=0.0, end=5.0, source_start=0.0):
+    return compose.Segment(
+        index=index, media_type="video", media_url=f"https://cdn.example.com/{index}.mp4",
+        start_time=start, end_time=end, local_path=f"seg_{index}.mp4", source_start=source_start,
+    )
+
+
+def test_still_graph_runs_at_30fps():
+    """A pre-scaled still is read at 30fps, retimed to 1/30 and kept on the canvas."""
+    inputs, parts, v_out, a_out = compose._build_timeline_graph(
+        [_image_segment(end=4.0)], 1080, 1920, {0: False},
+    )
+    assert inputs[:4] == ["-framerate", "30", "-i", "still.png"]
+    chain = parts[0]
+    assert "scale=1080:1920:force_original_aspect_ratio=decrease" in chain
+    assert "pad=1080:1920" in chain
+    assert "loop=loop=119:size=1" in chain
+    assert "settb=1/30,setpts=N/30/TB" in chain
+    assert chain.endswith("fps=30[v0]")
+    assert (v_out, a_out) == ("outv", "outa")
+
+
+def test_still_and_video_share_a_timebase_for_xfade():
+    """Both sides of an xfade end in fps=30 (same frame rate and timebase)."""
+    video = _video_segment(0, 0.0, 5.0)
+    video.transition_to_next = compose.Transition(type="crossfade", duration=0.5)
+    still = _image_segment(1, 5.0, 9.0)
+    _, parts, _, _ = compose._build_timeline_graph([video, still], 1080, 1920, {0: True, 1: False})
+    video_chains = [p for p in parts if p.endswith(("[v0]", "[v1]"))]
+    assert len(video_chains) == 2
+    assert all(",fps=30[" in p for p in video_chains)
+    assert any("xfade=transition=fade:duration=0.500000:offset=4.500000" in p for p in parts)
+
+
+def _layered_composition():
+    """Two base clips joined by a 1s crossfade, a picture-in-picture clip and music."""
+    return {
+        "tracks": [
+            {"id": "main", "type": "video"},
+            {"id": "pip", "type": "pip"},
+            {"id": "music", "type": "music", "volume": 0.5},
+        ],
+        "layers": [
+            {"id": "l1", "mediaUrl": "https://cdn.example.com/a.mp4"},
+            {"id": "l2", "mediaUrl": "https://cdn.example.com/b.mp4"},
+            {"id": "lp", "mediaUrl": "https://cdn.example.com/p.mp4", "x": 0.75, "y": 0.25, "width": 0.4, "height": 0.4},
+            {"id": "lm", "audioUrl": "https://cdn.example.com/song.mp3"},
+        ],
+        "clips": [
+            {"id": "c1", "trackId": "main", "layerId": "l1", "startTime": 0, "endTime": 5},
+            {"id": "c2", "trackId": "main", "layerId": "l2", "startTime": 5, "endTime": 10},
+            {"id": "cp", "trackId": "pip", "layerId": "lp", "startTime": 6, "endTime": 8},
+            {"id": "cm", "trackId": "music", "layerId": "lm", "startTime": 0, "endTime": 10},
+        ],
+        "transitions": [{"fromClipId": "c1", "toClipId": "c2", "type": "crossfade", "duration": 1}],
+    }
+
+
+def test_compile_timeline_keeps_layers_and_mix_apart_from_segments():
+    timeline = compose._compile_timeline(_layered_composition())
+    assert timeline["v"] == compose.TIMELINE_IR_VERSION
+    assert [s["url"] for s in timeline["segments"]] == [
+        "https://cdn.example.com/a.mp4", "https://cdn.example.com/b.mp4",
+    ]
+    (layer,) = timeline["layers"]
+    assert (layer["type"], layer["start"], layer["end"], layer["width"]) == ("video", 6.0, 8.0, 0.4)
+    (mix,) = timeline["mix"]
+    assert (mix["start"], mix["end"], mix["volume"]) == (0.0, 10.0, 0.5)
+
+
+def test_compile_timeline_single_track_has_no_layers():
+    composition = _layered_composition()
+    composition["tracks"] = composition["tracks"][:1]
+    timeline = compose._compile_timeline(composition)
+    assert "layers" not in timeline and "mix" not in timeline
+
+
+def test_raised_video_track_is_upper_only_over_a_base_track():
+    alone = {"tracks": [{"id": "a", "type": "video", "layer": 1}]}
+    assert compose._video_tracks(alone) == ({"a"}, [])
+    stacked = {"tracks": [{"id": "a", "type": "video", "layer": 1}, {"id": "b", "type": "video", "zIndex": 2}]}
+    assert compose._video_tracks(stacked) == ({"a"}, ["b"])
+
+
+def test_output_time_runs_ahead_by_the_transitions_before_it():
+    timeline = compose._compile_timeline(_layered_composition())
+    segments = compose._timeline_segments(timeline)
+    assert compose._output_time(3.0, segments) == 3.0
+    assert compose._output_time(6.0, segments) == 5.0
+    assert compose._output_time(12.0, segments) == 9.0
+
+
+def test_layers_and_mix_are_applied_once_after_the_chain():
+    """One input per layer clip, placed by output time over the xfaded program."""
+    timeline = compose._compile_timeline(_layered_composition())
+    segments = compose._planning_segments(timeline)
+    layers = compose._planning_layers(timeline, segments, 1080, 1920)
+    (ov,) = layers.overlays
+    (mix,) = layers.audio_mix
+    assert (ov.start, ov.end) == (5.0, 7.0)
+    assert (mix.start, mix.end) == (0.0, 9.0)  # plays through the crossfade, cut at the end
+
+    inputs, parts, v_out, a_out = compose._build_timeline_graph(
+        segments, 1080, 1920, {0: True, 1: True}, layers=layers,
+    )
+    assert inputs.count("-i") == 4
+    assert any(p.startswith("[vacc1][l0]overlay=") for p in parts)
+    assert any(p.startswith("[aacc1][m0]amix=inputs=2") for p in parts)
+    assert (v_out, a_out) == ("outl0", "outmix")
+
+    _, audio_parts, v_none, _ = compose._build_timeline_graph(
+        segments, 1080, 1920, {0: True, 1: True}, streams="a", layers=layers,
+    )
+    assert v_none is None and not any("overlay=" in p for p in audio_parts)
+
+
+def test_audio_track_key_ignores_the_picture():
+    video = _video_segment(0, 0.0, 5.0)
+    still = _image_segment(1, 5.0, 9.0)
+    flags = {0: True, 1: False}
+    key = compose._track_cache_key([video, still], flags)
+    restyled = compose.OutputLayers(overlays=[compose.OverlayPlacement(path="text.png", x=0, y=0, start=1.0, end=2.0)])
+    assert compose._track_cache_key([video, _image_segment(1, 5.0, 9.0, "other.png")], flags, restyled) == key
+
+    voiced = _video_segment(0, 0.0, 5.0)
+    voiced.audio_overlay_url, voiced.audio_overlay_local_path = "https://cdn.example.com/vo.mp3", "vo.mp3"
+    assert compose._track_cache_key([voiced, still], flags) != key
+    music = compose.OutputLayers(audio_mix=[compose.AudioMix(path="m.mp3", start=0.0, end=9.0, url="m")])
+    assert compose._track_cache_key([video, still], flags, music) != key
+
+
+def test_audio_only_pass_reads_clip_windows_without_video():
+    inputs, parts, v_out, a_out = compose._build_timeline_graph(
+        [_video_segment(0, 0.0, 5.0, source_start=12.0)], 1080, 1920, {0: True}, streams="a",
+    )
+    assert inputs == ["-vn", "-ss", "12.000000", "-t", "5.000000", "-i", "seg_0.mp4"]
+    assert parts[0].startswith("[0:a]atrim=0.0:5.0,")
+    assert v_out is None and a_out == "outa"
+
+
+def test_worker_lanes_default_to_one_slot():
+    assert job_queue.parse_worker_lanes(None) == [("interactive", "standard", "batch")]
+    assert job_queue.parse_worker_lanes("") == job_queue.parse_worker_lanes(job_queue.DEFAULT_WORKER_LANES)
+
+
+def test_worker_lanes_parse_slots_and_drop_unknown_lanes():
+    spec = " Interactive, standard ; interactive,standard,batch,bogus"
+    assert job_queue.parse_worker_lanes(spec) == [
+        ("interactive", "standard"), ("interactive", "standard", "batch"),
+    ]
+    assert job_queue.parse_worker_lanes("bogus;;") == [("interactive", "standard", "batch")]
+
+
+class _FakeRpcError(Exception):
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.code = code
+
+
+class _ClaimDb:
+    """Queue with one queued job; the claim rpc raises `rpc_error`."""
+
+    def __init__(self, rpc_error):
+        self.rpc_error = rpc_error
+        self.updates = []
+
+    def rpc(self, name, params):
+        raise self.rpc_error
+
+    def table(self, name):
+        db, query = self, _RecordingQuery()
+        query.execute = lambda: type("R", (), {"data": db._result(query)})()
+        return query
+
+    def _result(self, query):
+        names = [c[0] for c in query.calls]
+        if "update" in names:
+            self.updates.append(query.calls[names.index("update")][1][0])
+            return [{"id": "j1"}]
+        return [{"id": "j1", "user_id": "u1", "attempts": 2}]
+
+
+def test_claim_falls_back_to_fifo_only_without_the_function():
+    db = _ClaimDb(_FakeRpcError("Could not find the function claim_render_job", code="PGRST202"))
+    job = job_queue.claim_next_job(db, "export_jobs")
+    (update,) = db.updates
+    assert update["worker_id"] == job_queue.WORKER_ID and update["lease_expires_at"]
+    assert update["attempts"] == 3 and job["attempts"] == 3
+
+
+def test_claim_does_not_fall_back_after_a_timeout():
+    db = _ClaimDb(TimeoutError("read timed out"))
+    assert job_queue.claim_next_job(db, "export_jobs") is None
+    assert db.updates == []
+
+
+class _BatchRequest:
+    """Stands in for the Starlette request of POST /batch."""
+
+    def __init__(self, body):
+        self.headers = {"x-api-key": "test-key"}
+        self._body = body
+
+    async def json(self):
+        return self._body
+
+
+class _NoQueueDb:
+    """Fails the test if anything reads or writes the queue."""
+
+    def table(self, name):
+        raise AssertionError(f"unexpected query on {name}")
+
+    def rpc(self, name, params):
+        raise AssertionError(f"unexpected rpc {name}")
+
+
+def _submit_batch(jobs):
+    saved, compose.INTERNAL_API_KEY = compose.INTERNAL_API_KEY, "test-key"
+    request = _BatchRequest({"user_id": "u1", "jobs": jobs})
+    try:
+        asyncio.run(compose.create_compose_batch(request, supabase=_NoQueueDb()))
+    except HTTPException as exc:
+        return exc
+    finally:
+        compose.INTERNAL_API_KEY = saved
+    raise AssertionError("batch was accepted")
+
+
+def test_admission_refuses_more_jobs_than_a_user_may_hold_without_retry():
+    limit = admission.ADMISSION_MAX_USER_OUTSTANDING
+    decision = admission.check(_NoQueueDb(), "u1", "batch", [("batch",)], new_jobs=limit + 1)
+    assert not decision.accepted and decision.reason == "too_many_jobs"
+    assert decision.retry_after is None
+
+
+def test_batch_over_the_user_limit_is_rejected_as_not_retryable():
+    limit = admission.ADMISSION_MAX_USER_OUTSTANDING
+    exc = _submit_batch([{"composition": _layered_composition()}] * (limit + 1))
+    assert exc.status_code == 413
+    assert exc.detail["reason"] == "too_many_jobs"
+    assert not exc.headers or "Retry-After" not in exc.headers
+
+
+def test_batch_user_limit_counts_every_lane():
+    """Half the jobs in each of two lanes still add up against one user's limit."""
+    half = admission.ADMISSION_MAX_USER_OUTSTANDING // 2 + 1
+    jobs = (
+        [{"composition": _layered_composition(), "priority": "standard"}] * half
+        + [{"composition": _layered_composition(), "priority": "batch"}] * half
+    )
+    exc = _submit_batch(jobs)
+    assert exc.status_code == 413 and exc.detail["reason"] == "too_many_jobs"
+
+
+def _features(seconds=30.0, megapixels=2.0736, inputs=3, input_bytes=50 * 1024 * 1024):
+    return render_estimator.RenderFeatures(
+        output_seconds=seconds, output_megapixels=megapixels,
+        encode_work=seconds * megapixels, input_count=inputs, input_bytes=input_bytes,
+    )
+
+
+def test_estimate_sums_its_stages():
+    result = render_estimator.estimate(_features(), render_estimator.CostModel())
+    stages = result["download_seconds"] + result["encode_seconds"] + result["upload_seconds"]
+    assert abs(result["total_seconds"] - stages) <= 0.2
+    assert result["download_bytes"] == 50 * 1024 * 1024
+    longer = render_estimator.estimate(_features(seconds=60.0), render_estimator.CostModel())
+    assert longer["encode_seconds"] > result["encode_seconds"]
+
+
+def test_fit_recovers_the_encode_line_from_stage_timings():
+    rows = []
+    for k in range(render_estimator.ESTIMATOR_MIN_SAMPLES):
+        features = _features(seconds=10.0 + 5 * k)
+        rows.append({"stage_timings": render_estimator.stage_timings(
+            features, download_seconds=2.0, render_seconds=3.0 + 0.25 * features.encode_work,
+            upload_seconds=1.0, input_bytes=features.input_bytes, output_bytes=10 * 1024 * 1024,
+        )})
+    model = render_estimator.fit(rows)
+    assert model.source == "stage_timings" and model.samples == len(rows)
+    assert abs(model.seconds_per_work - 0.25) < 1e-3
+    assert abs(model.overhead_seconds - 3.0) < 0.05
+
+
+def test_fit_keeps_defaults_without_enough_history():
+    model = render_estimator.fit([{"processing_time_seconds": 40, "duration_seconds": 30}])
+    assert model == render_estimator.CostModel()
+
+
+class _RecordingQuery:
+    """Stands in for a PostgREST query builder; records the calls made on it."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+        return call
+
+
+def test_pagination_first_page_fetches_one_extra_row():
+    query = pagination.apply(_RecordingQuery(), None, 20)
+    assert [c[0] for c in query.calls] == ["order", "order", "limit"]
+    assert query.calls[-1][1] == (21,)
+
+
+def test_pagination_cursor_continues_after_last_row():
+    cursor = pagination.encode_cursor({"created_at": "2026-10-01T00:00:00+00:00", "id": "b"})
+    query = pagination.apply(_RecordingQuery(), cursor, 10, offset=40)
+    names = [c[0] for c in query.calls]
+    assert names == ["or_", "order", "order", "limit"]  # offset ignored with a cursor
+    assert 'id.lt."b"' in query.calls[0][1][0]
+
+
+def test_pagination_offset_uses_range_instead_of_limit():
+    query = pagination.apply(_RecordingQuery(), None, 10, offset=30)
+    names = [c[0] for c in query.calls]
+    assert "limit" not in names
+    assert query.calls[-1] == ("range", (30, 40), {})
+
+
+def test_pagination_page_has_exact_next_cursor():
+    rows = [{"created_at": f"2026-10-0{9 - i}", "id": str(i)} for i in range(4)]
+    listing = pagination.page(rows, 3)
+    assert listing["count"] == 3 and listing["has_more"]
+    assert pagination.decode_cursor(listing["next_cursor"]) == ("2026-10-07", "2")
+    last = pagination.page(rows[:2], 3)
+    assert not last["has_more"] and last["next_cursor"] is None
+
+
+def test_pagination_rejects_malformed_cursor():
+    for bad in ("not-base64!", pagination.encode_cursor({"created_at": 'x",id', "id": "1"})):
+        try:
+            pagination.decode_cursor(bad)
+        except ValueError:
+            continue
+        raise AssertionError(f"accepted {bad!r}")
+
+
+def main():
+    tests = [(name, fn) for name, fn in sorted(globals().items())
+             if name.startswith("test_") and callable(fn)]
+    failed = 0
+    for name, fn in tests:
+        try:
+            fn()
+            print(f"✓ {name}")
+        except Exception as e:
+            failed += 1
+            print(f"✗ {name}: {e!r}")
+    print(f"\nOverall: {len(tests) - failed}/{len(tests)} tests passed")
+    return failed == 0
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)